@@ -0,0 +1,38 @@
+from fastapi import APIRouter, HTTPException, Depends, Header, status
+from fastapi.responses import FileResponse
+from typing import Optional
+import secrets
+
+from core.config import settings
+from core.profiling import profile_store
+
+router = APIRouter()
+
+
+def require_admin(x_admin_token: Optional[str] = Header(None)):
+    # без ADMIN_TOKEN админ-эндпоинты недоступны совсем
+    if not settings.ADMIN_TOKEN or not x_admin_token \
+            or not secrets.compare_digest(x_admin_token, settings.ADMIN_TOKEN):
+        raise HTTPException(
+            status_code=status.HTTP_403_FORBIDDEN,
+            detail="Admin token required"
+        )
+
+
+@router.get("/profiles", dependencies=[Depends(require_admin)])
+async def list_profiles():
+    # список сохраненных профилей, новые первыми
+    return profile_store.list()
+
+
+@router.get("/profiles/{name}", dependencies=[Depends(require_admin)])
+async def download_profile(name: str):
+    # скачивание профиля в формате collapsed stacks
+    path = profile_store.path(name)
+    if path is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Profile not found"
+        )
+
+    return FileResponse(path, media_type="text/plain", filename=name)
@@ -1,44 +1,120 @@
-from fastapi import APIRouter, HTTPException, Depends, status, Query
+from fastapi import APIRouter, HTTPException, Depends, status, Query, Header, Request, Response
+from fastapi.responses import StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from sqlalchemy import or_
 from typing import List, Optional
 import uuid
-from datetime import datetime
-
-from core.database import get_db
-from models.note import AudioNote
-from schemas.note import NoteResponse, NoteCreate, NoteUpdate
+from datetime import datetime, timezone
+
+from core.auth import current_user_id
+from core.compression import IDENTITY, accepts_encoding
+from core.database import AsyncSessionLocal, choose_replica, get_db, get_read_db, get_write_db
+from core.etag import note_etag, etag_matches, text_etag
+from core.json_response import FastJSONResponse
+from core.metrics import TEXT_RESPONSES
+from models.note import ACTIVE_NOTE_STATUSES, AudioNote
+from models.note_text import NoteText
+from schemas.note import (NoteResponse, NoteCreate, NoteUpdate, NoteSearchResult, SegmentSearchResult, TranscriptWindow,
+                          UsageStats)
 
 from services.note_service import NoteService
+from services.export_service import ExportService, EXPORT_FORMATS
+from services.waveform_service import WaveformService, WAVEFORM_CONTENT_TYPE, WAVEFORM_IMMUTABLE
+from services.embedding_service import SemanticSearchService, semantic_search_available
+from services.transcript_service import TranscriptService
+from services.note_text_service import NoteTextService, decoded_body
+from services.usage_service import UsageService
 
 router = APIRouter()
 
+ACTIVE_STATUS_FILTER = "active"
+
+
+def set_etag_headers(response: Response, etag: str):
+    # no-cache: браузер хранит ответ, но всегда перепроверяет его через If-None-Match
+    response.headers["ETag"] = etag
+    response.headers["Cache-Control"] = "private, no-cache"
+
+
+def not_modified(etag: str) -> Response:
+    # 304 отдается напрямую, минуя response_model и сериализацию
+    return Response(
+        status_code=status.HTTP_304_NOT_MODIFIED,
+        headers={"ETag": etag, "Cache-Control": "private, no-cache"}
+    )
+
+
+def naive_utc(value: Optional[datetime]) -> Optional[datetime]:
+    # created_at хранится как timestamp без зоны (UTC)
+    if value is not None and value.tzinfo is not None:
+        return value.astimezone(timezone.utc).replace(tzinfo=None)
+    return value
+
+
+# поиск по search_vector (миграция 0003): слова, а не подстроки, как было с ILIKE '%...%'
+SEARCH_DESCRIPTION = (
+    "Full-text search in title, notes and transcript: every word of the query must match "
+    "the beginning of a word (case-insensitive, 'meet' finds 'meeting'). "
+    "Substrings inside words are not matched ('eting' does not find 'meeting')"
+)
+
+
+def note_filters(search: Optional[str], status_filter: Optional[List[str]], tags: Optional[List[str]],
+                 created_after: Optional[datetime], created_before: Optional[datetime],
+                 updated_before: Optional[datetime] = None) -> dict:
+    filters = {}
+    if search:
+        filters['search'] = search
+    if status_filter:
+        # "active" - все незавершенные статусы (частичный индекс ix_audio_notes_active_updated_at)
+        statuses = set()
+        for value in status_filter:
+            statuses.update(ACTIVE_NOTE_STATUSES if value == ACTIVE_STATUS_FILTER else [value])
+        filters['status'] = sorted(statuses)
+    if tags:
+        filters['tags'] = tags
+    if created_after:
+        filters['created_after'] = naive_utc(created_after)
+    if created_before:
+        filters['created_before'] = naive_utc(created_before)
+    if updated_before:
+        filters['updated_before'] = naive_utc(updated_before)
+    return filters
+
 
 @router.get("/notes", response_model=List[NoteResponse])
 async def get_notes(
         skip: int = Query(0, ge=0),
         limit: int = Query(100, ge=1, le=1000),
-        search: Optional[str] = Query(None),
-        status_filter: Optional[str] =  Query(None),
+        search: Optional[str] = Query(None, description=SEARCH_DESCRIPTION),
+        status_filter: Optional[List[str]] = Query(None),
         tags: Optional[List[str]] = Query(None),
-        db: AsyncSession = Depends(get_db)
+        created_after: Optional[datetime] = Query(None),
+        created_before: Optional[datetime] = Query(None),
+        updated_before: Optional[datetime] = Query(None),
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_db),
+        read_db: Optional[AsyncSession] = Depends(get_read_db),
+        user_id: uuid.UUID = Depends(current_user_id)
 ):
-    # Асинхронное получение списка заметок с фильтрацией
+    # Асинхронное получение списка заметок с фильтрацией (с реплики, если она есть и не отстает)
     try:
-        note_service = NoteService(db)
-
-        # Подготавливаем фильтры
-        filters = {}
-        if search:
-            filters['search'] = search
-        if status_filter:
-            filters['status'] = status_filter
-        if tags:
-            filters['tags'] = tags
-
-        notes = await note_service.get_notes(skip, limit, filters)
-        return notes
+        note_service = NoteService(db, read_db, user_id)
+
+        # Подготавливаем фильтры (created_after/created_before - полуинтервал [after, before))
+        # status_filter можно передать несколько раз: ?status_filter=pending&status_filter=error, active - все незавершенные
+        filters = note_filters(search, status_filter, tags, created_after, created_before, updated_before)
+
+        # условный запрос: если список не менялся - 304 без тела
+        etag = await note_service.get_notes_etag(skip, limit, filters)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+        body = await note_service.get_notes_json(skip, limit, filters)
+        response = FastJSONResponse(content=body)
+        set_etag_headers(response, etag)
+        return response
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -46,21 +122,112 @@ async def get_notes(
         )
 
 
+@router.get("/notes/export")
+async def export_notes(
+        request: Request,
+        export_format: str = Query("ndjson", alias="format", pattern="^(ndjson|csv)$"),
+        search: Optional[str] = Query(None, description=SEARCH_DESCRIPTION),
+        status_filter: Optional[List[str]] = Query(None),
+        tags: Optional[List[str]] = Query(None),
+        created_after: Optional[datetime] = Query(None),
+        created_before: Optional[datetime] = Query(None),
+        updated_before: Optional[datetime] = Query(None),
+        user_id: uuid.UUID = Depends(current_user_id)
+):
+    # Потоковая выгрузка всех заметок в NDJSON / CSV
+    # объявлен до /notes/{note_id}, иначе "export" разбирается как uuid
+    filters = note_filters(search, status_filter, tags, created_after, created_before, updated_before)
+
+    # выгрузка читает долго и много - с реплики; отказ реплики посреди потока обрывает выгрузку
+    replica = await choose_replica(request)
+    export_service = ExportService(replica.session_factory if replica is not None else AsyncSessionLocal,
+                                   user_id=user_id)
+    filename = f"notes_export_{datetime.utcnow():%Y%m%d_%H%M%S}.{export_format}"
+
+    return StreamingResponse(
+        export_service.export(export_format, filters),
+        media_type=EXPORT_FORMATS[export_format],
+        headers={"Content-Disposition": f'attachment; filename="{filename}"'}
+    )
+
+
+def require_semantic_search():
+    if not semantic_search_available():
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Semantic search is not available"
+        )
+
+
+def search_results(matches) -> List[NoteSearchResult]:
+    return [
+        NoteSearchResult.model_validate({**NoteResponse.model_validate(note).model_dump(), "score": score})
+        for note, score in matches
+    ]
+
+
+@router.get("/notes/search", response_model=List[NoteSearchResult])
+async def semantic_search(
+        semantic: str = Query(..., min_length=1, max_length=1000),
+        limit: int = Query(20, ge=1, le=100),
+        db: AsyncSession = Depends(get_db),
+        user_id: uuid.UUID = Depends(current_user_id)
+):
+    # Поиск заметок по смыслу транскрипта и саммари (ближайшие эмбеддинги, pgvector)
+    # объявлен до /notes/{note_id}, иначе "search" разбирается как uuid
+    require_semantic_search()
+    matches = await SemanticSearchService(db, user_id).search(semantic, limit)
+    return search_results(matches)
+
+
+@router.get("/notes/segments", response_model=List[SegmentSearchResult])
+async def search_segments(
+        search: str = Query(..., min_length=1, max_length=1000),
+        limit: int = Query(50, ge=1, le=500),
+        db: AsyncSession = Depends(get_db),
+        read_db: Optional[AsyncSession] = Depends(get_read_db),
+        user_id: uuid.UUID = Depends(current_user_id)
+):
+    # Полнотекстовый поиск по сегментам транскриптов: заметка и смещение в аудио (start_ms/end_ms) для перехода
+    # объявлен до /notes/{note_id}, иначе "segments" разбирается как uuid
+    return await TranscriptService(db, read_db, user_id).search(search, limit)
+
+
+@router.get("/stats", response_model=UsageStats)
+async def get_stats(
+        db: AsyncSession = Depends(get_db),
+        read_db: Optional[AsyncSession] = Depends(get_read_db),
+        user_id: uuid.UUID = Depends(current_user_id)
+):
+    # Статистика для дашборда из счетчиков usage_counters: время ответа не зависит от числа заметок
+    return await UsageService(db, read_db, user_id).get_stats()
+
+
 @router.get("/notes/{note_id}", response_model=NoteResponse)
 async def get_note(
         note_id: uuid.UUID,
-        db: AsyncSession = Depends(get_db)
+        response: Response,
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_db),
+        read_db: Optional[AsyncSession] = Depends(get_read_db),
+        user_id: uuid.UUID = Depends(current_user_id)
 ):
     # Асинхронное получение конкретной заметки
 
     try:
-        note_service = NoteService(db)
-        note_to_return = await note_service.get_note(note_id)
+        note_service = NoteService(db, read_db, user_id)
+        note_to_return = await note_service.get_cached_note(note_id)
         if note_to_return is None:
             raise HTTPException(
                 status_code=status.HTTP_404_NOT_FOUND,
                 detail="Note not found"
             )
+
+        etag = note_etag(note_to_return.id, note_to_return.updated_at)
+        if etag_matches(if_none_match, etag):
+            return not_modified(etag)
+
+        set_etag_headers(response, etag)
         return note_to_return
 
     except HTTPException:
@@ -75,11 +242,12 @@ async def get_note(
 @router.post("/notes", response_model=NoteResponse, status_code=status.HTTP_201_CREATED)
 async def create_note(
         note: NoteCreate,
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_write_db),
+        user_id: uuid.UUID = Depends(current_user_id)
 ):
     # Асинхронное создание заметки
     try:
-        note_service = NoteService(db)
+        note_service = NoteService(db, user_id=user_id)
         created_note = await note_service.create_note(note)
         return created_note
         '''
@@ -109,11 +277,12 @@ async def create_note(
 async def update_note(
         note_id: uuid.UUID,
         note_update_data: NoteUpdate,
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_write_db),
+        user_id: uuid.UUID = Depends(current_user_id)
 ):
     # Асинхронное обновление заметки
     try:
-        note_service = NoteService(db)
+        note_service = NoteService(db, user_id=user_id)
         note_to_edit = await note_service.get_note(note_id)
         if note_to_edit is None:
             raise HTTPException(
@@ -160,11 +329,12 @@ async def update_note(
 @router.delete("/notes/{note_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_note(
         note_id: uuid.UUID,
-        db: AsyncSession = Depends(get_db)
+        db: AsyncSession = Depends(get_write_db),
+        user_id: uuid.UUID = Depends(current_user_id)
 ):
     # Асинхронное удаление заметки
     try:
-        note_service = NoteService(db)
+        note_service = NoteService(db, user_id=user_id)
         note_to_edit = await note_service.get_note(note_id)
         if note_to_edit is None:
             raise HTTPException(
@@ -201,46 +371,151 @@ async def delete_note(
         )
 
 
-@router.get("/notes/{note_id}/transcription", response_model=dict)
+async def text_document_response(document: NoteText, accept_encoding: Optional[str],
+                                 if_none_match: Optional[str]) -> Response:
+    # сохраненный документ как есть: сжатые байты с Content-Encoding, если клиент его принимает,
+    # иначе распакованный JSON; Vary - кэши не отдают сжатый ответ клиенту без поддержки кодирования
+    etag = text_etag(document.note_id, document.kind, document.updated_at)
+    headers = {"ETag": etag, "Cache-Control": "private, no-cache", "Vary": "Accept-Encoding"}
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    if accepts_encoding(accept_encoding, document.encoding):
+        body = document.body
+        if document.encoding != IDENTITY:
+            headers["Content-Encoding"] = document.encoding
+        TEXT_RESPONSES.labels(kind=document.kind, mode="passthrough").inc()
+    else:
+        body = await decoded_body(document)
+        TEXT_RESPONSES.labels(kind=document.kind, mode="decoded").inc()
+    return Response(content=body, media_type="application/json", headers=headers)
+
+
+@router.get("/notes/{note_id}/transcription", response_model=TranscriptWindow)
 async def get_transcription(
         note_id: uuid.UUID,
-        db: AsyncSession = Depends(get_db)
+        from_ms: Optional[int] = Query(None, ge=0, description="Window start, ms from the beginning of the audio"),
+        to_ms: Optional[int] = Query(None, gt=0, description="Window end (exclusive), none - until the end"),
+        limit: Optional[int] = Query(None, ge=1, le=1000, description="Segments per page (200 if a window is given)"),
+        accept_encoding: Optional[str] = Header(None),
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_db),
+        read_db: Optional[AsyncSession] = Depends(get_read_db),
+        user_id: uuid.UUID = Depends(current_user_id)
 ):
-    # Получение транскрибации заметки  TODO - в бизнес-логику
-    note_service = NoteService(db)
-
-    #note_transcription = await note
-    '''
-    result = await db.execute(
-        select(AudioNote.transcription).where(AudioNote.id == note_id)
-    )
-    transcription = result.scalar_one_or_none()
+    # Без параметров - весь транскрипт: сохраненный сжатый документ отдается как есть (note_texts).
+    # С окном - сегменты, пересекающие [from_ms, to_ms), постранично: следующая страница -
+    # тот же запрос с from_ms=next_from_ms; transcription - текст сегментов страницы
+    whole = from_ms is None and to_ms is None and limit is None
+    if whole:
+        document = await NoteTextService(db, read_db, user_id).get(note_id, "transcription")
+        if document is not None:
+            return await text_document_response(document, accept_encoding, if_none_match)
+        # документа еще нет (заметка до миграции 0012) - весь транскрипт из сегментов
+        TEXT_RESPONSES.labels(kind="transcription", mode="assembled").inc()
+
+    from_ms = from_ms or 0
+    if to_ms is not None and to_ms <= from_ms:
+        raise HTTPException(
+            status_code=status.HTTP_422_UNPROCESSABLE_ENTITY,
+            detail="to_ms must be greater than from_ms"
+        )
 
-    if not transcription:
+    window_limit = None if whole else limit or 200
+    window = await TranscriptService(db, read_db, user_id).get_window(note_id, from_ms, to_ms, window_limit)
+    if window is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Transcription not found or not processed yet"
         )
 
-    return {"transcription": transcription}
-    '''
+    return window
 
 
 @router.get("/notes/{note_id}/summary", response_model=dict)
 async def get_summary(
         note_id: uuid.UUID,
-        db: AsyncSession = Depends(get_db)
+        accept_encoding: Optional[str] = Header(None),
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_db),
+        read_db: Optional[AsyncSession] = Depends(get_read_db),
+        user_id: uuid.UUID = Depends(current_user_id)
 ):
-    # Получение суммаризации заметки TODO - в бизнес-логику
-    result = await db.execute(
-        select(AudioNote.summary).where(AudioNote.id == note_id)
-    )
-    summary = result.scalar_one_or_none()
-
-    if not summary:
+    # Получение суммаризации заметки: сохраненный документ как есть, без него - из колонки
+    # select_fields - саммари старых заметок лежит в архивной таблице
+    texts = NoteTextService(db, read_db, user_id)
+    document = await texts.get(note_id, "summary")
+    if document is not None:
+        return await text_document_response(document, accept_encoding, if_none_match)
+
+    summary = await texts.build(note_id, "summary")
+    if summary is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Summary not found or not processed yet"
         )
 
-    return {"summary": summary}
\ No newline at end of file
+    TEXT_RESPONSES.labels(kind="summary", mode="assembled").inc()
+    return summary
+
+
+@router.get("/notes/{note_id}/waveform")
+async def get_waveform(
+        note_id: uuid.UUID,
+        resolution: int = Query(1024, ge=1, le=65536, description="Desired number of peaks (player width in px)"),
+        v: Optional[uuid.UUID] = Query(None, description="Waveform version (waveform_version of the note): "
+                                                         "the response is cached as immutable"),
+        if_none_match: Optional[str] = Header(None),
+        db: AsyncSession = Depends(get_db),
+        read_db: Optional[AsyncSession] = Depends(get_read_db),
+        user_id: uuid.UUID = Depends(current_user_id)
+):
+    # Пики waveform в формате .dat audiowaveform (заголовок + пары min/max) - самый грубый уровень,
+    # в котором не меньше resolution пиков. С v = waveform_version заметки URL меняется вместе с аудио,
+    # ответ кэшируется на год без ревалидации. Без v (или с устаревшей версией) URL общий для всех загрузок:
+    # браузер ревалидирует по ETag (id файла + уровень) и получает 304 без чтения S3
+    if await NoteService(db, read_db, user_id).get_cached_note(note_id) is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found"
+        )
+
+    waveform_service = WaveformService(db, user_id)
+    waveform = await waveform_service.get_level(note_id, resolution)
+    if waveform is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Waveform not found or not processed yet"
+        )
+
+    audio_file, level = waveform
+    etag = f'"wf-{audio_file.id.hex}-{level["samples_per_pixel"]}"'
+    headers = {
+        "ETag": etag,
+        "Cache-Control": WAVEFORM_IMMUTABLE if v == audio_file.id else "private, no-cache",
+        "X-Waveform-Samples-Per-Pixel": str(level["samples_per_pixel"]),
+    }
+    # 304 без обращения к S3
+    if etag_matches(if_none_match, etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+
+    data = await waveform_service.read_level(audio_file, level)
+    return Response(content=data, media_type=WAVEFORM_CONTENT_TYPE, headers=headers)
+
+
+@router.get("/notes/{note_id}/similar", response_model=List[NoteSearchResult])
+async def get_similar_notes(
+        note_id: uuid.UUID,
+        limit: int = Query(10, ge=1, le=100),
+        db: AsyncSession = Depends(get_db),
+        user_id: uuid.UUID = Depends(current_user_id)
+):
+    # Заметки пользователя, близкие по смыслу к данной
+    require_semantic_search()
+    matches = await SemanticSearchService(db, user_id).similar(note_id, limit)
+    if matches is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Note not found or not indexed yet"
+        )
+    return search_results(matches)
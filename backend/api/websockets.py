@@ -1,5 +1,8 @@
-from fastapi import APIRouter, WebSocket, WebSocketDisconnect
-from services.upload_service import UploadService
+from fastapi import APIRouter, Depends, WebSocket, WebSocketDisconnect, status
+from services.upload_service import UploadService, upload_tracker
+from services.upload_mux_service import UploadMultiplexer
+from core.admission import AdmissionRejected, client_id, upload_admission
+from core.auth import current_user_id, current_user_tier
 from core.database import get_db
 import uuid
 
@@ -7,17 +10,39 @@ router = APIRouter()
 
 
 @router.websocket("/ws/upload/{note_id}")
-async def websocket_upload_audio(websocket: WebSocket, note_id: uuid.UUID):
+async def websocket_upload_audio(websocket: WebSocket, note_id: uuid.UUID,
+                                 user_id: uuid.UUID = Depends(current_user_id),
+                                 tier: str = Depends(current_user_tier)):
+    # протокол: метаданные {"filename", "file_size"} -> "ready" -> кадры аудио -> "completed";
+    # {"stream": true, "format"} - запись еще идет: кадры до {"event": "end"}, между ними partial/segment
+    # транскрипта, после конца записи - "transcribed" (транскрипт сохранен) и "completed"
+    # воркер останавливается - новые загрузки не принимаем, клиент переподключится к другому
+    if upload_tracker.draining:
+        await websocket.close(code=status.WS_1012_SERVICE_RESTART)
+        return
+
     await websocket.accept()
+    upload_tracker.start()
+    db_session_generator = get_db()
+    close_code = status.WS_1000_NORMAL_CLOSURE
 
     try:
-        # Получаем сессию БД
-        db_session_generator = get_db()
-        db = await db_session_generator.__anext__()
+        # место в воркере занимается до сессии БД: загрузки в очереди не держат соединения пула
+        async with upload_admission.slot(client_id(websocket.client.host if websocket.client else None)):
+            # Получаем сессию БД
+            db = await db_session_generator.__anext__()
 
-        upload_service = UploadService(db)
-        await upload_service.handle_upload(websocket, note_id)
+            upload_service = UploadService(db, user_id, tier)
+            await upload_service.handle_upload(websocket, note_id)
 
+    except AdmissionRejected as e:
+        # HTTP 503 на рукопожатии Starlette отдать не может - ошибка с retry_after и код 1013 (Try Again Later)
+        await websocket.send_json({
+            "status": "error",
+            "message": e.reason,
+            "retry_after": e.retry_after
+        })
+        close_code = status.WS_1013_TRY_AGAIN_LATER
     except WebSocketDisconnect:
         print(f"Client disconnected from note {note_id}")
     except Exception as e:
@@ -26,4 +51,21 @@ async def websocket_upload_audio(websocket: WebSocket, note_id: uuid.UUID):
             "message": f"Unexpected error: {str(e)}"
         })
     finally:
-        await websocket.close()
\ No newline at end of file
+        # закрываем генератор, чтобы сессия вернула соединение в пул
+        await db_session_generator.aclose()
+        upload_tracker.finish()
+        await websocket.close(code=close_code)
+
+
+@router.websocket("/ws/upload")
+async def websocket_upload_multiplexed(websocket: WebSocket,
+                                       user_id: uuid.UUID = Depends(current_user_id),
+                                       tier: str = Depends(current_user_tier)):
+    # загрузки нескольких заметок по одному соединению: кадры с stream_id, окно управления потоком
+    # на каждый поток (протокол - services/upload_mux_service.py); соединение закрывает клиент
+    if upload_tracker.draining:
+        await websocket.close(code=status.WS_1012_SERVICE_RESTART)
+        return
+
+    await websocket.accept()
+    await UploadMultiplexer(websocket, user_id, tier).run()
@@ -0,0 +1,51 @@
+import asyncio
+import time
+from typing import Dict, List
+
+import httpx
+
+from benchmarks.common import summarize, seed_notes
+from core.cache import note_cache
+
+# Пропускная способность GET /api/v1/notes при разных limit, с кэшем и без
+
+
+async def load(client: httpx.AsyncClient, path: str, requests: int, concurrency: int) -> Dict[str, float]:
+    latencies: List[float] = []
+    counter = iter(range(requests))
+
+    async def worker():
+        for _ in counter:
+            started = time.perf_counter()
+            response = await client.get(path)
+            response.raise_for_status()
+            latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*[worker() for _ in range(concurrency)])
+    return summarize(latencies, time.perf_counter() - started, requests)
+
+
+async def run(rows: int, limits: List[int], requests: int, concurrency: int) -> Dict[str, Dict[str, float]]:
+    from main import app
+    from core.admission import rate_limiter
+
+    # все запросы идут от одного клиента - лимит API здесь не измеряется
+    rate_limiter.enabled = False
+
+    await seed_notes(rows)
+    results = {}
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+        for cached in (False, True):
+            note_cache.enabled = cached
+            for limit in limits:
+                path = f"/api/v1/notes?limit={limit}"
+                await load(client, path, concurrency, concurrency)
+                key = f"api.list_notes[limit={limit},cache={'on' if cached else 'off'},c={concurrency}]"
+                results[key] = await load(client, path, requests, concurrency)
+                print(f"{key}: {results[key]['ops_per_s']} req/s")
+
+    note_cache.enabled = True
+    return results
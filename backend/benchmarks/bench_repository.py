@@ -0,0 +1,97 @@
+import random
+from typing import Dict, List
+
+from sqlalchemy import text
+
+from benchmarks.common import BENCH_USER, timed, seed_notes, TAGS
+from core.database import AsyncSessionLocal, engine
+from db_layer.note_db_interaction import NoteDBInteraction
+
+# NoteDBInteraction: CRUD и фильтры на таблицах разного размера
+
+
+async def sample_ids(count: int) -> List:
+    async with engine.connect() as conn:
+        result = await conn.execute(text("SELECT id FROM audio_notes TABLESAMPLE SYSTEM (1) LIMIT :n"), {"n": count})
+        ids = [row[0] for row in result]
+        if not ids:
+            result = await conn.execute(text("SELECT id FROM audio_notes LIMIT :n"), {"n": count})
+            ids = [row[0] for row in result]
+    return ids
+
+
+async def run(sizes: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+
+    for size in sorted(sizes):
+        await seed_notes(size)
+        ids = await sample_ids(1000)
+        print(f"repository: {size} rows seeded")
+
+        async with AsyncSessionLocal() as session:
+            repository = NoteDBInteraction(session, user_id=BENCH_USER)
+
+            async def get_by_id():
+                await repository.get_by_id(random.choice(ids))
+                session.expunge_all()
+
+            async def list_first_page():
+                await repository.get_all(0, 100)
+                session.expunge_all()
+
+            async def list_by_status():
+                await repository.get_all(0, 100, {"status": "pending_transcription"})
+                session.expunge_all()
+
+            async def list_by_tags():
+                await repository.get_all(0, 100, {"tags": [random.choice(TAGS)]})
+                session.expunge_all()
+
+            async def list_search():
+                await repository.get_all(0, 100, {"search": "recorded"})
+                session.expunge_all()
+
+            async def list_deep_offset():
+                await repository.get_all(size // 2, 100)
+                session.expunge_all()
+
+            async def list_version():
+                await repository.get_list_version({"status": "completed"})
+
+            benches = {
+                "get_by_id": get_by_id,
+                "get_all_limit100": list_first_page,
+                "get_all_status": list_by_status,
+                "get_all_tags": list_by_tags,
+                "get_all_search": list_search,
+                "get_all_deep_offset": list_deep_offset,
+                "get_list_version": list_version,
+            }
+            for name, operation in benches.items():
+                results[f"repository.{name}[{size}]"] = await timed(operation, repeat)
+
+            created = []
+
+            async def create():
+                note = await repository.create({
+                    "title": "bench note",
+                    "tags": ["bench"],
+                    "audio_filename": "bench.webm",
+                    "status": "pending"
+                })
+                created.append(note.id)
+                session.expunge_all()
+
+            async def update():
+                await repository.update(random.choice(created), {"title": "bench note updated"})
+                session.expunge_all()
+
+            async def delete():
+                await repository.delete(created.pop())
+                session.expunge_all()
+
+            results[f"repository.create[{size}]"] = await timed(create, repeat)
+            results[f"repository.update[{size}]"] = await timed(update, repeat)
+            results[f"repository.delete[{size}]"] = await timed(delete, min(repeat, len(created) - 3), warmup=3)
+
+    return results
@@ -0,0 +1,46 @@
+import os
+from typing import Dict, List
+
+from benchmarks.common import timed
+from core.s3_client import s3_client
+
+# Латентность операций S3Client (put/get/delete/presign/multipart)
+
+
+async def run(sizes_kb: List[int], repeat: int) -> Dict[str, Dict[str, float]]:
+    results = {}
+
+    for size_kb in sizes_kb:
+        payload = os.urandom(size_kb * 1024)
+        keys = []
+
+        async def upload():
+            keys.append(await s3_client.upload_file(payload, "bench.webm"))
+
+        async def download():
+            await s3_client.download_file(keys[-1])
+
+        async def presign():
+            await s3_client.generate_presigned_url(keys[-1])
+
+        async def delete():
+            await s3_client.delete_file(keys.pop())
+
+        results[f"s3.upload_file[{size_kb}KB]"] = await timed(upload, repeat)
+        results[f"s3.download_file[{size_kb}KB]"] = await timed(download, repeat)
+        results[f"s3.generate_presigned_url[{size_kb}KB]"] = await timed(presign, repeat)
+        results[f"s3.delete_file[{size_kb}KB]"] = await timed(delete, min(repeat, len(keys) - 3))
+
+    # multipart: 3 части по 5 МБ
+    part = os.urandom(5 * 1024 * 1024)
+
+    async def multipart():
+        async def chunks():
+            for _ in range(3):
+                yield part
+
+        key = await s3_client.upload_multipart(chunks(), "bench.webm")
+        await s3_client.delete_file(key)
+
+    results["s3.upload_multipart[15MB]"] = await timed(multipart, max(repeat // 10, 3), warmup=1)
+    return results
@@ -0,0 +1,166 @@
+import asyncio
+import json
+import os
+import socket
+import struct
+import time
+from typing import Dict, List
+
+import httpx
+import uvicorn
+import websockets
+
+from benchmarks.common import summarize
+
+# WebSocket загрузка аудио: MB/s при нескольких одновременных клиентах (сокет на заметку) и при тех же
+# загрузках потоками одного мультиплексированного соединения /ws/upload
+# поднимается настоящий uvicorn на локальном порту, S3 - in-memory заглушка
+
+FRAME_HEADER = struct.Struct(">I")
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+async def upload_one(base_url: str, ws_url: str, payload: bytes, chunk_size: int) -> float:
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        note = (await client.post("/api/v1/notes", json={"title": "bench upload", "tags": ["bench"]})).json()
+
+    started = time.perf_counter()
+    async with websockets.connect(f"{ws_url}/ws/upload/{note['id']}", max_size=None) as ws:
+        await ws.send(json.dumps({"filename": "bench.webm", "file_size": len(payload)}))
+        ready = json.loads(await ws.recv())
+        if ready.get("status") != "ready":
+            raise RuntimeError(f"Upload not accepted: {ready}")
+
+        async def read_until_done():
+            while True:
+                message = json.loads(await ws.recv())
+                if message["status"] in ("completed", "error"):
+                    return message
+
+        reader = asyncio.create_task(read_until_done())
+        for offset in range(0, len(payload), chunk_size):
+            await ws.send(payload[offset:offset + chunk_size])
+
+        result = await reader
+        if result["status"] != "completed":
+            raise RuntimeError(f"Upload failed: {result}")
+
+    return (time.perf_counter() - started) * 1000
+
+
+async def upload_multiplexed(base_url: str, ws_url: str, payload: bytes, streams: int,
+                             chunk_size: int) -> List[float]:
+    # streams загрузок по одному соединению: кадры каждого потока отправляются, пока позволяет его окно
+    async with httpx.AsyncClient(base_url=base_url) as client:
+        notes = [(await client.post("/api/v1/notes", json={"title": "bench upload", "tags": ["bench"]})).json()
+                 for _ in range(streams)]
+
+    async with websockets.connect(f"{ws_url}/ws/upload", max_size=None) as ws:
+        state = {stream_id: {"window": 0, "credit": asyncio.Event(), "ready": asyncio.Event(),
+                             "done": asyncio.get_running_loop().create_future()}
+                 for stream_id in range(1, streams + 1)}
+
+        async def dispatch():
+            async for raw in ws:
+                message = json.loads(raw)
+                stream = state.get(message.get("stream_id"))
+                if stream is None:
+                    raise RuntimeError(f"Connection error: {message}")
+                if message["status"] == "opened":
+                    stream["window"] = message["window"]
+                elif message["status"] == "ready":
+                    stream["ready"].set()
+                elif message["status"] == "window":
+                    stream["window"] += message["increment"]
+                    stream["credit"].set()
+                elif message["status"] in ("completed", "error") and not stream["done"].done():
+                    stream["done"].set_result(message)
+
+        async def send_stream(stream_id: int, note_id: str) -> float:
+            stream = state[stream_id]
+            started = time.perf_counter()
+            await ws.send(json.dumps({"stream_id": stream_id, "note_id": note_id,
+                                      "filename": "bench.webm", "file_size": len(payload)}))
+            await stream["ready"].wait()
+            header = FRAME_HEADER.pack(stream_id)
+            for offset in range(0, len(payload), chunk_size):
+                chunk = payload[offset:offset + chunk_size]
+                while stream["window"] < len(chunk):
+                    stream["credit"].clear()
+                    await stream["credit"].wait()
+                stream["window"] -= len(chunk)
+                await ws.send(header + chunk)
+
+            result = await stream["done"]
+            if result["status"] != "completed":
+                raise RuntimeError(f"Upload failed: {result}")
+            return (time.perf_counter() - started) * 1000
+
+        reader = asyncio.create_task(dispatch())
+        try:
+            return await asyncio.gather(*(send_stream(stream_id, note["id"])
+                                          for stream_id, note in zip(state, notes)))
+        finally:
+            reader.cancel()
+
+
+async def run(file_size_mb: float, clients: List[int], uploads_per_client: int,
+              chunk_size: int = 64 * 1024) -> Dict[str, Dict[str, float]]:
+    from main import app
+    from core.admission import rate_limiter, upload_admission
+
+    # заметки для загрузок создаются пачками через REST - лимит API здесь не измеряется
+    rate_limiter.enabled = False
+    # все клиенты бенчмарка - один адрес 127.0.0.1: лимит на клиента иначе отклонил бы сокеты сверх него
+    upload_admission.max_per_client = max(upload_admission.max_per_client, max(clients))
+
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    server_task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.05)
+
+    payload = os.urandom(int(file_size_mb * 1024 * 1024))
+    results = {}
+    try:
+        for concurrency in clients:
+            latencies: List[float] = []
+
+            async def client():
+                for _ in range(uploads_per_client):
+                    latencies.append(await upload_one(f"http://127.0.0.1:{port}", f"ws://127.0.0.1:{port}", payload, chunk_size))
+
+            started = time.perf_counter()
+            await asyncio.gather(*[client() for _ in range(concurrency)])
+            elapsed = time.perf_counter() - started
+
+            total = concurrency * uploads_per_client
+            stats = summarize(latencies, elapsed, total)
+            stats["mb_per_s"] = round(total * len(payload) / 1024 / 1024 / elapsed, 2)
+            key = f"upload.websocket[size={file_size_mb}MB,clients={concurrency}]"
+            results[key] = stats
+            print(f"{key}: {stats['mb_per_s']} MB/s")
+
+            # те же загрузки потоками одного соединения
+            latencies = []
+            started = time.perf_counter()
+            for _ in range(uploads_per_client):
+                latencies.extend(await upload_multiplexed(f"http://127.0.0.1:{port}", f"ws://127.0.0.1:{port}",
+                                                          payload, concurrency, chunk_size))
+            elapsed = time.perf_counter() - started
+
+            stats = summarize(latencies, elapsed, total)
+            stats["mb_per_s"] = round(total * len(payload) / 1024 / 1024 / elapsed, 2)
+            key = f"upload.websocket_mux[size={file_size_mb}MB,streams={concurrency}]"
+            results[key] = stats
+            print(f"{key}: {stats['mb_per_s']} MB/s")
+    finally:
+        server.should_exit = True
+        await server_task
+
+    return results
@@ -0,0 +1,138 @@
+import asyncio
+import json
+import os
+import platform
+import statistics
+import subprocess
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+from core import database
+from core.config import settings
+from init_db import run_migrations
+
+STATUSES = ["pending", "uploading", "pending_transcription", "pending_summarization", "completed", "error"]
+TAGS = ["work", "personal", "meeting", "idea", "todo", "call", "lecture", "draft"]
+# владелец синтетических заметок по умолчанию - пользователь запросов API без X-User-Token:
+# бенчмарки поднимают приложение в своем процессе в однопользовательском режиме
+BENCH_USER = uuid.UUID(settings.DEFAULT_USER_ID) if settings.DEFAULT_USER_ID else uuid.UUID(int=0)
+settings.DEFAULT_USER_ID = str(BENCH_USER)
+
+
+def summarize(latencies_ms: List[float], elapsed_s: Optional[float] = None, operations: Optional[int] = None) -> Dict[str, float]:
+    # p50/p95/mean в мс и ops/s
+    ordered = sorted(latencies_ms)
+    operations = operations if operations is not None else len(ordered)
+    elapsed_s = elapsed_s if elapsed_s is not None else sum(ordered) / 1000
+    return {
+        "p50_ms": round(statistics.median(ordered), 4),
+        "p95_ms": round(ordered[max(int(len(ordered) * 0.95) - 1, 0)], 4),
+        "mean_ms": round(statistics.fmean(ordered), 4),
+        "ops_per_s": round(operations / elapsed_s, 2) if elapsed_s else 0.0,
+    }
+
+
+async def timed(operation: Callable[[], Awaitable], repeat: int, warmup: int = 3) -> Dict[str, float]:
+    for _ in range(warmup):
+        await operation()
+
+    latencies = []
+    started = time.perf_counter()
+    for _ in range(repeat):
+        op_started = time.perf_counter()
+        await operation()
+        latencies.append((time.perf_counter() - op_started) * 1000)
+    return summarize(latencies, time.perf_counter() - started)
+
+
+def check_bench_database(force: bool):
+    # бенчмарки очищают таблицы - не даем случайно запустить их на рабочей базе
+    database_name = make_url(database.engine.url).database or ""
+    if "bench" not in database_name and not force:
+        raise SystemExit(
+            f"Refusing to run against database '{database_name}': benchmarks truncate tables. "
+            f"Use a database whose name contains 'bench' or pass --force."
+        )
+
+
+async def prepare_database():
+    # схема через миграции (как в production); echo у основного engine выключаем, иначе лог SQL исказит замеры
+    database.engine.echo = False
+    await asyncio.to_thread(run_migrations)
+    async with database.engine.begin() as conn:
+        await conn.execute(text("TRUNCATE audio_files, note_processing, audio_note_archives, note_embeddings, transcript_segments, note_texts, usage_counters, audio_notes"))
+
+
+def note_records(count: int, start: int = 0, users: Optional[List[uuid.UUID]] = None):
+    # синтетические строки audio_notes для COPY
+    base = datetime(2024, 1, 1)
+    users = users or [BENCH_USER]
+    for i in range(start, start + count):
+        created_at = base + timedelta(seconds=i * 37)
+        yield (
+            uuid.uuid4(),
+            users[i % len(users)],
+            f"Note {i} about {TAGS[i % len(TAGS)]}",
+            json.dumps([TAGS[i % len(TAGS)], TAGS[(i * 7) % len(TAGS)]]),
+            f"Notes for record {i}" if i % 3 else None,
+            f"audio_{i}.webm",
+            f"audio_notes/{i}.webm",
+            STATUSES[i % len(STATUSES)],
+            ("Transcription text of a recorded note. " * 20) if i % 6 == 4 else None,
+            "Short summary." if i % 6 == 4 else None,
+            created_at,
+            created_at + timedelta(minutes=i % 60),
+        )
+
+
+NOTE_COLUMNS = ["id", "user_id", "title", "tags", "notes", "audio_filename", "audio_path",
+                "status", "transcription", "summary", "created_at", "updated_at"]
+
+
+async def seed_notes(total: int, batch_size: int = 50000, users: Optional[List[uuid.UUID]] = None) -> int:
+    # догружаем таблицу до total строк через COPY (asyncpg), быстрее обычных INSERT на порядки
+    async with database.engine.connect() as conn:
+        current = (await conn.execute(text("SELECT count(*) FROM audio_notes"))).scalar_one()
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+
+        while current < total:
+            count = min(batch_size, total - current)
+            await driver.copy_records_to_table(
+                "audio_notes",
+                records=list(note_records(count, current, users)),
+                columns=NOTE_COLUMNS
+            )
+            current += count
+
+        await conn.execute(text("ANALYZE audio_notes"))
+        await conn.commit()
+    return current
+
+
+def git_commit() -> str:
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except Exception:
+        return "unknown"
+
+
+def write_results(path: str, results: Dict[str, Dict[str, float]], params: dict):
+    payload = {
+        "meta": {
+            "timestamp": datetime.utcnow().isoformat(),
+            "commit": git_commit(),
+            "python": platform.python_version(),
+            "machine": platform.machine(),
+            "cpu_count": os.cpu_count(),
+            "params": params,
+        },
+        "results": results,
+    }
+    with open(path, "w", encoding="utf-8") as output:
+        json.dump(payload, output, indent=2, ensure_ascii=False)
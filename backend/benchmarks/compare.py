@@ -0,0 +1,69 @@
+# Сравнение двух файлов результатов и поиск регрессий
+# *_ms - чем меньше, тем лучше; *_per_s - чем больше, тем лучше
+# запуск: python -m benchmarks.compare baseline.json current.json --threshold 10
+# код выхода 1, если есть регрессии (удобно для CI)
+import argparse
+import json
+import sys
+from typing import Dict, List, Tuple
+
+
+def load(path: str) -> Dict[str, Dict[str, float]]:
+    with open(path, encoding="utf-8") as results:
+        return json.load(results)["results"]
+
+
+def change_percent(metric: str, old: float, new: float) -> float:
+    # положительное значение - ухудшение
+    if not old:
+        return 0.0
+    delta = (new - old) * 100 / old
+    return -delta if metric.endswith("_per_s") else delta
+
+
+def compare(baseline: Dict[str, Dict[str, float]], current: Dict[str, Dict[str, float]],
+            threshold: float, metrics: List[str]) -> Tuple[List[tuple], List[tuple]]:
+    regressions, improvements = [], []
+    for name in sorted(set(baseline) & set(current)):
+        for metric in metrics:
+            if metric not in baseline[name] or metric not in current[name]:
+                continue
+            old, new = baseline[name][metric], current[name][metric]
+            change = change_percent(metric, old, new)
+            row = (name, metric, old, new, change)
+            if change > threshold:
+                regressions.append(row)
+            elif change < -threshold:
+                improvements.append(row)
+    return regressions, improvements
+
+
+def print_rows(title: str, rows: List[tuple]):
+    if not rows:
+        return
+    print(f"\n{title}:")
+    for name, metric, old, new, change in rows:
+        sign = "worse" if change > 0 else "better"
+        print(f"  {name} {metric}: {old} -> {new} ({abs(change):.1f}% {sign})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compare benchmark results")
+    parser.add_argument("baseline")
+    parser.add_argument("current")
+    parser.add_argument("--threshold", type=float, default=10.0, help="percent change treated as significant")
+    parser.add_argument("--metrics", nargs="+", default=["p50_ms", "p95_ms", "ops_per_s", "mb_per_s"])
+    args = parser.parse_args()
+
+    baseline, current = load(args.baseline), load(args.current)
+    regressions, improvements = compare(baseline, current, args.threshold, args.metrics)
+
+    missing = sorted(set(baseline) - set(current))
+    if missing:
+        print(f"Missing in current run: {', '.join(missing)}")
+
+    print_rows("Regressions", regressions)
+    print_rows("Improvements", improvements)
+    print(f"\n{len(regressions)} regressions, {len(improvements)} improvements (threshold {args.threshold}%)")
+
+    sys.exit(1 if regressions else 0)
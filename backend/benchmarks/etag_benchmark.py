@@ -0,0 +1,66 @@
+# Бенчмарк условных запросов: полный ответ vs If-None-Match -> 304
+# запуск: python -m benchmarks.etag_benchmark --url http://localhost:8000 --requests 200
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+async def measure(client: httpx.AsyncClient, path: str, requests: int, conditional: bool) -> dict:
+    latencies = []
+    total_bytes = 0
+    statuses = {}
+
+    etag = None
+    if conditional:
+        first = await client.get(path)
+        etag = first.headers.get("ETag")
+
+    for _ in range(requests):
+        headers = {"If-None-Match": etag} if etag else {}
+        started = time.perf_counter()
+        response = await client.get(path, headers=headers)
+        latencies.append((time.perf_counter() - started) * 1000)
+
+        total_bytes += len(response.content)
+        statuses[response.status_code] = statuses.get(response.status_code, 0) + 1
+
+    return {
+        "p50_ms": round(statistics.median(latencies), 3),
+        "p95_ms": round(sorted(latencies)[int(len(latencies) * 0.95) - 1], 3),
+        "bytes_total": total_bytes,
+        "bytes_per_request": round(total_bytes / requests, 1),
+        "statuses": statuses,
+    }
+
+
+async def run(url: str, requests: int, limit: int):
+    async with httpx.AsyncClient(base_url=url, timeout=30.0) as client:
+        notes = (await client.get("/api/v1/notes", params={"limit": 1})).json()
+        paths = [f"/api/v1/notes?limit={limit}"]
+        if notes:
+            paths.append(f"/api/v1/notes/{notes[0]['id']}")
+
+        for path in paths:
+            full = await measure(client, path, requests, conditional=False)
+            cond = await measure(client, path, requests, conditional=True)
+
+            print(f"\n{path}")
+            print(f"  full body:   {full}")
+            print(f"  conditional: {cond}")
+            if full["bytes_total"]:
+                saved = 100 - cond["bytes_total"] * 100 / full["bytes_total"]
+                print(f"  bandwidth saved: {saved:.1f}%, "
+                      f"p50 {full['p50_ms']}ms -> {cond['p50_ms']}ms")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--url", default="http://localhost:8000")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--limit", type=int, default=100)
+    args = parser.parse_args()
+
+    asyncio.run(run(args.url, args.requests, args.limit))
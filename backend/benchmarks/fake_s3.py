@@ -0,0 +1,128 @@
+import asyncio
+import uuid
+from datetime import datetime, timezone
+from typing import Dict
+
+# In-memory замена S3 для офлайн бенчмарков: подменяет aioboto3.Session у S3Client
+# latency_ms имитирует сетевую задержку на каждую операцию
+
+
+class FakeBody:
+    def __init__(self, data: bytes):
+        self._data = data
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def read(self) -> bytes:
+        return self._data
+
+
+class FakeS3:
+    def __init__(self, storage: Dict[str, bytes], latency_ms: float, modified: Dict[str, datetime]):
+        self.storage = storage
+        self.modified = modified
+        self.latency = latency_ms / 1000
+        self.multipart: Dict[str, Dict[int, bytes]] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    async def _delay(self):
+        if self.latency:
+            await asyncio.sleep(self.latency)
+
+    async def put_object(self, Bucket, Key, Body, **kwargs):
+        await self._delay()
+        self.storage[Key] = bytes(Body)
+        self.modified[Key] = datetime.now(timezone.utc)
+        return {"ETag": f'"{uuid.uuid4().hex}"'}
+
+    async def get_object(self, Bucket, Key, Range=None):
+        await self._delay()
+        data = self.storage[Key]
+        if Range:
+            # только вида bytes=start-end (включительно)
+            start, end = Range[len("bytes="):].split("-")
+            data = data[int(start):int(end) + 1]
+        return {"Body": FakeBody(data)}
+
+    async def delete_object(self, Bucket, Key):
+        await self._delay()
+        self.storage.pop(Key, None)
+        return {}
+
+    async def delete_objects(self, Bucket, Delete):
+        await self._delay()
+        for item in Delete["Objects"]:
+            self.storage.pop(item["Key"], None)
+        return {}
+
+    async def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None):
+        await self._delay()
+        keys = sorted(key for key in self.storage if key.startswith(Prefix) and key > (ContinuationToken or ""))
+        page = keys[:MaxKeys]
+        response = {
+            "Contents": [{"Key": key, "LastModified": self.modified.get(key, datetime.now(timezone.utc))}
+                         for key in page],
+            "IsTruncated": len(keys) > MaxKeys,
+        }
+        if response["IsTruncated"]:
+            response["NextContinuationToken"] = page[-1]
+        return response
+
+    async def head_object(self, Bucket, Key):
+        await self._delay()
+        return {"ContentLength": len(self.storage[Key])}
+
+    async def generate_presigned_url(self, method, Params, ExpiresIn):
+        return f"http://fake-s3/{Params['Bucket']}/{Params['Key']}?expires={ExpiresIn}"
+
+    async def list_buckets(self):
+        await self._delay()
+        return {"Buckets": [{"Name": "bench"}]}
+
+    async def create_multipart_upload(self, Bucket, Key, **kwargs):
+        await self._delay()
+        upload_id = uuid.uuid4().hex
+        self.multipart[upload_id] = {}
+        return {"UploadId": upload_id}
+
+    async def upload_part(self, Bucket, Key, UploadId, PartNumber, Body):
+        await self._delay()
+        self.multipart[UploadId][PartNumber] = bytes(Body)
+        return {"ETag": f'"{PartNumber}"'}
+
+    async def complete_multipart_upload(self, Bucket, Key, UploadId, MultipartUpload):
+        await self._delay()
+        parts = self.multipart.pop(UploadId)
+        self.storage[Key] = b"".join(parts[p["PartNumber"]] for p in MultipartUpload["Parts"])
+        self.modified[Key] = datetime.now(timezone.utc)
+        return {}
+
+    async def abort_multipart_upload(self, Bucket, Key, UploadId):
+        self.multipart.pop(UploadId, None)
+        return {}
+
+
+class FakeS3Session:
+    # совместима с aioboto3.Session().client('s3', ...) как асинхронный контекстный менеджер
+    def __init__(self, latency_ms: float = 0.0):
+        self.storage: Dict[str, bytes] = {}
+        self.modified: Dict[str, datetime] = {}
+        self.latency_ms = latency_ms
+
+    def client(self, service_name: str, **kwargs) -> FakeS3:
+        return FakeS3(self.storage, self.latency_ms, self.modified)
+
+
+def install_fake_s3(s3_client, latency_ms: float = 0.0) -> FakeS3Session:
+    session = FakeS3Session(latency_ms)
+    s3_client.session = session
+    return session
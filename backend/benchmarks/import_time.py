@@ -0,0 +1,94 @@
+# Бюджет времени холодного старта: python -X importtime -c "import main" в отдельном процессе
+# код выхода 1, если медиана дольше --budget-ms или при старте импортированы запрещенные модули
+# (тяжелые клиенты должны импортироваться лениво при первом обращении)
+# запуск: python -m benchmarks.import_time --runs 5 --budget-ms 1500 [--output startup.json]
+import argparse
+import os
+import statistics
+import subprocess
+import sys
+from typing import List, Tuple
+
+from benchmarks.common import write_results
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+FORBIDDEN = ["aioboto3", "aiobotocore", "boto3", "botocore", "redis", "numpy", "torch", "sentence_transformers", "vosk", "zstandard"]
+
+
+def parse_importtime(stderr: str) -> List[Tuple[str, int, int]]:
+    # строки вида "import time:   self [us] | cumulative | [отступ]package"
+    rows = []
+    for line in stderr.splitlines():
+        if not line.startswith("import time:") or "[us]" in line:
+            continue
+        self_us, cumulative_us, name = line[len("import time:"):].split("|")
+        rows.append((name[1:].rstrip(), int(self_us), int(cumulative_us)))
+    return rows
+
+
+def measure(module: str) -> List[Tuple[str, int, int]]:
+    env = dict(os.environ, PYTHONPATH=BACKEND_DIR)
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=BACKEND_DIR, env=env, capture_output=True, text=True
+    )
+    if result.returncode != 0:
+        raise RuntimeError(f"import {module} failed:\n{result.stderr[-2000:]}")
+    return parse_importtime(result.stderr)
+
+
+def top_level_total_ms(rows: List[Tuple[str, int, int]], module: str) -> float:
+    for name, _, cumulative_us in rows:
+        if name == module:
+            return cumulative_us / 1000
+    raise RuntimeError(f"{module} not found in importtime output")
+
+
+def heaviest(rows: List[Tuple[str, int, int]], module: str, count: int) -> List[Tuple[str, float]]:
+    # прямые зависимости модуля по суммарному времени: в выводе importtime дочерние строки идут перед родителем
+    end = next(index for index, (name, _, _) in enumerate(rows) if name == module)
+    direct = []
+    for name, _, cumulative_us in reversed(rows[:end]):
+        if not name.startswith(" "):
+            break
+        if not name.startswith("   "):
+            direct.append((name.strip(), cumulative_us / 1000))
+    return sorted(direct, key=lambda item: item[1], reverse=True)[:count]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import time budget for application startup")
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--budget-ms", type=float, default=1500.0, help="max median import time")
+    parser.add_argument("--forbid", nargs="*", default=FORBIDDEN, help="modules that must not be imported at startup")
+    parser.add_argument("--output", help="also write results in benchmarks.compare format")
+    args = parser.parse_args()
+
+    totals, rows = [], []
+    for _ in range(args.runs):
+        rows = measure(args.module)
+        totals.append(top_level_total_ms(rows, args.module))
+
+    median_ms = statistics.median(totals)
+    print(f"import {args.module}: median {median_ms:.1f} ms, min {min(totals):.1f} ms, max {max(totals):.1f} ms "
+          f"({args.runs} runs, budget {args.budget_ms:.0f} ms)")
+    for name, ms in heaviest(rows, args.module, 10):
+        print(f"  {name}: {ms:.1f} ms")
+
+    imported = {name.strip() for name, _, _ in rows}
+    forbidden = sorted(name for name in args.forbid if name in imported)
+
+    if args.output:
+        results = {f"startup.import[{args.module}]": {"p50_ms": round(median_ms, 2), "min_ms": round(min(totals), 2)}}
+        write_results(args.output, results, vars(args))
+
+    failed = False
+    if forbidden:
+        print(f"FAIL: imported at startup: {', '.join(forbidden)}")
+        failed = True
+    if median_ms > args.budget_ms:
+        print(f"FAIL: import time {median_ms:.1f} ms exceeds budget {args.budget_ms:.0f} ms")
+        failed = True
+
+    sys.exit(1 if failed else 0)
@@ -0,0 +1,94 @@
+# Бенчмарк накладных расходов метрик: одинаковое приложение с MetricsMiddleware и без него
+# запуск: python -m benchmarks.metrics_overhead_benchmark --requests 5000
+import argparse
+import asyncio
+import statistics
+import time
+import uuid
+
+import httpx
+from fastapi import FastAPI
+
+from core.metrics import MetricsMiddleware
+
+
+def build_app(with_metrics: bool) -> FastAPI:
+    app = FastAPI()
+    if with_metrics:
+        app.add_middleware(MetricsMiddleware)
+
+    @app.get("/api/v1/notes/{note_id}")
+    async def get_note(note_id: uuid.UUID):
+        return {"id": str(note_id), "title": "note", "status": "completed"}
+
+    return app
+
+
+async def measure(app: FastAPI, requests: int) -> list:
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        path = f"/api/v1/notes/{uuid.uuid4()}"
+        for _ in range(200):
+            await client.get(path)
+
+        latencies = []
+        for _ in range(requests):
+            started = time.perf_counter()
+            await client.get(path)
+            latencies.append((time.perf_counter() - started) * 1e6)
+    return latencies
+
+
+async def isolated_overhead(calls: int) -> float:
+    # чистая стоимость middleware: одинаковый ASGI вызов с оберткой и без, мкс на запрос
+    async def inner(scope, receive, send):
+        await send({"type": "http.response.start", "status": 200, "headers": []})
+        await send({"type": "http.response.body", "body": b"{}"})
+
+    async def receive():
+        return {"type": "http.request"}
+
+    async def send(message):
+        pass
+
+    wrapped = MetricsMiddleware(inner)
+
+    async def run(app) -> float:
+        started = time.perf_counter()
+        for _ in range(calls):
+            await app({"type": "http", "method": "GET"}, receive, send)
+        return (time.perf_counter() - started) * 1e6 / calls
+
+    await run(wrapped)
+    plain = min([await run(inner) for _ in range(5)])
+    instrumented = min([await run(wrapped) for _ in range(5)])
+    return instrumented - plain
+
+
+async def main(requests: int, rounds: int):
+    isolated = await isolated_overhead(50000)
+
+    plain_p50, metrics_p50 = [], []
+    # чередуем прогоны, чтобы шум машины влиял на оба варианта одинаково
+    for _ in range(rounds):
+        plain_p50.append(statistics.median(await measure(build_app(False), requests)))
+        metrics_p50.append(statistics.median(await measure(build_app(True), requests)))
+
+    plain = statistics.median(plain_p50)
+    instrumented = statistics.median(metrics_p50)
+    overhead = instrumented - plain
+    print(f"p50 without metrics: {plain:.1f} us")
+    print(f"p50 with metrics:    {instrumented:.1f} us")
+    print(f"end-to-end overhead: {overhead:.1f} us per request ({overhead * 100 / plain:.2f}% of an in-memory request)")
+    print(f"isolated middleware cost: {isolated:.2f} us per request "
+          f"({isolated * 100 / plain:.2f}% of an in-memory request, "
+          f"{isolated * 100 / 5000:.3f}% of a 5 ms DB-backed request)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--requests", type=int, default=5000)
+    parser.add_argument("--rounds", type=int, default=3)
+    args = parser.parse_args()
+
+    asyncio.run(main(args.requests, args.rounds))
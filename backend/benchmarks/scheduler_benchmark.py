@@ -0,0 +1,177 @@
+# Симуляция планировщика транскрибации под массовой загрузкой одного пользователя: время до транскрипта
+# коротких заметок остальных пользователей при разных SCHEDULER_POLICY (fifo - поведение без планировщика)
+# очередь и выборка - настоящие (note_processing, TranscriptionScheduler.run_once на bench БД), время - модельное:
+# движки (--capacity мест) обрабатывают запись за duration * --rtf + --overhead секунд, события идут по порядку
+# каждая политика - без резерва мест и с --reserved-slots; код выхода 1, если p95 коротких заметок
+# при priority_fair с резервом больше --max-p95-s
+# запуск: DATABASE_URL=.../audio_notes_bench python -m benchmarks.scheduler_benchmark
+import argparse
+import asyncio
+import heapq
+import json
+import random
+import statistics
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Dict, List, Tuple
+
+from sqlalchemy import text
+
+from benchmarks.common import check_bench_database, prepare_database, write_results
+from core import database
+from db_layer.processing_db_interaction import ProcessingDBInteraction
+from services.scheduler_service import POLICIES, TASK_TYPE, TranscriptionScheduler, transcription_job
+
+
+class RecordingQueue:
+    # вместо RabbitMQ: опубликованные задачи забирает модель движков
+    def __init__(self):
+        self.published: List[str] = []
+
+    async def send_transcription_task(self, note_id: str, audio_path: str, audio_format: str = "webm"):
+        self.published.append(note_id)
+
+
+def workload(args) -> List[Dict]:
+    # массовая загрузка: --heavy-notes записей по --heavy-minutes минут за первую минуту;
+    # остальные пользователи - короткие заметки по Пуассону на протяжении --span-minutes
+    rng = random.Random(args.seed)
+    heavy_user = uuid.uuid4()
+    light_users = [uuid.uuid4() for _ in range(args.light_users)]
+    jobs = [
+        {"note_id": uuid.uuid4(), "user_id": heavy_user, "arrival": rng.uniform(0, 60),
+         "duration": args.heavy_minutes * 60 * rng.uniform(0.8, 1.2), "kind": "heavy"}
+        for _ in range(args.heavy_notes)
+    ]
+    arrival = 0.0
+    for _ in range(args.light_notes):
+        arrival += rng.expovariate(args.light_notes / (args.span_minutes * 60))
+        jobs.append({"note_id": uuid.uuid4(), "user_id": rng.choice(light_users), "arrival": arrival,
+                     "duration": rng.uniform(10, 90), "kind": "light"})
+    return sorted(jobs, key=lambda job: job["arrival"])
+
+
+async def seed_notes_for(jobs: List[Dict]):
+    # заметки в статусе pending_transcription (планировщик проверяет статус перед публикацией)
+    created_at = datetime(2024, 1, 1)
+    async with database.engine.connect() as conn:
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "audio_notes",
+            records=[(job["note_id"], job["user_id"], "sim", json.dumps([]), "sim.webm",
+                      f"audio_notes/{job['note_id']}.webm", "pending_transcription", created_at, created_at)
+                     for job in jobs],
+            columns=["id", "user_id", "title", "tags", "audio_filename", "audio_path", "status",
+                     "created_at", "updated_at"]
+        )
+        await conn.commit()
+
+
+async def simulate(policy: str, reserved_slots: int, jobs: List[Dict], args) -> Dict[str, Dict[str, float]]:
+    async with database.engine.begin() as conn:
+        await conn.execute(text("TRUNCATE note_processing"))
+
+    queue = RecordingQueue()
+    scheduler = TranscriptionScheduler(queue=queue, capacity=args.capacity, policy=policy,
+                                       reserved_slots=reserved_slots)
+    by_id = {str(job["note_id"]): job for job in jobs}
+    base = datetime(2030, 1, 1)
+    running: List[Tuple[float, str]] = []
+    finished: Dict[str, float] = {}
+    index = 0
+    now = 0.0
+
+    async with database.AsyncSessionLocal() as db:
+        processing = ProcessingDBInteraction(db)
+        while index < len(jobs) or running:
+            now = min(jobs[index]["arrival"] if index < len(jobs) else float("inf"),
+                      running[0][0] if running else float("inf"))
+
+            arrived = []
+            while index < len(jobs) and jobs[index]["arrival"] <= now:
+                arrived.append(jobs[index])
+                index += 1
+            for job in arrived:
+                await processing.enqueue_many(
+                    [transcription_job(job["note_id"], job["user_id"], job["duration"])], TASK_TYPE,
+                    now=base + timedelta(seconds=job["arrival"])
+                )
+
+            while running and running[0][0] <= now:
+                _, note_id = heapq.heappop(running)
+                finished[note_id] = now
+                await processing.finish(uuid.UUID(note_id), TASK_TYPE)
+
+            await scheduler.run_once(now=base + timedelta(seconds=now))
+            for note_id in queue.published:
+                job = by_id[note_id]
+                heapq.heappush(running, (now + job["duration"] * args.rtf + args.overhead, note_id))
+            queue.published.clear()
+
+    name = f"scheduler.{policy}.reserved_{reserved_slots}"
+    results = {}
+    for kind in ("light", "heavy"):
+        times = sorted(finished[str(job["note_id"])] - job["arrival"] for job in jobs if job["kind"] == kind)
+        results[f"{name}.{kind}"] = {
+            "p50_s": round(statistics.median(times), 1),
+            "p95_s": round(times[max(int(len(times) * 0.95) - 1, 0)], 1),
+            "max_s": round(times[-1], 1),
+        }
+    results[f"{name}.makespan"] = {"s": round(now, 1)}
+    return results
+
+
+async def main(args) -> bool:
+    check_bench_database(args.force)
+    await prepare_database()
+    jobs = workload(args)
+    await seed_notes_for(jobs)
+    print(f"workload: {args.heavy_notes} x {args.heavy_minutes} min from one user, {args.light_notes} short notes "
+          f"from {args.light_users} users over {args.span_minutes} min, capacity {args.capacity}, rtf {args.rtf}")
+
+    results = {}
+    for reserved_slots in sorted({0, args.reserved_slots}):
+        print(f"reserved slots {reserved_slots}:")
+        for policy in args.policies:
+            started = time.perf_counter()
+            results.update(await simulate(policy, reserved_slots, jobs, args))
+            name = f"scheduler.{policy}.reserved_{reserved_slots}"
+            light, heavy = results[f"{name}.light"], results[f"{name}.heavy"]
+            print(f"  {policy:14} short notes p50 {light['p50_s']:>8} s, p95 {light['p95_s']:>8} s,"
+                  f" max {light['max_s']:>8} s | flood p95 {heavy['p95_s']:>8} s"
+                  f" | makespan {results[f'{name}.makespan']['s']} s ({time.perf_counter() - started:.0f} s to simulate)")
+    await database.engine.dispose()
+
+    ok = True
+    if "priority_fair" in args.policies:
+        p95 = results[f"scheduler.priority_fair.reserved_{args.reserved_slots}.light"]["p95_s"]
+        ok = p95 <= args.max_p95_s
+        print(f"{'ok  ' if ok else 'FAIL'} priority_fair, {args.reserved_slots} reserved: "
+              f"short notes p95 {p95} s (max {args.max_p95_s} s)")
+
+    if args.output:
+        write_results(args.output, results, vars(args))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="p95 time-to-transcript of short notes under a heavy-user flood")
+    parser.add_argument("--policies", nargs="+", choices=POLICIES, default=["fifo", "priority", "fair", "priority_fair"])
+    parser.add_argument("--capacity", type=int, default=4, help="transcription jobs in flight")
+    parser.add_argument("--reserved-slots", type=int, default=1, help="slots long recordings never take")
+    parser.add_argument("--rtf", type=float, default=0.1, help="engine time per second of audio")
+    parser.add_argument("--overhead", type=float, default=5.0, help="engine seconds per job on top of rtf")
+    parser.add_argument("--heavy-notes", type=int, default=300)
+    parser.add_argument("--heavy-minutes", type=float, default=60.0)
+    parser.add_argument("--light-users", type=int, default=50)
+    parser.add_argument("--light-notes", type=int, default=600)
+    parser.add_argument("--span-minutes", type=float, default=180.0)
+    parser.add_argument("--max-p95-s", type=float, default=120.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results JSON")
+    parser.add_argument("--force", action="store_true", help="allow a database without 'bench' in its name")
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(main(args)) else 1)
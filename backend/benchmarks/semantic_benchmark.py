@@ -0,0 +1,262 @@
+# Recall и латентность приближенного поиска соседей (HNSW pgvector) на --vectors векторах (по умолчанию 1M)
+# вектора синтетические: смесь --clusters гауссовых кластеров (темы) в пространстве малой размерности --latent-dim,
+# поднятая случайной проекцией в --dim (у эмбеддингов текста внутренняя размерность много меньше dim;
+# изотропный шум во всех dim делает соседей внутри кластера почти равноудаленными и recall бессмысленным),
+# грузятся binary COPY, индекс строится после загрузки; эталон - точный перебор в numpy по тем же векторам
+# (генерируются повторно по частям из того же seed, в памяти не держатся)
+# вектора принадлежат --tenants пользователям с неравными долями (доля пользователя i ~ ((i+1)/n)^(1/skew) -
+# (i/n)^(1/skew)): HNSW фильтрует пользователя после индекса, и у малых пользователей короткие выдачи видны
+# только при многих пользователях в таблице; эталон запроса - top-k среди векторов его пользователя
+# семантический поиск (EmbeddingDBInteraction.search: HNSW или перебор по доле пользователя) - код выхода 1,
+# если его recall@k ниже --min-recall или p95 выше --max-p95-ms
+# запуск: DATABASE_URL=.../audio_notes_bench python -m benchmarks.semantic_benchmark --vectors 1000000
+import argparse
+import asyncio
+import statistics
+import struct
+import sys
+import time
+import uuid
+from collections import Counter
+from typing import Dict, List
+
+import numpy as np
+from sqlalchemy import text
+
+from benchmarks.common import check_bench_database, prepare_database, summarize, write_results
+from core import database
+from core.config import settings
+from db_layer.embedding_db_interaction import EmbeddingDBInteraction
+
+CHUNK = 50000
+# потоки генератора запросов и пользователей частей - не совпадают с номерами частей набора
+QUERY_STREAM = 2 ** 31
+TENANT_STREAM = 2 ** 31 + 1
+MODEL = "bench"
+KIND = b"transcription"
+COPY_HEADER = b"PGCOPY\n\xff\r\n\x00" + struct.pack(">ii", 0, 0)
+COPY_TRAILER = struct.pack(">h", -1)
+
+
+class Dataset:
+    def __init__(self, dim: int, latent_dim: int, clusters: int, spread: float, seed: int,
+                 tenants: int = 1, skew: float = 1.0):
+        rng = np.random.default_rng(seed)
+        self.centers = rng.standard_normal((clusters, latent_dim)).astype(np.float32)
+        self.projection = rng.standard_normal((latent_dim, dim)).astype(np.float32)
+        self.spread = spread
+        self.seed = seed
+        self.tenants = tenants
+        self.skew = skew
+
+    def sample(self, rng: np.random.Generator, count: int) -> np.ndarray:
+        labels = rng.integers(0, len(self.centers), count)
+        noise = rng.standard_normal((count, self.centers.shape[1])).astype(np.float32) * self.spread
+        latent = self.centers[labels] + noise
+        return normalize(latent @ self.projection)
+
+    def chunk(self, index: int, count: int) -> np.ndarray:
+        # часть index набора: детерминирована по (seed, index)
+        return self.sample(np.random.default_rng([self.seed, index]), count)
+
+    def chunk_tenants(self, index: int, count: int) -> np.ndarray:
+        # номера пользователей векторов части index: пользователь 0 - самый крупный, доли убывают
+        uniform = np.random.default_rng([self.seed, TENANT_STREAM, index]).random(count)
+        return (self.tenants * uniform ** self.skew).astype(np.int64)
+
+
+def normalize(points: np.ndarray) -> np.ndarray:
+    return points / np.linalg.norm(points, axis=1, keepdims=True)
+
+
+def chunks(total: int):
+    for index, start in enumerate(range(0, total, CHUNK)):
+        yield index, start, min(CHUNK, total - start)
+
+
+def note_uuid(position: int) -> uuid.UUID:
+    return uuid.UUID(int=position + 1)
+
+
+def tenant_uuid(tenant: int) -> uuid.UUID:
+    return uuid.UUID(int=(tenant + 1) << 64)
+
+
+def copy_rows(start: int, vectors: np.ndarray, tenants: np.ndarray) -> bytes:
+    # строки binary COPY (note_id, kind, user_id, model, embedding) одним numpy буфером, без цикла по строкам
+    count, dim = vectors.shape
+    row = np.dtype([
+        ("fields", ">i2"),
+        ("id_len", ">i4"), ("id_hi", ">u8"), ("id_lo", ">u8"),
+        ("kind_len", ">i4"), ("kind", f"S{len(KIND)}"),
+        ("user_len", ">i4"), ("user", "S16"),
+        ("model_len", ">i4"), ("model", f"S{len(MODEL)}"),
+        ("vector_len", ">i4"), ("dim", ">i2"), ("unused", ">i2"), ("vector", ">f4", (dim,)),
+    ])
+    rows = np.zeros(count, dtype=row)
+    rows["fields"] = 5
+    rows["id_len"], rows["id_hi"] = 16, 0
+    rows["id_lo"] = np.arange(start + 1, start + count + 1, dtype=np.uint64)
+    rows["kind_len"], rows["kind"] = len(KIND), KIND
+    rows["user_len"] = 16
+    rows["user"] = np.array([tenant_uuid(tenant).bytes for tenant in range(tenants.max() + 1)], dtype="S16")[tenants]
+    rows["model_len"], rows["model"] = len(MODEL), MODEL.encode()
+    rows["vector_len"], rows["dim"] = 4 + 4 * dim, dim
+    rows["vector"] = vectors
+    return rows.tobytes()
+
+
+async def seed_vectors(total: int, dataset: Dataset) -> float:
+    # загрузка без HNSW индекса и построение после: вставка в граф по строке в разы медленнее
+    async with database.engine.connect() as conn:
+        await conn.execute(text("DROP INDEX IF EXISTS ix_note_embeddings_hnsw"))
+        await conn.commit()
+        driver = (await conn.get_raw_connection()).driver_connection
+
+        async def source():
+            yield COPY_HEADER
+            for index, start, count in chunks(total):
+                yield copy_rows(start, dataset.chunk(index, count), dataset.chunk_tenants(index, count))
+            yield COPY_TRAILER
+
+        started = time.perf_counter()
+        await driver.copy_to_table(
+            "note_embeddings", source=source(), format="binary",
+            columns=["note_id", "kind", "user_id", "model", "embedding"]
+        )
+        print(f"loaded {total} vectors in {time.perf_counter() - started:.1f}s")
+
+        started = time.perf_counter()
+        await conn.execute(text("SET maintenance_work_mem = '2GB'"))
+        await conn.execute(text(
+            "CREATE INDEX ix_note_embeddings_hnsw ON note_embeddings USING hnsw (embedding vector_cosine_ops)"
+        ))
+        await conn.execute(text("ANALYZE note_embeddings"))
+        await conn.commit()
+        build_s = time.perf_counter() - started
+        print(f"HNSW index built in {build_s:.1f}s")
+        return build_s
+
+
+def exact_neighbors(queries: np.ndarray, tenants: np.ndarray, total: int, k: int, dataset: Dataset) -> List[set]:
+    # эталонные top-k среди векторов пользователя запроса по косинусу (вектора нормированы - скалярное
+    # произведение), по частям набора; у пользователя с числом векторов меньше k эталон короче
+    best_scores = np.full((len(queries), k), -np.inf, dtype=np.float32)
+    best_ids = np.zeros((len(queries), k), dtype=np.int64)
+    for index, start, count in chunks(total):
+        scores = queries @ dataset.chunk(index, count).T
+        scores[tenants[:, None] != dataset.chunk_tenants(index, count)[None, :]] = -np.inf
+        ids = np.broadcast_to(np.arange(start, start + count), scores.shape)
+        merged_scores = np.concatenate([best_scores, scores], axis=1)
+        merged_ids = np.concatenate([best_ids, ids], axis=1)
+        top = np.argpartition(-merged_scores, k - 1, axis=1)[:, :k]
+        best_scores = np.take_along_axis(merged_scores, top, axis=1)
+        best_ids = np.take_along_axis(merged_ids, top, axis=1)
+    return [{note_uuid(int(position)) for position, score in zip(ids, scores) if score > -np.inf}
+            for ids, scores in zip(best_ids, best_scores)]
+
+
+async def run_queries(queries: np.ndarray, tenants: np.ndarray, truth: List[set], k: int,
+                      mode: str, ef_search: int) -> Dict[str, float]:
+    # mode: ann - только HNSW с заданным ef_search, exact - только перебор, search - выбор стратегии как в API
+    latencies, recalls, short = [], [], 0
+    strategies = Counter()
+    for query, tenant, expected in zip(queries, tenants, truth):
+        vector, user_id = query.tolist(), tenant_uuid(int(tenant))
+        async with database.AsyncSessionLocal() as session:
+            repository = EmbeddingDBInteraction(session)
+            started = time.perf_counter()
+            if mode == "search":
+                found, strategy = await repository.search(
+                    user_id, MODEL, vector, k, ef_search, settings.EMBEDDING_EXACT_THRESHOLD
+                )
+                strategies[strategy] += 1
+            else:
+                found = await repository.nearest(user_id, MODEL, vector, k, exact=mode == "exact",
+                                                 ef_search=ef_search)
+            latencies.append((time.perf_counter() - started) * 1000)
+        if not expected:
+            continue
+        short += len(found) < len(expected)
+        recalls.append(len({note_id for note_id, _ in found} & expected) / len(expected))
+    result = summarize(latencies)
+    result["recall"] = round(statistics.fmean(recalls), 4)
+    # доля запросов с выдачей короче эталона (HNSW не нашел векторов пользователя среди кандидатов)
+    result["short_share"] = round(short / len(recalls), 4)
+    result.update(strategies)
+    return result
+
+
+async def main(args) -> bool:
+    check_bench_database(args.force)
+    await prepare_database()
+
+    dataset = Dataset(args.dim, args.latent_dim, args.clusters, args.spread, args.seed, args.tenants, args.skew)
+    build_s = await seed_vectors(args.vectors, dataset)
+
+    # запросы - новые точки тех же тем, в наборе их нет
+    rng = np.random.default_rng([args.seed, QUERY_STREAM])
+    queries = dataset.sample(rng, args.queries)
+    # половина запросов - от владельца случайного вектора (крупные пользователи), половина - от случайного пользователя
+    tenants = np.where(np.arange(args.queries) % 2 == 0,
+                       (args.tenants * rng.random(args.queries) ** args.skew).astype(np.int64),
+                       rng.integers(0, args.tenants, args.queries))
+    started = time.perf_counter()
+    truth = exact_neighbors(queries, tenants, args.vectors, args.k, dataset)
+    print(f"ground truth for {args.queries} queries in {time.perf_counter() - started:.1f}s")
+
+    results = {f"semantic.index_build[{args.vectors}]": {"build_s": round(build_s, 2)}}
+    for ef_search in sorted(set(args.ef_search + [settings.EMBEDDING_EF_SEARCH])):
+        name = f"semantic.ann[{args.vectors},ef={ef_search}]"
+        results[name] = await run_queries(queries, tenants, truth, args.k, "ann", ef_search)
+        print(f"  ann ef_search={ef_search}: recall@{args.k} {results[name]['recall']}, "
+              f"short {results[name]['short_share']}, "
+              f"p50 {results[name]['p50_ms']} ms, p95 {results[name]['p95_ms']} ms")
+
+    name = f"semantic.search[{args.vectors}]"
+    results[name] = await run_queries(queries, tenants, truth, args.k, "search", settings.EMBEDDING_EF_SEARCH)
+    print(f"  search: recall@{args.k} {results[name]['recall']}, short {results[name]['short_share']}, "
+          f"p50 {results[name]['p50_ms']} ms, p95 {results[name]['p95_ms']} ms, "
+          f"strategies {({key: results[name].get(key, 0) for key in ('ann', 'exact', 'fallback')})}")
+
+    # точный перебор (путь пользователей с небольшой долей векторов) - для сравнения, на нескольких запросах
+    if args.exact_queries:
+        name = f"semantic.exact[{args.vectors}]"
+        results[name] = await run_queries(queries[:args.exact_queries], tenants[:args.exact_queries],
+                                          truth[:args.exact_queries], args.k, "exact", 0)
+        print(f"  exact scan: recall@{args.k} {results[name]['recall']}, p50 {results[name]['p50_ms']} ms")
+    await database.engine.dispose()
+
+    target = results[f"semantic.search[{args.vectors}]"]
+    ok = target["recall"] >= args.min_recall and target["p95_ms"] <= args.max_p95_ms
+    print(f"{'ok  ' if ok else 'FAIL'} search, ef_search={settings.EMBEDDING_EF_SEARCH} (EMBEDDING_EF_SEARCH): "
+          f"recall {target['recall']} (min {args.min_recall}), p95 {target['p95_ms']} ms (max {args.max_p95_ms})")
+
+    if args.output:
+        write_results(args.output, results, vars(args))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="HNSW recall and latency of semantic search")
+    parser.add_argument("--vectors", type=int, default=1000000)
+    parser.add_argument("--dim", type=int, default=settings.EMBEDDING_DIM,
+                        help="must match the note_embeddings column (migration 0010)")
+    parser.add_argument("--latent-dim", type=int, default=32, help="intrinsic dimension of the synthetic vectors")
+    parser.add_argument("--clusters", type=int, default=1000)
+    parser.add_argument("--spread", type=float, default=0.5, help="latent noise around a cluster center")
+    parser.add_argument("--tenants", type=int, default=1000, help="users owning the vectors")
+    parser.add_argument("--skew", type=float, default=4.0,
+                        help="tenant size skew: 1 - equal shares, larger - a few big users and many small")
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--ef-search", type=int, nargs="+", default=[40, 100, 200])
+    parser.add_argument("--exact-queries", type=int, default=5, help="queries also run as an exact scan (0 - skip)")
+    parser.add_argument("--min-recall", type=float, default=0.9)
+    parser.add_argument("--max-p95-ms", type=float, default=50.0)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write results JSON (benchmarks.compare format)")
+    parser.add_argument("--force", action="store_true", help="allow a database without 'bench' in its name")
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(main(args)) else 1)
@@ -0,0 +1,87 @@
+# Бенчмарк сериализации списка заметок: NoteResponse (from_attributes) + json vs строки SELECT + orjson
+# заодно проверяет, что оба пути дают побайтно одинаковый JSON
+# запуск: python -m benchmarks.serialization_benchmark --notes 1000 --rounds 20
+import argparse
+import json
+import statistics
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import List
+
+from pydantic import TypeAdapter
+
+from core.json_response import dumps
+from models.note import AudioNote
+from schemas.note import NoteResponse, NOTE_RESPONSE_FIELDS
+
+notes_adapter = TypeAdapter(List[NoteResponse])
+
+
+def make_notes(count: int) -> List[AudioNote]:
+    now = datetime(2024, 1, 1, 12, 0, 0)
+    notes = []
+    for i in range(count):
+        notes.append(AudioNote(
+            id=uuid.uuid4(),
+            user_id=uuid.uuid4(),
+            title=f"Заметка {i}",
+            tags=["work", f"tag{i % 10}"],
+            notes="Короткое описание заметки" if i % 2 else None,
+            audio_filename=f"audio_{i}.webm",
+            audio_path=f"audio_notes/{uuid.uuid4()}_audio_{i}.webm",
+            status="completed",
+            transcription="Текст транскрибации. " * 200,
+            summary="Краткое содержание. " * 20,
+            created_at=now + timedelta(seconds=i, microseconds=i * 7),
+            updated_at=now + timedelta(minutes=i),
+        ))
+    return notes
+
+
+def pydantic_path(notes: List[AudioNote]) -> bytes:
+    # как сейчас делает FastAPI: response_model -> jsonable -> json.dumps (как в starlette JSONResponse)
+    validated = [NoteResponse.model_validate(note) for note in notes]
+    content = notes_adapter.dump_python(validated, mode="json")
+    return json.dumps(content, ensure_ascii=False, allow_nan=False, indent=None, separators=(",", ":")).encode("utf-8")
+
+
+def fast_path(rows: List[dict]) -> bytes:
+    return dumps(rows)
+
+
+def timeit(func, arg, rounds: int) -> List[float]:
+    timings = []
+    for _ in range(rounds):
+        started = time.perf_counter()
+        func(arg)
+        timings.append((time.perf_counter() - started) * 1000)
+    return timings
+
+
+def main(count: int, rounds: int):
+    notes = make_notes(count)
+    # то, что возвращает NoteDBInteraction.get_all_rows
+    rows = [{field: getattr(note, field) for field in NOTE_RESPONSE_FIELDS} for note in notes]
+
+    expected = pydantic_path(notes)
+    actual = fast_path(rows)
+    assert expected == actual, "fast path output differs from NoteResponse serialization"
+    print(f"byte-equivalent output: OK ({len(actual)} bytes)")
+
+    slow = timeit(pydantic_path, notes, rounds)
+    fast = timeit(fast_path, rows, rounds)
+
+    per_1000 = 1000 / count
+    print(f"NoteResponse + json: median {statistics.median(slow) * per_1000:.2f} ms / 1000 notes")
+    print(f"rows + orjson:       median {statistics.median(fast) * per_1000:.2f} ms / 1000 notes")
+    print(f"speedup: x{statistics.median(slow) / statistics.median(fast):.1f}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--notes", type=int, default=1000)
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    main(args.notes, args.rounds)
@@ -0,0 +1,129 @@
+# Статистика пользователя (GET /api/v1/stats): счетчики usage_counters против COUNT(*) GROUP BY status
+# по заметкам пользователя при растущем числе его заметок, время сверки и пропускная способность смены
+# статусов одного пользователя параллельными транзакциями при 1 шарде счетчика и при USAGE_COUNTER_SHARDS
+# код выхода 1, если p50 счетчиков на самой большой таблице больше p50 на самой маленькой в --max-growth раз
+# или счетчики после параллельных обновлений расходятся с GROUP BY
+# запуск: DATABASE_URL=.../audio_notes_bench python -m benchmarks.stats_benchmark --sizes 10000 1000000
+import argparse
+import asyncio
+import itertools
+import sys
+import time
+import uuid
+from typing import Dict, List
+
+from sqlalchemy import func, select, text
+
+from benchmarks.common import (BENCH_USER, STATUSES, check_bench_database, prepare_database, seed_notes, summarize,
+                               timed, write_results)
+from core import database
+from core.config import settings
+from db_layer.note_db_interaction import NoteDBInteraction
+from models.note import AudioNote
+from services.usage_service import UsageReconciler, UsageService
+
+
+async def group_by_counts() -> Dict[str, int]:
+    async with database.AsyncSessionLocal() as session:
+        result = await session.execute(
+            select(AudioNote.status, func.count()).where(AudioNote.user_id == BENCH_USER).group_by(AudioNote.status)
+        )
+        return dict(result.all())
+
+
+async def counter_counts() -> Dict[str, int]:
+    async with database.AsyncSessionLocal() as session:
+        by_status = (await UsageService(session, user_id=BENCH_USER).get_stats())["by_status"]
+    return {status: count for status, count in by_status.items() if count}
+
+
+async def status_updates(note_ids: List[uuid.UUID], shards: int, concurrency: int) -> Dict[str, float]:
+    # каждая задача в своей сессии переводит свои заметки по кругу статусов (транзакция на смену)
+    settings.USAGE_COUNTER_SHARDS = shards
+    latencies: List[float] = []
+
+    async def worker(ids: List[uuid.UUID]):
+        statuses = itertools.cycle(STATUSES)
+        async with database.AsyncSessionLocal() as session:
+            repository = NoteDBInteraction(session)
+            for note_id in ids:
+                started = time.perf_counter()
+                await repository.update(note_id, {"status": next(statuses)})
+                latencies.append((time.perf_counter() - started) * 1000)
+
+    started = time.perf_counter()
+    await asyncio.gather(*(worker(note_ids[i::concurrency]) for i in range(concurrency)))
+    return summarize(latencies, time.perf_counter() - started)
+
+
+async def main(args) -> bool:
+    check_bench_database(args.force)
+    shards = settings.USAGE_COUNTER_SHARDS
+    sizes = sorted(args.sizes)
+    results = {}
+    ok = True
+
+    await prepare_database()
+    for size in sizes:
+        await seed_notes(size)
+        started = time.perf_counter()
+        await UsageReconciler().run_once()
+        reconcile_s = time.perf_counter() - started
+        async with database.engine.connect() as conn:
+            await conn.execute(text("ANALYZE usage_counters"))
+        print(f"stats: {size} notes of one user, reconcile {reconcile_s:.2f} s")
+
+        async def counters():
+            async with database.AsyncSessionLocal() as session:
+                await UsageService(session, user_id=BENCH_USER).get_stats()
+
+        results[f"stats.counters[{size}]"] = await timed(counters, args.repeat)
+        results[f"stats.group_by[{size}]"] = await timed(group_by_counts, max(args.repeat // 10, 5))
+        results[f"stats.reconcile[{size}]"] = {"s": round(reconcile_s, 3)}
+        for name in ("counters", "group_by"):
+            print(f"  {name:9} p50 {results[f'stats.{name}[{size}]']['p50_ms']} ms")
+
+    base = results[f"stats.counters[{sizes[0]}]"]["p50_ms"]
+    top = results[f"stats.counters[{sizes[-1]}]"]["p50_ms"]
+    growth = top / base if base else 0.0
+    ok = growth <= args.max_growth
+    print(f"{'ok  ' if ok else 'FAIL'} counters: p50 {base} ms -> {top} ms ({growth:.2f}x, "
+          f"notes x{sizes[-1] // sizes[0]})")
+
+    # параллельные смены статусов одного пользователя: все транзакции прибавляют к одним и тем же метрикам
+    async with database.engine.connect() as conn:
+        note_ids = list((await conn.execute(
+            text("SELECT id FROM audio_notes ORDER BY created_at DESC LIMIT :limit"), {"limit": args.updates}
+        )).scalars())
+    for shard_count in sorted({1, shards}):
+        name = f"stats.status_update[shards={shard_count}]"
+        results[name] = await status_updates(note_ids, shard_count, args.concurrency)
+        print(f"  status updates, {args.concurrency} concurrent, {shard_count} shard(s): "
+              f"{results[name]['ops_per_s']} ops/s, p95 {results[name]['p95_ms']} ms")
+    settings.USAGE_COUNTER_SHARDS = shards
+
+    actual, counted = await group_by_counts(), await counter_counts()
+    consistent = actual == counted
+    ok = ok and consistent
+    print(f"{'ok  ' if consistent else 'FAIL'} counters after concurrent updates match GROUP BY"
+          f"{'' if consistent else f': {counted} != {actual}'}")
+    await database.engine.dispose()
+
+    if args.output:
+        write_results(args.output, results, vars(args))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="User stats from sharded counters vs GROUP BY")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 1000000])
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--updates", type=int, default=4000, help="status changes in the contention run")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-growth", type=float, default=2.0,
+                        help="allowed counters p50 ratio between the largest and the smallest table")
+    parser.add_argument("--output", help="write results JSON (benchmarks.compare format)")
+    parser.add_argument("--force", action="store_true", help="allow a database without 'bench' in its name")
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(main(args)) else 1)
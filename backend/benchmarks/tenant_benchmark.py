@@ -0,0 +1,130 @@
+# Запросы пользователя при разном размере таблицы: у каждого пользователя одинаковое число заметок
+# (--notes-per-user), растет только число пользователей. С индексами, ведущими с user_id (миграция 0008),
+# латентность списка пользователя не должна зависеть от общего числа строк
+# код выхода 1, если p50 на самой большой таблице больше p50 на самой маленькой в --max-growth раз
+# или план запроса списка не использует индекс пользователя
+# запуск: DATABASE_URL=.../audio_notes_bench python -m benchmarks.tenant_benchmark --sizes 100000 1000000
+import argparse
+import asyncio
+import json
+import random
+import sys
+import uuid
+from typing import Dict, List, Tuple
+
+from sqlalchemy import event
+
+from benchmarks.common import check_bench_database, prepare_database, seed_notes, timed, write_results
+from core import database
+from db_layer.note_db_interaction import NoteDBInteraction
+from schemas.note import NOTE_RESPONSE_FIELDS
+
+
+async def list_plan_indexes(user_id: uuid.UUID) -> List[str]:
+    # индексы в плане запроса первой страницы (SQL перехватывается у репозитория)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    sync_engine = database.engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", capture)
+    try:
+        async with database.AsyncSessionLocal() as session:
+            await NoteDBInteraction(session, user_id=user_id).get_all_rows(NOTE_RESPONSE_FIELDS, 0, 50)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", capture)
+
+    statement, parameters = statements[0]
+    async with database.engine.connect() as conn:
+        raw = (await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)).scalar_one()
+    plan = (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+    indexes, nodes = [], [plan]
+    while nodes:
+        node = nodes.pop()
+        if "Index Name" in node:
+            indexes.append(node["Index Name"])
+        nodes.extend(node.get("Plans", []))
+    return indexes
+
+
+async def run_size(size: int, notes_per_user: int, repeat: int) -> Tuple[Dict[str, Dict[str, float]], bool]:
+    await prepare_database()
+    users = [uuid.uuid4() for _ in range(max(size // notes_per_user, 1))]
+    await seed_notes(size, users=users)
+    print(f"tenants: {size} rows, {len(users)} users x {notes_per_user} notes")
+
+    results = {}
+    async with database.AsyncSessionLocal() as session:
+        def repository() -> NoteDBInteraction:
+            return NoteDBInteraction(session, user_id=random.choice(users))
+
+        async def list_first_page():
+            await repository().get_all_rows(NOTE_RESPONSE_FIELDS, 0, 50)
+
+        async def list_by_status():
+            await repository().get_all_rows(NOTE_RESPONSE_FIELDS, 0, 50, {"status": ["completed", "error"]})
+
+        async def list_by_tag():
+            await repository().get_all_rows(NOTE_RESPONSE_FIELDS, 0, 50, {"tags": ["meeting"]})
+
+        async def list_version():
+            await repository().get_list_version()
+
+        benches = {
+            "list_first_page": list_first_page,
+            "list_by_status": list_by_status,
+            "list_by_tag": list_by_tag,
+            "list_version": list_version,
+        }
+        for name, operation in benches.items():
+            results[f"tenant.{name}[{size}]"] = await timed(operation, repeat)
+            print(f"  {name}: p50 {results[f'tenant.{name}[{size}]']['p50_ms']} ms")
+
+    # индексы партиций называются <партиция>_user_created_at_idx / <партиция>_user_status_idx
+    indexes = await list_plan_indexes(users[0])
+    print(f"  list plan indexes: {', '.join(sorted(set(indexes))) or 'none'}")
+    return results, any("_user_" in index for index in indexes)
+
+
+async def main(args) -> bool:
+    check_bench_database(args.force)
+    sizes = sorted(args.sizes)
+    results = {}
+    ok = True
+    for size in sizes:
+        size_results, uses_user_index = await run_size(size, args.notes_per_user, args.repeat)
+        results.update(size_results)
+        if not uses_user_index:
+            print(f"FAIL list query on {size} rows does not use a user index")
+            ok = False
+    await database.engine.dispose()
+
+    smallest, largest = sizes[0], sizes[-1]
+    for name in ("list_first_page", "list_by_status", "list_by_tag", "list_version"):
+        base = results[f"tenant.{name}[{smallest}]"]["p50_ms"]
+        top = results[f"tenant.{name}[{largest}]"]["p50_ms"]
+        growth = top / base if base else 0.0
+        failed = growth > args.max_growth
+        ok = ok and not failed
+        print(f"{'FAIL' if failed else 'ok  '} {name}: p50 {base} ms -> {top} ms ({growth:.2f}x, "
+              f"table x{largest // smallest})")
+
+    if args.output:
+        write_results(args.output, results, vars(args))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Per-user list latency for growing numbers of tenants")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--notes-per-user", type=int, default=200)
+    parser.add_argument("--repeat", type=int, default=200)
+    parser.add_argument("--max-growth", type=float, default=2.0,
+                        help="allowed p50 ratio between the largest and the smallest table")
+    parser.add_argument("--output", help="write results JSON (benchmarks.compare format)")
+    parser.add_argument("--force", action="store_true", help="allow a database without 'bench' in its name")
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(main(args)) else 1)
@@ -0,0 +1,272 @@
+# Хранение и отдача транскриптов: размер на диске, чтение из БД и латентность GET /notes/{id}/transcription
+# для документа в text (TOAST pglz), несжатого bytea и сжатых gzip/zstd (note_texts, миграция 0012)
+# корпус синтетический, но с формой разговорной речи: частоты слов по Зипфу (служебные слова и слова-паразиты
+# сверху словаря, длинный хвост редких слов), ~150 слов в минуту, фразы по 4-20 слов с паузами, длительность
+# записей - логнормальная (медиана ~8 минут)
+# DB I/O - блоки heap/TOAST/индексов из pg_statio_user_tables на запрос (статистика сбрасывается при закрытии
+# соединений), латентность - через ASGI без сети; "assembled" - ответ из сегментов (как до 0012),
+# "assembled+gzip" - то же со сжатием на каждый запрос (как GZipMiddleware)
+# документ - копия текста, который остается в сегментах (источник для поиска и окон): хранение считается вместе,
+# overhead - размер note_texts относительно transcript_segments с индексами, combined_bytes - обе таблицы
+# код выхода 1, если документы добавляют больше --max-overhead к хранению сегментов или отдача как есть
+# медленнее сборки
+# запуск: DATABASE_URL=.../audio_notes_bench python -m benchmarks.text_storage_benchmark --notes 2000
+import argparse
+import asyncio
+import gzip
+import random
+import sys
+import time
+from typing import Dict, List, Tuple
+
+import httpx
+from sqlalchemy import text
+
+from benchmarks.common import BENCH_USER, check_bench_database, prepare_database, seed_notes, summarize, write_results
+from core import database
+from core.admission import rate_limiter
+from core.compression import IDENTITY, zstd_available
+from core.config import settings
+from services.note_text_service import backfill_texts
+
+FUNCTION_WORDS = (
+    "the i you and to a that it of is we so in this was like but just know for have they on what not be "
+    "with do are he think there it's if all at can about one as yeah right well then or get would me my "
+    "going don't have an our out some people really up there's because when more time could no them "
+    "said which now how also will been by see make these want other from good lot thing actually"
+).split()
+FILLERS = ("um", "uh", "you know", "i mean", "okay", "kind of", "sort of")
+SYLLABLES = ("ba", "ke", "lo", "mi", "nu", "ra", "te", "vi", "sho", "dan", "pel", "ric", "tor", "gen", "mar",
+             "con", "pro", "sta", "lin", "ver", "ment", "tion", "ing", "er", "al")
+
+
+def vocabulary(rng: random.Random, size: int) -> Tuple[List[str], List[float]]:
+    # служебные слова в голове распределения, затем "содержательные" псевдослова; веса по Зипфу (s ~ 1.05)
+    words = list(FUNCTION_WORDS)
+    seen = set(words)
+    while len(words) < size:
+        word = "".join(rng.choice(SYLLABLES) for _ in range(rng.choice((1, 2, 2, 3, 3, 4))))
+        if word not in seen:
+            seen.add(word)
+            words.append(word)
+    weights = [1 / (rank + 1) ** 1.05 for rank in range(len(words))]
+    return words, weights
+
+
+def transcript(rng: random.Random, words: List[str], weights: List[float], minutes: float) -> List[Dict]:
+    segments = []
+    position_ms = rng.randint(0, 1500)
+    end_of_audio = int(minutes * 60000)
+    while position_ms < end_of_audio:
+        count = rng.randint(4, 20)
+        phrase = rng.choices(words, weights, k=count)
+        if rng.random() < 0.3:
+            phrase.insert(rng.randrange(len(phrase)), rng.choice(FILLERS))
+        duration_ms = int(count * rng.gauss(400, 60))
+        segments.append({"start_ms": position_ms, "end_ms": position_ms + max(duration_ms, 300),
+                         "text": " ".join(phrase)})
+        position_ms += max(duration_ms, 300) + rng.randint(150, 1500)
+    return segments
+
+
+async def seed_transcripts(notes: int, seed: int) -> Tuple[List, int, int]:
+    # заметки через COPY, сегменты через COPY, флаг transcript_segmented - одним UPDATE (триггер собирает search_vector)
+    rng = random.Random(seed)
+    words, weights = vocabulary(rng, 20000)
+    await seed_notes(notes)
+
+    total_segments = total_chars = 0
+    async with database.engine.connect() as conn:
+        ids = [row[0] for row in await conn.execute(text("SELECT id FROM audio_notes ORDER BY created_at"))]
+        raw = await conn.get_raw_connection()
+        driver = raw.driver_connection
+        batch = []
+        for note_id in ids:
+            minutes = min(max(rng.lognormvariate(2.1, 0.8), 0.5), 120)
+            for segment in transcript(rng, words, weights, minutes):
+                batch.append((note_id, segment["start_ms"], segment["end_ms"], BENCH_USER, segment["text"]))
+                total_chars += len(segment["text"]) + 1
+            if len(batch) > 50000:
+                total_segments += len(batch)
+                await driver.copy_records_to_table("transcript_segments", records=batch,
+                                                   columns=["note_id", "start_ms", "end_ms", "user_id", "text"])
+                batch = []
+        if batch:
+            total_segments += len(batch)
+            await driver.copy_records_to_table("transcript_segments", records=batch,
+                                               columns=["note_id", "start_ms", "end_ms", "user_id", "text"])
+        await conn.execute(text(
+            "UPDATE audio_notes SET transcription = NULL, summary = NULL, transcript_segmented = true"
+        ))
+        await conn.execute(text("ANALYZE transcript_segments"))
+        await conn.commit()
+    return ids, total_segments, total_chars
+
+
+async def relation_size(name: str) -> int:
+    async with database.engine.connect() as conn:
+        return (await conn.execute(text("SELECT pg_total_relation_size(:name)"), {"name": name})).scalar_one()
+
+
+def footprint(documents_bytes: int, segments_bytes: int) -> Dict[str, float]:
+    # документы хранятся в дополнение к сегментам, а не вместо них
+    return {
+        "combined_bytes": documents_bytes + segments_bytes,
+        "overhead": round(documents_bytes / segments_bytes, 4),
+    }
+
+
+async def io_blocks(tables: List[str]) -> int:
+    # прочитанные блоки (shared hit + read) heap, TOAST и индексов таблиц
+    async with database.engine.connect() as conn:
+        return (await conn.execute(text("""
+            SELECT coalesce(sum(coalesce(heap_blks_read, 0) + coalesce(heap_blks_hit, 0)
+                + coalesce(idx_blks_read, 0) + coalesce(idx_blks_hit, 0)
+                + coalesce(toast_blks_read, 0) + coalesce(toast_blks_hit, 0)
+                + coalesce(tidx_blks_read, 0) + coalesce(tidx_blks_hit, 0)), 0)
+            FROM pg_statio_user_tables WHERE relname = ANY(:tables)
+        """), {"tables": tables})).scalar_one()
+
+
+async def load(client: httpx.AsyncClient, paths: List[str], accept_encoding: str,
+               recompress: bool = False) -> Tuple[Dict[str, float], int]:
+    # последовательные запросы, тело читается без распаковки - замеряется работа сервера
+    latencies = []
+    wire_bytes = 0
+    for path in paths:
+        started = time.perf_counter()
+        async with client.stream("GET", path, headers={"Accept-Encoding": accept_encoding}) as response:
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+            response.raise_for_status()
+        if recompress:
+            body = gzip.compress(body, compresslevel=6)
+        latencies.append((time.perf_counter() - started) * 1000)
+        wire_bytes += len(body)
+    return summarize(latencies), wire_bytes // len(paths)
+
+
+async def measure(client: httpx.AsyncClient, name: str, paths: List[str], tables: List[str], accept_encoding: str,
+                  recompress: bool = False) -> Dict[str, float]:
+    await load(client, paths[:20], accept_encoding, recompress)
+    # pg_statio пополняется при выходе backend'а - соединения пула закрываются до и после замера
+    await database.engine.dispose()
+    before = await io_blocks(tables)
+    await database.engine.dispose()
+    stats, wire_bytes = await load(client, paths, accept_encoding, recompress)
+    await database.engine.dispose()
+    await asyncio.sleep(0.5)
+    blocks = await io_blocks(tables) - before
+    result = {**stats, "bytes_per_response": wire_bytes, "db_blocks_per_request": round(blocks / len(paths), 2)}
+    print(f"  {name}: p50 {result['p50_ms']} ms, p95 {result['p95_ms']} ms, {wire_bytes} B/response, "
+          f"{result['db_blocks_per_request']} blocks/request")
+    return result
+
+
+async def main(args) -> bool:
+    check_bench_database(args.force)
+    await prepare_database()
+    # латентность без очереди эмбеддингов и token bucket клиента
+    settings.EMBEDDING_ENABLED = False
+    rate_limiter.enabled = False
+
+    started = time.perf_counter()
+    ids, total_segments, total_chars = await seed_transcripts(args.notes, args.seed)
+    print(f"corpus: {len(ids)} notes, {total_segments} segments, {total_chars / 1e6:.1f} MB of text "
+          f"({time.perf_counter() - started:.0f} s to seed)")
+
+    rng = random.Random(args.seed)
+    paths = [f"/api/v1/notes/{rng.choice(ids)}/transcription" for _ in range(args.requests)]
+    results = {}
+
+    from main import app
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=60.0) as client:
+        segments_bytes = await relation_size("transcript_segments")
+        results["storage.segments"] = {"bytes": segments_bytes}
+        print(f"storage segments (with search index): {segments_bytes / 1e6:.1f} MB")
+        results["response.assembled"] = await measure(
+            client, "assembled from segments", paths, ["transcript_segments", "audio_notes", "note_texts"], IDENTITY
+        )
+        results["response.assembled+gzip"] = await measure(
+            client, "assembled + gzip per request", paths, ["transcript_segments", "audio_notes", "note_texts"],
+            IDENTITY, recompress=True
+        )
+
+        encodings = [IDENTITY, "gzip"] + (["zstd"] if zstd_available() else [])
+        for encoding in encodings:
+            async with database.engine.begin() as conn:
+                await conn.execute(text("TRUNCATE note_texts"))
+            settings.TEXT_COMPRESSION = encoding if encoding != IDENTITY else "gzip"
+            settings.TEXT_COMPRESSION_MIN_BYTES = 1 << 30 if encoding == IDENTITY else 512
+
+            started = time.perf_counter()
+            await backfill_texts()
+            write_s = time.perf_counter() - started
+            async with database.engine.connect() as conn:
+                raw_bytes, body_bytes = (await conn.execute(text(
+                    "SELECT sum(size), sum(octet_length(body)) FROM note_texts WHERE kind = 'transcription'"
+                ))).one()
+            documents_bytes = await relation_size("note_texts")
+            results[f"storage.{encoding}"] = {
+                "bytes": documents_bytes,
+                "body_bytes": int(body_bytes),
+                "ratio": round(body_bytes / raw_bytes, 4),
+                **footprint(documents_bytes, segments_bytes),
+                "write_ms_per_note": round(write_s * 1000 / len(ids), 3),
+            }
+            print(f"storage {encoding}: table {documents_bytes / 1e6:.1f} MB, "
+                  f"ratio {results[f'storage.{encoding}']['ratio']}, "
+                  f"with segments {results[f'storage.{encoding}']['combined_bytes'] / 1e6:.1f} MB "
+                  f"(+{results[f'storage.{encoding}']['overhead'] * 100:.1f}%), "
+                  f"{results[f'storage.{encoding}']['write_ms_per_note']} ms/note to build")
+            results[f"response.{encoding}.passthrough"] = await measure(
+                client, f"{encoding} as stored", paths, ["note_texts"], encoding
+            )
+            if encoding != IDENTITY:
+                results[f"response.{encoding}.decoded"] = await measure(
+                    client, f"{encoding} decoded for identity client", paths, ["note_texts"], IDENTITY
+                )
+
+            if encoding == IDENTITY:
+                # тот же JSON в колонке text: TOAST сжимает его pglz (так хранился бы документ без 0012)
+                async with database.engine.begin() as conn:
+                    await conn.execute(text("DROP TABLE IF EXISTS bench_text_documents"))
+                    await conn.execute(text(
+                        "CREATE TABLE bench_text_documents AS "
+                        "SELECT note_id, convert_from(body, 'UTF8') AS body FROM note_texts"
+                    ))
+                pglz_bytes = await relation_size("bench_text_documents")
+                results["storage.text_pglz"] = {"bytes": pglz_bytes, **footprint(pglz_bytes, segments_bytes)}
+                print(f"storage text (pglz): table {pglz_bytes / 1e6:.1f} MB "
+                      f"(+{results['storage.text_pglz']['overhead'] * 100:.1f}% to segments)")
+                async with database.engine.begin() as conn:
+                    await conn.execute(text("DROP TABLE bench_text_documents"))
+
+    await database.engine.dispose()
+
+    best = "zstd" if zstd_available() else "gzip"
+    overhead = results[f"storage.{best}"]["overhead"]
+    passthrough = results[f"response.{best}.passthrough"]["p50_ms"]
+    assembled = results["response.assembled"]["p50_ms"]
+    ok = overhead <= args.max_overhead and passthrough < assembled
+    print(f"{'ok  ' if ok else 'FAIL'} {best}: documents add {overhead * 100:.1f}% to segment storage "
+          f"(max {args.max_overhead * 100:.0f}%), p50 as stored {passthrough} ms vs assembled {assembled} ms")
+
+    if args.output:
+        write_results(args.output, {name: value for name, value in results.items() if "p50_ms" in value},
+                      vars(args))
+    return ok
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Storage size, DB I/O and latency of compressed transcript documents")
+    parser.add_argument("--notes", type=int, default=2000)
+    parser.add_argument("--requests", type=int, default=300)
+    parser.add_argument("--max-overhead", type=float, default=0.2,
+                        help="limit of document storage relative to transcript_segments (0.2 - +20%%)")
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="write latency results JSON (benchmarks.compare format)")
+    parser.add_argument("--force", action="store_true", help="allow a database without 'bench' in its name")
+    args = parser.parse_args()
+
+    sys.exit(0 if asyncio.run(main(args)) else 1)
@@ -0,0 +1,277 @@
+import asyncio
+import math
+import time
+from collections import defaultdict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional, Tuple
+
+from fastapi import HTTPException, Request, status
+
+from core.config import settings
+from core.metrics import ADMISSION_REJECTED, UPLOAD_BYTES_IN_FLIGHT
+
+# Контроль допуска: ограничения загрузок воркера (одновременные загрузки, байты в памяти, загрузки клиента)
+# и token bucket на клиента для REST API со стоимостью запроса по его тяжести
+
+
+class AdmissionRejected(Exception):
+    # запрос не принят: retry_after - через сколько секунд имеет смысл повторить
+    def __init__(self, reason: str, retry_after: float, status_code: int = status.HTTP_503_SERVICE_UNAVAILABLE):
+        super().__init__(reason)
+        self.reason = reason
+        self.retry_after = retry_after
+        self.status_code = status_code
+
+    @property
+    def retry_after_header(self) -> str:
+        return str(max(math.ceil(self.retry_after), 1))
+
+
+class LocalBucketStore:
+    # token bucket в памяти воркера (для тестов и одиночного воркера), интерфейс совпадает с RedisBucketStore
+    def __init__(self, max_keys: int = 100000):
+        self.max_keys = max_keys
+        self._buckets: Dict[str, Tuple[float, float]] = {}
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        # 0 - токены списаны, иначе - через сколько секунд их станет достаточно
+        now = time.monotonic()
+        tokens, updated = self._buckets.get(key, (burst, now))
+        tokens = min(burst, tokens + (now - updated) * rate)
+
+        wait = 0.0
+        if tokens >= cost:
+            tokens -= cost
+        else:
+            wait = (cost - tokens) / rate
+        self._buckets[key] = (tokens, now)
+
+        if len(self._buckets) > self.max_keys:
+            self._prune(now, rate, burst)
+        return wait
+
+    def _prune(self, now: float, rate: float, burst: float):
+        # полные корзины ничем не отличаются от отсутствующих - удаляем, чтобы словарь не рос по числу IP
+        self._buckets = {
+            key: (tokens, updated) for key, (tokens, updated) in self._buckets.items()
+            if tokens + (now - updated) * rate < burst
+        }
+
+    async def close(self):
+        self._buckets.clear()
+
+
+# атомарно: пополнение по времени, списание, TTL - время до полного пополнения
+TOKEN_BUCKET_SCRIPT = """
+local rate, burst, cost, now = tonumber(ARGV[1]), tonumber(ARGV[2]), tonumber(ARGV[3]), tonumber(ARGV[4])
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'updated')
+local tokens = tonumber(state[1]) or burst
+local updated = tonumber(state[2]) or now
+tokens = math.min(burst, tokens + math.max(0, now - updated) * rate)
+local wait = 0
+if tokens >= cost then tokens = tokens - cost else wait = (cost - tokens) / rate end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'updated', now)
+redis.call('PEXPIRE', KEYS[1], math.ceil(burst / rate * 1000))
+return tostring(wait)
+"""
+
+
+class RedisBucketStore:
+    # общие корзины для всех воркеров и реплик, redis импортируется только при использовании
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+        self._script = self._client.register_script(TOKEN_BUCKET_SCRIPT)
+
+    async def take(self, key: str, cost: float, rate: float, burst: float) -> float:
+        return float(await self._script(keys=[key], args=[rate, burst, cost, time.time()]))
+
+    async def close(self):
+        await self._client.close()
+
+
+class RateLimiter:
+    def __init__(self, rate: float = 20.0, burst: float = 100.0, store=None, enabled: bool = True):
+        self.rate = rate
+        self.burst = burst
+        self.store = store or LocalBucketStore()
+        self.enabled = enabled
+
+    async def check(self, client: str, cost: float = 1.0):
+        if not self.enabled:
+            return
+        # запрос дороже корзины иначе не прошел бы никогда
+        wait = await self.store.take(f"ratelimit:{client}", min(cost, self.burst), self.rate, self.burst)
+        if wait > 0:
+            ADMISSION_REJECTED.labels("rate_limit").inc()
+            raise AdmissionRejected("Rate limit exceeded", wait, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    async def close(self):
+        await self.store.close()
+
+
+class UploadAdmission:
+    # ограничения загрузок воркера; при нехватке места загрузка ждет в очереди до queue_timeout секунд
+    def __init__(self, max_uploads: int = 32, max_bytes: int = 512 * 1024 * 1024, max_per_client: int = 4,
+                 queue_timeout: float = 10.0, retry_after: float = 15.0):
+        self.max_uploads = max_uploads
+        self.max_bytes = max_bytes
+        self.max_per_client = max_per_client
+        self.queue_timeout = queue_timeout
+        self.retry_after = retry_after
+
+        self.active = 0
+        self.bytes_in_flight = 0
+        self.per_client: Dict[str, int] = defaultdict(int)
+        self.connections: Dict[str, int] = defaultdict(int)
+        self._changed = asyncio.Condition()
+
+    def _reject(self, reason: str, label: str, status_code: int = status.HTTP_503_SERVICE_UNAVAILABLE):
+        ADMISSION_REJECTED.labels(label).inc()
+        raise AdmissionRejected(reason, self.retry_after, status_code)
+
+    async def _wait(self, predicate, reason: str, label: str):
+        # вызывается под self._changed
+        try:
+            await asyncio.wait_for(self._changed.wait_for(predicate), self.queue_timeout)
+        except asyncio.TimeoutError:
+            self._reject(reason, label)
+
+    @asynccontextmanager
+    async def slot(self, client: str):
+        # место для загрузки отдельным сокетом: лимит клиента проверяется сразу (без очереди), общий - с ожиданием
+        async with self.client_slot(client), self.worker_slot():
+            yield
+
+    @asynccontextmanager
+    async def client_slot(self, client: str, wait: bool = False):
+        # место клиента - одна принимаемая загрузка, отдельным сокетом или потоком мультиплексированного соединения.
+        # Сокет получает отказ сразу, поток (wait) ждет свободного места без таймаута: в очереди он не держит
+        # ни сессию БД, ни резерв байтов, а его кадры ограничены окном потока
+        async with self._changed:
+            if wait:
+                await self._changed.wait_for(lambda: self.per_client.get(client, 0) < self.max_per_client)
+            elif self.per_client.get(client, 0) >= self.max_per_client:
+                self._reject("Too many concurrent uploads from this client", "upload_client",
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+            self.per_client[client] += 1
+
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self.per_client[client] -= 1
+                if not self.per_client[client]:
+                    del self.per_client[client]
+                self._changed.notify_all()
+
+    @asynccontextmanager
+    async def connection_slot(self, client: str):
+        # мультиплексированное соединение: у клиента не больше max_per_client соединений - ограничены
+        # потоки, ждущие места клиента; сами загрузки соединений считаются в client_slot
+        async with self._changed:
+            if self.connections.get(client, 0) >= self.max_per_client:
+                self._reject("Too many upload connections from this client", "upload_client",
+                             status.HTTP_429_TOO_MANY_REQUESTS)
+            self.connections[client] += 1
+
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self.connections[client] -= 1
+                if not self.connections[client]:
+                    del self.connections[client]
+
+    @asynccontextmanager
+    async def worker_slot(self):
+        # место в общем лимите загрузок воркера, с ожиданием до queue_timeout
+        async with self._changed:
+            await self._wait(lambda: self.active < self.max_uploads, "Upload capacity exhausted", "uploads")
+            self.active += 1
+
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self.active -= 1
+                self._changed.notify_all()
+
+    @asynccontextmanager
+    async def reserve_bytes(self, size: int):
+        # объявленный размер файла резервируется на время приема, файл буферизуется в памяти целиком
+        if size > self.max_bytes:
+            self._reject(f"File is larger than {self.max_bytes} bytes", "upload_too_large",
+                         status.HTTP_413_REQUEST_ENTITY_TOO_LARGE)
+
+        async with self._changed:
+            await self._wait(lambda: self.bytes_in_flight + size <= self.max_bytes,
+                             "Upload memory budget exhausted", "upload_bytes")
+            self.bytes_in_flight += size
+        UPLOAD_BYTES_IN_FLIGHT.inc(size)
+
+        try:
+            yield
+        finally:
+            async with self._changed:
+                self.bytes_in_flight -= size
+                self._changed.notify_all()
+            UPLOAD_BYTES_IN_FLIGHT.dec(size)
+
+
+def request_cost(request: Request) -> float:
+    # стоимость в токенах: список дороже с ростом limit, полнотекстовый поиск и выгрузка - отдельно
+    route = request.scope.get("route")
+    path = route.path if route is not None else request.url.path
+    query = request.query_params
+
+    cost = 1.0
+    if path.endswith("/notes/export"):
+        cost = settings.RATE_LIMIT_EXPORT_COST
+    elif path.endswith("/notes"):
+        try:
+            cost += int(query.get("limit", 100)) / 100
+        except ValueError:
+            pass
+    if query.get("search") or query.get("semantic") or path.endswith("/similar"):
+        cost *= settings.RATE_LIMIT_SEARCH_COST
+    return cost
+
+
+def client_id(host: Optional[str]) -> str:
+    # адрес клиента (за прокси - из X-Forwarded-For, см. proxy_headers в serve.py)
+    return host or "unknown"
+
+
+async def rate_limit(request: Request):
+    # Dependency для роутеров REST API
+    try:
+        await rate_limiter.check(client_id(request.client.host if request.client else None), request_cost(request))
+    except AdmissionRejected as e:
+        raise HTTPException(
+            status_code=e.status_code,
+            detail=e.reason,
+            headers={"Retry-After": e.retry_after_header}
+        )
+
+
+def create_rate_limiter() -> RateLimiter:
+    url = settings.RATE_LIMIT_URL or settings.CACHE_URL
+    return RateLimiter(
+        rate=settings.RATE_LIMIT_RATE,
+        burst=settings.RATE_LIMIT_BURST,
+        store=RedisBucketStore(url) if url else None,
+        enabled=settings.RATE_LIMIT_ENABLED
+    )
+
+
+# Глобальные экземпляры воркера
+rate_limiter = create_rate_limiter()
+upload_admission = UploadAdmission(
+    max_uploads=settings.MAX_CONCURRENT_UPLOADS,
+    max_bytes=settings.MAX_UPLOAD_BYTES_IN_FLIGHT,
+    max_per_client=settings.MAX_UPLOADS_PER_CLIENT,
+    queue_timeout=settings.UPLOAD_QUEUE_TIMEOUT,
+    retry_after=settings.UPLOAD_RETRY_AFTER
+)
@@ -0,0 +1,91 @@
+import base64
+import hashlib
+import hmac
+import json
+import time
+import uuid
+from typing import Optional
+
+from fastapi import Depends, Header, HTTPException, status
+
+from core.config import settings
+
+# Пользователь запроса. Аутентификацию выполняет шлюз перед API: он передает подписанный токен в X-User-Token -
+# JWT (HS256) на общем с API секрете GATEWAY_SECRET, claims: sub - id пользователя, exp - срок действия (unix time),
+# tier - тариф пользователя (необязательный).
+# Без подписи заголовку не доверяем: клиент, обратившийся к API в обход шлюза, не может назваться другим пользователем.
+# Без токена - DEFAULT_USER_ID, только если он задан явно: однопользовательский режим, фронтенд без входа
+# (миграция 0008 передала все заметки, созданные до разделения, пользователю 00000000-0000-0000-0000-000000000000)
+
+
+def _b64encode(value: bytes) -> str:
+    return base64.urlsafe_b64encode(value).rstrip(b"=").decode()
+
+
+def _b64decode(value: str) -> bytes:
+    return base64.urlsafe_b64decode(value + "=" * (-len(value) % 4))
+
+
+def _signature(secret: str, signing_input: str) -> bytes:
+    return hmac.new(secret.encode(), signing_input.encode(), hashlib.sha256).digest()
+
+
+def _unauthorized(detail: str) -> HTTPException:
+    return HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail=detail)
+
+
+def sign_gateway_token(claims: dict, secret: str) -> str:
+    # токен, который выпускает шлюз (для тестов и локальной отладки без шлюза)
+    header = _b64encode(json.dumps({"alg": "HS256", "typ": "JWT"}).encode())
+    payload = _b64encode(json.dumps(claims).encode())
+    return f"{header}.{payload}.{_b64encode(_signature(secret, f'{header}.{payload}'))}"
+
+
+def verify_gateway_token(token: str, secret: str, now: Optional[float] = None) -> dict:
+    try:
+        header, payload, signature = token.split(".")
+        if not hmac.compare_digest(_b64decode(signature), _signature(secret, f"{header}.{payload}")):
+            raise ValueError("signature mismatch")
+        if json.loads(_b64decode(header)).get("alg") != "HS256":
+            raise ValueError("unsupported alg")
+        claims = json.loads(_b64decode(payload))
+        if not isinstance(claims, dict):
+            raise ValueError("claims are not an object")
+    except (ValueError, AttributeError):
+        raise _unauthorized("Invalid X-User-Token")
+
+    expires = claims.get("exp")
+    if not isinstance(expires, (int, float)) or expires <= (time.time() if now is None else now):
+        raise _unauthorized("X-User-Token expired")
+    return claims
+
+
+# Dependency: проверенные claims токена шлюза, None - запрос без токена
+def gateway_claims(x_user_token: Optional[str] = Header(None)) -> Optional[dict]:
+    if x_user_token is None:
+        return None
+    if not settings.GATEWAY_SECRET:
+        raise _unauthorized("X-User-Token is not accepted: GATEWAY_SECRET is not configured")
+    return verify_gateway_token(x_user_token, settings.GATEWAY_SECRET)
+
+
+# Dependency для HTTP и WebSocket эндпоинтов
+def current_user_id(claims: Optional[dict] = Depends(gateway_claims)) -> uuid.UUID:
+    if claims is None:
+        if not settings.DEFAULT_USER_ID:
+            raise _unauthorized("X-User-Token header required")
+        return uuid.UUID(settings.DEFAULT_USER_ID)
+
+    try:
+        return uuid.UUID(str(claims.get("sub")))
+    except ValueError:
+        raise _unauthorized("Invalid user in X-User-Token")
+
+
+# Тариф пользователя - вес в честной очереди транскрибации: только из подписанного токена (claim tier),
+# клиент не может повысить себе приоритет; без токена, без claim или с неизвестным тарифом - DEFAULT_USER_TIER
+def current_user_tier(claims: Optional[dict] = Depends(gateway_claims)) -> str:
+    tier = claims.get("tier") if claims else None
+    if isinstance(tier, str) and tier in settings.USER_TIER_WEIGHTS:
+        return tier
+    return settings.DEFAULT_USER_TIER
@@ -0,0 +1,240 @@
+import asyncio
+import hashlib
+import json
+import random
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Optional, Tuple
+
+from core.config import settings
+
+
+class LRUCache:
+    # in-process LRU кэш с TTL на каждую запись
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: "OrderedDict[str, Tuple[float, Any]]" = OrderedDict()
+
+    def get(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+
+        expires_at, value = item
+        if expires_at < time.monotonic():
+            del self._data[key]
+            return None
+
+        self._data.move_to_end(key)
+        return value
+
+    def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + (ttl if ttl is not None else self.ttl)
+        self._data[key] = (expires_at, value)
+        self._data.move_to_end(key)
+
+        # вытесняем самые старые записи
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: str):
+        self._data.pop(key, None)
+
+    def clear(self):
+        self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class LocalCacheBackend:
+    # локальная замена общего кэш-сервера (для тестов и одиночного воркера)
+    # интерфейс совпадает с RedisCacheBackend
+    def __init__(self):
+        self._data: Dict[str, Tuple[Optional[float], Any]] = {}
+        self._lock = asyncio.Lock()
+
+    def _alive(self, key: str) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if expires_at is not None and expires_at < time.monotonic():
+            del self._data[key]
+            return None
+        return value
+
+    async def get(self, key: str) -> Optional[Any]:
+        return self._alive(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        expires_at = time.monotonic() + ttl if ttl else None
+        self._data[key] = (expires_at, value)
+
+    async def incr(self, key: str, ttl: Optional[float] = None, initial: int = 0) -> int:
+        # initial - значение отсутствующего ключа перед увеличением
+        async with self._lock:
+            current = self._alive(key)
+            value = int(current if current is not None else initial) + 1
+            await self.set(key, value, ttl)
+            return value
+
+    async def close(self):
+        self._data.clear()
+
+
+class RedisCacheBackend:
+    # общий кэш между воркерами/репликами, redis импортируется только при использовании
+    def __init__(self, url: str):
+        import redis.asyncio as redis
+
+        self._client = redis.from_url(url)
+
+    async def get(self, key: str) -> Optional[Any]:
+        return await self._client.get(key)
+
+    async def set(self, key: str, value: Any, ttl: Optional[float] = None):
+        await self._client.set(key, value, px=int(ttl * 1000) if ttl else None)
+
+    async def incr(self, key: str, ttl: Optional[float] = None, initial: int = 0) -> int:
+        async with self._client.pipeline(transaction=True) as pipe:
+            if initial:
+                pipe.set(key, initial, nx=True)
+            pipe.incr(key)
+            if ttl:
+                pipe.pexpire(key, int(ttl * 1000))
+            results = await pipe.execute()
+        return int(results[1 if initial else 0])
+
+    async def close(self):
+        await self._client.close()
+
+
+class NoteCache:
+    # read-through кэш заметок и страниц списка
+    # инвалидация через счетчики версий: версия входит в ключ записи,
+    # поэтому после записи в БД старые значения больше никогда не читаются
+    LIST_VERSION_KEY = "notes:list:version"
+
+    def __init__(self, maxsize: int = 1024, ttl: float = 30.0,
+                 backend=None, enabled: bool = True):
+        self.enabled = enabled
+        self.ttl = ttl
+        self.local = LRUCache(maxsize=maxsize, ttl=ttl)
+        self.backend = backend or LocalCacheBackend()
+        self.shared = not isinstance(self.backend, LocalCacheBackend)
+
+        self.stats = {
+            "note": {"hits": 0, "misses": 0},
+            "list": {"hits": 0, "misses": 0},
+        }
+        self.invalidations = 0
+
+    @staticmethod
+    def filters_hash(skip: int, limit: int, filters: Optional[Dict[str, Any]]) -> str:
+        # нормализуем фильтры: пустые значения отбрасываем, списки сортируем
+        normalized = {}
+        for key, value in (filters or {}).items():
+            if value in (None, "", [], ()):
+                continue
+            if isinstance(value, (list, tuple, set)):
+                value = sorted(str(v) for v in value)
+            normalized[key] = value
+
+        payload = json.dumps(
+            {"skip": skip, "limit": limit, "filters": normalized},
+            sort_keys=True,
+            default=str
+        )
+        return hashlib.sha1(payload.encode()).hexdigest()
+
+    # версии живут дольше записей; истекшая версия начинается заново со случайной эпохи, а не с 0,
+    # иначе новые увеличения попадали бы на номера версий, под которыми еще лежат старые записи
+    def _version_ttl(self) -> float:
+        return self.ttl * 2
+
+    async def _bump(self, key: str):
+        await self.backend.incr(key, self._version_ttl(), initial=random.randrange(1, 2 ** 48))
+
+    async def _version(self, key: str) -> int:
+        return int(await self.backend.get(key) or 0)
+
+    def _note_version_key(self, note_id) -> str:
+        return f"note:{note_id}:version"
+
+    async def note_key(self, note_id, user_id=None) -> str:
+        # владелец в ключе: заметку из кэша получает только тот, для кого она была прочитана
+        version = await self._version(self._note_version_key(note_id))
+        return f"note:{note_id}:u{user_id}:v{version}"
+
+    async def list_key(self, skip: int, limit: int, filters: Optional[Dict[str, Any]]) -> str:
+        version = await self._version(self.LIST_VERSION_KEY)
+        return f"notes:list:v{version}:{self.filters_hash(skip, limit, filters)}"
+
+    async def get(self, kind: str, key: str, decoder=None) -> Optional[Any]:
+        if not self.enabled:
+            return None
+
+        value = self.local.get(key)
+        if value is None and self.shared:
+            raw = await self.backend.get(key)
+            if raw is not None:
+                value = decoder(raw) if decoder else raw
+                self.local.set(key, value)
+
+        self.stats[kind]["hits" if value is not None else "misses"] += 1
+        return value
+
+    async def set(self, key: str, value: Any, encoder=None):
+        if not self.enabled:
+            return
+
+        self.local.set(key, value)
+        if self.shared:
+            await self.backend.set(key, encoder(value) if encoder else value, self.ttl)
+
+    async def invalidate_note(self, note_id):
+        # запись конкретной заметки меняет и ее, и все страницы списка
+        self.invalidations += 1
+        await self._bump(self._note_version_key(note_id))
+        await self._bump(self.LIST_VERSION_KEY)
+
+    async def invalidate_lists(self):
+        self.invalidations += 1
+        await self._bump(self.LIST_VERSION_KEY)
+
+    def metrics(self) -> dict:
+        result = {}
+        for kind, counters in self.stats.items():
+            total = counters["hits"] + counters["misses"]
+            result[kind] = {
+                **counters,
+                "hit_ratio": round(counters["hits"] / total, 4) if total else 0.0
+            }
+
+        hits = sum(c["hits"] for c in self.stats.values())
+        total = hits + sum(c["misses"] for c in self.stats.values())
+        result["total_hit_ratio"] = round(hits / total, 4) if total else 0.0
+        result["invalidations"] = self.invalidations
+        result["local_entries"] = len(self.local)
+        result["shared"] = self.shared
+        return result
+
+    async def close(self):
+        self.local.clear()
+        await self.backend.close()
+
+
+def create_note_cache() -> NoteCache:
+    backend = RedisCacheBackend(settings.CACHE_URL) if settings.CACHE_URL else None
+    return NoteCache(
+        maxsize=settings.CACHE_MAXSIZE,
+        ttl=settings.CACHE_TTL,
+        backend=backend,
+        enabled=settings.CACHE_ENABLED
+    )
+
+
+# Глобальный экземпляр кэша
+note_cache = create_note_cache()
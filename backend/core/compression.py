@@ -0,0 +1,74 @@
+import gzip
+import importlib.util
+from typing import Optional
+
+from core.config import settings
+
+# Сжатие документов транскрипта и саммари при хранении (таблица note_texts): тело ответа сжимается один раз
+# при записи и отдается клиенту как есть с Content-Encoding - без распаковки и повторного сжатия на запрос
+# gzip - stdlib, понимают все клиенты; zstd - меньше и быстрее распаковывается, но нужен extra "zstd"
+# (zstandard, импортируется лениво) и клиенту - Accept-Encoding: zstd
+
+IDENTITY = "identity"
+ENCODINGS = ("gzip", "zstd")
+
+# уровни по умолчанию: сжатие один раз при записи, чтение - на каждый запрос, поэтому уровень высокий
+DEFAULT_LEVELS = {"gzip": 9, "zstd": 19}
+
+
+def zstd_available() -> bool:
+    return importlib.util.find_spec("zstandard") is not None
+
+
+def storage_encoding() -> str:
+    # кодирование новых документов: без zstandard - gzip, документы остаются читаемыми
+    if settings.TEXT_COMPRESSION == "zstd" and not zstd_available():
+        return "gzip"
+    return settings.TEXT_COMPRESSION
+
+
+def compress(data: bytes, encoding: str, level: Optional[int] = None) -> bytes:
+    level = level or settings.TEXT_COMPRESSION_LEVEL or DEFAULT_LEVELS.get(encoding)
+    if encoding == IDENTITY:
+        return data
+    if encoding == "gzip":
+        # mtime=0 - одинаковый текст дает одинаковые байты
+        return gzip.compress(data, compresslevel=level, mtime=0)
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdCompressor(level=level, write_content_size=True).compress(data)
+    raise ValueError(f"Unknown encoding {encoding!r}")
+
+
+def decompress(data: bytes, encoding: str) -> bytes:
+    if encoding == IDENTITY:
+        return data
+    if encoding == "gzip":
+        return gzip.decompress(data)
+    if encoding == "zstd":
+        import zstandard
+        return zstandard.ZstdDecompressor().decompress(data)
+    raise ValueError(f"Unknown encoding {encoding!r}")
+
+
+def accepts_encoding(accept_encoding: Optional[str], encoding: str) -> bool:
+    # Accept-Encoding по RFC 9110: кодирование (или *) с q > 0; identity подходит всегда, если явно не запрещено
+    if encoding == IDENTITY:
+        return True
+    if not accept_encoding:
+        return False
+
+    qualities = {}
+    for item in accept_encoding.split(","):
+        name, _, params = item.strip().partition(";")
+        quality = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                quality = float(params[2:])
+            except ValueError:
+                quality = 0.0
+        qualities[name.strip().lower()] = quality
+
+    quality = qualities.get(encoding, qualities.get("*", 0.0))
+    return quality > 0
@@ -1,12 +1,13 @@
 from pydantic_settings import BaseSettings
-from typing import Optional
+from typing import Dict, Optional
 from pydantic import Field, field_validator
+import logging
 import os
-from dotenv import load_dotenv
 
-# Загружаем .env вручную
+logger = logging.getLogger(__name__)
+
+# app.env читает сам pydantic-settings, переменные окружения имеют приоритет
 env_path = os.path.join(os.path.dirname(__file__), '..', 'app.env')
-load_dotenv(env_path)
 
 class Settings(BaseSettings):
     # Database
@@ -15,6 +16,167 @@ class Settings(BaseSettings):
         description="Database connection URL"
     )
 
+    DB_ECHO: bool = Field(
+        default=False,
+        description="Log every SQL statement (debug only)"
+    )
+
+    # Реплики для чтения (списки и карточки заметок), без них все запросы идут в primary
+    DATABASE_REPLICA_URLS: Optional[str] = Field(
+        default=None,
+        description="Comma-separated read replica URLs; the role needs pg_monitor to see the WAL receiver status"
+    )
+
+    REPLICA_MAX_LAG: float = Field(
+        default=5.0,
+        description="Replica replay lag in seconds above which reads go to the primary"
+    )
+
+    REPLICA_CHECK_INTERVAL: float = Field(
+        default=5.0,
+        description="Seconds between replica lag checks in each worker"
+    )
+
+    REPLICA_CHECK_TIMEOUT: float = Field(
+        default=1.0,
+        description="Timeout of one replica lag check"
+    )
+
+    READ_YOUR_WRITES_WINDOW: float = Field(
+        default=5.0,
+        description="Seconds a client's reads go to the primary after its own write"
+    )
+
+    # Секционирование audio_notes по месяцам и архивация старых транскриптов
+    PARTITION_MONTHS_AHEAD: int = Field(
+        default=6,
+        description="Monthly audio_notes partitions to keep created in advance"
+    )
+
+    TRANSCRIPT_ARCHIVE_AFTER_DAYS: int = Field(
+        default=180,
+        description="Move transcription/summary of notes older than this to the archive table"
+    )
+
+    # Восстановление зависших этапов обработки (services/reaper_service.py)
+    REAPER_ENABLED: bool = Field(
+        default=True,
+        description="Run the stale processing job reaper in every worker (one pass at a time via advisory lock)"
+    )
+
+    REAPER_INTERVAL: float = Field(
+        default=60.0,
+        description="Seconds between reaper passes"
+    )
+
+    REAPER_BATCH_SIZE: int = Field(
+        default=100,
+        description="Jobs handled per reaper transaction"
+    )
+
+    UPLOAD_STALE_AFTER: float = Field(
+        default=900.0,
+        description="Seconds after which an unfinished upload is considered abandoned"
+    )
+
+    PROCESSING_STALE_AFTER: float = Field(
+        default=1800.0,
+        description="Seconds after which a transcription/summarization job without result is retried"
+    )
+
+    PROCESSING_MAX_ATTEMPTS: int = Field(
+        default=5,
+        description="Attempts before a job is moved to dead_letter"
+    )
+
+    RETRY_BACKOFF_BASE: float = Field(
+        default=60.0,
+        description="First retry delay in seconds, doubled on every attempt"
+    )
+
+    RETRY_BACKOFF_MAX: float = Field(
+        default=3600.0,
+        description="Upper bound for the retry delay"
+    )
+
+    S3_ORPHAN_MIN_AGE_HOURS: float = Field(
+        default=24.0,
+        description="Unreferenced S3 objects younger than this are kept (uploads in flight)"
+    )
+
+    # Планировщик транскрибации: приоритет по длительности и честная очередь по пользователям
+    # (services/scheduler_service.py)
+    SCHEDULER_ENABLED: bool = Field(
+        default=True,
+        description="Hold transcription jobs in note_processing and publish them as engine capacity frees up"
+    )
+
+    SCHEDULER_POLICY: str = Field(
+        default="priority_fair",
+        description="Dispatch order: 'priority_fair', 'priority', 'fair' or 'fifo'"
+    )
+
+    SCHEDULER_CAPACITY: int = Field(
+        default=4,
+        description="Transcription jobs in flight across the cluster (total slots of the transcription workers)"
+    )
+
+    SCHEDULER_RESERVED_SLOTS: int = Field(
+        default=1,
+        description="Slots long recordings never take: kept free for short and standard notes"
+    )
+
+    SCHEDULER_INTERVAL: float = Field(
+        default=1.0,
+        description="Seconds between dispatcher passes"
+    )
+
+    PRIORITY_SHORT_SECONDS: float = Field(
+        default=120.0,
+        description="Recordings up to this duration go to the 'short' priority class"
+    )
+
+    PRIORITY_LONG_SECONDS: float = Field(
+        default=1800.0,
+        description="Recordings from this duration go to the 'long' priority class"
+    )
+
+    SCHEDULER_STARVATION_AFTER: float = Field(
+        default=3600.0,
+        description="Jobs queued longer than this are dispatched as the top priority class"
+    )
+
+    SCHEDULER_JOB_OVERHEAD: float = Field(
+        default=10.0,
+        description="Fixed cost of a job in seconds of audio (model load, S3 download) for fair queuing"
+    )
+
+    USER_TIER_WEIGHTS: Dict[str, float] = Field(
+        default={"free": 1.0, "standard": 2.0, "premium": 4.0},
+        description="Fair-queuing weight per user tier (tier claim of the gateway token)"
+    )
+
+    DEFAULT_USER_TIER: str = Field(
+        default="standard",
+        description="Tier of requests without a token or a known tier claim"
+    )
+
+    # Счетчики заметок пользователя для GET /api/v1/stats (db_layer/usage_db_interaction.py)
+    USAGE_COUNTER_SHARDS: int = Field(
+        default=8,
+        description="Rows per user counter: concurrent transactions of one user update different rows"
+    )
+
+    USAGE_RECONCILE_ENABLED: bool = Field(
+        default=True,
+        description="Periodically recompute counters from audio_notes/audio_files and correct drift"
+    )
+
+    USAGE_RECONCILE_INTERVAL: float = Field(
+        default=3600.0,
+        description="Seconds between counter reconciliation passes (full scan of audio_notes)"
+    )
+
     # RabbitMQ
     #RABBITMQ_URL: str = Field(
     #    description="RabbitMQ connection URL"
@@ -22,31 +184,310 @@ class Settings(BaseSettings):
 
     # Yandex Cloud S3 Configuration
     S3_ENDPOINT_URL: str = Field(
-        default=os.getenv("S3_ENDPOINT_URL", "https://storage.yandexcloud.net"),
+        default="https://storage.yandexcloud.net",
         description="Yandex Cloud Object Storage endpoint"
     )
 
 
     S3_ACCESS_KEY: Optional[str] = Field(
-        default=os.getenv("S3_ACCESS_KEY"),
+        default=None,
         description="Yandex Cloud Access Key ID"
     )
 
     S3_SECRET_KEY: Optional[str] = Field(
-        default=os.getenv("S3_SECRET_KEY"),
+        default=None,
         description="Yandex Cloud Secret Access Key"
     )
 
     S3_BUCKET_NAME: str = Field(
-        default=os.getenv("S3_BUCKET_NAME", "audio-notes-bucket"),
+        default="audio-notes-bucket",
         description="Yandex Cloud bucket name"
     )
 
     S3_REGION: str = Field(
-        default=os.getenv("S3_REGION", "ru-central1"),
+        default="ru-central1",
         description="Yandex Cloud region"
     )
 
+    # Сервер (production режим, serve.py)
+    HOST: str = Field(
+        default="0.0.0.0",
+        description="Bind host"
+    )
+
+    PORT: int = Field(
+        default=8000,
+        description="Bind port"
+    )
+
+    WORKERS: int = Field(
+        default=0,
+        description="Worker processes, 0 = CPU count"
+    )
+
+    GRACEFUL_SHUTDOWN_TIMEOUT: float = Field(
+        default=30.0,
+        description="Seconds to wait for in-flight uploads and requests on shutdown"
+    )
+
+    # Кэш заметок
+    CACHE_ENABLED: bool = Field(
+        default=True,
+        description="Enable read-through cache for note endpoints"
+    )
+
+    CACHE_MAXSIZE: int = Field(
+        default=1024,
+        description="Max entries in the in-process LRU cache"
+    )
+
+    CACHE_TTL: float = Field(
+        default=30.0,
+        description="Cache entry TTL in seconds"
+    )
+
+    CACHE_URL: Optional[str] = Field(
+        default=None,
+        description="Shared cache server URL (redis://...), in-process only if empty"
+    )
+
+    # Допуск загрузок (на воркер: аудио буферизуется в памяти процесса)
+    MAX_CONCURRENT_UPLOADS: int = Field(
+        default=32,
+        description="Concurrent WebSocket uploads per worker"
+    )
+
+    MAX_UPLOAD_BYTES_IN_FLIGHT: int = Field(
+        default=512 * 1024 * 1024,
+        description="Declared bytes of uploads being received at once per worker"
+    )
+
+    MAX_UPLOADS_PER_CLIENT: int = Field(
+        default=4,
+        description="Concurrent uploads from one client address per worker (sockets and multiplexed streams together) "
+                    "and multiplexed /ws/upload connections per client"
+    )
+
+    UPLOAD_QUEUE_TIMEOUT: float = Field(
+        default=10.0,
+        description="Seconds an upload waits for a free slot before it is rejected"
+    )
+
+    UPLOAD_RETRY_AFTER: float = Field(
+        default=15.0,
+        description="Retry-after hint sent with rejected uploads"
+    )
+
+    UPLOAD_MUX_MAX_STREAMS: int = Field(
+        default=16,
+        description="Open streams on one /ws/upload connection; streams beyond the client's MAX_UPLOADS_PER_CLIENT queue"
+    )
+
+    UPLOAD_MUX_STREAM_WINDOW: int = Field(
+        default=256 * 1024,
+        description="Flow-control window: bytes a client may send on a stream before the server grants more"
+    )
+
+    # Token bucket на клиента для REST API, стоимость запроса зависит от его тяжести
+    RATE_LIMIT_ENABLED: bool = Field(
+        default=True,
+        description="Enable per-client rate limiting of REST routes"
+    )
+
+    RATE_LIMIT_RATE: float = Field(
+        default=20.0,
+        description="Tokens per second refilled for each client"
+    )
+
+    RATE_LIMIT_BURST: float = Field(
+        default=100.0,
+        description="Bucket size (max tokens a client can spend at once)"
+    )
+
+    RATE_LIMIT_SEARCH_COST: float = Field(
+        default=5.0,
+        description="Cost multiplier for full-text and semantic search requests"
+    )
+
+    RATE_LIMIT_EXPORT_COST: float = Field(
+        default=50.0,
+        description="Cost of one /notes/export request"
+    )
+
+    RATE_LIMIT_URL: Optional[str] = Field(
+        default=None,
+        description="Shared store for buckets (redis://...), CACHE_URL if empty, in-process if both are empty"
+    )
+
+    # Пики waveform для плеера (services/waveform_service.py, нужен extra "waveform" - numpy)
+    WAVEFORM_ENABLED: bool = Field(
+        default=True,
+        description="Compute waveform peaks after upload (skipped if numpy is not installed)"
+    )
+
+    WAVEFORM_FFMPEG: str = Field(
+        default="ffmpeg",
+        description="ffmpeg binary used to decode non-WAV uploads"
+    )
+
+    WAVEFORM_DECODE_RATE: int = Field(
+        default=16000,
+        description="Sample rate ffmpeg decodes to before computing peaks"
+    )
+
+    WAVEFORM_BITS: int = Field(
+        default=8,
+        description="Peak resolution in the stored .dat artifact: 8 or 16 bits"
+    )
+
+    WAVEFORM_CONCURRENCY: int = Field(
+        default=2,
+        description="Waveform computations running at once per worker"
+    )
+
+    # Семантический поиск: эмбеддинги транскриптов и саммари (pgvector, services/embedding_service.py)
+    EMBEDDING_ENABLED: bool = Field(
+        default=True,
+        description="Compute embeddings and serve semantic search (skipped if the model backend is not installed)"
+    )
+
+    EMBEDDING_MODEL: str = Field(
+        default="sentence-transformers/all-MiniLM-L6-v2",
+        description="sentence-transformers model name, or 'fake' for the deterministic hashing model (tests)"
+    )
+
+    EMBEDDING_DIM: int = Field(
+        default=384,
+        description="Vector dimension, must match the model and the note_embeddings column (migration 0010)"
+    )
+
+    EMBEDDING_BATCH_SIZE: int = Field(
+        default=64,
+        description="Texts embedded per indexer batch"
+    )
+
+    EMBEDDING_INTERVAL: float = Field(
+        default=5.0,
+        description="Seconds between indexer passes in each worker"
+    )
+
+    EMBEDDING_MAX_ATTEMPTS: int = Field(
+        default=3,
+        description="Failed attempts after which a queued embedding is skipped"
+    )
+
+    EMBEDDING_EF_SEARCH: int = Field(
+        default=100,
+        description="Initial HNSW candidate list size per query, raised up to 1000 while too few notes are found"
+    )
+
+    EMBEDDING_EXACT_THRESHOLD: int = Field(
+        default=20000,
+        description="Users with fewer vectors (or too small a share of all vectors) are searched exactly, not via HNSW"
+    )
+
+    # Транскрибация во время записи (потоковый режим /ws/upload, core/transcription.py)
+    LIVE_TRANSCRIPTION_ENABLED: bool = Field(
+        default=True,
+        description="Transcribe streamed recordings on the fly (batch pipeline if the engine is unavailable)"
+    )
+
+    LIVE_TRANSCRIPTION_ENGINE: str = Field(
+        default="vosk",
+        description="Incremental engine: 'vosk' (extra 'live', needs a model directory) or 'fake' (tests)"
+    )
+
+    LIVE_TRANSCRIPTION_MODEL_PATH: str = Field(
+        default="/models/vosk-model-small-en-us-0.15",
+        description="Vosk model directory"
+    )
+
+    LIVE_TRANSCRIPTION_SAMPLE_RATE: int = Field(
+        default=16000,
+        description="Sample rate of PCM fed to the engine (raw pcm streams must be s16le mono at this rate)"
+    )
+
+    LIVE_TRANSCRIPTION_CHUNK_MS: int = Field(
+        default=200,
+        description="Audio accumulated before each engine call"
+    )
+
+    LIVE_TRANSCRIPTION_MAX_BYTES: int = Field(
+        default=64 * 1024 * 1024,
+        description="Recording size limit of a stream that does not declare file_size"
+    )
+
+    # Сжатые документы транскрипта и саммари для отдачи как есть (core/compression.py, таблица note_texts)
+    TEXT_COMPRESSION: str = Field(
+        default="gzip",
+        description="Encoding of stored transcript/summary documents: 'gzip' or 'zstd' (extra 'zstd', falls back to gzip)"
+    )
+
+    TEXT_COMPRESSION_LEVEL: Optional[int] = Field(
+        default=None,
+        description="Compression level, none - codec default for write-once data (gzip 9, zstd 19)"
+    )
+
+    TEXT_COMPRESSION_MIN_BYTES: int = Field(
+        default=512,
+        description="Documents smaller than this are stored uncompressed (identity)"
+    )
+
+    # Метрики
+    METRICS_ENABLED: bool = Field(
+        default=True,
+        description="Expose Prometheus metrics at /metrics"
+    )
+
+    # Профилирование запросов
+    PROFILING_ENABLED: bool = Field(
+        default=False,
+        description="Enable sampling profiler middleware"
+    )
+
+    PROFILING_SAMPLE_RATE: float = Field(
+        default=0.01,
+        description="Share of requests to profile (0..1), X-Profile: <ADMIN_TOKEN> always profiles"
+    )
+
+    PROFILING_THRESHOLD_MS: float = Field(
+        default=500.0,
+        description="Keep sampled profiles only for requests slower than this"
+    )
+
+    PROFILING_INTERVAL_MS: float = Field(
+        default=5.0,
+        description="Stack sampling interval"
+    )
+
+    PROFILING_DIR: str = Field(
+        default="profiles",
+        description="Directory for collapsed-stack profiles"
+    )
+
+    PROFILING_MAX_FILES: int = Field(
+        default=100,
+        description="Ring buffer size for stored profiles"
+    )
+
+    # Пользователь запроса: подписанный токен шлюза аутентификации в X-User-Token (core/auth.py),
+    # без токена - DEFAULT_USER_ID, если задан (однопользовательский режим)
+    GATEWAY_SECRET: Optional[str] = Field(
+        default=None,
+        description="HS256 secret shared with the auth gateway that signs X-User-Token, tokens rejected if empty"
+    )
+
+    DEFAULT_USER_ID: Optional[str] = Field(
+        default=None,
+        description="User for requests without X-User-Token (single-user mode), token required if empty"
+    )
+
+    # Админ-доступ (профили и т.п.), без токена админ-эндпоинты выключены
+    ADMIN_TOKEN: Optional[str] = Field(
+        default=None,
+        description="Token expected in X-Admin-Token header"
+    )
+
     # Преобразуем MultiHostUrl в обычную строку для SQLAlchemy
     @field_validator('DATABASE_URL')
     def convert_db_url_to_string(cls, v):
@@ -55,7 +496,7 @@ class Settings(BaseSettings):
         return v
 
     class Config:
-        env_file = ".env"
+        env_file = (env_path, ".env")
         env_file_encoding = "utf-8"
         case_sensitive = False
         extra = "ignore"  # Игнорируем дополнительные поля
@@ -64,9 +505,8 @@ class Settings(BaseSettings):
 # Создаем экземпляр с обработкой ошибок
 try:
     settings = Settings()
-    print("Configuration loaded successfully")
 except Exception as e:
-    print(f"Configuration error: {e}")
+    logger.error(f"Configuration error: {e}")
     # Создаем с дефолтными значениями для разработки
     settings = Settings(
         S3_ACCESS_KEY="dummy_key",
@@ -1,16 +1,31 @@
-from sqlalchemy.ext.asyncio import create_async_engine, AsyncSession, async_sessionmaker
+import asyncio
+import logging
+import math
+import time
+from typing import List, Optional
+
+from fastapi import Depends, Request, Response
+from sqlalchemy import text
+from sqlalchemy.exc import DBAPIError
+from sqlalchemy.ext.asyncio import create_async_engine, AsyncEngine, AsyncSession, async_sessionmaker
 from sqlalchemy.orm import DeclarativeBase
 from core.config import settings
+from core.metrics import DB_READ_ROUTE, DB_REPLICA_LAG, instrument_engine
 
 from models.base_model import BaseModel
 
+logger = logging.getLogger(__name__)
+
 # Асинхронный engine
 engine = create_async_engine(
     settings.DATABASE_URL,
-    echo=True,
+    echo=settings.DB_ECHO,
     future=True
 )
 
+if settings.METRICS_ENABLED:
+    instrument_engine(engine)
+
 # Асинхронная сессия
 AsyncSessionLocal = async_sessionmaker(
     engine,
@@ -19,7 +34,147 @@ AsyncSessionLocal = async_sessionmaker(
     autoflush=False
 )
 
-# Dependency для получения асинхронной сессии
+# Реплики: отставание по времени последней примененной транзакции,
+# 0 если реплика применила все полученное и WAL receiver подключен (на простаивающем primary время транзакции
+# не растет); без streaming равенство LSN ничего не значит - новый WAL просто не приходит, поэтому отставание
+# считается от последней примененной транзакции, а если ее не было - бесконечным.
+# status в pg_stat_wal_receiver виден только ролям с pg_read_all_stats (pg_monitor) - иначе реплика всегда отстает
+REPLICA_LAG_QUERY = text("""
+    SELECT CASE
+        WHEN NOT pg_is_in_recovery() THEN 0
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+             AND EXISTS (SELECT 1 FROM pg_stat_wal_receiver WHERE status = 'streaming') THEN 0
+        ELSE coalesce(extract(epoch FROM now() - pg_last_xact_replay_timestamp())::float8, 'infinity'::float8)
+    END
+""")
+
+# после своей записи клиент читает из primary до времени в cookie (cookie видят все воркеры)
+PRIMARY_UNTIL_COOKIE = "read_primary_until"
+
+# sqlstate отмены запроса на реплике из-за конфликта с применением WAL
+RECOVERY_CONFLICT = "40001"
+
+
+class Replica:
+    def __init__(self, replica_engine: AsyncEngine, name: str):
+        self.engine = replica_engine
+        self.name = name
+        self.session_factory = async_sessionmaker(
+            replica_engine,
+            class_=AsyncSession,
+            expire_on_commit=False,
+            autoflush=False
+        )
+        self.healthy = True
+        self.lag: Optional[float] = None
+        self.checked_at = 0.0
+        self._checking = asyncio.Lock()
+
+
+class ReplicaRouter:
+    # выбор реплики для чтения: по кругу среди здоровых, отставание проверяется раз в check_interval;
+    # отстающая больше max_lag или недоступная реплика пропускается до следующей проверки
+    def __init__(self, replicas: List[Replica], max_lag: float = 5.0, check_interval: float = 5.0,
+                 check_timeout: float = 1.0):
+        self.replicas = replicas
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.check_timeout = check_timeout
+        self._next = 0
+
+    async def choose(self) -> Optional[Replica]:
+        for offset in range(len(self.replicas)):
+            replica = self.replicas[(self._next + offset) % len(self.replicas)]
+            await self._refresh(replica)
+            if replica.healthy:
+                self._next = (self._next + offset + 1) % len(self.replicas)
+                return replica
+        return None
+
+    async def _refresh(self, replica: Replica):
+        # проверку выполняет один запрос, остальные в это время используют прошлый результат
+        if time.monotonic() - replica.checked_at < self.check_interval or replica._checking.locked():
+            return
+
+        async with replica._checking:
+            try:
+                replica.lag = await asyncio.wait_for(self._lag(replica), self.check_timeout)
+                replica.healthy = replica.lag <= self.max_lag
+                DB_REPLICA_LAG.labels(replica.name).set(replica.lag)
+                if not replica.healthy:
+                    logger.warning(f"Replica {replica.name} lags {replica.lag:.1f}s, reading from primary")
+            except Exception as e:
+                replica.healthy = False
+                logger.warning(f"Replica {replica.name} check failed, reading from primary: {e}")
+            replica.checked_at = time.monotonic()
+
+    @staticmethod
+    async def _lag(replica: Replica) -> float:
+        async with replica.engine.connect() as conn:
+            return float(await conn.scalar(REPLICA_LAG_QUERY))
+
+    def mark_failed(self, replica: Replica, error: Exception):
+        # ошибка запроса: реплика выводится до следующей проверки
+        if replica.healthy:
+            logger.warning(f"Replica {replica.name} failed, reading from primary: {error}")
+        replica.healthy = False
+        replica.checked_at = time.monotonic()
+
+    async def dispose(self):
+        for replica in self.replicas:
+            await replica.engine.dispose()
+
+    @staticmethod
+    def is_replica_failure(error: Exception) -> bool:
+        # недоступность или отмена запроса из-за применения WAL - повторяем на primary; ошибки SQL - нет
+        if isinstance(error, (OSError, asyncio.TimeoutError)):
+            return True
+        if isinstance(error, DBAPIError):
+            return error.connection_invalidated or getattr(error.orig, "sqlstate", None) == RECOVERY_CONFLICT
+        return False
+
+
+def create_replica_router() -> ReplicaRouter:
+    replicas = []
+    urls = [url.strip() for url in (settings.DATABASE_REPLICA_URLS or "").split(",") if url.strip()]
+    for index, url in enumerate(urls):
+        replica_engine = create_async_engine(url, echo=settings.DB_ECHO, future=True)
+        if settings.METRICS_ENABLED:
+            instrument_engine(replica_engine, track_pool=False)
+        replicas.append(Replica(replica_engine, replica_engine.url.host or f"replica{index}"))
+
+    return ReplicaRouter(
+        replicas,
+        max_lag=settings.REPLICA_MAX_LAG,
+        check_interval=settings.REPLICA_CHECK_INTERVAL,
+        check_timeout=settings.REPLICA_CHECK_TIMEOUT
+    )
+
+
+replica_router = create_replica_router()
+
+
+def reads_from_primary(request: Request) -> bool:
+    try:
+        return float(request.cookies.get(PRIMARY_UNTIL_COOKIE, 0)) > time.time()
+    except ValueError:
+        return False
+
+
+async def choose_replica(request: Request) -> Optional[Replica]:
+    # реплика для чтений запроса или None - читать из primary
+    if not replica_router.replicas:
+        return None
+    if reads_from_primary(request):
+        DB_READ_ROUTE.labels("primary_sticky").inc()
+        return None
+
+    replica = await replica_router.choose()
+    DB_READ_ROUTE.labels("replica" if replica is not None else "primary_unavailable").inc()
+    return replica
+
+
+# Dependency для получения асинхронной сессии (primary)
 async def get_db():
     async with AsyncSessionLocal() as session:
         try:
@@ -29,4 +184,31 @@ async def get_db():
             await session.rollback()
             raise
         finally:
-            await session.close()
\ No newline at end of file
+            await session.close()
+
+
+# Dependency для изменяющих запросов: сессия primary, следующие чтения клиента тоже идут в primary
+async def get_write_db(response: Response, session: AsyncSession = Depends(get_db)) -> AsyncSession:
+    if replica_router.replicas:
+        window = settings.READ_YOUR_WRITES_WINDOW
+        response.set_cookie(
+            PRIMARY_UNTIL_COOKIE, str(time.time() + window),
+            max_age=math.ceil(window), httponly=True, samesite="lax"
+        )
+    return session
+
+
+# Dependency для чтений: сессия реплики или None, если читать нужно из primary
+# (см. NoteDBInteraction.read - там же повтор на primary при отказе реплики)
+async def get_read_db(request: Request):
+    replica = await choose_replica(request)
+    if replica is None:
+        yield None
+        return
+
+    async with replica.session_factory() as session:
+        session.info["replica"] = replica
+        try:
+            yield session
+        finally:
+            await session.close()
@@ -0,0 +1,106 @@
+import hashlib
+import importlib.util
+import logging
+import re
+import threading
+from typing import List, Optional, Sequence
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Модели эмбеддингов на CPU: вектора нормированы (длина 1), близость - косинусное расстояние pgvector (<=>)
+# numpy и sentence-transformers - необязательные зависимости (extra "embeddings"), импортируются лениво
+
+
+class EmbeddingModel:
+    name = "base"
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def embed(self, texts: Sequence[str]):
+        # float32 матрица len(texts) x dim
+        raise NotImplementedError
+
+
+class FakeEmbeddingModel(EmbeddingModel):
+    # детерминированная модель для тестов и офлайн бенчмарков: hashing trick по словам и парам слов,
+    # у текстов с общими словами вектора близки, результат не зависит от процесса и версии Python
+    name = "fake"
+
+    def _features(self, text: str):
+        words = re.findall(r"\w+", text.lower())
+        return words + [f"{a} {b}" for a, b in zip(words, words[1:])]
+
+    def embed(self, texts: Sequence[str]):
+        import numpy as np
+
+        vectors = np.zeros((len(texts), self.dim), dtype=np.float32)
+        for row, text in enumerate(texts):
+            features = self._features(text)
+            if not features:
+                continue
+            digests = np.frombuffer(
+                b"".join(hashlib.blake2b(feature.encode(), digest_size=8).digest() for feature in features),
+                dtype="<u8"
+            )
+            signs = np.where(digests >> np.uint64(63), -1.0, 1.0).astype(np.float32)
+            np.add.at(vectors[row], (digests % np.uint64(self.dim)).astype(np.int64), signs)
+
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        return vectors / np.where(norms > 0, norms, 1)
+
+
+class SentenceTransformerModel(EmbeddingModel):
+    def __init__(self, name: str, dim: int):
+        super().__init__(dim)
+        self.name = name
+        self._model = None
+        self._lock = threading.Lock()
+
+    def _load(self):
+        # загрузка модели - секунды и сотни МБ, поэтому при первом обращении и один раз на процесс
+        with self._lock:
+            if self._model is None:
+                from sentence_transformers import SentenceTransformer
+                model = SentenceTransformer(self.name, device="cpu")
+                if model.get_sentence_embedding_dimension() != self.dim:
+                    raise ValueError(f"Model {self.name} produces {model.get_sentence_embedding_dimension()}-d "
+                                     f"vectors, EMBEDDING_DIM is {self.dim}")
+                self._model = model
+        return self._model
+
+    def embed(self, texts: Sequence[str]):
+        import numpy as np
+
+        vectors = self._load().encode(list(texts), batch_size=settings.EMBEDDING_BATCH_SIZE,
+                                      normalize_embeddings=True, convert_to_numpy=True)
+        return vectors.astype(np.float32, copy=False)
+
+
+def create_embedding_model() -> EmbeddingModel:
+    if settings.EMBEDDING_MODEL == FakeEmbeddingModel.name:
+        return FakeEmbeddingModel(settings.EMBEDDING_DIM)
+    return SentenceTransformerModel(settings.EMBEDDING_MODEL, settings.EMBEDDING_DIM)
+
+
+def embedding_backend_available(model: EmbeddingModel) -> bool:
+    # без импорта: torch грузится секунды, это делает первая пачка индексатора или первый запрос
+    modules = ["numpy"] if isinstance(model, FakeEmbeddingModel) else ["numpy", "sentence_transformers"]
+    return all(importlib.util.find_spec(module) is not None for module in modules)
+
+
+def vector_literal(vector) -> str:
+    # текстовое представление pgvector: "[0.1,0.2,...]"
+    return "[" + ",".join(f"{value:.7g}" for value in vector) + "]"
+
+
+def parse_vector(value: Optional[str]) -> Optional[List[float]]:
+    if value is None:
+        return None
+    return [float(item) for item in value.strip("[]").split(",") if item]
+
+
+# Глобальная модель воркера (индексатор и запросы поиска)
+embedding_model = create_embedding_model()
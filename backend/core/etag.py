@@ -0,0 +1,39 @@
+import hashlib
+from datetime import datetime
+from typing import Optional
+
+
+# слабые ETag для условных запросов (If-None-Match -> 304 Not Modified)
+def _weak(payload: str) -> str:
+    return f'W/"{hashlib.md5(payload.encode()).hexdigest()}"'
+
+
+def note_etag(note_id, updated_at: datetime) -> str:
+    # ETag одной заметки - пара (id, updated_at)
+    return _weak(f"{note_id}:{updated_at.isoformat()}")
+
+
+def text_etag(note_id, kind: str, updated_at: datetime) -> str:
+    # ETag сохраненного документа транскрипта/саммари: одинаковый для всех Content-Encoding (слабый)
+    return _weak(f"{note_id}:{kind}:{updated_at.isoformat()}")
+
+
+def list_etag(max_updated_at: Optional[datetime], count: int, filters_hash: str) -> str:
+    # ETag страницы списка - max(updated_at) и count по тем же фильтрам + параметры страницы
+    max_part = max_updated_at.isoformat() if max_updated_at else "empty"
+    return _weak(f"{max_part}:{count}:{filters_hash}")
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    # слабое сравнение по RFC 9110: префикс W/ не учитывается
+    if not if_none_match:
+        return False
+
+    if if_none_match.strip() == "*":
+        return True
+
+    def opaque(tag: str) -> str:
+        tag = tag.strip()
+        return tag[2:] if tag.startswith("W/") else tag
+
+    return any(opaque(tag) == opaque(etag) for tag in if_none_match.split(","))
@@ -0,0 +1,28 @@
+import uuid
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+# OPT_UTC_Z - UTC datetime как "Z", так же как сериализует pydantic
+ORJSON_OPTIONS = orjson.OPT_UTC_Z
+
+
+def _default(value: Any) -> Any:
+    # asyncpg отдает свой подкласс UUID, а orjson кодирует только точный uuid.UUID
+    if isinstance(value, uuid.UUID):
+        return str(value)
+    raise TypeError(f"Type is not JSON serializable: {type(value).__name__}")
+
+
+def dumps(content: Any) -> bytes:
+    # быстрая сериализация в JSON: datetime и точный uuid.UUID orjson кодирует сам, подклассы UUID - через _default
+    return orjson.dumps(content, default=_default, option=ORJSON_OPTIONS)
+
+
+class FastJSONResponse(JSONResponse):
+    # ответ на orjson, уже готовые bytes отдаются как есть
+    def render(self, content: Any) -> bytes:
+        if isinstance(content, bytes):
+            return content
+        return dumps(content)
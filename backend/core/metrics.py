@@ -0,0 +1,297 @@
+import os
+import time
+from functools import wraps
+
+from prometheus_client import (
+    Counter, Gauge, Histogram, CollectorRegistry, CONTENT_TYPE_LATEST, generate_latest, multiprocess
+)
+from sqlalchemy import event
+
+# Метрики Prometheus для API, загрузок, S3, БД и очереди
+# отдаются на /metrics (см. main.py)
+# при нескольких воркерах (serve.py) задается PROMETHEUS_MULTIPROC_DIR и метрики собираются со всех процессов,
+# поэтому gauge считаются через inc/dec с multiprocess_mode, а не через set_function
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+STAGE_BUCKETS = (0.5, 1, 5, 15, 30, 60, 120, 300, 600, 1800, 3600)
+# ожидание в очереди при массовой загрузке - часы
+QUEUE_WAIT_BUCKETS = STAGE_BUCKETS + (2 * 3600, 6 * 3600, 24 * 3600)
+
+HTTP_REQUEST_DURATION = Histogram(
+    "http_request_duration_seconds",
+    "HTTP request latency by route",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+
+HTTP_REQUESTS_IN_PROGRESS = Gauge(
+    "http_requests_in_progress",
+    "HTTP requests currently being handled",
+    multiprocess_mode="livesum"
+)
+
+UPLOAD_BYTES = Counter(
+    "upload_bytes_total",
+    "Audio bytes received over the upload WebSocket"
+)
+
+UPLOAD_DURATION = Histogram(
+    "upload_duration_seconds",
+    "Duration of WebSocket audio uploads",
+    ["result"],
+    buckets=STAGE_BUCKETS
+)
+
+UPLOAD_THROUGHPUT = Histogram(
+    "upload_throughput_bytes_per_second",
+    "Per-upload receive throughput",
+    buckets=(64e3, 256e3, 1e6, 4e6, 16e6, 64e6, 256e6)
+)
+
+S3_OPERATION_DURATION = Histogram(
+    "s3_operation_duration_seconds",
+    "S3 client operation latency",
+    ["operation"],
+    buckets=LATENCY_BUCKETS
+)
+
+S3_OPERATION_ERRORS = Counter(
+    "s3_operation_errors_total",
+    "S3 client operation errors",
+    ["operation"]
+)
+
+DB_QUERY_DURATION = Histogram(
+    "db_query_duration_seconds",
+    "SQL statement execution time",
+    ["statement"],
+    buckets=LATENCY_BUCKETS
+)
+
+DB_POOL_CHECKED_OUT = Gauge(
+    "db_pool_checked_out_connections",
+    "Connections currently checked out of the pool",
+    multiprocess_mode="livesum"
+)
+
+DB_POOL_SIZE = Gauge(
+    "db_pool_size",
+    "Configured pool size (without overflow), summed over workers",
+    multiprocess_mode="livesum"
+)
+
+DB_READ_ROUTE = Counter(
+    "db_read_route_total",
+    "Read sessions by target (replica, primary_sticky, primary_unavailable, primary_fallback)",
+    ["target"]
+)
+
+DB_REPLICA_LAG = Gauge(
+    "db_replica_lag_seconds",
+    "Replay lag of read replicas at the last check",
+    ["replica"],
+    multiprocess_mode="livemax"
+)
+
+QUEUE_PUBLISH_DURATION = Histogram(
+    "queue_publish_duration_seconds",
+    "Message publish latency",
+    ["queue"],
+    buckets=LATENCY_BUCKETS
+)
+
+NOTE_STAGE_DURATION = Histogram(
+    "note_stage_duration_seconds",
+    "Processing stage duration (upload, transcription, summarization)",
+    ["stage", "status"],
+    buckets=STAGE_BUCKETS
+)
+
+TRANSCRIPTION_QUEUE_WAIT = Histogram(
+    "transcription_queue_wait_seconds",
+    "Time a transcription job waited in the scheduler queue before dispatch, by priority class",
+    ["priority"],
+    buckets=QUEUE_WAIT_BUCKETS
+)
+
+TRANSCRIPTION_QUEUE_DEPTH = Gauge(
+    "transcription_queue_depth",
+    "Transcription jobs waiting in the scheduler queue, by priority class",
+    ["priority"],
+    multiprocess_mode="livemax"
+)
+
+REAPER_JOBS = Counter(
+    "reaper_jobs_total",
+    "Stale processing jobs handled by the reaper (retry, dispatch, dead_letter, abandoned, cancelled)",
+    ["stage", "action"]
+)
+
+S3_ORPHANS_DELETED = Counter(
+    "s3_orphans_deleted_total",
+    "S3 objects deleted because no note or audio file references them"
+)
+
+EMBEDDINGS_INDEXED = Counter(
+    "embeddings_indexed_total",
+    "Note texts processed by the embedding indexer (embedded, failed, dropped)",
+    ["result"]
+)
+
+SEMANTIC_SEARCHES = Counter(
+    "semantic_searches_total",
+    "Vector searches by strategy (ann - HNSW index, exact - scan of the user's vectors, "
+    "fallback - scan after HNSW found too few notes)",
+    ["strategy"]
+)
+
+LIVE_TRANSCRIPTIONS = Counter(
+    "live_transcriptions_total",
+    "Streamed recordings by live transcription result (saved, failed, unavailable)",
+    ["result"]
+)
+
+TEXT_RESPONSES = Counter(
+    "text_responses_total",
+    "Transcript/summary responses by how the body was produced "
+    "(passthrough - stored compressed bytes, decoded - decompressed for the client, assembled - no stored document)",
+    ["kind", "mode"]
+)
+
+USAGE_COUNTERS_CORRECTED = Counter(
+    "usage_counters_corrected_total",
+    "User counters (notes by status, storage, audio seconds) corrected by reconciliation - drift of incremental updates"
+)
+
+ADMISSION_REJECTED = Counter(
+    "admission_rejected_total",
+    "Requests and uploads rejected by admission control",
+    ["reason"]
+)
+
+UPLOAD_BYTES_IN_FLIGHT = Gauge(
+    "upload_bytes_in_flight",
+    "Declared size of uploads currently being received",
+    multiprocess_mode="livesum"
+)
+
+
+class MetricsMiddleware:
+    # чистый ASGI middleware: без BaseHTTPMiddleware, чтобы не добавлять лишних задач на запрос
+    # маршрут берется шаблоном (/api/v1/notes/{note_id}), а не реальным путем - иначе кардинальность
+    def __init__(self, app):
+        self.app = app
+        # дочерние метрики по меткам кэшируются: labels() берет блокировку на каждый вызов
+        self._children = {}
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        status_code = 500
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        HTTP_REQUESTS_IN_PROGRESS.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            key = (scope["method"], route.path if route is not None else "unmatched", status_code)
+            child = self._children.get(key)
+            if child is None:
+                child = self._children[key] = HTTP_REQUEST_DURATION.labels(*key)
+            child.observe(time.perf_counter() - started)
+            HTTP_REQUESTS_IN_PROGRESS.dec()
+
+
+def track_s3(operation: str):
+    # декоратор для методов S3Client
+    def decorator(func):
+        @wraps(func)
+        async def wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                S3_OPERATION_ERRORS.labels(operation).inc()
+                raise
+            finally:
+                S3_OPERATION_DURATION.labels(operation).observe(time.perf_counter() - started)
+        return wrapper
+    return decorator
+
+
+def track_queue_publish(queue_name: str):
+    return QUEUE_PUBLISH_DURATION.labels(queue_name).time()
+
+
+def observe_upload(size: int, duration: float, result: str):
+    UPLOAD_DURATION.labels(result).observe(duration)
+    if result == "completed":
+        UPLOAD_BYTES.inc(size)
+        if duration > 0:
+            UPLOAD_THROUGHPUT.observe(size / duration)
+
+
+def observe_stage(stage: str, status: str, started_at, completed_at):
+    if started_at is None or completed_at is None:
+        return
+    NOTE_STAGE_DURATION.labels(stage, status).observe((completed_at - started_at).total_seconds())
+
+
+def observe_reaper(stage: str, action: str):
+    REAPER_JOBS.labels(stage, action).inc()
+
+
+def instrument_engine(engine, track_pool: bool = True):
+    # время SQL запросов через события engine, метка - тип запроса (SELECT/INSERT/...)
+    # track_pool=False - для реплик: насыщение пула считается по primary
+    sync_engine = engine.sync_engine
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault("query_started", []).append(time.perf_counter())
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info["query_started"].pop()
+        keyword = statement.lstrip().split(None, 1)[0].upper() if statement.strip() else "OTHER"
+        DB_QUERY_DURATION.labels(keyword).observe(time.perf_counter() - started)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(context):
+        # при ошибке after_cursor_execute не вызывается - снимаем отметку
+        started = context.connection.info.get("query_started") if context.connection is not None else None
+        if started:
+            started.pop()
+
+    if not track_pool:
+        return
+
+    # насыщение пула: checked_out / size (больше 1 - используется overflow)
+    pool = sync_engine.pool
+    if hasattr(pool, "size"):
+        DB_POOL_SIZE.set(pool.size())
+
+    @event.listens_for(sync_engine, "checkout")
+    def on_checkout(dbapi_connection, connection_record, connection_proxy):
+        DB_POOL_CHECKED_OUT.inc()
+
+    @event.listens_for(sync_engine, "checkin")
+    def on_checkin(dbapi_connection, connection_record):
+        DB_POOL_CHECKED_OUT.dec()
+
+
+def render_metrics():
+    if "PROMETHEUS_MULTIPROC_DIR" in os.environ:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,197 @@
+import asyncio
+import hmac
+import os
+import random
+import re
+import sys
+import threading
+import time
+from collections import Counter
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from core.config import settings
+
+# Выборочное статистическое профилирование запросов и загрузок через WebSocket
+# профиль пишется в формате collapsed stacks ("a;b;c 12"), который понимают flamegraph.pl и speedscope
+
+
+def _frame_name(frame) -> str:
+    code = frame.f_code
+    return f"{os.path.basename(code.co_filename)}:{code.co_name}"
+
+
+class StackSampler:
+    # поток, который каждые interval секунд снимает стек задачи запроса
+    # стек строится по цепочке корутин задачи (cr_await), поэтому видно и то, чего запрос ждет
+    # (SQL, S3), а не только код, который сейчас исполняется в event loop
+    def __init__(self, task: asyncio.Task, thread_id: int, interval: float):
+        self.task = task
+        self.thread_id = thread_id
+        self.interval = interval
+        self.samples: Counter = Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="profiler-sampler", daemon=True)
+
+    def _coroutine_frames(self) -> list:
+        frames = []
+        coro = self.task.get_coro()
+        while coro is not None:
+            frame = getattr(coro, "cr_frame", None) or getattr(coro, "gi_frame", None)
+            if frame is None:
+                break
+            frames.append(frame)
+            coro = getattr(coro, "cr_await", None) or getattr(coro, "gi_yieldfrom", None)
+        return frames
+
+    def _thread_frames(self) -> list:
+        frame = sys._current_frames().get(self.thread_id)
+        frames = []
+        while frame is not None:
+            frames.append(frame)
+            frame = frame.f_back
+        frames.reverse()
+        return frames
+
+    def sample(self):
+        frames = self._coroutine_frames()
+        if not frames:
+            return
+
+        stack = [_frame_name(frame) for frame in frames]
+
+        # если задача сейчас исполняется - дописываем синхронные вызовы ниже последней корутины
+        thread_frames = self._thread_frames()
+        leaf = frames[-1]
+        for index, frame in enumerate(thread_frames):
+            if frame is leaf:
+                stack.extend(_frame_name(f) for f in thread_frames[index + 1:])
+                break
+        else:
+            stack.append("[awaiting]")
+
+        self.samples[";".join(stack)] += 1
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.sample()
+            except Exception:
+                # стек может поменяться прямо во время обхода - такой сэмпл просто пропускаем
+                pass
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self) -> Counter:
+        self._stop.set()
+        self._thread.join()
+        return self.samples
+
+
+class ProfileStore:
+    # кольцевой буфер профилей на диске: хранится не больше max_files последних файлов
+    def __init__(self, directory: str, max_files: int = 100):
+        self.directory = Path(directory)
+        self.max_files = max_files
+        self._lock = threading.Lock()
+
+    def save(self, name: str, samples: Counter) -> Path:
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / name
+        with open(path, "w", encoding="utf-8") as profile:
+            for stack, count in samples.most_common():
+                profile.write(f"{stack} {count}\n")
+
+        with self._lock:
+            files = sorted(self._stats(), key=lambda item: item[1].st_mtime)
+            for old, _ in files[:max(len(files) - self.max_files, 0)]:
+                old.unlink(missing_ok=True)
+        return path
+
+    def _stats(self) -> List[Tuple[Path, os.stat_result]]:
+        # файл может удалить другой процесс между glob и stat - такой просто пропускаем
+        stats = []
+        for file in self.directory.glob("*.collapsed"):
+            try:
+                stats.append((file, file.stat()))
+            except FileNotFoundError:
+                continue
+        return stats
+
+    def list(self) -> List[dict]:
+        if not self.directory.exists():
+            return []
+
+        files = sorted(self._stats(), key=lambda item: item[1].st_mtime, reverse=True)
+        return [
+            {"name": file.name, "size": stat.st_size, "created_at": stat.st_mtime}
+            for file, stat in files
+        ]
+
+    def path(self, name: str) -> Optional[Path]:
+        # только имена из каталога профилей, без путей
+        if "/" in name or "\\" in name or not name.endswith(".collapsed"):
+            return None
+        path = self.directory / name
+        return path if path.is_file() else None
+
+
+class ProfilingMiddleware:
+    # ASGI middleware: профилирует выборку запросов (sample_rate), запросы с заголовком X-Profile: <trigger_token>
+    # и сохраняет профиль, если запрос был запрошен явно или оказался медленнее threshold_ms
+    # одновременно профилируется не больше одного запроса, так что включенный режим почти бесплатен
+    # при выключенном PROFILING_ENABLED middleware вообще не подключается
+    def __init__(self, app, store: "ProfileStore", sample_rate: float = 0.01,
+                 threshold_ms: float = 0.0, interval_ms: float = 5.0, trigger_token: Optional[str] = None):
+        self.app = app
+        self.store = store
+        self.sample_rate = sample_rate
+        self.threshold_ms = threshold_ms
+        self.interval = interval_ms / 1000
+        self.trigger_token = trigger_token
+        self._busy = False
+
+    def _forced(self, scope) -> bool:
+        # без настроенного токена заголовок X-Profile игнорируется
+        if not self.trigger_token:
+            return False
+        for name, value in scope.get("headers", []):
+            if name == b"x-profile":
+                return hmac.compare_digest(value, self.trigger_token.encode())
+        return False
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] not in ("http", "websocket") or self._busy:
+            await self.app(scope, receive, send)
+            return
+
+        forced = self._forced(scope)
+        if not forced and random.random() >= self.sample_rate:
+            await self.app(scope, receive, send)
+            return
+
+        self._busy = True
+        sampler = StackSampler(asyncio.current_task(), threading.get_ident(), self.interval)
+        sampler.start()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send)
+        finally:
+            samples = sampler.stop()
+            self._busy = False
+            duration_ms = (time.perf_counter() - started) * 1000
+
+            if samples and (forced or duration_ms >= self.threshold_ms):
+                await asyncio.to_thread(self.store.save, self._profile_name(scope, duration_ms), samples)
+
+    @staticmethod
+    def _profile_name(scope, duration_ms: float) -> str:
+        route = scope.get("route")
+        path = route.path if route is not None else scope.get("path", "")
+        method = scope.get("method", "WS")
+        slug = re.sub(r"[^A-Za-z0-9]+", "_", path).strip("_") or "root"
+        return f"{int(time.time() * 1000)}_{method}_{slug}_{int(duration_ms)}ms.collapsed"
+
+
+profile_store = ProfileStore(settings.PROFILING_DIR, settings.PROFILING_MAX_FILES)
@@ -1,15 +1,23 @@
-import aioboto3
-from botocore.exceptions import ClientError
-from typing import Optional
+import asyncio
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime
+from typing import Optional, AsyncIterator, List, Sequence, Tuple
 import uuid
 import os
 
 from core.config import settings
+from core.metrics import track_s3
+
+
+def client_error():
+    # botocore импортируется при первом обращении к S3, а не при старте приложения
+    from botocore.exceptions import ClientError
+    return ClientError
 
 
 class S3Client:
     def __init__(self):
-        self.session = aioboto3.Session()
+        self._session = None
         self.bucket_name = settings.S3_BUCKET_NAME
         self.s3_config = {
             'endpoint_url': settings.S3_ENDPOINT_URL,
@@ -17,11 +25,57 @@ class S3Client:
             'aws_secret_access_key': settings.S3_SECRET_KEY,
             'region_name': settings.S3_REGION
         }
+        self._client = None
+        self._exit_stack: Optional[AsyncExitStack] = None
+        self._persistent = False
+        self._client_lock = asyncio.Lock()
+
+    @property
+    def session(self):
+        # aioboto3 тяжелый (~0.3 с на импорт), поэтому сессия создается лениво
+        if self._session is None:
+            import aioboto3
+            self._session = aioboto3.Session()
+        return self._session
+
+    @session.setter
+    def session(self, session):
+        self._session = session
+
+    async def start(self):
+        # один долгоживущий клиент на воркер (вызывается из lifespan) вместо клиента на каждый вызов
+        # сам клиент создается при первом обращении, чтобы не тянуть aioboto3 в старт воркера
+        self._persistent = True
+
+    async def close(self):
+        if self._exit_stack is not None:
+            await self._exit_stack.aclose()
+        self._client = None
+        self._exit_stack = None
+        self._persistent = False
+
+    @asynccontextmanager
+    async def client(self):
+        # общий клиент, если включен start(), иначе временный (скрипты, CLI)
+        if not self._persistent:
+            async with self.session.client('s3', **self.s3_config) as s3:
+                yield s3
+            return
 
+        async with self._client_lock:
+            if self._client is None:
+                exit_stack = AsyncExitStack()
+                self._client = await exit_stack.enter_async_context(
+                    self.session.client('s3', **self.s3_config)
+                )
+                self._exit_stack = exit_stack
+        yield self._client
+
+    @track_s3("upload_file")
     async def upload_file(self, file_data: bytes, filename: str) -> str:
         # асинхронная загрузка файла в Yandex Cloud S3
         try:
-            async with self.session.client('s3', **self.s3_config) as s3:
+            async with self.client() as s3:
                 file_key = f"audio_notes/{uuid.uuid4()}_{filename}"
                 await s3.put_object(
                     Bucket=self.bucket_name,
@@ -33,15 +87,95 @@ class S3Client:
 
                 return file_key
 
-        except ClientError as e:
+        except client_error() as e:
             error_code = e.response['Error']['Code']
             if error_code == 'NoSuchBucket':
                 raise Exception(f"S3 bucket {self.bucket_name} does not exist")
             raise Exception(f"S3 upload error: {e}")
 
+    @track_s3("upload_multipart")
+    async def upload_multipart(self, chunks: AsyncIterator[bytes], filename: str,
+                               content_type: str = 'audio/webm', max_parallel_parts: int = 4) -> str:
+        # multipart загрузка потока частей (каждая часть кроме последней >= 5 МБ)
+        # части грузятся параллельно, но не больше max_parallel_parts одновременно
+        file_key = f"audio_notes/{uuid.uuid4()}_{filename}"
+        semaphore = asyncio.Semaphore(max_parallel_parts)
+
+        async with self.client() as s3:
+            first = await anext(chunks, None)
+            second = await anext(chunks, None) if first is not None else None
+
+            # маленький файл - обычный put_object
+            if second is None:
+                await s3.put_object(
+                    Bucket=self.bucket_name,
+                    Key=file_key,
+                    Body=first or b"",
+                    ContentType=content_type,
+                    ACL='private'
+                )
+                return file_key
+
+            upload = await s3.create_multipart_upload(
+                Bucket=self.bucket_name,
+                Key=file_key,
+                ContentType=content_type,
+                ACL='private'
+            )
+            upload_id = upload['UploadId']
+
+            async def upload_part(part_number: int, body: bytes) -> dict:
+                try:
+                    response = await s3.upload_part(
+                        Bucket=self.bucket_name,
+                        Key=file_key,
+                        UploadId=upload_id,
+                        PartNumber=part_number,
+                        Body=body
+                    )
+                    return {'PartNumber': part_number, 'ETag': response['ETag']}
+                finally:
+                    semaphore.release()
+
+            async def all_chunks():
+                yield first
+                yield second
+                async for chunk in chunks:
+                    yield chunk
+
+            tasks = []
+            try:
+                part_number = 0
+                async for chunk in all_chunks():
+                    part_number += 1
+                    await semaphore.acquire()
+                    tasks.append(asyncio.create_task(upload_part(part_number, chunk)))
+
+                parts = await asyncio.gather(*tasks)
+                await s3.complete_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=file_key,
+                    UploadId=upload_id,
+                    MultipartUpload={'Parts': parts}
+                )
+                return file_key
+
+            except Exception as e:
+                for task in tasks:
+                    task.cancel()
+                # отмененные части должны завершиться до abort, иначе часть может дописаться после него
+                await asyncio.gather(*tasks, return_exceptions=True)
+                await s3.abort_multipart_upload(
+                    Bucket=self.bucket_name,
+                    Key=file_key,
+                    UploadId=upload_id
+                )
+                raise Exception(f"S3 multipart upload error: {e}")
+
+    @track_s3("download_file")
     async def download_file(self, file_key: str) -> bytes:
         # Асинхронное скачивание файла из Yandex Cloud S3
-        async with self.session.client('s3', **self.s3_config) as s3:
+        async with self.client() as s3:
             try:
                 response = await s3.get_object(
                     Bucket=self.bucket_name,
@@ -50,12 +184,46 @@ class S3Client:
                 async with response['Body'] as stream:
                     return await stream.read()
 
-            except ClientError as e:
+            except client_error() as e:
+                raise Exception(f"S3 download error: {e}")
+
+    @track_s3("put_object")
+    async def put_object(self, file_key: str, data: bytes, content_type: str) -> str:
+        # запись объекта под заданным ключом (производные артефакты: пики waveform и т.п.)
+        async with self.client() as s3:
+            try:
+                await s3.put_object(
+                    Bucket=self.bucket_name,
+                    Key=file_key,
+                    Body=data,
+                    ContentType=content_type,
+                    ACL='private'
+                )
+                return file_key
+
+            except client_error() as e:
+                raise Exception(f"S3 upload error: {e}")
+
+    @track_s3("download_range")
+    async def download_range(self, file_key: str, offset: int, size: int) -> bytes:
+        # часть объекта [offset, offset + size) одним Range GET
+        async with self.client() as s3:
+            try:
+                response = await s3.get_object(
+                    Bucket=self.bucket_name,
+                    Key=file_key,
+                    Range=f"bytes={offset}-{offset + size - 1}"
+                )
+                async with response['Body'] as stream:
+                    return await stream.read()
+
+            except client_error() as e:
                 raise Exception(f"S3 download error: {e}")
 
+    @track_s3("delete_file")
     async def delete_file(self, file_key: str) -> bool:
         # асинхронное удаление файла из Yandex Cloud S3
-        async with self.session.client('s3', **self.s3_config) as s3:
+        async with self.client() as s3:
             try:
                 await s3.delete_object(
                     Bucket=self.bucket_name,
@@ -63,12 +231,54 @@ class S3Client:
                 )
                 return True
 
-            except ClientError as e:
+            except client_error() as e:
                 raise Exception(f"S3 delete error: {e}")
 
+    async def list_objects(self, prefix: str = "audio_notes/",
+                           page_size: int = 1000) -> AsyncIterator[List[Tuple[str, datetime]]]:
+        # ключи бакета страницами (key, last_modified), без загрузки всего списка в память
+        async with self.client() as s3:
+            token = None
+            while True:
+                params = {'Bucket': self.bucket_name, 'Prefix': prefix, 'MaxKeys': page_size}
+                if token:
+                    params['ContinuationToken'] = token
+                try:
+                    response = await s3.list_objects_v2(**params)
+                except client_error() as e:
+                    raise Exception(f"S3 list error: {e}")
+
+                page = [(item['Key'], item['LastModified']) for item in response.get('Contents', [])]
+                if page:
+                    yield page
+                if not response.get('IsTruncated'):
+                    break
+                token = response['NextContinuationToken']
+
+    @track_s3("delete_files")
+    async def delete_files(self, file_keys: Sequence[str]) -> int:
+        # удаление пачкой (до 1000 ключей за запрос), возвращает число удаленных
+        deleted = 0
+        async with self.client() as s3:
+            for start in range(0, len(file_keys), 1000):
+                batch = file_keys[start:start + 1000]
+                try:
+                    response = await s3.delete_objects(
+                        Bucket=self.bucket_name,
+                        Delete={'Objects': [{'Key': key} for key in batch], 'Quiet': True}
+                    )
+                except client_error() as e:
+                    raise Exception(f"S3 delete error: {e}")
+                errors = response.get('Errors', [])
+                if errors:
+                    raise Exception(f"S3 delete error: {errors[0].get('Key')}: {errors[0].get('Message')}")
+                deleted += len(batch)
+        return deleted
+
+    @track_s3("generate_presigned_url")
     async def generate_presigned_url(self, file_key: str, expiration: int = 3600) -> str:
         # генерация урла для доступа к файлу
-        async with self.session.client('s3', **self.s3_config) as s3:
+        async with self.client() as s3:
             try:
                 url = await s3.generate_presigned_url(
                     'get_object',
@@ -80,13 +290,14 @@ class S3Client:
                 )
                 return url
 
-            except ClientError as e:
+            except client_error() as e:
                 raise Exception(f"S3 presigned URL error: {e}")
 
+    @track_s3("check_connection")
     async def check_connection(self) -> bool:
         # проверка подключения к Yandex Cloud S3
         try:
-            async with self.session.client('s3', **self.s3_config) as s3:
+            async with self.client() as s3:
                 response = await s3.list_buckets()
                 buckets = [b['Name'] for b in response['Buckets']]
                 print(f"Connected to Yandex Cloud S3. Available buckets: {buckets}")
@@ -0,0 +1,188 @@
+import hashlib
+import importlib.util
+import json
+import logging
+import math
+import os
+import threading
+from array import array
+from typing import Dict, List, Optional
+
+from core.config import settings
+
+logger = logging.getLogger(__name__)
+
+# Движки инкрементальной транскрибации для записи, которая еще идет: на вход - PCM s16le моно,
+# на выход - события сегментов {"final", "start_ms", "end_ms", "text"}: partial - текущая гипотеза
+# незавершенной фразы (заменяет предыдущую), final - окончательный сегмент (больше не меняется)
+# методы сессии синхронные и тяжелые - вызываются из пула потоков (services/live_transcription_service.py)
+# vosk - необязательная зависимость (extra "live"), импортируется лениво
+
+
+def segment_event(final: bool, start_ms: int, end_ms: int, text: str) -> Dict:
+    return {"final": final, "start_ms": start_ms, "end_ms": end_ms, "text": text}
+
+
+class TranscriptionSession:
+    def accept(self, pcm: bytes) -> List[Dict]:
+        raise NotImplementedError
+
+    def finish(self) -> List[Dict]:
+        # запись закончилась: оставшаяся гипотеза становится final
+        raise NotImplementedError
+
+
+class StreamingEngine:
+    name = "base"
+
+    def available(self) -> bool:
+        raise NotImplementedError
+
+    def open(self, sample_rate: int) -> TranscriptionSession:
+        raise NotImplementedError
+
+
+class FakeSession(TranscriptionSession):
+    # окно аудио -> слово из словаря по хэшу окна, тихое окно - пауза, на паузе фраза становится final;
+    # детерминирована по байтам аудио
+    WINDOW_MS = 400
+    SILENCE_RMS = 300
+    MAX_SEGMENT_MS = 5000
+    WORDS = ("alpha", "budget", "client", "deadline", "review", "meeting", "plan", "report",
+             "design", "release", "team", "update", "risk", "summary", "question", "next")
+
+    def __init__(self, sample_rate: int):
+        self.window_bytes = sample_rate * self.WINDOW_MS // 1000 * 2
+        self.buffer = bytearray()
+        self.position_ms = 0
+        self.words: List[str] = []
+        self.segment_start_ms = 0
+
+    def accept(self, pcm: bytes) -> List[Dict]:
+        self.buffer.extend(pcm)
+        events = []
+        while len(self.buffer) >= self.window_bytes:
+            window = bytes(self.buffer[:self.window_bytes])
+            del self.buffer[:self.window_bytes]
+            events.extend(self._window(window, self.WINDOW_MS))
+        if self.words:
+            events.append(segment_event(False, self.segment_start_ms, self.position_ms, " ".join(self.words)))
+        return events
+
+    def finish(self) -> List[Dict]:
+        events = []
+        if len(self.buffer) >= 2:
+            tail = bytes(self.buffer[:len(self.buffer) // 2 * 2])
+            events.extend(self._window(tail, self.WINDOW_MS * len(tail) // self.window_bytes))
+        self.buffer.clear()
+        return events + self._flush()
+
+    def _window(self, window: bytes, duration_ms: int) -> List[Dict]:
+        samples = array("h", window)
+        rms = math.sqrt(sum(sample * sample for sample in samples) / len(samples)) if samples else 0
+        events = []
+        if rms < self.SILENCE_RMS:
+            events.extend(self._flush())
+            self.position_ms += duration_ms
+            self.segment_start_ms = self.position_ms
+            return events
+
+        if not self.words:
+            self.segment_start_ms = self.position_ms
+        digest = hashlib.blake2b(window, digest_size=2).digest()
+        self.words.append(self.WORDS[int.from_bytes(digest, "little") % len(self.WORDS)])
+        self.position_ms += duration_ms
+        if self.position_ms - self.segment_start_ms >= self.MAX_SEGMENT_MS:
+            events.extend(self._flush())
+            self.segment_start_ms = self.position_ms
+        return events
+
+    def _flush(self) -> List[Dict]:
+        if not self.words:
+            return []
+        event = segment_event(True, self.segment_start_ms, self.position_ms, " ".join(self.words))
+        self.words = []
+        return [event]
+
+
+class FakeStreamingEngine(StreamingEngine):
+    name = "fake"
+
+    def available(self) -> bool:
+        return True
+
+    def open(self, sample_rate: int) -> TranscriptionSession:
+        return FakeSession(sample_rate)
+
+
+class VoskSession(TranscriptionSession):
+    def __init__(self, model, sample_rate: int):
+        from vosk import KaldiRecognizer
+
+        self.recognizer = KaldiRecognizer(model, sample_rate)
+        self.recognizer.SetWords(True)
+        self.bytes_per_ms = sample_rate * 2 / 1000
+        self.received = 0
+        self.final_end_ms = 0
+        self.partial: Optional[str] = None
+
+    def accept(self, pcm: bytes) -> List[Dict]:
+        self.received += len(pcm)
+        if self.recognizer.AcceptWaveform(pcm):
+            return self._final(self.recognizer.Result())
+
+        partial = json.loads(self.recognizer.PartialResult()).get("partial", "")
+        if not partial or partial == self.partial:
+            return []
+        self.partial = partial
+        return [segment_event(False, self.final_end_ms, int(self.received / self.bytes_per_ms), partial)]
+
+    def finish(self) -> List[Dict]:
+        return self._final(self.recognizer.FinalResult())
+
+    def _final(self, result: str) -> List[Dict]:
+        # таймкоды фразы - по словам (SetWords), в секундах от начала потока
+        words = json.loads(result).get("result") or []
+        self.partial = None
+        if not words:
+            return []
+        start_ms, end_ms = int(words[0]["start"] * 1000), int(words[-1]["end"] * 1000)
+        self.final_end_ms = end_ms
+        return [segment_event(True, start_ms, end_ms, " ".join(word["word"] for word in words))]
+
+
+class VoskStreamingEngine(StreamingEngine):
+    name = "vosk"
+
+    def __init__(self, model_path: str):
+        self.model_path = model_path
+        self._model = None
+        self._lock = threading.Lock()
+
+    def available(self) -> bool:
+        # без импорта и загрузки модели: это делает первая запись
+        return importlib.util.find_spec("vosk") is not None and os.path.isdir(self.model_path)
+
+    def _load(self):
+        # модель - сотни МБ, загружается один раз на процесс и общая для всех записей
+        with self._lock:
+            if self._model is None:
+                from vosk import Model, SetLogLevel
+                SetLogLevel(-1)
+                self._model = Model(self.model_path)
+        return self._model
+
+    def open(self, sample_rate: int) -> TranscriptionSession:
+        return VoskSession(self._load(), sample_rate)
+
+
+def create_streaming_engine() -> StreamingEngine:
+    if settings.LIVE_TRANSCRIPTION_ENGINE == FakeStreamingEngine.name:
+        return FakeStreamingEngine()
+    if settings.LIVE_TRANSCRIPTION_ENGINE == VoskStreamingEngine.name:
+        return VoskStreamingEngine(settings.LIVE_TRANSCRIPTION_MODEL_PATH)
+    raise ValueError(f"Unknown LIVE_TRANSCRIPTION_ENGINE {settings.LIVE_TRANSCRIPTION_ENGINE!r}")
+
+
+# Глобальный движок воркера
+streaming_engine = create_streaming_engine()
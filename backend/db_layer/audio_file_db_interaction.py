@@ -0,0 +1,98 @@
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy import update
+from typing import List, Optional, Sequence
+import uuid
+
+from core.cache import note_cache
+from db_layer.usage_db_interaction import UsageDBInteraction, UsageDeltas
+from models.audio_file import AudioFile
+from models.note import AudioNote
+from models.usage_counter import AUDIO_SECONDS, STORAGE_BYTES
+
+
+class AudioFileDBInteraction:
+    # байты и секунды аудио файлов входят в счетчики владельца заметки (usage) в той же транзакции
+    def __init__(self, db: AsyncSession):
+        self.db = db
+        self.usage = UsageDBInteraction(db)
+
+    async def _count_files(self, files: Sequence[AudioFile]):
+        result = await self.db.execute(
+            select(AudioNote.id, AudioNote.user_id).where(AudioNote.id.in_({file.note_id for file in files}))
+        )
+        owners = dict(result.all())
+        deltas = UsageDeltas()
+        for file in files:
+            user_id = owners.get(file.note_id)
+            if user_id is not None:
+                deltas[(user_id, STORAGE_BYTES)] += file.file_size or 0
+                deltas[(user_id, AUDIO_SECONDS)] += file.duration or 0
+        await self.usage.add(deltas)
+
+    # создать пачку записей об аудиофайлах одним коммитом
+    async def create_many(self, files_data: List[dict]) -> List[AudioFile]:
+        files = [AudioFile(**file_data) for file_data in files_data]
+        self.db.add_all(files)
+        await self._count_files(files)
+        await self.db.commit()
+        return files
+
+    # последний загруженный файл заметки
+    async def get_by_note_id(self, note_id: uuid.UUID) -> Optional[AudioFile]:
+        result = await self.db.execute(
+            select(AudioFile)
+            .where(AudioFile.note_id == note_id)
+            .order_by(AudioFile.uploaded_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    # запись о файле загрузки (одна на загрузку, на нее ссылаются производные артефакты)
+    async def create(self, file_data: dict) -> AudioFile:
+        audio_file = AudioFile(**file_data)
+        self.db.add(audio_file)
+        await self._count_files([audio_file])
+        await self.db.commit()
+        return audio_file
+
+    # сохранить пики waveform файла и длительность декодированного аудио (секунды); версия пиков в заметке -
+    # id файла: ответ заметки меняется (updated_at, ETag), клиент получает новый URL пиков
+    async def set_waveform(self, audio_file_id: uuid.UUID, waveform_path: str, levels: List[dict],
+                           duration: Optional[int] = None):
+        # длительность заменяет оценку прежней записи пиков (если была) - в счетчик идет разница
+        previous = (await self.db.execute(
+            select(AudioFile.duration, AudioFile.note_id, AudioNote.user_id)
+            .join(AudioNote, AudioNote.id == AudioFile.note_id)
+            .where(AudioFile.id == audio_file_id)
+            .with_for_update(of=AudioFile)
+        )).one_or_none()
+        if previous is not None:
+            deltas = UsageDeltas()
+            deltas[(previous.user_id, AUDIO_SECONDS)] += (duration or 0) - (previous.duration or 0)
+            await self.usage.add(deltas)
+
+        await self.db.execute(
+            update(AudioFile)
+            .where(AudioFile.id == audio_file_id)
+            .values(waveform_path=waveform_path, waveform_levels=levels, duration=duration)
+        )
+        if previous is not None:
+            await self.db.execute(
+                update(AudioNote)
+                .where(AudioNote.id == previous.note_id)
+                .values(waveform_version=audio_file_id)
+            )
+        await self.db.commit()
+        if previous is not None:
+            await note_cache.invalidate_note(previous.note_id)
+
+    # последний файл заметки с готовыми пиками
+    async def get_waveform(self, note_id: uuid.UUID) -> Optional[AudioFile]:
+        result = await self.db.execute(
+            select(AudioFile)
+            .where(AudioFile.note_id == note_id, AudioFile.waveform_path.is_not(None))
+            .order_by(AudioFile.uploaded_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
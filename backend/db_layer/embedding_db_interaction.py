@@ -0,0 +1,153 @@
+from datetime import datetime
+from sqlalchemy import func, literal_column, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Dict, List, Optional, Sequence, Tuple
+import uuid
+
+from models.note_embedding import NoteEmbedding
+
+# pgvector принимает hnsw.ef_search от 1 до 1000
+MAX_EF_SEARCH = 1000
+
+
+class EmbeddingDBInteraction:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # поставить тексты заметок в очередь индексатора: (note_id, user_id, kind); старый вектор сбрасывается
+    async def enqueue(self, items: Sequence[Tuple[uuid.UUID, uuid.UUID, str]]):
+        if not items:
+            return
+        statement = insert(NoteEmbedding).values([
+            {"note_id": note_id, "user_id": user_id, "kind": kind} for note_id, user_id, kind in items
+        ])
+        await self.db.execute(statement.on_conflict_do_update(
+            index_elements=[NoteEmbedding.note_id, NoteEmbedding.kind],
+            set_={
+                "user_id": statement.excluded.user_id,
+                "embedding": None,
+                "model": None,
+                "attempts": 0,
+                "error_message": None,
+                "queued_at": func.now(),
+                "embedded_at": None,
+            }
+        ))
+        await self.db.commit()
+
+    # пачка из очереди (частичный индекс ix_note_embeddings_queued); строки заблокированы до конца транзакции,
+    # занятые другим воркером пропускаются
+    async def claim_queued(self, limit: int, max_attempts: int) -> List[NoteEmbedding]:
+        result = await self.db.execute(
+            select(NoteEmbedding)
+            .where(NoteEmbedding.embedding.is_(None), NoteEmbedding.attempts < max_attempts)
+            .order_by(NoteEmbedding.queued_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return list(result.scalars())
+
+    # сохранить вектора пачки (строки получены из claim_queued в этой же сессии)
+    async def save(self, rows: Sequence[NoteEmbedding], vectors, model: str):
+        now = datetime.utcnow()
+        for row, vector in zip(rows, vectors):
+            row.embedding = vector
+            row.model = model
+            row.error_message = None
+            row.embedded_at = now
+        await self.db.commit()
+
+    async def fail(self, rows: Sequence[NoteEmbedding], error_message: str):
+        for row in rows:
+            row.attempts += 1
+            row.error_message = error_message
+        await self.db.commit()
+
+    # вектора заметки по видам текста
+    async def get_vectors(self, note_id: uuid.UUID, user_id: uuid.UUID, model: str) -> Dict[str, List[float]]:
+        result = await self.db.execute(
+            select(NoteEmbedding.kind, NoteEmbedding.embedding)
+            .where(NoteEmbedding.note_id == note_id, NoteEmbedding.user_id == user_id,
+                   NoteEmbedding.model == model, NoteEmbedding.embedding.is_not(None))
+        )
+        return {kind: embedding for kind, embedding in result}
+
+    # число векторов пользователя, но не больше cap (индекс (user_id, model), читается не больше cap записей)
+    async def count_vectors(self, user_id: uuid.UUID, model: str, cap: int) -> int:
+        limited = (
+            select(literal_column("1"))
+            .where(NoteEmbedding.user_id == user_id, NoteEmbedding.model == model)
+            .limit(cap)
+            .subquery()
+        )
+        return (await self.db.execute(select(func.count()).select_from(limited))).scalar_one()
+
+    # ближайшие вектора пользователя: (note_id, косинусное расстояние), по лучшему виду текста на заметку
+    # exact=False - HNSW индекс (ef_search кандидатов), exact=True - перебор векторов пользователя по индексу user_id
+    async def nearest(self, user_id: uuid.UUID, model: str, vector: Sequence[float], limit: int,
+                      exact: bool = False, ef_search: int = 100,
+                      exclude: Optional[uuid.UUID] = None) -> List[Tuple[uuid.UUID, float]]:
+        conditions = [NoteEmbedding.user_id == user_id, NoteEmbedding.model == model,
+                      NoteEmbedding.embedding.is_not(None)]
+        if exclude is not None:
+            conditions.append(NoteEmbedding.note_id != exclude)
+        # у заметки до двух векторов - кандидатов берется вдвое больше
+        candidates = limit * 2
+
+        if exact:
+            # MATERIALIZED: планировщик не может заменить перебор на HNSW с фильтрацией после индекса
+            owned = (
+                select(NoteEmbedding.note_id, NoteEmbedding.embedding)
+                .where(*conditions)
+                .cte("owned")
+                .prefix_with("MATERIALIZED")
+            )
+            distance = owned.c.embedding.cosine_distance(vector)
+            query = select(owned.c.note_id, distance.label("distance")).order_by(distance).limit(candidates)
+        else:
+            # условия пользователя проверяются после индекса: ef_search должен покрывать долю его векторов
+            ef_search = min(max(int(ef_search), candidates), MAX_EF_SEARCH)
+            await self.db.execute(text(f"SET LOCAL hnsw.ef_search = {ef_search}"))
+            distance = NoteEmbedding.embedding.cosine_distance(vector)
+            query = (
+                select(NoteEmbedding.note_id, distance.label("distance"))
+                .where(*conditions)
+                .order_by(distance)
+                .limit(candidates)
+            )
+
+        best: Dict[uuid.UUID, float] = {}
+        for note_id, value in await self.db.execute(query):
+            if note_id not in best:
+                best[note_id] = value
+        return list(best.items())[:limit]
+
+    # оценка числа строк note_embeddings по статистике планировщика (без чтения таблицы; 0 - ANALYZE еще не было)
+    async def total_vectors_estimate(self) -> int:
+        result = await self.db.execute(text(
+            "SELECT greatest(reltuples, 0)::bigint FROM pg_class WHERE oid = 'note_embeddings'::regclass"
+        ))
+        return result.scalar_one()
+
+    # ближайшие вектора пользователя и стратегия поиска (exact, ann или fallback)
+    # HNSW проверяет пользователя после индекса: из ef_search кандидатов его - примерно доля его векторов в таблице.
+    # Если даже при MAX_EF_SEARCH этой доли не хватит на limit заметок (или векторов меньше exact_threshold) -
+    # сразу точный перебор; иначе HNSW с ростом ef_search, пока заметок меньше limit, и перебор, если не набралось
+    async def search(self, user_id: uuid.UUID, model: str, vector: Sequence[float], limit: int,
+                     ef_search: int, exact_threshold: int,
+                     exclude: Optional[uuid.UUID] = None) -> Tuple[List[Tuple[uuid.UUID, float]], str]:
+        share_threshold = -(-limit * 2 * await self.total_vectors_estimate() // MAX_EF_SEARCH)
+        cap = max(exact_threshold, share_threshold)
+        if await self.count_vectors(user_id, model, cap) < cap:
+            return await self.nearest(user_id, model, vector, limit, exact=True, exclude=exclude), "exact"
+
+        while True:
+            found = await self.nearest(user_id, model, vector, limit, ef_search=ef_search, exclude=exclude)
+            if len(found) >= limit:
+                return found, "ann"
+            if ef_search >= MAX_EF_SEARCH:
+                break
+            ef_search = min(ef_search * 4, MAX_EF_SEARCH)
+        return await self.nearest(user_id, model, vector, limit, exact=True, exclude=exclude), "fallback"
@@ -1,34 +1,102 @@
-from cgitb import reset
 
-from sqlalchemy import or_, and_
+from sqlalchemy import and_, case, delete, func, literal, text, update
+from sqlalchemy.dialects.postgresql import aggregate_order_by, insert
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from typing import List, Optional, Sequence, Dict, Any
+from sqlalchemy.orm.attributes import set_committed_value
+from typing import List, Optional, Sequence, Dict, Any, Tuple, AsyncIterator
+from datetime import datetime
+import re
 import uuid
-from models.note import AudioNote
+from models.audio_file import AudioFile
+from models.note import ACTIVE_NOTE_STATUSES, ACTIVE_STATUS_PREDICATE, AudioNote
+from models.note_archive import NoteArchive
+from models.note_embedding import NoteEmbedding
+from models.note_text import NoteText
+from models.processing import NoteProcessing
+from models.transcript_segment import TranscriptSegment
+from models.usage_counter import AUDIO_SECONDS, STORAGE_BYTES
+from db_layer.usage_db_interaction import UsageDBInteraction, UsageDeltas, add_status, usage_query
+from core.cache import note_cache
+from core.database import replica_router
+from core.metrics import DB_READ_ROUTE
+
+# поля, которые у старых заметок лежат в audio_note_archives
+ARCHIVED_FIELDS = ("transcription", "summary")
+
+
+# полный текст транскрипта из сегментов (коррелированный подзапрос к заметке внешнего запроса)
+def assembled_transcription():
+    return (
+        select(func.string_agg(TranscriptSegment.text, aggregate_order_by(literal(" "), TranscriptSegment.start_ms)))
+        .where(TranscriptSegment.note_id == AudioNote.id)
+        .scalar_subquery()
+    )
+
+
+def search_query(search: str) -> Optional[str]:
+    # слова поиска -> tsquery с префиксным совпадением: "встреча клиент" -> "встреча:* & клиент:*"
+    words = re.findall(r"\w+", search.lower())
+    return " & ".join(f"{word}:*" for word in words) if words else None
+
 
 class NoteDBInteraction:
-    def __init__(self, db: AsyncSession):
+    # read_db - сессия реплики (core.database.get_read_db) для списков и карточек, запись всегда через db
+    # user_id - владелец: все запросы ограничены его заметками (индексы ведут с user_id, миграция 0008);
+    # None - системный доступ без ограничения (pipeline обработки, reaper, импорт)
+    # создание, смена статуса и удаление меняют счетчики пользователя (usage) в той же транзакции
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None,
+                 user_id: Optional[uuid.UUID] = None):
         self.db = db
+        self.read_db = read_db
+        self.user_id = user_id
+        self.usage = UsageDBInteraction(db)
+
+    def scope(self, query):
+        if self.user_id is None:
+            return query
+        return query.where(AudioNote.user_id == self.user_id)
+
+    @property
+    def from_replica(self) -> bool:
+        return self.read_db is not None
+
+    # чтение без требования свежести: с реплики, при ее отказе - повтор на primary
+    async def read(self, query):
+        if self.read_db is not None:
+            try:
+                return await self.read_db.execute(query)
+            except Exception as e:
+                if not replica_router.is_replica_failure(e):
+                    raise
+                replica_router.mark_failed(self.read_db.info["replica"], e)
+                DB_READ_ROUTE.labels("primary_fallback").inc()
+                self.read_db = None
+        return await self.db.execute(query)
 
     # метод фильтрации
     def apply_filters(self, query, filters: Dict[str, Any]):
         conditions = []
 
-        # Фильтр по поиску в title, notes, transcription
+        # Фильтр по поиску в title, notes, transcription (GIN индекс по search_vector, см. миграцию 0003)
         if 'search' in filters and filters['search']:
-            search_term = f"%{filters['search']}%"
-            conditions.append(
-                or_(
-                    AudioNote.title.ilike(search_term),
-                    AudioNote.notes.ilike(search_term),
-                    AudioNote.transcription.ilike(search_term)
-                )
-            )
+            query_text = search_query(filters['search'])
+            if query_text:
+                conditions.append(AudioNote.search_vector.op("@@")(func.to_tsquery('simple', query_text)))
 
-        # Фильтр по статусу
+        # Фильтр по статусу: одно значение или список
         if 'status' in filters and filters['status']:
-            conditions.append(AudioNote.status == filters['status'])
+            statuses = filters['status']
+            if isinstance(statuses, str):
+                statuses = [statuses]
+            if set(statuses) == set(ACTIVE_NOTE_STATUSES):
+                # все незавершенные: условие частичного индекса литералом - по параметрам запроса
+                # планировщик его не докажет (generic plan у prepared statements asyncpg)
+                conditions.append(text(f"audio_notes.{ACTIVE_STATUS_PREDICATE}"))
+            elif len(statuses) == 1:
+                conditions.append(AudioNote.status == statuses[0])
+            else:
+                conditions.append(AudioNote.status.in_(statuses))
 
         # Фильтр по тегам
         if 'tags' in filters and filters['tags']:
@@ -40,72 +108,275 @@ class NoteDBInteraction:
                 for tag in filters['tags']:
                     conditions.append(AudioNote.tags.contains([tag]))
 
+        # Диапазон дат создания: по created_at секционирована таблица, лишние партиции не читаются
+        if filters.get('created_after'):
+            conditions.append(AudioNote.created_at >= filters['created_after'])
+        if filters.get('created_before'):
+            conditions.append(AudioNote.created_at < filters['created_before'])
+        # давно не менявшиеся заметки (например зависшие в обработке)
+        if filters.get('updated_before'):
+            conditions.append(AudioNote.updated_at < filters['updated_before'])
+
         # Применяем все условия
         if conditions:
             query = query.where(and_(*conditions))
 
         return query
 
+    # выборка колонок заметки: transcription/summary архивных заметок подтягиваются из audio_note_archives.
+    # Транскрипт заметок с сегментами в списках и выгрузке не собирается (transcription - NULL, текст отдают
+    # эндпоинты транскрипта); assemble_segments - собрать его из transcript_segments там, где нужен весь текст
+    # (coalesce не вычисляет подзапрос, если текст уже найден, CASE - у заметок без сегментов)
+    def select_fields(self, fields: Sequence[str], assemble_segments: bool = False):
+        columns = [self._field_column(field, assemble_segments) for field in fields]
+        query = select(*columns)
+        if any(field in ARCHIVED_FIELDS for field in fields):
+            query = query.join_from(AudioNote, NoteArchive, NoteArchive.note_id == AudioNote.id, isouter=True)
+        return self.scope(query)
+
+    @staticmethod
+    def _field_column(field: str, assemble_segments: bool = False):
+        if field == "transcription" and assemble_segments:
+            return func.coalesce(
+                AudioNote.transcription, NoteArchive.transcription,
+                case((AudioNote.transcript_segmented, assembled_transcription()))
+            ).label(field)
+        if field in ARCHIVED_FIELDS:
+            return func.coalesce(getattr(AudioNote, field), getattr(NoteArchive, field)).label(field)
+        return getattr(AudioNote, field)
+
+    # подставить архивные transcription/summary в ORM-объекты (без пометки объекта измененным)
+    async def load_archived(self, notes: Sequence[AudioNote]):
+        archived = {note.id: note for note in notes if note.transcript_archived}
+        if archived:
+            result = await self.read(select(NoteArchive).where(NoteArchive.note_id.in_(archived)))
+            for archive in result.scalars():
+                note = archived[archive.note_id]
+                for field in ARCHIVED_FIELDS:
+                    if getattr(note, field) is None:
+                        set_committed_value(note, field, getattr(archive, field))
+
+    # собрать транскрипты заметок с сегментами в transcription (без пометки объекта измененным) -
+    # только там, где нужен весь текст (повторная суммаризация), не в списках и карточке
+    async def load_segmented(self, notes: Sequence[AudioNote]):
+        segmented = {note.id: note for note in notes if note.transcript_segmented and note.transcription is None}
+        if segmented:
+            result = await self.read(
+                select(TranscriptSegment.note_id,
+                       func.string_agg(TranscriptSegment.text,
+                                       aggregate_order_by(literal(" "), TranscriptSegment.start_ms)))
+                .where(TranscriptSegment.note_id.in_(segmented))
+                .group_by(TranscriptSegment.note_id)
+            )
+            for note_id, transcription in result:
+                set_committed_value(segmented[note_id], "transcription", transcription)
+
     # получить все заметки
     async  def get_all(self, skip: int = 0, limit: int = 100, filters: Optional[Dict[str, Any]] = None) -> Sequence[AudioNote]:
 
-        query = select(AudioNote).order_by(AudioNote.created_at.desc())
+        query = self.scope(select(AudioNote)).order_by(AudioNote.created_at.desc())
 
         if filters:
             query = self.apply_filters(query, filters)
 
         query = query.offset(skip).limit(limit)
-        result = await self.db.execute(query)
-        return result.scalars().all()
+        result = await self.read(query)
+        notes = result.scalars().all()
+        await self.load_archived(notes)
+        return notes
+
+    # те же заметки, но сразу строками-словарями нужных колонок, без ORM-объектов
+    async def get_all_rows(self, fields: Sequence[str], skip: int = 0, limit: int = 100,
+                           filters: Optional[Dict[str, Any]] = None) -> List[Dict[str, Any]]:
+        query = self.select_fields(fields).order_by(AudioNote.created_at.desc())
+
+        if filters:
+            query = self.apply_filters(query, filters)
+
+        query = query.offset(skip).limit(limit)
+        result = await self.read(query)
+        return [dict(zip(fields, row)) for row in result]
+
+    # потоковое чтение через серверный курсор, в памяти не больше batch_size строк
+    async def stream_rows(self, fields: Sequence[str], filters: Optional[Dict[str, Any]] = None,
+                          batch_size: int = 1000) -> AsyncIterator[List[Dict[str, Any]]]:
+        query = self.select_fields(fields).order_by(AudioNote.created_at)
+
+        if filters:
+            query = self.apply_filters(query, filters)
+
+        result = await self.db.stream(query.execution_options(yield_per=batch_size))
+        async for partition in result.partitions():
+            yield [dict(zip(fields, row)) for row in partition]
+
+    # версия выборки для ETag: max(updated_at) и count без чтения строк
+    async def get_list_version(self, filters: Optional[Dict[str, Any]] = None) -> Tuple[Optional[datetime], int]:
+        query = self.scope(select(func.max(AudioNote.updated_at), func.count(AudioNote.id)))
+
+        if filters:
+            query = self.apply_filters(query, filters)
+
+        result = await self.read(query)
+        max_updated_at, count = result.one()
+        return max_updated_at, count
 
     # получить 1 заметку по uuid
     async def get_by_id(self, note_id: uuid.UUID) -> Optional[AudioNote]:
-        result = await self.db.execute(
-            select(AudioNote).where(AudioNote.id == note_id)
+        result = await self.read(
+            self.scope(select(AudioNote).where(AudioNote.id == note_id))
         )
-        return result.scalar_one_or_none()
+        note = result.scalar_one_or_none()
+        if note:
+            await self.load_archived([note])
+        return note
+
+    # какие из заметок еще существуют (с учетом пользователя репозитория)
+    async def existing_ids(self, note_ids: Sequence[uuid.UUID]) -> set:
+        if not note_ids:
+            return set()
+        result = await self.db.execute(self.scope(select(AudioNote.id).where(AudioNote.id.in_(note_ids))))
+        return set(result.scalars())
+
+    # новая заметка принадлежит пользователю репозитория, если владелец не указан явно
+    def _owned(self, note_data: dict) -> dict:
+        if self.user_id is not None and "user_id" not in note_data:
+            return {**note_data, "user_id": self.user_id}
+        return note_data
 
     # создать заметку из набора параметров
     async def create(self, note_data: dict) -> AudioNote:
-        note = AudioNote(**note_data)
+        note = AudioNote(**self._owned(note_data))
         self.db.add(note)
+        # flush заполняет значения по умолчанию (status)
+        await self.db.flush()
+        deltas = UsageDeltas()
+        add_status(deltas, note.user_id, None, note.status)
+        await self.usage.add(deltas)
         await self.db.commit()
         await self.db.refresh(note)
+        await note_cache.invalidate_lists()
         return note
 
-    # обновить заметку
-    async def update(self, note_id: uuid.UUID, update_data: dict) -> Optional[AudioNote]:
+    # создать пачку заметок одним коммитом (массовый импорт)
+    async def create_many(self, notes_data: List[dict]) -> List[AudioNote]:
+        notes = [AudioNote(**self._owned(note_data)) for note_data in notes_data]
+        self.db.add_all(notes)
+        await self.db.flush()
+        deltas = UsageDeltas()
+        for note in notes:
+            add_status(deltas, note.user_id, None, note.status)
+        await self.usage.add(deltas)
+        await self.db.commit()
+        await note_cache.invalidate_lists()
+        return notes
+
+    # обновить пачку заметок по первичному ключу одним запросом (каждый dict содержит id)
+    async def update_many(self, updates: List[dict]):
+        if not updates:
+            return
+
+        # строки - под блокировкой: прежние статусы для счетчиков (параллельная смена статуса не посчитается
+        # дважды) и created_at - вторая часть первичного ключа; чужие и удаленные заметки пропускаются
         result = await self.db.execute(
-            select(AudioNote).where(AudioNote.id == note_id)
+            self.scope(select(AudioNote.id, AudioNote.created_at, AudioNote.user_id, AudioNote.status))
+            .where(AudioNote.id.in_([item["id"] for item in updates]))
+            .with_for_update()
         )
+        rows = {row.id: row for row in result}
+
+        deltas = UsageDeltas()
+        for item in updates:
+            row = rows.get(item["id"])
+            if row is not None and "status" in item:
+                add_status(deltas, row.user_id, row.status, item["status"])
+        await self.usage.add(deltas)
+
+        updates = [{**item, "created_at": rows[item["id"]].created_at} for item in updates if item["id"] in rows]
+        if updates:
+            await self.db.execute(update(AudioNote), updates)
+            for kind in ARCHIVED_FIELDS:
+                await self.drop_text_documents([item["id"] for item in updates if kind in item], kind)
+        await self.db.commit()
+        for item in updates:
+            await note_cache.invalidate_note(item["id"])
+
+    # обновить заметку
+    async def update(self, note_id: uuid.UUID, update_data: dict) -> Optional[AudioNote]:
+        query = self.scope(select(AudioNote).where(AudioNote.id == note_id))
+        if "status" in update_data:
+            # смена статуса меняет счетчики: прежний статус - из строки под блокировкой, не из identity map
+            query = query.with_for_update().execution_options(populate_existing=True)
+        result = await self.db.execute(query)
         note = result.scalar_one_or_none()
 
         if note:
+            old_status = note.status
             for key, value in update_data.items():
                 setattr(note, key, value)
+            deltas = UsageDeltas()
+            add_status(deltas, note.user_id, old_status, note.status)
+            await self.usage.add(deltas)
+            for kind in ARCHIVED_FIELDS:
+                if kind in update_data:
+                    await self.drop_text_documents([note_id], kind)
             await self.db.commit()
             await self.db.refresh(note)
+            await self.load_archived([note])
+            await note_cache.invalidate_note(note_id)
 
         return note
 
-    # удалить заметку
-    async def delete(self, note_id: uuid.UUID) -> bool:
+    # удалить заметку; None - заметки нет, иначе ключи S3 ее файлов (аудио и волновые формы),
+    # на которые после коммита больше ничего не ссылается
+    async def delete(self, note_id: uuid.UUID) -> Optional[List[str]]:
         result = await self.db.execute(
-            select(AudioNote).where(AudioNote.id == note_id)
+            self.scope(select(AudioNote).where(AudioNote.id == note_id))
+            .with_for_update()
+            .execution_options(populate_existing=True)
         )
 
         note = result.scalar_one_or_none()
 
         if note:
+            # строки audio_files и note_processing ссылаются на заметку; файлы уходят и из счетчиков пользователя
+            files = (await self.db.execute(
+                delete(AudioFile).where(AudioFile.note_id == note_id)
+                .returning(AudioFile.file_path, AudioFile.waveform_path, AudioFile.file_size, AudioFile.duration)
+            )).all()
+            deltas = UsageDeltas()
+            add_status(deltas, note.user_id, note.status, None)
+            deltas[(note.user_id, STORAGE_BYTES)] -= sum(file.file_size or 0 for file in files)
+            deltas[(note.user_id, AUDIO_SECONDS)] -= sum(file.duration or 0 for file in files)
+            await self.usage.add(deltas)
+
+            await self.db.execute(delete(NoteProcessing).where(NoteProcessing.note_id == note_id))
             await self.db.delete(note)
+            if note.transcript_archived:
+                await self.db.execute(delete(NoteArchive).where(NoteArchive.note_id == note_id))
+            await self.db.execute(delete(NoteEmbedding).where(NoteEmbedding.note_id == note_id))
+            if note.transcript_segmented:
+                await self.db.execute(delete(TranscriptSegment).where(TranscriptSegment.note_id == note_id))
+            await self.db.execute(delete(NoteText).where(NoteText.note_id == note_id))
+
+            # audio_path до загрузки - "pending" (server_default), это не ключ S3
+            keys = {file.file_path for file in files} | {file.waveform_path for file in files if file.waveform_path}
+            if note.audio_path and note.audio_path != "pending":
+                keys.add(note.audio_path)
+
             await self.db.commit()
-            return True
+            await note_cache.invalidate_note(note_id)
+            return sorted(keys)
+
+        return None
 
-        return False
+    # счетчики пользователя репозитория (metric -> значение), O(1) от числа заметок
+    async def get_usage(self) -> Dict[str, int]:
+        result = await self.read(usage_query(self.user_id))
+        return {metric: int(value) for metric, value in result}
 
     async def get_by_status(self, status: str, skip: int = 0, limit: int = 100) -> List[AudioNote]:
         result = await self.db.execute(
-            select(AudioNote)
+            self.scope(select(AudioNote))
             .where(AudioNote.status == status)
             .order_by(AudioNote.created_at.desc())
             .offset(skip)
@@ -115,7 +386,7 @@ class NoteDBInteraction:
 
     async def get_note_status(self, note_id: uuid.UUID) -> str:
         result = await self.db.execute(
-            select(AudioNote).where(AudioNote.id == note_id)
+            self.scope(select(AudioNote).where(AudioNote.id == note_id))
         )
         note = result.scalar_one_or_none()
         if note:
@@ -124,22 +395,112 @@ class NoteDBInteraction:
         return '-----'
 
     async def get_note_transcription(self, note_id: uuid.UUID) -> str:
-        result = await self.db.execute(
-            select(AudioNote).where(AudioNote.id == note_id)
-        )
-        note = result.scalar_one_or_none()
+        note = await self.get_by_id(note_id)
         if note:
+            await self.load_segmented([note])
             return note.transcription
 
         return '-----'
 
     async def get_note_summarization(self, note_id: uuid.UUID) -> str:
-        result = await self.db.execute(
-            select(AudioNote).where(AudioNote.id == note_id)
-        )
-        note = result.scalar_one_or_none()
+        note = await self.get_by_id(note_id)
         if note:
             return note.summary
 
         return '-----'
 
+    # заменить транскрипт заметки сегментами [{start_ms, end_ms, text}] (нормализованы, по возрастанию start_ms)
+    # transcription сбрасывается: полный текст теперь производный. UPDATE явно перечисляет обе колонки -
+    # триггер search_vector срабатывает и при повторной транскрибации (флаг уже стоял)
+    async def replace_segments(self, note: AudioNote, segments: Sequence[Dict[str, Any]]):
+        await self.db.execute(delete(TranscriptSegment).where(TranscriptSegment.note_id == note.id))
+        if segments:
+            await self.db.execute(insert(TranscriptSegment).values([
+                {**segment, "note_id": note.id, "user_id": note.user_id} for segment in segments
+            ]))
+        await self.db.execute(
+            update(AudioNote)
+            .where(AudioNote.id == note.id)
+            .values(transcription=None, transcript_segmented=bool(segments))
+            .execution_options(synchronize_session=False)
+        )
+        await self.drop_text_documents([note.id], "transcription")
+        await self.db.commit()
+        set_committed_value(note, "transcription", None)
+        set_committed_value(note, "transcript_segmented", bool(segments))
+        await note_cache.invalidate_note(note.id)
+
+    # сегменты заметки, пересекающие окно [from_ms, to_ms), по порядку; сегменты не перекрываются,
+    # поэтому end_ms растет вместе с start_ms и окно - диапазон индекса (note_id, end_ms); limit None - все
+    async def get_segments(self, note_id: uuid.UUID, from_ms: int = 0, to_ms: Optional[int] = None,
+                           limit: Optional[int] = 200) -> List[TranscriptSegment]:
+        query = select(TranscriptSegment).where(
+            TranscriptSegment.note_id == note_id, TranscriptSegment.end_ms > from_ms
+        )
+        if to_ms is not None:
+            query = query.where(TranscriptSegment.start_ms < to_ms)
+        if self.user_id is not None:
+            query = query.where(TranscriptSegment.user_id == self.user_id)
+
+        query = query.order_by(TranscriptSegment.end_ms)
+        if limit is not None:
+            query = query.limit(limit)
+        result = await self.read(query)
+        return list(result.scalars())
+
+    # готовый сжатый документ (transcription/summary) заметки пользователя
+    async def get_text_document(self, note_id: uuid.UUID, kind: str) -> Optional[NoteText]:
+        query = select(NoteText).where(NoteText.note_id == note_id, NoteText.kind == kind)
+        if self.user_id is not None:
+            query = query.where(NoteText.user_id == self.user_id)
+        return (await self.read(query)).scalar_one_or_none()
+
+    # документ производный от текста: при смене текста он удаляется в той же транзакции, что и запись текста,
+    # - устаревшее тело не отдается; до пересборки (NoteTextService.store) ответ собирается из колонок и сегментов
+    async def drop_text_documents(self, note_ids: Sequence[uuid.UUID], kind: str):
+        if note_ids:
+            await self.db.execute(delete(NoteText).where(NoteText.note_id.in_(note_ids), NoteText.kind == kind))
+
+    # записать документ (upsert); body None - текста больше нет, документ удаляется
+    async def save_text_document(self, note: AudioNote, kind: str, encoding: Optional[str] = None,
+                                 body: Optional[bytes] = None, size: int = 0):
+        if body is None:
+            await self.db.execute(delete(NoteText).where(NoteText.note_id == note.id, NoteText.kind == kind))
+        else:
+            statement = insert(NoteText).values(
+                note_id=note.id, kind=kind, user_id=note.user_id, encoding=encoding, body=body, size=size
+            )
+            await self.db.execute(statement.on_conflict_do_update(
+                index_elements=[NoteText.note_id, NoteText.kind],
+                set_={
+                    "user_id": statement.excluded.user_id,
+                    "encoding": statement.excluded.encoding,
+                    "body": statement.excluded.body,
+                    "size": statement.excluded.size,
+                    "updated_at": func.now(),
+                }
+            ))
+        await self.db.commit()
+
+    # полнотекстовый поиск по сегментам заметок пользователя: (note_id, title, start_ms, end_ms, text, rank),
+    # по убыванию релевантности
+    async def search_segments(self, search: str, limit: int = 50) -> List[Dict[str, Any]]:
+        query_text = search_query(search)
+        if not query_text:
+            return []
+
+        tsquery = func.to_tsquery('simple', query_text)
+        rank = func.ts_rank(TranscriptSegment.search_vector, tsquery)
+        query = (
+            select(TranscriptSegment.note_id, AudioNote.title, TranscriptSegment.start_ms,
+                   TranscriptSegment.end_ms, TranscriptSegment.text, rank.label("rank"))
+            .join(AudioNote, AudioNote.id == TranscriptSegment.note_id)
+            .where(TranscriptSegment.search_vector.op("@@")(tsquery))
+            .order_by(rank.desc(), TranscriptSegment.note_id, TranscriptSegment.start_ms)
+            .limit(limit)
+        )
+        if self.user_id is not None:
+            query = query.where(TranscriptSegment.user_id == self.user_id)
+
+        result = await self.read(self.scope(query))
+        return [dict(row._mapping) for row in result]
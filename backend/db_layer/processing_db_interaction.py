@@ -0,0 +1,169 @@
+from datetime import datetime, timedelta
+from sqlalchemy import func, text
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from typing import Any, Dict, List, Optional, Sequence
+import uuid
+
+from core.config import settings
+from models.processing import QUEUED, RETRY_SCHEDULED, NoteProcessing
+
+# advisory lock постановки задач пользователя (ключ - hashtext(префикс:тип:user_id))
+ENQUEUE_LOCK = "processing_enqueue"
+
+
+def stale_after(task_type: str) -> timedelta:
+    # срок, после которого незавершенный этап считается зависшим
+    if task_type == "upload":
+        return timedelta(seconds=settings.UPLOAD_STALE_AFTER)
+    return timedelta(seconds=settings.PROCESSING_STALE_AFTER)
+
+
+class ProcessingDBInteraction:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # начать этап обработки заметки (upload / transcription / summarization)
+    async def start(self, note_id: uuid.UUID, task_type: str) -> NoteProcessing:
+        now = datetime.utcnow()
+        processing = NoteProcessing(
+            note_id=note_id,
+            task_type=task_type,
+            status="in_progress",
+            attempts=1,
+            started_at=now,
+            due_at=now + stale_after(task_type)
+        )
+        self.db.add(processing)
+        await self.db.commit()
+        return processing
+
+    # начать один этап для пачки заметок одним коммитом
+    async def start_many(self, note_ids: List[uuid.UUID], task_type: str):
+        now = datetime.utcnow()
+        self.db.add_all([
+            NoteProcessing(note_id=note_id, task_type=task_type, status="in_progress", attempts=1,
+                           started_at=now, due_at=now + stale_after(task_type))
+            for note_id in note_ids
+        ])
+        await self.db.commit()
+
+    # последний незавершенный этап заметки данного типа
+    async def get_active(self, note_id: uuid.UUID, task_type: str) -> Optional[NoteProcessing]:
+        result = await self.db.execute(
+            select(NoteProcessing)
+            .where(
+                NoteProcessing.note_id == note_id,
+                NoteProcessing.task_type == task_type,
+                NoteProcessing.completed_at.is_(None)
+            )
+            .order_by(NoteProcessing.created_at.desc())
+            .limit(1)
+        )
+        return result.scalar_one_or_none()
+
+    # продлить срок незавершенного этапа (долгая потоковая запись не должна считаться брошенной)
+    async def extend(self, note_id: uuid.UUID, task_type: str) -> Optional[NoteProcessing]:
+        processing = await self.get_active(note_id, task_type)
+        if processing is None:
+            return None
+
+        processing.due_at = datetime.utcnow() + stale_after(task_type)
+        await self.db.commit()
+        return processing
+
+    # завершить этап: completed или error
+    async def finish(self, note_id: uuid.UUID, task_type: str, status: str = "completed",
+                     error_message: Optional[str] = None) -> Optional[NoteProcessing]:
+        processing = await self.get_active(note_id, task_type)
+        if processing is None:
+            return None
+
+        processing.status = status
+        processing.error_message = error_message
+        processing.completed_at = datetime.utcnow()
+        await self.db.commit()
+        return processing
+
+    # этапы, срок которых наступил (зависшие in_progress и retry_scheduled), по частичному индексу due_at
+    # строки блокируются до конца транзакции, занятые другим процессом пропускаются
+    async def claim_due(self, now: datetime, limit: int) -> List[NoteProcessing]:
+        result = await self.db.execute(
+            select(NoteProcessing)
+            .where(NoteProcessing.completed_at.is_(None), NoteProcessing.due_at <= now)
+            .order_by(NoteProcessing.due_at)
+            .limit(limit)
+            .with_for_update(skip_locked=True)
+        )
+        return list(result.scalars())
+
+    # поставить задачи в очередь планировщика [{note_id, user_id, priority, cost}] одним коммитом
+    # метка задачи - max(виртуальное время очереди, метка последней задачи пользователя) + cost (уже с весом):
+    # пользователь с длинной очередью встает за своими задачами, новый - сразу за головой очереди.
+    # Чтение последней метки и вставка - под advisory lock пользователя до коммита: параллельные постановки
+    # одного пользователя (несколько воркеров) иначе получили бы одинаковые метки и обошли его очередь;
+    # блокировки берутся в порядке user_id - без взаимоблокировок между пачками разных пользователей
+    async def enqueue_many(self, jobs: Sequence[Dict[str, Any]], task_type: str,
+                           now: Optional[datetime] = None) -> List[NoteProcessing]:
+        for user_id in sorted({job["user_id"] for job in jobs}, key=str):
+            await self.db.execute(
+                text("SELECT pg_advisory_xact_lock(hashtext(:key))"),
+                {"key": f"{ENQUEUE_LOCK}:{task_type}:{user_id}"}
+            )
+
+        virtual_time = (await self.db.execute(
+            select(func.min(NoteProcessing.finish_tag))
+            .where(NoteProcessing.status == QUEUED, NoteProcessing.task_type == task_type)
+        )).scalar() or 0.0
+
+        tags: Dict[uuid.UUID, float] = {}
+        queued = []
+        for job in jobs:
+            user_id = job["user_id"]
+            if user_id not in tags:
+                tags[user_id] = (await self.db.execute(
+                    select(func.max(NoteProcessing.finish_tag))
+                    .where(NoteProcessing.status == QUEUED, NoteProcessing.task_type == task_type,
+                           NoteProcessing.user_id == user_id)
+                )).scalar() or 0.0
+            tags[user_id] = max(tags[user_id], virtual_time) + job["cost"]
+            queued.append(NoteProcessing(
+                note_id=job["note_id"], task_type=task_type, status=QUEUED, user_id=user_id,
+                priority=job["priority"], finish_tag=tags[user_id], created_at=now or datetime.utcnow()
+            ))
+        self.db.add_all(queued)
+        await self.db.commit()
+        return queued
+
+    # число задач в очереди по классам приоритета
+    async def queue_depth(self, task_type: str) -> Dict[int, int]:
+        result = await self.db.execute(
+            select(NoteProcessing.priority, func.count())
+            .where(NoteProcessing.status == QUEUED, NoteProcessing.task_type == task_type)
+            .group_by(NoteProcessing.priority)
+        )
+        return {priority: count for priority, count in result}
+
+    # опубликованные и еще не завершенные задачи (включая ждущие повтора) - заняты места движков;
+    # priority - только задачи этого класса
+    async def count_in_flight(self, task_type: str, priority: Optional[int] = None) -> int:
+        query = select(func.count()).select_from(NoteProcessing).where(
+            NoteProcessing.task_type == task_type,
+            NoteProcessing.completed_at.is_(None),
+            NoteProcessing.status.in_(["in_progress", RETRY_SCHEDULED])
+        )
+        if priority is not None:
+            query = query.where(NoteProcessing.priority == priority)
+        return (await self.db.execute(query)).scalar_one()
+
+    # следующие задачи очереди в порядке order_by (политика планировщика), блокировка как в claim_due
+    # max_priority - только классы не ниже заданного (меньшее число - выше приоритет)
+    async def claim_queued(self, task_type: str, limit: int, order_by: Sequence,
+                           max_priority: Optional[int] = None) -> List[NoteProcessing]:
+        query = select(NoteProcessing).where(NoteProcessing.status == QUEUED, NoteProcessing.task_type == task_type)
+        if max_priority is not None:
+            query = query.where(NoteProcessing.priority <= max_priority)
+        result = await self.db.execute(
+            query.order_by(*order_by).limit(limit).with_for_update(skip_locked=True)
+        )
+        return list(result.scalars())
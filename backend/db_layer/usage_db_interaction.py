@@ -0,0 +1,87 @@
+import random
+import uuid
+from collections import Counter
+
+from sqlalchemy import func, select, text
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from models.usage_counter import AUDIO_SECONDS, STATUS_METRIC_PREFIX, STORAGE_BYTES, UsageCounter, status_metric
+
+# дельты счетчиков транзакции: (user_id, metric) -> изменение
+UsageDeltas = Counter
+
+# сверка: настоящие значения (audio_notes, audio_files) минус сумма шардов - поправка в шард 0.
+# Один запрос - один снимок: изменения, закоммиченные после него, не видны ни в заметках, ни в счетчиках,
+# а их дельты прибавляются к строке поверх поправки (ON CONFLICT складывает), поэтому сверка ничего не теряет
+RECONCILE = text(f"""
+    WITH actual AS (
+        SELECT user_id, '{STATUS_METRIC_PREFIX}' || status AS metric, count(*) AS value
+        FROM audio_notes GROUP BY user_id, status
+        UNION ALL
+        SELECT n.user_id, '{STORAGE_BYTES}', coalesce(sum(f.file_size), 0)
+        FROM audio_files f JOIN audio_notes n ON n.id = f.note_id GROUP BY n.user_id
+        UNION ALL
+        SELECT n.user_id, '{AUDIO_SECONDS}', coalesce(sum(f.duration), 0)
+        FROM audio_files f JOIN audio_notes n ON n.id = f.note_id GROUP BY n.user_id
+    ),
+    counted AS (
+        SELECT user_id, metric, sum(value) AS value FROM usage_counters GROUP BY user_id, metric
+    ),
+    drift AS (
+        SELECT coalesce(a.user_id, c.user_id) AS user_id, coalesce(a.metric, c.metric) AS metric,
+               coalesce(a.value, 0) - coalesce(c.value, 0) AS delta
+        FROM actual a FULL JOIN counted c ON c.user_id = a.user_id AND c.metric = a.metric
+    )
+    INSERT INTO usage_counters (user_id, metric, shard, value)
+    SELECT user_id, metric, 0, delta FROM drift WHERE delta <> 0
+    ON CONFLICT (user_id, metric, shard) DO UPDATE SET value = usage_counters.value + excluded.value
+""")
+
+
+def add_status(deltas: UsageDeltas, user_id: uuid.UUID, old_status, new_status):
+    # переход заметки между статусами; None - заметки не было (создание) или больше нет (удаление)
+    if old_status == new_status:
+        return
+    if old_status is not None:
+        deltas[(user_id, status_metric(old_status))] -= 1
+    if new_status is not None:
+        deltas[(user_id, status_metric(new_status))] += 1
+
+
+class UsageDBInteraction:
+    def __init__(self, db: AsyncSession):
+        self.db = db
+
+    # прибавить дельты в транзакции вызывающего (без commit): все строки - в одном случайном шарде,
+    # по порядку (user_id, metric), чтобы параллельные транзакции брали блокировки строк в одном порядке
+    async def add(self, deltas: UsageDeltas):
+        rows = sorted((key, value) for key, value in deltas.items() if value)
+        if not rows:
+            return
+
+        shard = random.randrange(settings.USAGE_COUNTER_SHARDS)
+        statement = insert(UsageCounter).values([
+            {"user_id": user_id, "metric": metric, "shard": shard, "value": value}
+            for (user_id, metric), value in rows
+        ])
+        await self.db.execute(statement.on_conflict_do_update(
+            index_elements=[UsageCounter.user_id, UsageCounter.metric, UsageCounter.shard],
+            set_={"value": UsageCounter.value + statement.excluded.value}
+        ))
+
+    # исправить расхождения со всеми таблицами, возвращает число исправленных счетчиков (commit - вызывающий)
+    async def reconcile(self) -> int:
+        result = await self.db.execute(RECONCILE)
+        return result.rowcount
+
+
+# значения метрик пользователя: не больше (метрик x USAGE_COUNTER_SHARDS) строк по первичному ключу,
+# от числа заметок не зависит
+def usage_query(user_id: uuid.UUID):
+    return (
+        select(UsageCounter.metric, func.sum(UsageCounter.value))
+        .where(UsageCounter.user_id == user_id)
+        .group_by(UsageCounter.metric)
+    )
@@ -0,0 +1,32 @@
+# Индексатор эмбеддингов семантического поиска (воркеры API разбирают очередь сами, см. EMBEDDING_ENABLED)
+#   python embed.py run         - разобрать очередь note_embeddings до конца
+#   python embed.py backfill    - поставить в очередь тексты заметок без векторов (после миграции 0010), затем run
+import argparse
+import asyncio
+import logging
+
+from core.database import engine
+from services.embedding_service import EmbeddingIndexer, semantic_search_available
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(args):
+    if not semantic_search_available():
+        raise SystemExit("Embeddings are disabled or the model backend is not installed (extra 'embeddings')")
+
+    indexer = EmbeddingIndexer(batch_size=args.batch_size)
+    try:
+        if args.command == "backfill":
+            logger.info(f"Queued {await indexer.backfill()} texts")
+        logger.info(f"Embedding pass: {await indexer.run_once() or 'queue is empty'}")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Embeddings of note transcriptions and summaries")
+    parser.add_argument("command", choices=["run", "backfill"])
+    parser.add_argument("--batch-size", type=int, default=64, help="texts per model call")
+    asyncio.run(main(parser.parse_args()))
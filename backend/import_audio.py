@@ -0,0 +1,58 @@
+# Массовый импорт аудиозаписей из каталога или tar/zip архива
+# запуск: python import_audio.py /path/to/recordings --concurrency 16
+import argparse
+import asyncio
+import logging
+import os
+import uuid
+
+from core.config import settings
+from core.database import engine
+from services.import_service import ImportService, ImportSource
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def import_audio(args):
+    source = ImportSource(args.path)
+    manifest = args.manifest or f"{os.path.abspath(args.path).rstrip(os.sep)}.import_manifest.jsonl"
+    logger.info(f"Importing from {args.path}, manifest: {manifest}")
+
+    service = ImportService(
+        source,
+        manifest_path=manifest,
+        concurrency=args.concurrency,
+        batch_size=args.batch_size,
+        part_size=args.part_size_mb * 1024 * 1024,
+        tags=args.tags,
+        user_id=uuid.UUID(args.user_id),
+        tier=args.tier
+    )
+
+    try:
+        report = await service.run()
+        logger.info(
+            f"Import finished: {report['files']} files, {report['errors']} errors, "
+            f"{report['skipped']} skipped, {report['elapsed_s']}s, "
+            f"{report['files_per_s']} files/s, {report['mb_per_s']} MB/s"
+        )
+    finally:
+        source.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Bulk import of audio recordings")
+    parser.add_argument("path", help="directory, .tar(.gz) or .zip archive")
+    parser.add_argument("--manifest", help="resume manifest path (default: <path>.import_manifest.jsonl)")
+    parser.add_argument("--concurrency", type=int, default=8, help="parallel file uploads")
+    parser.add_argument("--batch-size", type=int, default=50, help="notes per DB batch")
+    parser.add_argument("--part-size-mb", type=int, default=8, help="multipart part size, >= 5")
+    parser.add_argument("--tags", nargs="*", default=["import"])
+    parser.add_argument("--user-id", default=settings.DEFAULT_USER_ID, required=not settings.DEFAULT_USER_ID,
+                        help="owner of imported notes (default: DEFAULT_USER_ID)")
+    parser.add_argument("--tier", default=settings.DEFAULT_USER_TIER,
+                        help="owner's tier, fair-queuing weight of the transcriptions (USER_TIER_WEIGHTS)")
+
+    asyncio.run(import_audio(parser.parse_args()))
@@ -1,51 +1,50 @@
 import asyncio
-from core.database import engine
-from core.config import settings
-from models.base_model import BaseModel
-from models.note import AudioNote
-from models.processing import NoteProcessing
-from models.audio_file import AudioFile
+import os
+import sys
+import logging
 
+from alembic import command
+from alembic.config import Config
 
-import logging
-import sys
-import os
+from core.config import settings
+from core.database import engine
+from services.partition_service import PartitionService
 
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
+# Схема БД управляется миграциями (migrations/), запускается один раз перед стартом воркеров:
+#   python init_db.py            - до последней ревизии + месячные партиции audio_notes вперед
+#   python init_db.py 0001       - до указанной ревизии
+ALEMBIC_INI = os.path.join(os.path.dirname(os.path.abspath(__file__)), "alembic.ini")
 
-async def init_database():
-    logger.info(f"Database URL: {settings.DATABASE_URL}")
-
-    try:
-        async with engine.begin() as conn:
-            logger.info("Creating tables...")
-            await conn.run_sync(AudioNote.__table__.create)
-            logger.info("Created audio_notes table")
 
-            # 2. Таблицы с foreign keys (после родительских)
-            await conn.run_sync(NoteProcessing.__table__.create)
-            logger.info("Created note_processing table")
+def alembic_config() -> Config:
+    config = Config(ALEMBIC_INI)
+    config.set_main_option("script_location", os.path.join(os.path.dirname(ALEMBIC_INI), "migrations"))
+    config.attributes["configure_logging"] = False
+    return config
 
-            await conn.run_sync(AudioFile.__table__.create)
-            logger.info("Created audio_files table")
 
-            '''
-            await conn.run_sync(BaseModel.metadata.create_all)
+def run_migrations(revision: str = "head"):
+    # синхронный вызов: env.py сам поднимает event loop, из async кода - через asyncio.to_thread
+    command.upgrade(alembic_config(), revision)
 
-            result = await conn.execute(
-                "SELECT table_name FROM information_schema.tables WHERE table_schema = 'public'"
-            )
-            tables = await result.scalars().all()
-            logger.info("Tables created successfully!")
-            '''
 
-    except Exception as e:
-        logger.error(f"Error: {e}")
-        import traceback
-        logger.error(traceback.format_exc())
+async def ensure_partitions():
+    try:
+        await PartitionService().ensure_partitions(settings.PARTITION_MONTHS_AHEAD)
+    finally:
+        await engine.dispose()
 
 
 if __name__ == "__main__":
-    asyncio.run(init_database())
\ No newline at end of file
+    revision = sys.argv[1] if len(sys.argv) > 1 else "head"
+    try:
+        run_migrations(revision)
+        logger.info(f"Database migrated to {revision}")
+        if revision == "head":
+            asyncio.run(ensure_partitions())
+    except Exception as e:
+        logger.error(f"Migration failed: {e}")
+        sys.exit(1)
@@ -1,44 +1,78 @@
-from fastapi import FastAPI
+from fastapi import Depends, FastAPI, Response
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from core.database import engine
-from models.base_model import BaseModel
+from core.database import engine, replica_router
+from core.s3_client import s3_client
+from core.cache import note_cache
+from core.config import settings
+from core.admission import rate_limit, rate_limiter
+from core.metrics import MetricsMiddleware, render_metrics
+from core.profiling import ProfilingMiddleware, profile_store
+from services.queue_service import queue_service
+from services.upload_service import upload_tracker
+from services.reaper_service import ProcessingReaper
+from services.scheduler_service import TranscriptionScheduler
+from services.usage_service import UsageReconciler
+from services.embedding_service import EmbeddingIndexer, semantic_search_available
+import asyncio
 import logging
 # Подключаем роутеры
-from api import notes, websockets
+from api import notes, websockets, admin
 
 logger = logging.getLogger(__name__)
 
-app_api = FastAPI(title="Audio Notes API", version="0.1.0")
-
-# CORS
-app_api.add_middleware(
-    CORSMiddleware,
-    allow_origins=["http://localhost:5173"],
-    allow_credentials=True,
-    allow_methods=["*"],
-    allow_headers=["*"],
-    expose_headers=["*"]
-)
-
-# Инициализация БД с обработкой ошибок
-async def lifespan():
-    # Startup logic
+# Ресурсы воркера: создаются один раз при старте процесса и закрываются при остановке
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Startup logic: схема БД не трогается, миграции запускаются отдельно (init_db.py) до старта воркеров
     try:
-        # ининициализация БД
-        async with engine.begin() as conn:
-            await conn.run_sync(BaseModel.metadata.create_all)
-        logger.info("Database tables created successfully")
-
-        # TODO - здесь подключение к брокеру
+        await s3_client.start()
+        await queue_service.connect()
         # TODO - проверять тут коннект к S3, внешним LLM?
     except Exception as e:
-        logger.error(f"Database connection failed: {e}")
+        logger.error(f"Startup failed: {e}")
         raise
 
+    # reaper работает в каждом воркере, проход в кластере один за раз (advisory lock)
+    reaper_task = None
+    if settings.REAPER_ENABLED:
+        reaper_task = asyncio.create_task(ProcessingReaper().run_forever(settings.REAPER_INTERVAL))
+
+    # планировщик транскрибации: как reaper, в каждом воркере, публикует один за раз (advisory lock)
+    scheduler_task = None
+    if settings.SCHEDULER_ENABLED:
+        scheduler_task = asyncio.create_task(TranscriptionScheduler().run_forever(settings.SCHEDULER_INTERVAL))
+
+    # сверка счетчиков статистики: как reaper, в каждом воркере, проход в кластере один за раз (advisory lock)
+    reconcile_task = None
+    if settings.USAGE_RECONCILE_ENABLED:
+        reconcile_task = asyncio.create_task(UsageReconciler().run_forever(settings.USAGE_RECONCILE_INTERVAL))
+
+    # индексатор эмбеддингов: воркеры разбирают очередь параллельно, модель грузится при первой пачке
+    indexer_task = None
+    if semantic_search_available():
+        indexer_task = asyncio.create_task(EmbeddingIndexer().run_forever(settings.EMBEDDING_INTERVAL))
+
     yield  # Здесь приложение работает
 
-app = FastAPI()
+    background = [task for task in (reaper_task, scheduler_task, reconcile_task, indexer_task) if task is not None]
+    for task in background:
+        task.cancel()
+    await asyncio.gather(*background, return_exceptions=True)
+
+    # Shutdown: сервер уже не принимает соединения, дожидаемся текущих загрузок
+    if not await upload_tracker.drain(settings.GRACEFUL_SHUTDOWN_TIMEOUT):
+        logger.warning(f"{upload_tracker.active} uploads still running at shutdown")
+
+    await queue_service.close()
+    await s3_client.close()
+    await note_cache.close()
+    await rate_limiter.close()
+    await engine.dispose()
+    await replica_router.dispose()
+    logger.info("Worker resources closed")
+
+app = FastAPI(title="Audio Notes API", version="0.1.0", lifespan=lifespan)
 
 app.add_middleware(
     CORSMiddleware,
@@ -46,10 +80,27 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["ETag"],
 )
 
-app.include_router(notes.router, prefix="/api/v1", tags=["notes"])
+if settings.METRICS_ENABLED:
+    app.add_middleware(MetricsMiddleware)
+
+# профилировщик подключается только если включен - в выключенном состоянии ноль накладных расходов
+if settings.PROFILING_ENABLED:
+    app.add_middleware(
+        ProfilingMiddleware,
+        store=profile_store,
+        sample_rate=settings.PROFILING_SAMPLE_RATE,
+        threshold_ms=settings.PROFILING_THRESHOLD_MS,
+        interval_ms=settings.PROFILING_INTERVAL_MS,
+        trigger_token=settings.ADMIN_TOKEN
+    )
+
+# token bucket на клиента, стоимость запроса зависит от его тяжести (core/admission.py)
+app.include_router(notes.router, prefix="/api/v1", tags=["notes"], dependencies=[Depends(rate_limit)])
 app.include_router(websockets.router, tags=["websockets"])
+app.include_router(admin.router, prefix="/admin", tags=["admin"])
 
 @app.get("/")
 async def root():
@@ -57,4 +108,15 @@ async def root():
 
 @app.get("/health")
 async def health_check():
-    return {"status": "healthy"}
\ No newline at end of file
+    return {"status": "healthy"}
+
+@app.get("/cache/stats")
+async def cache_stats():
+    # hit ratio кэша заметок
+    return note_cache.metrics()
+
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    # метрики в формате Prometheus
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
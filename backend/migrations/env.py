@@ -0,0 +1,103 @@
+import asyncio
+import logging
+import re
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import pool, inspect, text
+from sqlalchemy.ext.asyncio import create_async_engine
+
+from core.config import settings
+from models.base_model import BaseModel
+# все модели должны быть импортированы, чтобы autogenerate видел их таблицы
+from models.note import AudioNote  # noqa: F401
+from models.processing import NoteProcessing  # noqa: F401
+from models.audio_file import AudioFile  # noqa: F401
+from models.note_archive import NoteArchive  # noqa: F401
+from models.note_embedding import NoteEmbedding  # noqa: F401
+from models.transcript_segment import TranscriptSegment  # noqa: F401
+from models.note_text import NoteText  # noqa: F401
+from models.usage_counter import UsageCounter  # noqa: F401
+
+# Окружение alembic: миграции выполняются одним процессом до запуска воркеров (init_db.py),
+# а не create_all при каждом старте приложения
+
+config = context.config
+# логирование из alembic.ini только при запуске из CLI, init_db.py настраивает его сам
+if config.config_file_name is not None and config.attributes.get("configure_logging", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = BaseModel.metadata
+
+# ревизия, соответствующая схеме, которую раньше создавал create_all / init_db.py
+BASELINE_REVISION = "0001"
+MIGRATIONS_LOCK = "audio_notes_migrations"
+
+logger = logging.getLogger("alembic.env")
+
+# партиции audio_notes создаются не миграциями, а partitions.py - autogenerate их не сравнивает
+PARTITION_TABLE = re.compile(r"^audio_notes_(legacy|p\d{4}_\d{2})$")
+
+
+def include_name(name, type_, parent_names) -> bool:
+    return not (type_ == "table" and PARTITION_TABLE.match(name))
+
+
+def is_unversioned_schema(connection) -> bool:
+    # база создана до появления миграций: таблицы есть, alembic_version нет
+    tables = inspect(connection).get_table_names()
+    return "audio_notes" in tables and "alembic_version" not in tables
+
+
+def do_run_migrations(connection):
+    # session-level advisory lock: несколько контейнеров не мигрируют одновременно,
+    # лок переживает autocommit блоки (CREATE INDEX CONCURRENTLY)
+    connection.execute(text("SELECT pg_advisory_lock(hashtext(:name))"), {"name": MIGRATIONS_LOCK})
+    connection.commit()
+    try:
+        # отдельная транзакция на каждую миграцию: онлайн-операции (migrations/online.py) коммитят по ходу работы
+        context.configure(
+            connection=connection,
+            target_metadata=target_metadata,
+            compare_type=True,
+            transaction_per_migration=True,
+            include_name=include_name,
+        )
+        if is_unversioned_schema(connection):
+            logger.info(f"Existing schema without alembic_version, stamping {BASELINE_REVISION}")
+            context.get_context().stamp(context.script, BASELINE_REVISION)
+        connection.commit()
+
+        with context.begin_transaction():
+            context.run_migrations()
+        connection.commit()
+    finally:
+        connection.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": MIGRATIONS_LOCK})
+        connection.commit()
+
+
+async def run_migrations_online():
+    engine = create_async_engine(settings.DATABASE_URL, poolclass=pool.NullPool)
+    try:
+        async with engine.connect() as connection:
+            await connection.run_sync(do_run_migrations)
+    finally:
+        await engine.dispose()
+
+
+def run_migrations_offline():
+    # alembic upgrade head --sql: только вывод SQL, без подключения к базе
+    context.configure(
+        url=settings.DATABASE_URL,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    asyncio.run(run_migrations_online())
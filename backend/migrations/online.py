@@ -0,0 +1,170 @@
+# Онлайн-операции для миграций больших таблиц без долгих эксклюзивных блокировок:
+#   - индексы через CREATE/DROP INDEX CONCURRENTLY (не блокируют запись), для секционированных таблиц - по партициям
+#   - заполнение новых колонок батчами по диапазонам первичного ключа, каждый батч - своя короткая транзакция
+#   - lock_timeout для DDL, которому все же нужен ACCESS EXCLUSIVE (ADD COLUMN, CREATE TRIGGER)
+# Операции идемпотентны: прерванную миграцию можно просто запустить заново
+import logging
+import time
+from typing import List, Optional, Sequence, Union
+
+from alembic import op
+from sqlalchemy import text
+from sqlalchemy.sql.elements import TextClause
+
+logger = logging.getLogger("alembic.online")
+
+
+def set_lock_timeout(timeout: str = "5s"):
+    # DDL, ждущий блокировку за долгой транзакцией, блокирует все запросы за собой,
+    # поэтому лучше быстро упасть и перезапустить миграцию
+    op.execute(f"SET LOCAL lock_timeout = '{timeout}'")
+
+
+def index_state(name: str) -> Optional[bool]:
+    # None - индекса нет, False - INVALID (остался от прерванной сборки), True - готов
+    return op.get_bind().execute(
+        text("SELECT indisvalid FROM pg_index WHERE indexrelid = to_regclass(:name)"),
+        {"name": name}
+    ).scalar()
+
+
+def create_index_concurrently(name: str, table: str, columns: Sequence[Union[str, TextClause]],
+                              unique: bool = False, **kwargs):
+    # CREATE INDEX CONCURRENTLY нельзя выполнять в транзакции - отдельный autocommit блок
+    # kwargs уходят в op.create_index (postgresql_using, postgresql_where, postgresql_ops)
+    with op.get_context().autocommit_block():
+        state = index_state(name)
+        if state:
+            logger.info(f"index {name} already exists")
+            return
+        if state is False:
+            logger.warning(f"index {name} is INVALID after an interrupted build, rebuilding")
+            op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+        logger.info(f"building index {name} on {table} concurrently")
+        started = time.perf_counter()
+        op.create_index(name, table, list(columns), unique=unique,
+                        postgresql_concurrently=True, if_not_exists=True, **kwargs)
+        size = op.get_bind().execute(
+            text("SELECT pg_size_pretty(pg_relation_size(to_regclass(:name)))"), {"name": name}
+        ).scalar()
+        logger.info(f"index {name} built in {time.perf_counter() - started:.1f}s, size {size}")
+
+
+def drop_index_concurrently(name: str, table: str):
+    with op.get_context().autocommit_block():
+        op.drop_index(name, table_name=table, postgresql_concurrently=True, if_exists=True)
+
+
+def partitions_of(table: str) -> List[str]:
+    return list(op.get_bind().execute(
+        text("SELECT inhrelid::regclass::text FROM pg_inherits WHERE inhparent = to_regclass(:table) ORDER BY 1"),
+        {"table": table}
+    ).scalars())
+
+
+def create_partitioned_index_concurrently(name: str, table: str, definition: str, where: Optional[str] = None):
+    # у секционированной таблицы CONCURRENTLY нет: индекс создается на родителе ON ONLY (пустой, INVALID),
+    # на каждой партиции строится CONCURRENTLY и подключается через ATTACH PARTITION;
+    # когда подключены все партиции, индекс родителя становится валидным, новые партиции получают его сами
+    # definition - часть после имени таблицы: "(status, created_at)", "USING gin (tags)"
+    predicate = f" WHERE {where}" if where else ""
+    with op.get_context().autocommit_block():
+        if index_state(name):
+            logger.info(f"index {name} already exists")
+            return
+        op.execute(f"CREATE INDEX IF NOT EXISTS {name} ON ONLY {table} {definition}{predicate}")
+
+        suffix = name[len(f"ix_{table}_"):] if name.startswith(f"ix_{table}_") else name
+        partitions = partitions_of(table)
+        started = time.perf_counter()
+        for number, partition in enumerate(partitions, 1):
+            child = f"{partition}_{suffix}_idx"
+            if index_state(child) is False:
+                logger.warning(f"index {child} is INVALID after an interrupted build, rebuilding")
+                op.execute(f"DROP INDEX CONCURRENTLY IF EXISTS {child}")
+            op.execute(f"CREATE INDEX CONCURRENTLY IF NOT EXISTS {child} ON {partition} {definition}{predicate}")
+            attached = op.get_bind().execute(
+                text("SELECT 1 FROM pg_inherits WHERE inhrelid = to_regclass(:child)"), {"child": child}
+            ).scalar()
+            if not attached:
+                op.execute(f"ALTER INDEX {name} ATTACH PARTITION {child}")
+            logger.info(f"index {name}: {number}/{len(partitions)} partitions, {child} ready")
+
+        size = op.get_bind().execute(text(
+            "SELECT pg_size_pretty(sum(pg_relation_size(inhrelid))) FROM pg_inherits WHERE inhparent = to_regclass(:name)"
+        ), {"name": name}).scalar()
+        logger.info(f"index {name} built in {time.perf_counter() - started:.1f}s, size {size}")
+
+
+def drop_partitioned_index(name: str):
+    # DROP INDEX CONCURRENTLY для индекса секционированной таблицы не поддерживается:
+    # обычный DROP с lock_timeout, индексы партиций удаляются вместе с родительским
+    set_lock_timeout()
+    op.execute(f"DROP INDEX IF EXISTS {name}")
+
+
+class BackfillProgress:
+    # прогресс заполнения: обработано/всего, скорость и оценка оставшегося времени
+    def __init__(self, label: str, total: int, log_interval: float = 5.0):
+        self.label = label
+        self.total = total
+        self.done = 0
+        self.log_interval = log_interval
+        self.started = time.perf_counter()
+        self.last_logged = 0.0
+
+    def add(self, rows: int):
+        self.done += rows
+        now = time.perf_counter()
+        if now - self.last_logged >= self.log_interval:
+            self.last_logged = now
+            logger.info(self.format(now))
+
+    def format(self, now: float) -> str:
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed else 0.0
+        percent = self.done * 100 / self.total if self.total else 100.0
+        eta = (self.total - self.done) / rate if rate and self.total > self.done else 0.0
+        return (f"{self.label}: {self.done}/{self.total} rows ({percent:.1f}%), "
+                f"{rate:.0f} rows/s, eta {eta:.0f}s")
+
+    def finish(self):
+        logger.info(f"{self.format(time.perf_counter())}, done")
+
+
+def backfill(table: str, assignments: str, where: str = "TRUE", key: str = "id",
+             batch_size: int = 5000, pause: float = 0.05, label: Optional[str] = None) -> int:
+    # UPDATE table SET <assignments> WHERE <where> батчами по batch_size строк первичного ключа (keyset),
+    # между батчами пауза pause секунд - меньше нагрузка на диск и реплики, короткие блокировки строк
+    # where должен отсекать уже заполненные строки (например "search_vector IS NULL"), тогда перезапуск продолжит с места
+    with op.get_context().autocommit_block():
+        bind = op.get_bind()
+        total = bind.execute(text(f"SELECT count(*) FROM {table} WHERE {where}")).scalar()
+        progress = BackfillProgress(label or f"backfill {table}", total)
+
+        last_key = None
+        while True:
+            # граница следующего батча по индексу первичного ключа
+            batch = bind.execute(
+                text(f"SELECT {key} FROM {table} "
+                     f"{'WHERE ' + key + ' > :last_key ' if last_key is not None else ''}"
+                     f"ORDER BY {key} LIMIT :batch_size"),
+                {"last_key": last_key, "batch_size": batch_size}
+            ).scalars().all()
+            if not batch:
+                break
+
+            updated = bind.execute(
+                text(f"UPDATE {table} SET {assignments} "
+                     f"WHERE {key} >= :first_key AND {key} <= :last_key AND ({where})"),
+                {"first_key": batch[0], "last_key": batch[-1]}
+            ).rowcount
+            progress.add(updated)
+            last_key = batch[-1]
+
+            if pause:
+                time.sleep(pause)
+
+        progress.finish()
+        return progress.done
@@ -0,0 +1,68 @@
+"""initial schema: audio_notes, note_processing, audio_files
+
+Схема, которую раньше создавали create_all / init_db.py (базы без alembic_version
+помечаются этой ревизией автоматически, см. env.py)
+
+Revision ID: 0001
+Revises: 
+Create Date: 2026-10-19 12:53:21.450165
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0001'
+down_revision: Union[str, None] = None
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table('audio_notes',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('user_id', sa.UUID(), nullable=False),
+    sa.Column('title', sa.String(length=255), nullable=False),
+    sa.Column('tags', postgresql.JSONB(astext_type=sa.Text()), nullable=True),
+    sa.Column('notes', sa.Text(), nullable=True),
+    sa.Column('audio_filename', sa.String(length=500), nullable=False),
+    sa.Column('audio_path', sa.String(length=500), server_default='pending', nullable=True),
+    sa.Column('status', sa.String(length=30), server_default='pending', nullable=False),
+    sa.Column('transcription', sa.Text(), nullable=True),
+    sa.Column('summary', sa.Text(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.Column('updated_at', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('audio_files',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('note_id', sa.UUID(), nullable=False),
+    sa.Column('file_path', sa.String(length=500), nullable=False),
+    sa.Column('file_size', sa.Integer(), nullable=True),
+    sa.Column('duration', sa.Integer(), nullable=True),
+    sa.Column('format', sa.String(length=10), nullable=True),
+    sa.Column('uploaded_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['note_id'], ['audio_notes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('note_processing',
+    sa.Column('id', sa.UUID(), nullable=False),
+    sa.Column('note_id', sa.UUID(), nullable=False),
+    sa.Column('task_type', sa.String(length=50), nullable=False),
+    sa.Column('status', sa.String(length=20), nullable=False),
+    sa.Column('error_message', sa.Text(), nullable=True),
+    sa.Column('started_at', sa.DateTime(), nullable=True),
+    sa.Column('completed_at', sa.DateTime(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['note_id'], ['audio_notes.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('note_processing')
+    op.drop_table('audio_files')
+    op.drop_table('audio_notes')
@@ -0,0 +1,36 @@
+"""indexes for note listing, tag filter and processing/audio file lookups
+
+Все индексы строятся CONCURRENTLY - таблицы остаются доступными на запись
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-19 13:20:00.000000
+
+"""
+from typing import Sequence, Union
+
+from migrations.online import create_index_concurrently, drop_index_concurrently
+
+# revision identifiers, used by Alembic.
+revision: str = '0002'
+down_revision: Union[str, None] = '0001'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    # сортировка списка заметок по created_at
+    create_index_concurrently('ix_audio_notes_created_at', 'audio_notes', ['created_at'])
+    # фильтр tags @> '["tag"]', jsonb_path_ops компактнее и поддерживает только @>
+    create_index_concurrently('ix_audio_notes_tags', 'audio_notes', ['tags'],
+                              postgresql_using='gin', postgresql_ops={'tags': 'jsonb_path_ops'})
+    # postgres не индексирует внешние ключи сам
+    create_index_concurrently('ix_note_processing_note_id_task_type', 'note_processing', ['note_id', 'task_type'])
+    create_index_concurrently('ix_audio_files_note_id', 'audio_files', ['note_id'])
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_audio_files_note_id', 'audio_files')
+    drop_index_concurrently('ix_note_processing_note_id_task_type', 'note_processing')
+    drop_index_concurrently('ix_audio_notes_tags', 'audio_notes')
+    drop_index_concurrently('ix_audio_notes_created_at', 'audio_notes')
@@ -0,0 +1,67 @@
+"""full text search column for audio_notes
+
+Колонка search_vector (tsvector) без GENERATED ALWAYS: добавление генерируемой колонки переписывает
+всю таблицу под ACCESS EXCLUSIVE. Вместо этого:
+  1. ADD COLUMN без default - только изменение каталога
+  2. триггер заполняет колонку для новых и изменяемых строк
+  3. существующие строки заполняются батчами (online.backfill)
+  4. GIN индекс строится CONCURRENTLY
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-19 13:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+from sqlalchemy.dialects import postgresql
+import sqlalchemy as sa
+
+from migrations.online import backfill, create_index_concurrently, drop_index_concurrently, set_lock_timeout
+
+# revision identifiers, used by Alembic.
+revision: str = '0003'
+down_revision: Union[str, None] = '0002'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# 'simple' - без стемминга, заметки на разных языках
+SEARCH_DOCUMENT = (
+    "to_tsvector('simple', coalesce({row}title, '') || ' ' || coalesce({row}notes, '') "
+    "|| ' ' || coalesce({row}transcription, ''))"
+)
+
+
+def upgrade() -> None:
+    set_lock_timeout()
+    op.add_column('audio_notes', sa.Column('search_vector', postgresql.TSVECTOR(), nullable=True))
+
+    op.execute(f"""
+        CREATE OR REPLACE FUNCTION audio_notes_search_vector_update() RETURNS trigger AS $$
+        BEGIN
+            NEW.search_vector := {SEARCH_DOCUMENT.format(row='NEW.')};
+            RETURN NEW;
+        END
+        $$ LANGUAGE plpgsql
+    """)
+    op.execute("DROP TRIGGER IF EXISTS audio_notes_search_vector_update ON audio_notes")
+    op.execute("""
+        CREATE TRIGGER audio_notes_search_vector_update
+        BEFORE INSERT OR UPDATE OF title, notes, transcription ON audio_notes
+        FOR EACH ROW EXECUTE FUNCTION audio_notes_search_vector_update()
+    """)
+
+    backfill('audio_notes', f"search_vector = {SEARCH_DOCUMENT.format(row='')}",
+             where="search_vector IS NULL", batch_size=2000, label="backfill audio_notes.search_vector")
+
+    create_index_concurrently('ix_audio_notes_search_vector', 'audio_notes', ['search_vector'],
+                              postgresql_using='gin')
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_audio_notes_search_vector', 'audio_notes')
+    set_lock_timeout()
+    op.execute("DROP TRIGGER IF EXISTS audio_notes_search_vector_update ON audio_notes")
+    op.execute("DROP FUNCTION IF EXISTS audio_notes_search_vector_update()")
+    op.drop_column('audio_notes', 'search_vector')
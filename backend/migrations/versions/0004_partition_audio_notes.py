@@ -0,0 +1,94 @@
+"""monthly range partitioning of audio_notes by created_at
+
+Таблица не копируется: существующая audio_notes становится партицией audio_notes_legacy
+(MINVALUE .. boundary), новые заметки попадают в месячные партиции начиная с boundary.
+  1. FK note_processing/audio_files -> audio_notes.id удаляются: у секционированной таблицы
+     уникальность только вместе с ключом секционирования (id, created_at)
+  2. уникальный индекс (id, created_at) строится CONCURRENTLY и становится первичным ключом партиции
+  3. CHECK (created_at < boundary) NOT VALID + VALIDATE: ATTACH PARTITION не сканирует таблицу под блокировкой
+  4. одна короткая транзакция: переименование, новая секционированная audio_notes, ATTACH старой таблицы
+     (ее индексы подключаются к индексам родителя без перестроения), месячные партиции вперед
+Дальше партиции создаются заранее через partitions.py ensure (и init_db.py при каждом деплое)
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-19 15:10:00.000000
+
+"""
+from datetime import date, datetime
+from typing import Sequence, Union
+
+from alembic import op
+
+from migrations.online import create_index_concurrently, set_lock_timeout
+
+# revision identifiers, used by Alembic.
+revision: str = '0004'
+down_revision: Union[str, None] = '0003'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+MONTHS_AHEAD = 3
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def upgrade() -> None:
+    # с запасом в месяц: старое приложение продолжает писать в таблицу до переключения
+    boundary = add_months(datetime.utcnow().date().replace(day=1), 2)
+
+    set_lock_timeout()
+    op.execute("ALTER TABLE note_processing DROP CONSTRAINT IF EXISTS note_processing_note_id_fkey")
+    op.execute("ALTER TABLE audio_files DROP CONSTRAINT IF EXISTS audio_files_note_id_fkey")
+    op.execute("ALTER TABLE audio_notes DROP CONSTRAINT IF EXISTS audio_notes_partition_range")
+    op.execute(f"""
+        ALTER TABLE audio_notes ADD CONSTRAINT audio_notes_partition_range
+        CHECK (created_at < '{boundary}') NOT VALID
+    """)
+
+    create_index_concurrently('audio_notes_id_created_at_key', 'audio_notes', ['id', 'created_at'], unique=True)
+
+    # VALIDATE держит только SHARE UPDATE EXCLUSIVE - чтение и запись продолжаются
+    with op.get_context().autocommit_block():
+        op.execute("ALTER TABLE audio_notes VALIDATE CONSTRAINT audio_notes_partition_range")
+
+    set_lock_timeout()
+    op.execute("ALTER TABLE audio_notes RENAME TO audio_notes_legacy")
+    op.execute("ALTER TABLE audio_notes_legacy DROP CONSTRAINT audio_notes_pkey")
+    op.execute("""
+        ALTER TABLE audio_notes_legacy ADD CONSTRAINT audio_notes_legacy_pkey
+        PRIMARY KEY USING INDEX audio_notes_id_created_at_key
+    """)
+    for index in ('created_at', 'tags', 'search_vector'):
+        op.execute(f"ALTER INDEX ix_audio_notes_{index} RENAME TO audio_notes_legacy_{index}_idx")
+    op.execute("DROP TRIGGER audio_notes_search_vector_update ON audio_notes_legacy")
+
+    op.execute("CREATE TABLE audio_notes (LIKE audio_notes_legacy INCLUDING DEFAULTS) PARTITION BY RANGE (created_at)")
+    op.execute("ALTER TABLE audio_notes ADD CONSTRAINT audio_notes_pkey PRIMARY KEY (id, created_at)")
+    op.execute("CREATE INDEX ix_audio_notes_created_at ON audio_notes (created_at)")
+    op.execute("CREATE INDEX ix_audio_notes_tags ON audio_notes USING gin (tags jsonb_path_ops)")
+    op.execute("CREATE INDEX ix_audio_notes_search_vector ON audio_notes USING gin (search_vector)")
+    # триггер родителя клонируется на все партиции
+    op.execute("""
+        CREATE TRIGGER audio_notes_search_vector_update
+        BEFORE INSERT OR UPDATE OF title, notes, transcription ON audio_notes
+        FOR EACH ROW EXECUTE FUNCTION audio_notes_search_vector_update()
+    """)
+
+    op.execute(f"ALTER TABLE audio_notes ATTACH PARTITION audio_notes_legacy FOR VALUES FROM (MINVALUE) TO ('{boundary}')")
+    op.execute("ALTER TABLE audio_notes_legacy DROP CONSTRAINT audio_notes_partition_range")
+
+    for offset in range(MONTHS_AHEAD):
+        start, end = add_months(boundary, offset), add_months(boundary, offset + 1)
+        op.execute(f"""
+            CREATE TABLE IF NOT EXISTS audio_notes_p{start:%Y_%m} PARTITION OF audio_notes
+            FOR VALUES FROM ('{start}') TO ('{end}')
+        """)
+
+
+def downgrade() -> None:
+    # обратное превращение требует переписать все строки в одну таблицу - только вручную, из бэкапа
+    raise NotImplementedError("audio_notes partitioning can't be reverted automatically")
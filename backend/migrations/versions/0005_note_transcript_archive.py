@@ -0,0 +1,79 @@
+"""side table for transcripts and summaries of old notes
+
+Архивация (partitions.py archive) переносит transcription/summary старых заметок в audio_note_archives,
+горячие партиции audio_notes остаются компактными. Чтение идет через LEFT JOIN (NoteDBInteraction).
+ADD COLUMN с константным default в postgres 11+ - только изменение каталога, без перезаписи таблицы
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-19 15:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.online import set_lock_timeout
+
+# revision identifiers, used by Alembic.
+revision: str = '0005'
+down_revision: Union[str, None] = '0004'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_FUNCTION = """
+    CREATE OR REPLACE FUNCTION audio_notes_search_vector_update() RETURNS trigger AS $$
+    DECLARE
+        transcript text := NEW.transcription;
+    BEGIN
+        {archived}
+        NEW.search_vector := to_tsvector('simple', coalesce(NEW.title, '') || ' ' || coalesce(NEW.notes, '')
+            || ' ' || coalesce(transcript, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+# транскрипт переносится в архив (текст не меняется) - вектор остается прежним,
+# при других изменениях архивной заметки транскрипт берется из архива
+ARCHIVED_BRANCH = """
+        IF TG_OP = 'UPDATE' AND NEW.transcript_archived AND NEW.transcription IS NULL THEN
+            IF OLD.transcription IS NOT NULL AND NEW.title IS NOT DISTINCT FROM OLD.title
+                    AND NEW.notes IS NOT DISTINCT FROM OLD.notes THEN
+                RETURN NEW;
+            END IF;
+            SELECT a.transcription INTO transcript FROM audio_note_archives a WHERE a.note_id = NEW.id;
+        END IF;
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        'audio_note_archives',
+        sa.Column('note_id', sa.UUID(), nullable=False),
+        sa.Column('transcription', sa.Text(), nullable=True),
+        sa.Column('summary', sa.Text(), nullable=True),
+        sa.Column('archived_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('note_id')
+    )
+
+    set_lock_timeout()
+    op.add_column('audio_notes', sa.Column('transcript_archived', sa.Boolean(),
+                                           server_default=sa.false(), nullable=False))
+    op.execute(SEARCH_VECTOR_FUNCTION.format(archived=ARCHIVED_BRANCH))
+
+
+def downgrade() -> None:
+    # транскрипты возвращаются в audio_notes до удаления архива
+    op.execute("""
+        UPDATE audio_notes n
+        SET transcription = coalesce(n.transcription, a.transcription),
+            summary = coalesce(n.summary, a.summary),
+            transcript_archived = false
+        FROM audio_note_archives a
+        WHERE a.note_id = n.id
+    """)
+    op.execute(SEARCH_VECTOR_FUNCTION.format(archived=""))
+    op.drop_column('audio_notes', 'transcript_archived')
+    op.drop_table('audio_note_archives')
@@ -0,0 +1,35 @@
+"""composite (status, created_at) and partial updated_at index for notes still in processing
+
+audio_notes секционирована (0004) - индексы строятся по партициям, см. create_partitioned_index_concurrently
+  - (status, created_at): фильтр по одному или нескольким статусам + диапазон дат / сортировка по дате
+  - (updated_at) WHERE status незавершенный: все незавершенные заметки одним упорядоченным диапазоном
+    (поиск зависших, updated_before), в индекс попадает небольшая доля строк (основная масса - completed)
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-19 17:40:00.000000
+
+"""
+from typing import Sequence, Union
+
+from migrations.online import create_partitioned_index_concurrently, drop_partitioned_index
+
+# revision identifiers, used by Alembic.
+revision: str = '0006'
+down_revision: Union[str, None] = '0005'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# зафиксировано на момент миграции, совпадает с models.note.ACTIVE_STATUS_PREDICATE
+ACTIVE_STATUS_PREDICATE = "status IN ('pending', 'uploading', 'pending_transcription', 'pending_summarization')"
+
+
+def upgrade() -> None:
+    create_partitioned_index_concurrently('ix_audio_notes_status_created_at', 'audio_notes', '(status, created_at)')
+    create_partitioned_index_concurrently('ix_audio_notes_active_updated_at', 'audio_notes', '(updated_at)',
+                                          where=ACTIVE_STATUS_PREDICATE)
+
+
+def downgrade() -> None:
+    drop_partitioned_index('ix_audio_notes_active_updated_at')
+    drop_partitioned_index('ix_audio_notes_status_created_at')
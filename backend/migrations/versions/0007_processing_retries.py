@@ -0,0 +1,53 @@
+"""attempts and due_at on note_processing for the stale job reaper, S3 key lookup indexes
+
+  - attempts/due_at: ADD COLUMN с константным default и nullable - только изменение каталога
+  - due_at незавершенных этапов заполняется по started_at (таймауты на момент миграции)
+  - частичный индекс по due_at незавершенных этапов - очередь reaper
+  - индексы по audio_notes.audio_path и audio_files.file_path - поиск ключей S3 без ссылок
+
+Revision ID: 0007
+Revises: 0006
+Create Date: 2026-10-19 19:10:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+
+from migrations.online import (backfill, create_index_concurrently, create_partitioned_index_concurrently,
+                               drop_index_concurrently, drop_partitioned_index, set_lock_timeout)
+
+# revision identifiers, used by Alembic.
+revision: str = '0007'
+down_revision: Union[str, None] = '0006'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    set_lock_timeout()
+    op.add_column('note_processing', sa.Column('attempts', sa.Integer(), server_default='0', nullable=False))
+    op.add_column('note_processing', sa.Column('due_at', sa.DateTime(), nullable=True))
+
+    backfill(
+        'note_processing',
+        "due_at = coalesce(started_at, created_at) + CASE task_type WHEN 'upload' THEN interval '15 minutes' "
+        "ELSE interval '30 minutes' END",
+        where="completed_at IS NULL AND due_at IS NULL",
+        label="note_processing.due_at"
+    )
+
+    create_index_concurrently('ix_note_processing_due_at', 'note_processing', ['due_at'],
+                              postgresql_where=sa.text('completed_at IS NULL'))
+    create_partitioned_index_concurrently('ix_audio_notes_audio_path', 'audio_notes', '(audio_path)')
+    create_index_concurrently('ix_audio_files_file_path', 'audio_files', ['file_path'])
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_audio_files_file_path', 'audio_files')
+    drop_partitioned_index('ix_audio_notes_audio_path')
+    drop_index_concurrently('ix_note_processing_due_at', 'note_processing')
+    set_lock_timeout()
+    op.drop_column('note_processing', 'due_at')
+    op.drop_column('note_processing', 'attempts')
@@ -0,0 +1,48 @@
+"""per-user note indexes, legacy notes assigned to the default user
+
+До 0008 user_id был заглушкой (случайный uuid на каждую заметку) и ни один запрос по нему не фильтровал.
+  - существующие заметки передаются пользователю по умолчанию (DEFAULT_USER_ID, однопользовательский режим):
+    батчами по первичному ключу, каждый батч - своя транзакция
+  - (user_id, created_at, id): список пользователя по дате - диапазон индекса, размер таблицы не влияет
+  - (user_id, status, created_at): фильтр по статусам внутри пользователя с сортировкой по дате
+Поиск и теги остаются на GIN индексах (в GIN нельзя поставить user_id первым без btree_gin),
+планировщик объединяет их с индексом пользователя через BitmapAnd
+
+Revision ID: 0008
+Revises: 0007
+Create Date: 2026-10-19 21:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from migrations.online import backfill, create_partitioned_index_concurrently, drop_partitioned_index
+
+# revision identifiers, used by Alembic.
+revision: str = '0008'
+down_revision: Union[str, None] = '0007'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+# однопользовательский режим (DEFAULT_USER_ID) должен указывать на этого пользователя, чтобы видеть старые заметки
+LEGACY_USER_ID = "00000000-0000-0000-0000-000000000000"
+
+
+def upgrade() -> None:
+    # индексы строятся после заполнения - батчи не обновляют их лишний раз
+    backfill(
+        'audio_notes',
+        f"user_id = '{LEGACY_USER_ID}'",
+        where=f"user_id <> '{LEGACY_USER_ID}'",
+        label="audio_notes.user_id"
+    )
+
+    create_partitioned_index_concurrently('ix_audio_notes_user_created_at', 'audio_notes',
+                                          '(user_id, created_at, id)')
+    create_partitioned_index_concurrently('ix_audio_notes_user_status', 'audio_notes',
+                                          '(user_id, status, created_at)')
+
+
+def downgrade() -> None:
+    # исходные случайные user_id не восстанавливаются - они ничего не значили
+    drop_partitioned_index('ix_audio_notes_user_status')
+    drop_partitioned_index('ix_audio_notes_user_created_at')
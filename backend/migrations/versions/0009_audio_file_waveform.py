@@ -0,0 +1,39 @@
+"""waveform peaks artifact on audio_files
+
+  - waveform_path / waveform_levels: nullable ADD COLUMN без default - только изменение каталога
+  - индекс по waveform_path - поиск ключей S3 без ссылок (ProcessingReaper.delete_orphans)
+
+Revision ID: 0009
+Revises: 0008
+Create Date: 2026-10-19 22:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from migrations.online import create_index_concurrently, drop_index_concurrently, set_lock_timeout
+
+# revision identifiers, used by Alembic.
+revision: str = '0009'
+down_revision: Union[str, None] = '0008'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    set_lock_timeout()
+    op.add_column('audio_files', sa.Column('waveform_path', sa.String(length=500), nullable=True))
+    op.add_column('audio_files', sa.Column('waveform_levels', postgresql.JSONB(astext_type=sa.Text()),
+                                           nullable=True))
+
+    create_index_concurrently('ix_audio_files_waveform_path', 'audio_files', ['waveform_path'])
+
+
+def downgrade() -> None:
+    drop_index_concurrently('ix_audio_files_waveform_path', 'audio_files')
+    set_lock_timeout()
+    op.drop_column('audio_files', 'waveform_levels')
+    op.drop_column('audio_files', 'waveform_path')
@@ -0,0 +1,56 @@
+"""note_embeddings: transcription/summary vectors for semantic search (pgvector)
+
+  - расширение vector (pgvector >= 0.5 для HNSW); нужны права на CREATE EXTENSION
+    или заранее установленное расширение в базе
+  - одна строка на (заметка, вид текста); embedding IS NULL - очередь индексатора (частичный индекс по queued_at)
+  - HNSW по косинусному расстоянию - приближенный поиск соседей; (user_id, model) - точный поиск
+    у пользователей с небольшим числом векторов
+  - размерность 384 совпадает с EMBEDDING_DIM по умолчанию (all-MiniLM-L6-v2);
+    другая модель с другой размерностью - новая миграция
+
+Revision ID: 0010
+Revises: 0009
+Create Date: 2026-10-19 23:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0010'
+down_revision: Union[str, None] = '0009'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+EMBEDDING_DIM = 384
+
+
+def upgrade() -> None:
+    op.execute("CREATE EXTENSION IF NOT EXISTS vector")
+    op.create_table(
+        'note_embeddings',
+        sa.Column('note_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('model', sa.String(length=200), nullable=True),
+        sa.Column('attempts', sa.Integer(), server_default='0', nullable=False),
+        sa.Column('error_message', sa.Text(), nullable=True),
+        sa.Column('queued_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.Column('embedded_at', sa.DateTime(), nullable=True),
+        sa.PrimaryKeyConstraint('note_id', 'kind')
+    )
+    # тип расширения - без модели приложения, миграция не зависит от ее будущих изменений
+    op.execute(f"ALTER TABLE note_embeddings ADD COLUMN embedding vector({EMBEDDING_DIM})")
+    op.create_index('ix_note_embeddings_user_id', 'note_embeddings', ['user_id', 'model'])
+    op.create_index('ix_note_embeddings_queued', 'note_embeddings', ['queued_at'],
+                    postgresql_where=sa.text('embedding IS NULL'))
+    op.create_index('ix_note_embeddings_hnsw', 'note_embeddings', ['embedding'],
+                    postgresql_using='hnsw', postgresql_ops={'embedding': 'vector_cosine_ops'})
+
+
+def downgrade() -> None:
+    # расширение остается: его могут использовать другие таблицы
+    op.drop_table('note_embeddings')
@@ -0,0 +1,105 @@
+"""transcript segments with audio offsets
+
+  - transcript_segments: (note_id, start_ms) -> end_ms, text; новая пустая таблица, поэтому
+    search_vector - GENERATED STORED колонка, а не триггер + backfill
+  - (note_id, end_ms) - окно транскрипта [from_ms, to_ms) без чтения всего текста
+  - audio_notes.transcript_segmented: ADD COLUMN с константным default - только изменение каталога;
+    у таких заметок transcription IS NULL, текст собирается из сегментов
+  - триггер search_vector заметки берет текст сегментов и срабатывает на смену transcript_segmented
+
+Revision ID: 0011
+Revises: 0010
+Create Date: 2026-10-20 00:30:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from migrations.online import set_lock_timeout
+
+# revision identifiers, used by Alembic.
+revision: str = '0011'
+down_revision: Union[str, None] = '0010'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+SEARCH_VECTOR_FUNCTION = """
+    CREATE OR REPLACE FUNCTION audio_notes_search_vector_update() RETURNS trigger AS $$
+    DECLARE
+        transcript text := NEW.transcription;
+    BEGIN
+        IF TG_OP = 'UPDATE' AND NEW.transcript_archived AND NEW.transcription IS NULL THEN
+            IF OLD.transcription IS NOT NULL AND NEW.title IS NOT DISTINCT FROM OLD.title
+                    AND NEW.notes IS NOT DISTINCT FROM OLD.notes THEN
+                RETURN NEW;
+            END IF;
+            SELECT a.transcription INTO transcript FROM audio_note_archives a WHERE a.note_id = NEW.id;
+        END IF;
+        {segmented}
+        NEW.search_vector := to_tsvector('simple', coalesce(NEW.title, '') || ' ' || coalesce(NEW.notes, '')
+            || ' ' || coalesce(transcript, ''));
+        RETURN NEW;
+    END
+    $$ LANGUAGE plpgsql
+"""
+
+# сегменты пишутся до смены флага в той же транзакции (NoteDBInteraction.replace_segments)
+SEGMENTED_BRANCH = """
+        IF NEW.transcript_segmented AND transcript IS NULL THEN
+            SELECT string_agg(s.text, ' ' ORDER BY s.start_ms) INTO transcript
+            FROM transcript_segments s WHERE s.note_id = NEW.id;
+        END IF;
+"""
+
+TRIGGER = """
+    CREATE TRIGGER audio_notes_search_vector_update
+    BEFORE INSERT OR UPDATE OF {columns} ON audio_notes
+    FOR EACH ROW EXECUTE FUNCTION audio_notes_search_vector_update()
+"""
+
+
+def upgrade() -> None:
+    op.create_table(
+        'transcript_segments',
+        sa.Column('note_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('start_ms', sa.Integer(), nullable=False),
+        sa.Column('end_ms', sa.Integer(), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('text', sa.Text(), nullable=False),
+        sa.Column('search_vector', postgresql.TSVECTOR(),
+                  sa.Computed("to_tsvector('simple', text)", persisted=True), nullable=True),
+        sa.PrimaryKeyConstraint('note_id', 'start_ms')
+    )
+    op.create_index('ix_transcript_segments_note_end', 'transcript_segments', ['note_id', 'end_ms'])
+    op.create_index('ix_transcript_segments_search_vector', 'transcript_segments', ['search_vector'],
+                    postgresql_using='gin')
+
+    set_lock_timeout()
+    op.add_column('audio_notes', sa.Column('transcript_segmented', sa.Boolean(),
+                                           server_default=sa.false(), nullable=False))
+    op.execute(SEARCH_VECTOR_FUNCTION.format(segmented=SEGMENTED_BRANCH))
+    # триггер родителя клонируется на все партиции
+    op.execute("DROP TRIGGER audio_notes_search_vector_update ON audio_notes")
+    op.execute(TRIGGER.format(columns="title, notes, transcription, transcript_segmented"))
+
+
+def downgrade() -> None:
+    # собранный текст возвращается в transcription до удаления сегментов
+    op.execute("""
+        UPDATE audio_notes n
+        SET transcription = s.transcript, transcript_segmented = false
+        FROM (
+            SELECT note_id, string_agg(text, ' ' ORDER BY start_ms) AS transcript
+            FROM transcript_segments GROUP BY note_id
+        ) s
+        WHERE s.note_id = n.id AND n.transcript_segmented
+    """)
+    set_lock_timeout()
+    op.execute("DROP TRIGGER audio_notes_search_vector_update ON audio_notes")
+    op.execute(TRIGGER.format(columns="title, notes, transcription"))
+    op.execute(SEARCH_VECTOR_FUNCTION.format(segmented=""))
+    op.drop_column('audio_notes', 'transcript_segmented')
+    op.drop_table('transcript_segments')
@@ -0,0 +1,43 @@
+"""note_texts: compressed transcript/summary documents served as is
+
+  - (note_id, kind) -> готовое тело ответа /notes/{id}/transcription или /summary, сжатое gzip/zstd;
+    отдается с Content-Encoding без распаковки; исходные колонки и сегменты не меняются
+  - body - STORAGE EXTERNAL: байты уже сжаты, pglz TOAST только тратил бы CPU на запись
+    и распаковку при чтении; большие тела по-прежнему выносятся в TOAST-таблицу
+  - новая пустая таблица; документы существующих заметок - python texts.py backfill
+
+Revision ID: 0012
+Revises: 0011
+Create Date: 2026-10-20 02:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0012'
+down_revision: Union[str, None] = '0011'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'note_texts',
+        sa.Column('note_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('kind', sa.String(length=20), nullable=False),
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('encoding', sa.String(length=10), nullable=False),
+        sa.Column('body', sa.LargeBinary(), nullable=False),
+        sa.Column('size', sa.Integer(), nullable=False),
+        sa.Column('updated_at', sa.DateTime(), server_default=sa.text('now()'), nullable=False),
+        sa.PrimaryKeyConstraint('note_id', 'kind')
+    )
+    op.execute("ALTER TABLE note_texts ALTER COLUMN body SET STORAGE EXTERNAL")
+
+
+def downgrade() -> None:
+    op.drop_table('note_texts')
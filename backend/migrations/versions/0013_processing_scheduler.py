@@ -0,0 +1,49 @@
+"""user_id, priority and finish_tag on note_processing for the transcription scheduler
+
+  - колонки nullable без default - только изменение каталога; у старых этапов остаются NULL
+  - частичные индексы по status = 'queued' (очередь планировщика): маленькие, строк в очереди единицы тысяч
+    - (task_type, finish_tag) - виртуальное время очереди (min) и выборка по порядку
+    - (user_id, task_type, finish_tag) - метка последней задачи пользователя (max) при постановке
+
+Revision ID: 0013
+Revises: 0012
+Create Date: 2026-10-20 03:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from migrations.online import create_index_concurrently, drop_index_concurrently, set_lock_timeout
+
+# revision identifiers, used by Alembic.
+revision: str = '0013'
+down_revision: Union[str, None] = '0012'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    set_lock_timeout()
+    op.add_column('note_processing', sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=True))
+    op.add_column('note_processing', sa.Column('priority', sa.SmallInteger(), nullable=True))
+    op.add_column('note_processing', sa.Column('finish_tag', sa.Float(), nullable=True))
+
+    create_index_concurrently('ix_note_processing_queued', 'note_processing', ['task_type', 'finish_tag'],
+                              postgresql_where=sa.text("status = 'queued'"))
+    create_index_concurrently('ix_note_processing_queued_user', 'note_processing',
+                              ['user_id', 'task_type', 'finish_tag'], postgresql_where=sa.text("status = 'queued'"))
+
+
+def downgrade() -> None:
+    # задачи из очереди подберет reaper: этап становится просроченным in_progress и уходит на повтор
+    op.execute("UPDATE note_processing SET status = 'in_progress', attempts = 1, started_at = now(), "
+               "due_at = now() WHERE status = 'queued'")
+    drop_index_concurrently('ix_note_processing_queued_user', 'note_processing')
+    drop_index_concurrently('ix_note_processing_queued', 'note_processing')
+    set_lock_timeout()
+    op.drop_column('note_processing', 'finish_tag')
+    op.drop_column('note_processing', 'priority')
+    op.drop_column('note_processing', 'user_id')
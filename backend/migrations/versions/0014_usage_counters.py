@@ -0,0 +1,38 @@
+"""usage_counters: sharded per-user counters for GET /api/v1/stats
+
+  - (user_id, metric, shard) -> value: заметки по статусу, байты и секунды аудио; значение метрики -
+    сумма шардов, транзакции прибавляют дельты к строке случайного шарда и не ждут друг друга
+  - новая пустая таблица; счетчики существующих заметок - python usage.py reconcile
+    (или первый проход сверки в воркере, USAGE_RECONCILE_INTERVAL)
+
+Revision ID: 0014
+Revises: 0013
+Create Date: 2026-10-20 04:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+# revision identifiers, used by Alembic.
+revision: str = '0014'
+down_revision: Union[str, None] = '0013'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    op.create_table(
+        'usage_counters',
+        sa.Column('user_id', postgresql.UUID(as_uuid=True), nullable=False),
+        sa.Column('metric', sa.String(length=40), nullable=False),
+        sa.Column('shard', sa.SmallInteger(), nullable=False),
+        sa.Column('value', sa.BigInteger(), nullable=False),
+        sa.PrimaryKeyConstraint('user_id', 'metric', 'shard')
+    )
+
+
+def downgrade() -> None:
+    op.drop_table('usage_counters')
@@ -0,0 +1,35 @@
+"""waveform version on audio_notes for immutable waveform URLs
+
+  - waveform_version: id файла (audio_files.id) с готовыми пиками, клиент строит из него
+    /notes/{id}/waveform?v=<waveform_version> и кэширует ответ навсегда
+  - nullable ADD COLUMN без default на родителе секционированной таблицы - только изменение каталога;
+    у существующих пиков версии нет, они отдаются по URL без v (ревалидация по ETag) до перезагрузки аудио
+
+Revision ID: 0015
+Revises: 0014
+Create Date: 2026-10-20 05:00:00.000000
+
+"""
+from typing import Sequence, Union
+
+from alembic import op
+import sqlalchemy as sa
+from sqlalchemy.dialects import postgresql
+
+from migrations.online import set_lock_timeout
+
+# revision identifiers, used by Alembic.
+revision: str = '0015'
+down_revision: Union[str, None] = '0014'
+branch_labels: Union[str, Sequence[str], None] = None
+depends_on: Union[str, Sequence[str], None] = None
+
+
+def upgrade() -> None:
+    set_lock_timeout()
+    op.add_column('audio_notes', sa.Column('waveform_version', postgresql.UUID(as_uuid=True), nullable=True))
+
+
+def downgrade() -> None:
+    set_lock_timeout()
+    op.drop_column('audio_notes', 'waveform_version')
@@ -1,6 +1,6 @@
-from sqlalchemy import String, Integer, ForeignKey
+from sqlalchemy import String, Integer, Index
 from sqlalchemy.orm import Mapped, mapped_column, relationship
-from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.dialects.postgresql import JSONB, UUID
 from sqlalchemy.sql import func
 from datetime import datetime
 from typing import Optional
@@ -11,15 +11,21 @@ from .base_model  import BaseModel
 class AudioFile(BaseModel):
     __tablename__ = "audio_files"
 
+    __table_args__ = (
+        Index("ix_audio_files_note_id", "note_id"),
+        Index("ix_audio_files_file_path", "file_path"),
+        Index("ix_audio_files_waveform_path", "waveform_path"),
+    )
+
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
         primary_key=True,
         default=uuid.uuid4
     )
 
+    # без FK: audio_notes секционирована, уникален только (id, created_at)
     note_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
-        ForeignKey('audio_notes.id'),
         nullable=False
     )
 
@@ -28,6 +34,11 @@ class AudioFile(BaseModel):
     duration: Mapped[Optional[int]] = mapped_column(Integer, nullable=True)
     format: Mapped[Optional[str]] = mapped_column(String(10), nullable=True)
 
+    # пики для плеера: ключ .dat артефакта в S3 и оглавление уровней
+    # [{samples_per_pixel, length, offset, size}] от детального к грубому (services/waveform_service.py)
+    waveform_path: Mapped[Optional[str]] = mapped_column(String(500), nullable=True)
+    waveform_levels: Mapped[Optional[list]] = mapped_column(JSONB, nullable=True)
+
     uploaded_at: Mapped[datetime] = mapped_column(default=func.now())
 
     # TODO - связь с  таблицей обработки
@@ -1,8 +1,8 @@
 #from json.decoder import JSONObject
 from typing import Optional, List
 
-from sqlalchemy import Column, String, DateTime, Text, JSON, ForeignKey
-from sqlalchemy.dialects.postgresql import UUID, JSONB
+from sqlalchemy import Boolean, Column, String, DateTime, Text, JSON, ForeignKey, Index, false, text
+from sqlalchemy.dialects.postgresql import UUID, JSONB, TSVECTOR
 from sqlalchemy.sql import func
 import uuid
 from datetime import datetime
@@ -10,11 +10,39 @@ from datetime import datetime
 from sqlalchemy.orm import  Mapped, mapped_column
 from .base_model import BaseModel
 
+# статусы заметки: пока заметка в ACTIVE_NOTE_STATUSES, ее обрабатывает pipeline,
+# completed/error - конечные (в них остается подавляющая часть заметок)
+ACTIVE_NOTE_STATUSES = ("pending", "uploading", "pending_transcription", "pending_summarization")
+TERMINAL_NOTE_STATUSES = ("completed", "error")
+NOTE_STATUSES = ACTIVE_NOTE_STATUSES + TERMINAL_NOTE_STATUSES
+# условие частичного индекса ix_audio_notes_active_updated_at (миграция 0006)
+ACTIVE_STATUS_PREDICATE = f"status IN ({', '.join(repr(status) for status in ACTIVE_NOTE_STATUSES)})"
+
 
 class AudioNote(BaseModel):
     # сущность в БД для заметок
     __tablename__ = "audio_notes"
 
+    # индексы создаются миграциями (CONCURRENTLY), здесь - чтобы autogenerate не предлагал их удалить
+    # таблица секционирована по месяцам created_at (миграция 0004), первичный ключ в БД и в ORM - (id, created_at):
+    # flush ORM пишет по обоим столбцам и попадает в одну секцию, а запросы репозитория WHERE id = :id проверяют
+    # все секции. Уникальность одного id БД не гарантирует (у секционированной таблицы нет такого индекса,
+    # FK audio_files/note_processing на заметку сняты) - она держится на uuid4 при создании
+    __table_args__ = (
+        Index("ix_audio_notes_created_at", "created_at"),
+        Index("ix_audio_notes_tags", "tags", postgresql_using="gin", postgresql_ops={"tags": "jsonb_path_ops"}),
+        Index("ix_audio_notes_search_vector", "search_vector", postgresql_using="gin"),
+        Index("ix_audio_notes_status_created_at", "status", "created_at"),
+        # частичный индекс только по незавершенным заметкам - маленький, для поиска зависших
+        Index("ix_audio_notes_active_updated_at", "updated_at", postgresql_where=text(ACTIVE_STATUS_PREDICATE)),
+        # поиск ключей S3 без ссылок (ProcessingReaper.delete_orphans)
+        Index("ix_audio_notes_audio_path", "audio_path"),
+        # запросы пользователя (миграция 0008): список по дате и фильтр по статусу читают только его строки
+        Index("ix_audio_notes_user_created_at", "user_id", "created_at", "id"),
+        Index("ix_audio_notes_user_status", "user_id", "status", "created_at"),
+        {"postgresql_partition_by": "RANGE (created_at)"},
+    )
+
     # маппинг свойств сущности
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -22,11 +50,10 @@ class AudioNote(BaseModel):
         default=uuid.uuid4
     )
 
-    # user_id пока заглушка
+    # владелец заметки, задается репозиторием из пользователя запроса (core.auth)
     user_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
-        nullable=False,
-        default=uuid.uuid4
+        nullable=False
     )
 
     # базовая информация о заметке
@@ -50,8 +77,23 @@ class AudioNote(BaseModel):
     transcription: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
     summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
+    # transcription/summary перенесены в audio_note_archives (старые заметки, см. NoteArchive)
+    transcript_archived: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false(), nullable=False)
+
+    # транскрипт хранится сегментами с таймкодами (TranscriptSegment), transcription IS NULL -
+    # полный текст собирается из сегментов при чтении (NoteDBInteraction)
+    transcript_segmented: Mapped[bool] = mapped_column(Boolean, default=False, server_default=false(), nullable=False)
+
+    # версия пиков waveform - id файла (audio_files.id), для которого они посчитаны (миграция 0015):
+    # клиент запрашивает /notes/{id}/waveform?v=<waveform_version>, такой ответ кэшируется навсегда
+    waveform_version: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), nullable=True)
+
+    # полнотекстовый поиск по title/notes/transcription, заполняется триггером в БД (миграция 0003)
+    # deferred - не загружается вместе с заметкой
+    search_vector: Mapped[Optional[str]] = mapped_column(TSVECTOR, nullable=True, deferred=True)
+
     # таймстампы
-    created_at: Mapped[datetime] = mapped_column(default=func.now(), nullable=False)
+    created_at: Mapped[datetime] = mapped_column(primary_key=True, default=func.now(), nullable=False)
     updated_at: Mapped[datetime] = mapped_column(default=func.now(), onupdate=func.now(), nullable=False)
 
     # TODO - processing task relationship
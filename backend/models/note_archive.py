@@ -0,0 +1,20 @@
+from datetime import datetime
+import uuid
+from typing import Optional
+
+from sqlalchemy import Text
+from sqlalchemy.sql import func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import mapped_column, Mapped
+
+from .base_model import BaseModel
+
+
+class NoteArchive(BaseModel):
+    # транскрипты и саммари старых заметок, вынесенные из горячих партиций audio_notes
+    __tablename__ = "audio_note_archives"
+
+    note_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    transcription: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    summary: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    archived_at: Mapped[datetime] = mapped_column(server_default=func.now())
@@ -0,0 +1,65 @@
+from datetime import datetime
+import uuid
+from typing import List, Optional
+
+from sqlalchemy import Float, Index, Integer, String, Text
+from sqlalchemy.sql import func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import mapped_column, Mapped
+from sqlalchemy.types import UserDefinedType
+
+from core.config import settings
+from core.embeddings import parse_vector, vector_literal
+from .base_model import BaseModel
+
+
+class Vector(UserDefinedType):
+    # тип vector(dim) pgvector без пакета pgvector: значения передаются текстом "[x,y,...]"
+    cache_ok = True
+
+    def __init__(self, dim: int):
+        self.dim = dim
+
+    def get_col_spec(self, **kwargs) -> str:
+        return f"vector({self.dim})"
+
+    def bind_processor(self, dialect):
+        def process(value):
+            if value is None or isinstance(value, str):
+                return value
+            return vector_literal(value)
+        return process
+
+    def result_processor(self, dialect, coltype):
+        return parse_vector
+
+    class comparator_factory(UserDefinedType.Comparator):
+        def cosine_distance(self, other):
+            return self.op("<=>", return_type=Float)(other)
+
+
+# что векторизуется: транскрипт и саммари отдельно, заметка находится по лучшему из двух
+EMBEDDING_KINDS = ("transcription", "summary")
+
+
+class NoteEmbedding(BaseModel):
+    # вектор текста заметки; embedding IS NULL - текст изменился и ждет индексатора (очередь, частичный индекс)
+    # без FK: audio_notes секционирована, уникален только (id, created_at)
+    __tablename__ = "note_embeddings"
+
+    __table_args__ = (
+        Index("ix_note_embeddings_user_id", "user_id", "model"),
+        Index("ix_note_embeddings_queued", "queued_at", postgresql_where="embedding IS NULL"),
+        Index("ix_note_embeddings_hnsw", "embedding", postgresql_using="hnsw",
+              postgresql_ops={"embedding": "vector_cosine_ops"}),
+    )
+
+    note_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    model: Mapped[Optional[str]] = mapped_column(String(200), nullable=True)
+    embedding: Mapped[Optional[List[float]]] = mapped_column(Vector(settings.EMBEDDING_DIM), nullable=True)
+    attempts: Mapped[int] = mapped_column(Integer, server_default="0", nullable=False)
+    error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
+    queued_at: Mapped[datetime] = mapped_column(server_default=func.now())
+    embedded_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
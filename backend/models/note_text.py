@@ -0,0 +1,30 @@
+from datetime import datetime
+import uuid
+
+from sqlalchemy import Integer, LargeBinary, String
+from sqlalchemy.sql import func
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import mapped_column, Mapped
+
+from .base_model import BaseModel
+
+# документы, которые отдаются как есть: JSON ответа /notes/{id}/transcription и /notes/{id}/summary
+NOTE_TEXT_KINDS = ("transcription", "summary")
+
+
+class NoteText(BaseModel):
+    # готовое сжатое тело ответа с текстом заметки (core/compression.py) - производное от transcription/summary
+    # и сегментов, пересобирается при их смене; поиск, списки и эмбеддинги работают с исходными колонками
+    # без FK: audio_notes секционирована, уникален только (id, created_at)
+    __tablename__ = "note_texts"
+
+    note_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    kind: Mapped[str] = mapped_column(String(20), primary_key=True)
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    # Content-Encoding тела: gzip, zstd или identity (маленькие документы)
+    encoding: Mapped[str] = mapped_column(String(10), nullable=False)
+    # STORAGE EXTERNAL (миграция 0012): уже сжатые байты не сжимаются TOAST повторно
+    body: Mapped[bytes] = mapped_column(LargeBinary, nullable=False)
+    # размер несжатого JSON
+    size: Mapped[int] = mapped_column(Integer, nullable=False)
+    updated_at: Mapped[datetime] = mapped_column(server_default=func.now(), onupdate=func.now())
@@ -2,17 +2,38 @@ from datetime import datetime
 import uuid
 from typing import Optional
 
-from sqlalchemy import ForeignKey, String, Text
+from sqlalchemy import Float, Index, Integer, SmallInteger, String, Text, text
 from sqlalchemy.sql import func
 from sqlalchemy.dialects.postgresql import UUID
 from sqlalchemy.orm import mapped_column, Mapped
 
 from .base_model import BaseModel
 
+# статусы этапа: [queued ->] in_progress -> completed | error, queued - транскрибация ждет места
+# у движков в планировщике (services/scheduler_service.py); зависший этап reaper переводит в retry_scheduled
+# (и снова in_progress) или, после PROCESSING_MAX_ATTEMPTS попыток, в dead_letter
+# cancelled - этап больше не нужен (заметку удалили или она уже ушла дальше по pipeline)
+QUEUED = "queued"
+RETRY_SCHEDULED = "retry_scheduled"
+DEAD_LETTER = "dead_letter"
+CANCELLED = "cancelled"
+
 class NoteProcessing(BaseModel):
     # сущность в БД для обработки
     __tablename__ = "note_processing"
 
+    # выборка этапов заметки (get_active, finish)
+    __table_args__ = (
+        Index("ix_note_processing_note_id_task_type", "note_id", "task_type"),
+        # очередь reaper: только незавершенные этапы (миграция 0007)
+        Index("ix_note_processing_due_at", "due_at", postgresql_where=text("completed_at IS NULL")),
+        # очередь планировщика: виртуальное время (min finish_tag) и выборка по порядку, хвост пользователя
+        # (max finish_tag) - миграция 0013
+        Index("ix_note_processing_queued", "task_type", "finish_tag", postgresql_where=text("status = 'queued'")),
+        Index("ix_note_processing_queued_user", "user_id", "task_type", "finish_tag",
+              postgresql_where=text("status = 'queued'")),
+    )
+
     # маппинг свойств сущности
     id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
@@ -20,9 +41,9 @@ class NoteProcessing(BaseModel):
         default=uuid.uuid4
     )
 
+    # без FK: audio_notes секционирована, уникален только (id, created_at)
     note_id: Mapped[uuid.UUID] = mapped_column(
         UUID(as_uuid=True),
-        ForeignKey('audio_notes.id'),
         nullable=False
     )
 
@@ -30,6 +51,18 @@ class NoteProcessing(BaseModel):
     status: Mapped[str] = mapped_column(String(20), default="pending")
     error_message: Mapped[Optional[str]] = mapped_column(Text, nullable=True)
 
+    # попытки выполнения и момент, когда reaper должен посмотреть на этап:
+    # для in_progress - истечение срока (этап завис), для retry_scheduled - время повтора
+    attempts: Mapped[int] = mapped_column(Integer, default=0, server_default="0", nullable=False)
+    due_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
+
+    # планировщик: владелец заметки, класс приоритета (0 - самый высокий) и метка окончания
+    # взвешенной честной очереди (виртуальное время пользователя после этой задачи)
+    user_id: Mapped[Optional[uuid.UUID]] = mapped_column(UUID(as_uuid=True), nullable=True)
+    priority: Mapped[Optional[int]] = mapped_column(SmallInteger, nullable=True)
+    finish_tag: Mapped[Optional[float]] = mapped_column(Float, nullable=True)
+
+    # started_at - публикация задачи (у queued - NULL), ожидание в очереди - started_at - created_at
     started_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
     completed_at: Mapped[Optional[datetime]] = mapped_column(nullable=True)
     created_at: Mapped[datetime] = mapped_column(default=func.now())
@@ -0,0 +1,33 @@
+import uuid
+
+from sqlalchemy import Computed, Index, Integer, Text
+from sqlalchemy.dialects.postgresql import TSVECTOR, UUID
+from sqlalchemy.orm import mapped_column, Mapped
+
+from .base_model import BaseModel
+
+
+class TranscriptSegment(BaseModel):
+    # фрагмент транскрипта с таймкодами аудио; полный текст заметки собирается из сегментов при чтении
+    # (AudioNote.transcript_segmented). Сегменты заметки не перекрываются: start_ms уникален,
+    # end_ms растет вместе с start_ms (нормализация в services/transcript_service.py)
+    # без FK: audio_notes секционирована, уникален только (id, created_at)
+    __tablename__ = "transcript_segments"
+
+    __table_args__ = (
+        # окно [from_ms, to_ms) заметки: первый сегмент, закончившийся позже from_ms, дальше по порядку
+        Index("ix_transcript_segments_note_end", "note_id", "end_ms"),
+        Index("ix_transcript_segments_search_vector", "search_vector", postgresql_using="gin"),
+    )
+
+    note_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    start_ms: Mapped[int] = mapped_column(Integer, primary_key=True)
+    end_ms: Mapped[int] = mapped_column(Integer, nullable=False)
+    # владелец заметки - поиск по сегментам ограничивается пользователем без JOIN с audio_notes
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), nullable=False)
+    text: Mapped[str] = mapped_column(Text, nullable=False)
+
+    # полнотекстовый поиск с переходом к моменту аудио, 'simple' - как у audio_notes.search_vector
+    search_vector: Mapped[str] = mapped_column(
+        TSVECTOR, Computed("to_tsvector('simple', text)", persisted=True), deferred=True
+    )
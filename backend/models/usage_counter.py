@@ -0,0 +1,28 @@
+import uuid
+
+from sqlalchemy import BigInteger, SmallInteger, String
+from sqlalchemy.dialects.postgresql import UUID
+from sqlalchemy.orm import Mapped, mapped_column
+
+from .base_model import BaseModel
+
+# метрики пользователя: заметки по статусу ("status:completed"), байты загруженного аудио и секунды аудио
+STATUS_METRIC_PREFIX = "status:"
+STORAGE_BYTES = "storage_bytes"
+AUDIO_SECONDS = "audio_seconds"
+
+
+def status_metric(status: str) -> str:
+    return f"{STATUS_METRIC_PREFIX}{status}"
+
+
+class UsageCounter(BaseModel):
+    # шардированный счетчик: значение метрики - сумма value по всем shard; транзакция прибавляет дельту
+    # к строке случайного шарда, поэтому параллельные записи одного пользователя не ждут друг друга
+    # на одной строке (db_layer/usage_db_interaction.py); расхождения исправляет сверка (UsageReconciler)
+    __tablename__ = "usage_counters"
+
+    user_id: Mapped[uuid.UUID] = mapped_column(UUID(as_uuid=True), primary_key=True)
+    metric: Mapped[str] = mapped_column(String(40), primary_key=True)
+    shard: Mapped[int] = mapped_column(SmallInteger, primary_key=True)
+    value: Mapped[int] = mapped_column(BigInteger, nullable=False, default=0)
@@ -0,0 +1,55 @@
+# Обслуживание секций audio_notes (запускать по cron, например раз в сутки: ensure и archive)
+#   python partitions.py list
+#   python partitions.py ensure --months-ahead 6
+#   python partitions.py detach audio_notes_p2024_01
+#   python partitions.py archive --older-than-days 180
+import argparse
+import asyncio
+import logging
+
+from core.config import settings
+from core.database import engine
+from services.partition_service import PartitionService
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(args):
+    service = PartitionService()
+    try:
+        if args.command == "list":
+            for partition in await service.list_partitions():
+                print(f"{partition['name']:<32} {str(partition['from'] or 'MINVALUE'):<10} .. "
+                      f"{str(partition['to'] or 'MAXVALUE'):<10} ~{partition['rows']} rows, "
+                      f"{partition['size_bytes'] / 1024 / 1024:.1f} MB")
+        elif args.command == "ensure":
+            await service.ensure_partitions(args.months_ahead)
+        elif args.command == "detach":
+            await service.detach_partition(args.name, restore_archived=not args.keep_archive)
+        elif args.command == "archive":
+            await service.archive_transcripts(args.older_than_days, args.batch_size, args.pause)
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="audio_notes partition maintenance")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("list", help="show partitions with row estimates")
+
+    ensure = commands.add_parser("ensure", help="create monthly partitions in advance")
+    ensure.add_argument("--months-ahead", type=int, default=settings.PARTITION_MONTHS_AHEAD)
+
+    detach = commands.add_parser("detach", help="detach an old partition (the table is kept)")
+    detach.add_argument("name")
+    detach.add_argument("--keep-archive", action="store_true",
+                        help="leave archived transcripts in audio_note_archives instead of moving them back")
+
+    archive = commands.add_parser("archive", help="move old transcripts to audio_note_archives")
+    archive.add_argument("--older-than-days", type=int, default=settings.TRANSCRIPT_ARCHIVE_AFTER_DAYS)
+    archive.add_argument("--batch-size", type=int, default=1000)
+    archive.add_argument("--pause", type=float, default=0.1, help="seconds between batches")
+
+    asyncio.run(main(parser.parse_args()))
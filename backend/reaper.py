@@ -0,0 +1,45 @@
+# Восстановление зависших этапов обработки и очистка S3 (воркеры API делают проходы сами, см. REAPER_ENABLED)
+#   python reaper.py run                        - один проход: повторы, dead_letter, брошенные загрузки
+#   python reaper.py orphans --dry-run          - объекты S3 без ссылок из БД (cron, например раз в сутки)
+#   python reaper.py orphans --min-age-hours 24
+#   python reaper.py orphans --prefix waveforms/  - только указанные префиксы (по умолчанию - все префиксы приложения)
+import argparse
+import asyncio
+import logging
+from datetime import timedelta
+
+from core.config import settings
+from core.database import engine
+from core.s3_client import s3_client
+from services.reaper_service import ORPHAN_PREFIXES, ProcessingReaper
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(args):
+    reaper = ProcessingReaper()
+    try:
+        if args.command == "run":
+            logger.info(f"Reaper pass: {await reaper.run_once() or 'nothing due'}")
+        elif args.command == "orphans":
+            await reaper.delete_orphans(timedelta(hours=args.min_age_hours), args.prefix or ORPHAN_PREFIXES,
+                                        args.dry_run)
+    finally:
+        await s3_client.close()
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Stale processing jobs and orphaned S3 objects")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("run", help="retry or dead-letter stale processing jobs once")
+
+    orphans = commands.add_parser("orphans", help="delete S3 objects no note or audio file references")
+    orphans.add_argument("--min-age-hours", type=float, default=settings.S3_ORPHAN_MIN_AGE_HOURS)
+    orphans.add_argument("--prefix", action="append",
+                         help="bucket prefix to sweep, repeatable (default: audio and waveform prefixes)")
+    orphans.add_argument("--dry-run", action="store_true", help="only count unreferenced objects")
+
+    asyncio.run(main(parser.parse_args()))
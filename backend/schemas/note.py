@@ -1,5 +1,5 @@
 from pydantic import BaseModel, UUID4
-from typing import List, Optional
+from typing import Dict, List, Optional
 from datetime import datetime
 
 
@@ -26,11 +26,55 @@ class NoteResponse(NoteBase):
     id: UUID4
     audio_filename: str
     audio_path: Optional[str]
+    # у транскрипта из сегментов - None: весь текст и окна отдает GET /notes/{id}/transcription
     transcription: Optional[str]
     summary: Optional[str]
     status: str
     created_at: datetime
     updated_at: datetime
+    # версия пиков для URL GET /notes/{id}/waveform?v=...; None - пиков еще нет
+    waveform_version: Optional[UUID4] = None
 
     class Config:
-        from_attributes = True
\ No newline at end of file
+        from_attributes = True
+
+
+class NoteSearchResult(NoteResponse):
+    # результат семантического поиска: косинусное сходство с запросом (1 - совпадение)
+    score: float
+
+
+class TranscriptSegmentResponse(BaseModel):
+    # фрагмент транскрипта, смещения от начала аудио; end_ms None - транскрипт без таймкодов (один сегмент)
+    start_ms: int
+    end_ms: Optional[int]
+    text: str
+
+
+class TranscriptWindow(BaseModel):
+    # страница сегментов окна [from_ms, to_ms); next_from_ms - from_ms следующей страницы, None - окно прочитано
+    note_id: UUID4
+    from_ms: int
+    to_ms: Optional[int]
+    transcription: str
+    segments: List[TranscriptSegmentResponse]
+    next_from_ms: Optional[int]
+
+
+class SegmentSearchResult(TranscriptSegmentResponse):
+    # совпадение полнотекстового поиска: заметка и момент аудио для перехода
+    note_id: UUID4
+    title: str
+    rank: float
+
+
+class UsageStats(BaseModel):
+    # статистика пользователя для дашборда: заметки всего и по статусам, объем загруженного аудио, минуты аудио
+    notes: int
+    by_status: Dict[str, int]
+    storage_bytes: int
+    audio_minutes: float
+
+
+# порядок полей ответа - по нему строится быстрый путь сериализации списка
+NOTE_RESPONSE_FIELDS = tuple(NoteResponse.model_fields)
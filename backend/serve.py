@@ -0,0 +1,106 @@
+# Production запуск: несколько воркеров, uvloop + httptools, корректная остановка
+# запуск: python serve.py  (WORKERS=0 - по числу CPU), для разработки - run.py
+import logging
+import os
+import shutil
+import tempfile
+
+import uvicorn
+from uvicorn.supervisors import Multiprocess
+
+from core.config import settings
+
+logger = logging.getLogger("uvicorn.error")
+
+
+class DrainingServer(uvicorn.Server):
+    # uvicorn при остановке сразу рвет WebSocket соединения с кодом 1012,
+    # поэтому сначала перестаем принимать соединения и дожидаемся текущих загрузок аудио
+    async def shutdown(self, sockets=None):
+        from services.upload_service import upload_tracker
+
+        for server in self.servers:
+            server.close()
+
+        if upload_tracker.active:
+            logger.info(f"Waiting for {upload_tracker.active} in-flight uploads")
+        if not await upload_tracker.drain(self.config.timeout_graceful_shutdown or 0):
+            logger.warning(f"{upload_tracker.active} uploads interrupted by shutdown")
+
+        await super().shutdown(sockets)
+
+
+class MetricsMultiprocess(Multiprocess):
+    # uvicorn Multiprocess, который снимает livesum/livemax метрики завершившихся воркеров:
+    # без mark_process_dead их файлы в PROMETHEUS_MULTIPROC_DIR учитываются до перезапуска
+    def run(self):
+        self.startup()
+        while not self.should_exit.wait(1.0):
+            self.mark_dead()
+        self.shutdown()
+        self.mark_dead(stopping=True)
+
+    def mark_dead(self, stopping: bool = False):
+        from prometheus_client import multiprocess
+
+        for process in list(self.processes):
+            if process.is_alive():
+                continue
+            if not stopping:
+                logger.warning(f"Worker {process.pid} exited with code {process.exitcode}")
+            multiprocess.mark_process_dead(process.pid)
+            self.processes.remove(process)
+
+
+def prepare_workers_env(workers: int):
+    # переменные окружения наследуются воркерами, настройки и метрики читают их при импорте
+    if workers <= 1:
+        return
+
+    # метрики со всех воркеров собираются через общий каталог
+    metrics_dir = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR", os.path.join(tempfile.gettempdir(), "audio_notes_metrics")
+    )
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir, exist_ok=True)
+
+    # версии кэша без общего сервера живут в памяти воркера - запись в одном воркере
+    # не инвалидирует кэш остальных, поэтому без CACHE_URL кэш выключаем
+    if settings.CACHE_ENABLED and not settings.CACHE_URL:
+        logger.warning("CACHE_URL is not set, note cache disabled for multi-worker mode")
+        os.environ["CACHE_ENABLED"] = "false"
+
+    # без общего хранилища у каждого воркера свои корзины - клиент получает лимит, умноженный на число воркеров
+    if settings.RATE_LIMIT_ENABLED and not (settings.RATE_LIMIT_URL or settings.CACHE_URL):
+        logger.warning(f"RATE_LIMIT_URL is not set, rate limits apply per worker ({workers} workers)")
+
+
+def main():
+    workers = settings.WORKERS or os.cpu_count() or 1
+    prepare_workers_env(workers)
+    config = uvicorn.Config(
+        "main:app",
+        host=settings.HOST,
+        port=settings.PORT,
+        workers=workers,
+        loop="uvloop",
+        http="httptools",
+        ws="websockets",
+        lifespan="on",
+        proxy_headers=True,
+        timeout_graceful_shutdown=int(settings.GRACEFUL_SHUTDOWN_TIMEOUT),
+        access_log=False
+    )
+    server = DrainingServer(config)
+
+    if workers > 1:
+        # как uvicorn.run(workers=N), но каждый воркер - DrainingServer
+        sock = config.bind_socket()
+        MetricsMultiprocess(config, target=server.run, sockets=[sock]).run()
+    else:
+        # server.run, а не asyncio.run(server.serve()): ставит uvloop из config.loop
+        server.run()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,178 @@
+import asyncio
+import logging
+import random
+import uuid
+from collections import Counter
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.embeddings import EmbeddingModel, embedding_backend_available, embedding_model
+from core.metrics import EMBEDDINGS_INDEXED, SEMANTIC_SEARCHES
+from db_layer.embedding_db_interaction import EmbeddingDBInteraction
+from db_layer.note_db_interaction import NoteDBInteraction
+from models.note import AudioNote
+from models.note_embedding import EMBEDDING_KINDS
+
+logger = logging.getLogger(__name__)
+
+# Семантический поиск по заметкам: транскрипт и саммари векторизуются индексатором пачками
+# (очередь - строки note_embeddings без вектора, их ставит NoteService при записи текста),
+# поиск - ближайшие соседи в pgvector: HNSW или точный перебор для пользователей с небольшой долей векторов
+
+# текст длиннее обрезается: модели видят только первые ~256-512 токенов
+MAX_TEXT_CHARS = 8000
+
+# тексты заметок (с учетом архива), для которых нет строки в note_embeddings
+MISSING_EMBEDDINGS = text("""
+    SELECT n.id, n.user_id, k.kind
+    FROM audio_notes n
+    LEFT JOIN audio_note_archives a ON a.note_id = n.id
+    CROSS JOIN LATERAL (VALUES
+        ('transcription', coalesce(n.transcription, a.transcription) IS NOT NULL OR n.transcript_segmented),
+        ('summary', coalesce(n.summary, a.summary) IS NOT NULL)
+    ) AS k(kind, present)
+    WHERE k.present
+      AND NOT EXISTS (SELECT 1 FROM note_embeddings e WHERE e.note_id = n.id AND e.kind = k.kind)
+""")
+
+
+def semantic_search_available(model: EmbeddingModel = embedding_model) -> bool:
+    return settings.EMBEDDING_ENABLED and embedding_backend_available(model)
+
+
+class EmbeddingIndexer:
+    def __init__(self, session_factory=AsyncSessionLocal, model: EmbeddingModel = embedding_model,
+                 batch_size: int = settings.EMBEDDING_BATCH_SIZE,
+                 max_attempts: int = settings.EMBEDDING_MAX_ATTEMPTS):
+        self.session_factory = session_factory
+        self.model = model
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+    async def run_once(self) -> Dict[str, int]:
+        # очередь пачками, пока она не опустеет
+        results = Counter()
+        while True:
+            batch = await self._index_batch()
+            results.update(batch)
+            if sum(batch.values()) < self.batch_size:
+                break
+        return dict(results)
+
+    async def run_forever(self, interval: float):
+        # фоновая задача воркера (lifespan), воркеры разбирают очередь параллельно (SKIP LOCKED)
+        while True:
+            await asyncio.sleep(interval * random.uniform(0.5, 1.5))
+            try:
+                results = await self.run_once()
+                if results:
+                    logger.info(f"Embedding pass: {results}")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Embedding pass failed")
+
+    async def _index_batch(self) -> Counter:
+        results = Counter()
+        async with self.session_factory() as db:
+            repository = EmbeddingDBInteraction(db)
+            rows = await repository.claim_queued(self.batch_size, self.max_attempts)
+            if not rows:
+                return results
+
+            texts = await self._texts(db, {row.note_id for row in rows})
+            ready, dropped = [], []
+            for row in rows:
+                body = texts.get(row.note_id, {}).get(row.kind)
+                (ready if body else dropped).append((row, body))
+
+            # заметка удалена или текст пуст - строка очереди больше не нужна
+            for row, _ in dropped:
+                await db.delete(row)
+            if dropped:
+                results["dropped"] += len(dropped)
+
+            if ready:
+                try:
+                    # модель на CPU - в пуле потоков, event loop воркера не блокируется
+                    vectors = await asyncio.to_thread(
+                        self.model.embed, [body[:MAX_TEXT_CHARS] for _, body in ready]
+                    )
+                except Exception as e:
+                    logger.warning(f"Embedding batch of {len(ready)} failed: {e}")
+                    await repository.fail([row for row, _ in ready], str(e))
+                    results["failed"] += len(ready)
+                else:
+                    await repository.save([row for row, _ in ready], vectors.tolist(), self.model.name)
+                    results["embedded"] += len(ready)
+            await db.commit()
+
+        for result, count in results.items():
+            EMBEDDINGS_INDEXED.labels(result).inc(count)
+        return results
+
+    @staticmethod
+    async def _texts(db: AsyncSession, note_ids) -> Dict[uuid.UUID, Dict[str, Optional[str]]]:
+        # тексты с учетом архива и сегментов (select_fields), без ограничения по пользователю
+        repository = NoteDBInteraction(db)
+        result = await db.execute(
+            repository.select_fields(["id", *EMBEDDING_KINDS], assemble_segments=True)
+            .where(AudioNote.id.in_(note_ids))
+        )
+        return {row[0]: dict(zip(EMBEDDING_KINDS, row[1:])) for row in result}
+
+    async def backfill(self, batch_size: int = 1000) -> int:
+        # поставить в очередь тексты заметок без строк note_embeddings (заметки до 0010, потерянные постановки)
+        # чтение - серверным курсором в одной сессии, постановка пачками - в другой (коммит не закрывает курсор)
+        queued = 0
+        async with self.session_factory() as reader, self.session_factory() as writer:
+            result = await reader.stream(MISSING_EMBEDDINGS.execution_options(yield_per=batch_size))
+            async for rows in result.partitions():
+                await EmbeddingDBInteraction(writer).enqueue([tuple(row) for row in rows])
+                queued += len(rows)
+        return queued
+
+
+class SemanticSearchService:
+    def __init__(self, db: AsyncSession, user_id: uuid.UUID, model: EmbeddingModel = embedding_model):
+        self.user_id = user_id
+        self.model = model
+        self.embeddings = EmbeddingDBInteraction(db)
+        self.repository = NoteDBInteraction(db, user_id=user_id)
+
+    async def search(self, query_text: str, limit: int = 20) -> List[Tuple[AudioNote, float]]:
+        # заметки пользователя, ближайшие к тексту запроса: (заметка, сходство 0..1)
+        vectors = await asyncio.to_thread(self.model.embed, [query_text[:MAX_TEXT_CHARS]])
+        return await self._nearest_notes(vectors[0].tolist(), limit)
+
+    async def similar(self, note_id: uuid.UUID, limit: int = 10) -> Optional[List[Tuple[AudioNote, float]]]:
+        # похожие на заметку: по вектору саммари (короче и ближе к теме), иначе транскрипта;
+        # None - у заметки еще нет векторов
+        vectors = await self.embeddings.get_vectors(note_id, self.user_id, self.model.name)
+        vector = vectors.get("summary") or vectors.get("transcription")
+        if vector is None:
+            return None
+        return await self._nearest_notes(vector, limit, exclude=note_id)
+
+    async def _nearest_notes(self, vector: List[float], limit: int,
+                             exclude: Optional[uuid.UUID] = None) -> List[Tuple[AudioNote, float]]:
+        # выбор между HNSW и точным перебором - по доле векторов пользователя (EmbeddingDBInteraction.search)
+        nearest, strategy = await self.embeddings.search(
+            self.user_id, self.model.name, vector, limit,
+            ef_search=settings.EMBEDDING_EF_SEARCH, exact_threshold=settings.EMBEDDING_EXACT_THRESHOLD,
+            exclude=exclude
+        )
+        SEMANTIC_SEARCHES.labels(strategy).inc()
+        if not nearest:
+            return []
+
+        result = await self.repository.db.execute(
+            self.repository.scope(select(AudioNote)).where(AudioNote.id.in_([note_id for note_id, _ in nearest]))
+        )
+        notes = {note.id: note for note in result.scalars()}
+        await self.repository.load_archived(list(notes.values()))
+        return [(notes[note_id], round(1 - distance, 6)) for note_id, distance in nearest if note_id in notes]
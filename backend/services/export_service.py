@@ -0,0 +1,74 @@
+import csv
+import io
+from datetime import datetime
+from typing import AsyncIterator, Dict, Any, Optional, List
+
+from core.database import AsyncSessionLocal
+from core.json_response import dumps
+from db_layer.note_db_interaction import NoteDBInteraction
+from schemas.note import NOTE_RESPONSE_FIELDS
+
+EXPORT_FORMATS = {
+    "ndjson": "application/x-ndjson",
+    "csv": "text/csv; charset=utf-8",
+}
+
+
+class ExportService:
+    # потоковая выгрузка всех заметок (для комплаенса)
+    # отдельная сессия живет столько же, сколько StreamingResponse, а не запрос
+    # user_id - выгружаются только заметки пользователя, None - все (системная выгрузка)
+    def __init__(self, session_factory=AsyncSessionLocal, batch_size: int = 1000, user_id=None):
+        self.session_factory = session_factory
+        self.user_id = user_id
+        self.batch_size = batch_size
+        self.fields = NOTE_RESPONSE_FIELDS
+
+    async def stream_batches(self, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[List[Dict[str, Any]]]:
+        # одна транзакция REPEATABLE READ = один снимок данных на всю выгрузку,
+        # параллельные записи не дают дублей и пропусков
+        async with self.session_factory() as session:
+            await session.connection(execution_options={"isolation_level": "REPEATABLE READ"})
+            repository = NoteDBInteraction(session, user_id=self.user_id)
+            async for rows in repository.stream_rows(self.fields, filters, self.batch_size):
+                yield rows
+
+    async def export_ndjson(self, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[bytes]:
+        # одна заметка - одна строка JSON
+        async for rows in self.stream_batches(filters):
+            yield b"".join(dumps(row) + b"\n" for row in rows)
+
+    async def export_csv(self, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[bytes]:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+
+        writer.writerow(self.fields)
+        yield self._flush(buffer)
+
+        async for rows in self.stream_batches(filters):
+            for row in rows:
+                writer.writerow([self._csv_value(row[field]) for field in self.fields])
+            yield self._flush(buffer)
+
+    def export(self, export_format: str, filters: Optional[Dict[str, Any]] = None) -> AsyncIterator[bytes]:
+        if export_format == "csv":
+            return self.export_csv(filters)
+        return self.export_ndjson(filters)
+
+    @staticmethod
+    def _flush(buffer: io.StringIO) -> bytes:
+        # забираем накопленный кусок и очищаем буфер, чтобы память не росла
+        chunk = buffer.getvalue().encode("utf-8")
+        buffer.seek(0)
+        buffer.truncate(0)
+        return chunk
+
+    @staticmethod
+    def _csv_value(value: Any) -> Any:
+        if value is None:
+            return ""
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, (list, dict)):
+            return dumps(value).decode("utf-8")
+        return value
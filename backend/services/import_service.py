@@ -0,0 +1,314 @@
+import asyncio
+import json
+import logging
+import mimetypes
+import os
+import tarfile
+import time
+import uuid
+import zipfile
+from pathlib import Path
+from typing import AsyncIterator, BinaryIO, Dict, List, Optional
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.s3_client import s3_client
+from db_layer.audio_file_db_interaction import AudioFileDBInteraction
+from db_layer.note_db_interaction import NoteDBInteraction
+from db_layer.processing_db_interaction import ProcessingDBInteraction
+from services.queue_service import queue_service
+from services.scheduler_service import TASK_TYPE, estimate_duration, transcription_job
+
+logger = logging.getLogger(__name__)
+
+AUDIO_EXTENSIONS = {".webm", ".wav", ".mp3", ".ogg", ".oga", ".m4a", ".flac", ".aac"}
+
+# минимальный размер части multipart загрузки в S3
+MIN_PART_SIZE = 5 * 1024 * 1024
+
+
+class ImportItem:
+    # один аудиофайл источника; name - относительный путь, он же ключ в манифесте
+    def __init__(self, name: str, size: int):
+        self.name = name
+        self.size = size
+
+    @property
+    def filename(self) -> str:
+        return os.path.basename(self.name)
+
+    @property
+    def title(self) -> str:
+        return Path(self.name).stem
+
+    @property
+    def format(self) -> str:
+        return Path(self.name).suffix.lstrip(".").lower()
+
+    @property
+    def content_type(self) -> str:
+        # mimetypes считает .webm видео
+        if self.format == "webm":
+            return "audio/webm"
+        return mimetypes.guess_type(self.name)[0] or "application/octet-stream"
+
+
+class ImportSource:
+    # источник аудиофайлов: каталог, tar или zip архив
+    def __init__(self, path: str):
+        self.path = Path(path)
+        self._tar: Optional[tarfile.TarFile] = None
+        self._zip: Optional[zipfile.ZipFile] = None
+        # архив читается через один файловый дескриптор, чтения сериализуем
+        self._lock = asyncio.Lock()
+
+        if self.path.is_dir():
+            pass
+        elif zipfile.is_zipfile(self.path):
+            self._zip = zipfile.ZipFile(self.path)
+        elif tarfile.is_tarfile(self.path):
+            self._tar = tarfile.open(self.path)
+        else:
+            raise ValueError(f"{path} is not a directory, tar or zip archive")
+
+    @staticmethod
+    def _is_audio(name: str) -> bool:
+        return Path(name).suffix.lower() in AUDIO_EXTENSIONS
+
+    def items(self) -> List[ImportItem]:
+        if self._zip:
+            return [
+                ImportItem(info.filename, info.file_size)
+                for info in self._zip.infolist()
+                if not info.is_dir() and self._is_audio(info.filename)
+            ]
+
+        if self._tar:
+            return [
+                ImportItem(member.name, member.size)
+                for member in self._tar.getmembers()
+                if member.isfile() and self._is_audio(member.name)
+            ]
+
+        return [
+            ImportItem(file.relative_to(self.path).as_posix(), file.stat().st_size)
+            for file in sorted(self.path.rglob("*"))
+            if file.is_file() and self._is_audio(file.name)
+        ]
+
+    def open(self, item: ImportItem) -> BinaryIO:
+        if self._zip:
+            return self._zip.open(item.name)
+        if self._tar:
+            return self._tar.extractfile(item.name)
+        return open(self.path / item.name, "rb")
+
+    async def read(self, file: BinaryIO, size: int) -> bytes:
+        if self._zip or self._tar:
+            async with self._lock:
+                return await asyncio.to_thread(file.read, size)
+        return await asyncio.to_thread(file.read, size)
+
+    def close(self):
+        if self._zip:
+            self._zip.close()
+        if self._tar:
+            self._tar.close()
+
+
+class ImportService:
+    # массовый импорт аудио: строки AudioNote пачками, параллельная multipart загрузка в S3,
+    # пакетная постановка задач на транскрибацию и манифест для продолжения после сбоя
+    def __init__(self, source: ImportSource, manifest_path: str, concurrency: int = 8,
+                 batch_size: int = 50, part_size: int = 8 * 1024 * 1024,
+                 tags: Optional[List[str]] = None, session_factory=AsyncSessionLocal,
+                 user_id: Optional[uuid.UUID] = None, tier: Optional[str] = None):
+        self.source = source
+        self.manifest_path = Path(manifest_path)
+        self.concurrency = concurrency
+        self.batch_size = batch_size
+        self.part_size = max(part_size, MIN_PART_SIZE)
+        self.tags = tags or ["import"]
+        self.session_factory = session_factory
+        # владелец импортированных заметок
+        self.user_id = user_id
+        # тариф владельца - вес в честной очереди транскрибации (services/scheduler_service.py)
+        self.tier = tier
+
+        self.stats = {"files": 0, "bytes": 0, "errors": 0, "skipped": 0}
+
+    def load_manifest(self) -> Dict[str, Dict[str, str]]:
+        # записи прошлых запусков по файлу источника, последняя запись главнее:
+        # {"source", "note_id"} - заметка создана, {"source", "note_id", "file_key"} - файл загружен
+        if not self.manifest_path.exists():
+            return {}
+
+        entries = {}
+        with open(self.manifest_path, encoding="utf-8") as manifest:
+            for line in manifest:
+                line = line.strip()
+                if line:
+                    entry = json.loads(line)
+                    entries[entry["source"]] = entry
+        return entries
+
+    def append_manifest(self, entries: List[Dict[str, str]]):
+        with open(self.manifest_path, "a", encoding="utf-8") as manifest:
+            for entry in entries:
+                manifest.write(json.dumps(entry, ensure_ascii=False) + "\n")
+            manifest.flush()
+            os.fsync(manifest.fileno())
+
+    async def read_chunks(self, item: ImportItem) -> AsyncIterator[bytes]:
+        file = self.source.open(item)
+        try:
+            while True:
+                chunk = await self.source.read(file, self.part_size)
+                if not chunk:
+                    break
+                yield chunk
+        finally:
+            file.close()
+
+    async def run(self) -> dict:
+        entries = self.load_manifest()
+        items = self.source.items()
+        pending = [item for item in items if not entries.get(item.name, {}).get("file_key")]
+        self.stats["skipped"] = len(items) - len(pending)
+        logger.info(f"Found {len(items)} audio files, {len(pending)} to import, {self.stats['skipped']} already done")
+
+        if not pending:
+            return self.report(0.0)
+
+        # ограниченная очередь: строки в БД создаются не сильно раньше загрузки
+        upload_queue: asyncio.Queue = asyncio.Queue(maxsize=self.concurrency * 2)
+        results: asyncio.Queue = asyncio.Queue()
+        started = time.perf_counter()
+
+        # в БД ходят только producer и finisher - не больше двух соединений из пула
+        async def producer():
+            async with self.session_factory() as session:
+                repository = NoteDBInteraction(session, user_id=self.user_id)
+                for start in range(0, len(pending), self.batch_size):
+                    batch = pending[start:start + self.batch_size]
+                    # заметки, созданные прошлым запуском до сбоя, используются повторно, а не дублируются
+                    known = {
+                        item.name: uuid.UUID(entries[item.name]["note_id"])
+                        for item in batch if item.name in entries
+                    }
+                    existing = await repository.existing_ids(list(known.values()))
+                    note_ids = {name: note_id for name, note_id in known.items() if note_id in existing}
+
+                    new_items = [item for item in batch if item.name not in note_ids]
+                    notes = await repository.create_many([
+                        {
+                            "title": item.title,
+                            "tags": self.tags,
+                            "audio_filename": item.filename,
+                            "status": "uploading"
+                        }
+                        for item in new_items
+                    ]) if new_items else []
+                    # id новых заметок - в манифест сразу после коммита, до загрузки
+                    if notes:
+                        self.append_manifest([
+                            {"source": item.name, "note_id": str(note.id)} for item, note in zip(new_items, notes)
+                        ])
+                    note_ids.update((item.name, note.id) for item, note in zip(new_items, notes))
+
+                    for item in batch:
+                        await upload_queue.put((item, note_ids[item.name]))
+
+            for _ in range(self.concurrency):
+                await upload_queue.put(None)
+
+        async def worker():
+            while True:
+                job = await upload_queue.get()
+                if job is None:
+                    return
+
+                item, note_id = job
+                try:
+                    file_key = await s3_client.upload_multipart(
+                        self.read_chunks(item),
+                        item.filename,
+                        content_type=item.content_type,
+                        max_parallel_parts=2
+                    )
+                    await results.put((item, note_id, file_key))
+                except Exception as e:
+                    logger.error(f"Failed to upload {item.name}: {e}")
+                    await results.put((item, note_id, None))
+
+        async def finisher():
+            buffer = []
+            async with self.session_factory() as session:
+                for processed in range(1, len(pending) + 1):
+                    buffer.append(await results.get())
+                    if len(buffer) >= self.batch_size or processed == len(pending):
+                        await self.flush(session, buffer)
+                        buffer = []
+                        logger.info(self.format_report(processed, len(pending), time.perf_counter() - started))
+
+        workers = [asyncio.create_task(worker()) for _ in range(self.concurrency)]
+        await asyncio.gather(producer(), finisher(), *workers)
+
+        return self.report(time.perf_counter() - started)
+
+    async def flush(self, session, results: List[tuple]):
+        # статусы, записи AudioFile, задачи в очередь и манифест - пачкой
+        note_updates = []
+        audio_files = []
+        tasks = []
+        manifest_entries = []
+
+        for item, note_id, file_key in results:
+            if file_key is None:
+                self.stats["errors"] += 1
+                note_updates.append({"id": note_id, "status": "error"})
+                continue
+
+            self.stats["files"] += 1
+            self.stats["bytes"] += item.size
+            note_updates.append({"id": note_id, "audio_path": file_key, "status": "pending_transcription"})
+            audio_files.append({
+                "note_id": note_id,
+                "file_path": file_key,
+                "file_size": item.size,
+                "format": item.format[:10]
+            })
+            tasks.append({"note_id": str(note_id), "audio_path": file_key, "audio_format": item.format,
+                          "size": item.size})
+            manifest_entries.append({"source": item.name, "note_id": str(note_id), "file_key": file_key})
+
+        await NoteDBInteraction(session).update_many(note_updates)
+        if audio_files:
+            await AudioFileDBInteraction(session).create_many(audio_files)
+        if tasks and settings.SCHEDULER_ENABLED:
+            # задачи публикует планировщик: импорт тысяч записей не занимает движки целиком
+            await ProcessingDBInteraction(session).enqueue_many([
+                transcription_job(uuid.UUID(task["note_id"]), self.user_id,
+                                  estimate_duration(task["size"], task["audio_format"]), self.tier)
+                for task in tasks
+            ], TASK_TYPE)
+        elif tasks:
+            await ProcessingDBInteraction(session).start_many(
+                [uuid.UUID(task["note_id"]) for task in tasks], TASK_TYPE
+            )
+            await queue_service.send_transcription_tasks(tasks)
+        if manifest_entries:
+            self.append_manifest(manifest_entries)
+
+    def report(self, elapsed: float) -> dict:
+        return {
+            **self.stats,
+            "elapsed_s": round(elapsed, 2),
+            "files_per_s": round(self.stats["files"] / elapsed, 2) if elapsed else 0.0,
+            "mb_per_s": round(self.stats["bytes"] / 1024 / 1024 / elapsed, 2) if elapsed else 0.0,
+        }
+
+    def format_report(self, processed: int, total: int, elapsed: float) -> str:
+        report = self.report(elapsed)
+        return (f"{processed}/{total} processed, {report['errors']} errors, "
+                f"{report['files_per_s']} files/s, {report['mb_per_s']} MB/s")
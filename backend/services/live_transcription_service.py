@@ -0,0 +1,150 @@
+import asyncio
+import io
+import logging
+import wave
+from typing import Dict, List, Optional
+
+from core.config import settings
+from core.transcription import StreamingEngine, streaming_engine
+
+logger = logging.getLogger(__name__)
+
+# Транскрибация записи по мере поступления кадров в /ws/upload (потоковый режим):
+# кадры -> PCM (сырой pcm как есть, остальное - через процесс ffmpeg) -> движок пачками по CHUNK_MS
+# в пуле потоков; события сегментов копятся в очереди и отправляются клиенту между кадрами.
+# Ошибка движка не обрывает запись: транскрибация выключается, аудио уходит в обычный pipeline
+
+# форматы, которые приходят уже как PCM s16le моно с частотой LIVE_TRANSCRIPTION_SAMPLE_RATE
+PCM_FORMATS = ("pcm", "raw", "s16le")
+
+
+def pcm_to_wav(pcm: bytes, sample_rate: int) -> bytes:
+    # сырой PCM записи сохраняется в S3 как WAV: файл проигрывается и разбирается для waveform без ffmpeg
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(1)
+        wav.setsampwidth(2)
+        wav.setframerate(sample_rate)
+        wav.writeframes(pcm[:len(pcm) // 2 * 2])
+    return buffer.getvalue()
+
+
+def live_transcription_available(engine: StreamingEngine = streaming_engine) -> bool:
+    return settings.LIVE_TRANSCRIPTION_ENABLED and engine.available()
+
+
+class LiveTranscription:
+    def __init__(self, audio_format: str, engine: StreamingEngine = streaming_engine,
+                 sample_rate: int = settings.LIVE_TRANSCRIPTION_SAMPLE_RATE):
+        self.audio_format = audio_format
+        self.engine = engine
+        self.sample_rate = sample_rate
+        self.chunk_bytes = sample_rate * settings.LIVE_TRANSCRIPTION_CHUNK_MS // 1000 * 2
+        self.session = None
+        self.segments: List[Dict] = []
+        self.error: Optional[str] = None
+        self._pcm = bytearray()
+        self._events: asyncio.Queue = asyncio.Queue()
+        self._partial: Optional[Dict] = None
+        self._decoder: Optional[asyncio.subprocess.Process] = None
+        self._reader: Optional[asyncio.Task] = None
+
+    @property
+    def active(self) -> bool:
+        return self.error is None
+
+    async def start(self):
+        try:
+            # первая запись воркера загружает модель - в пуле потоков
+            self.session = await asyncio.to_thread(self.engine.open, self.sample_rate)
+            if self.audio_format not in PCM_FORMATS:
+                # тот же ffmpeg, что декодирует загрузки для waveform
+                self._decoder = await asyncio.create_subprocess_exec(
+                    settings.WAVEFORM_FFMPEG, "-v", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1",
+                    "-ar", str(self.sample_rate), "pipe:1",
+                    stdin=asyncio.subprocess.PIPE, stdout=asyncio.subprocess.PIPE,
+                    stderr=asyncio.subprocess.DEVNULL
+                )
+                self._reader = asyncio.create_task(self._read_decoded())
+        except Exception as e:
+            self._fail(e)
+
+    async def feed(self, data: bytes):
+        # кадр записи; события забираются через pending()
+        if not self.active:
+            return
+        try:
+            if self._decoder is not None:
+                self._decoder.stdin.write(data)
+                await self._decoder.stdin.drain()
+            else:
+                await self._accept(data)
+        except Exception as e:
+            self._fail(e)
+
+    def pending(self) -> List[Dict]:
+        events = []
+        while not self._events.empty():
+            events.append(self._events.get_nowait())
+        return events
+
+    async def finish(self) -> List[Dict]:
+        # запись остановлена: дочитать декодер, отдать движку остаток буфера и закрыть фразу
+        if self.active:
+            try:
+                if self._decoder is not None:
+                    self._decoder.stdin.close()
+                    await self._reader
+                    if await self._decoder.wait() != 0:
+                        raise ValueError(f"ffmpeg exited with code {self._decoder.returncode}")
+                if self._pcm:
+                    await self._run(self.session.accept, bytes(self._pcm))
+                    self._pcm.clear()
+                await self._run(self.session.finish)
+            except Exception as e:
+                self._fail(e)
+        return self.pending()
+
+    async def close(self):
+        # обрыв записи: процесс декодера не должен пережить соединение
+        if self._reader is not None and not self._reader.done():
+            self._reader.cancel()
+        if self._decoder is not None and self._decoder.returncode is None:
+            self._decoder.kill()
+            await self._decoder.wait()
+
+    async def _read_decoded(self):
+        try:
+            while True:
+                pcm = await self._decoder.stdout.read(self.chunk_bytes)
+                if not pcm:
+                    break
+                await self._accept(pcm)
+        except Exception as e:
+            self._fail(e)
+
+    async def _accept(self, pcm: bytes):
+        # движок вызывается пачками не меньше chunk_bytes: кадры браузера по 20-100 мс - лишние переходы в поток
+        self._pcm.extend(pcm)
+        if len(self._pcm) >= self.chunk_bytes:
+            # PCM s16le - четное число байт, нечетный хвост ждет следующего кадра
+            size = len(self._pcm) // 2 * 2
+            chunk = bytes(self._pcm[:size])
+            del self._pcm[:size]
+            await self._run(self.session.accept, chunk)
+
+    async def _run(self, method, *args):
+        for event in await asyncio.to_thread(method, *args):
+            if event["final"]:
+                self.segments.append(event)
+                self._partial = None
+            elif event == self._partial:
+                continue
+            else:
+                self._partial = event
+            self._events.put_nowait(event)
+
+    def _fail(self, error: Exception):
+        if self.error is None:
+            logger.warning(f"Live transcription stopped ({self.engine.name}): {error}")
+            self.error = str(error) or type(error).__name__
@@ -1,15 +1,36 @@
 from typing import Optional, Sequence, Dict, Any
+import logging
 import uuid
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from core.cache import note_cache
+from core.config import settings
+from core.etag import list_etag
+from core.json_response import dumps
+from core.metrics import observe_stage
+from core.s3_client import s3_client
+from db_layer.embedding_db_interaction import EmbeddingDBInteraction
 from db_layer.note_db_interaction import NoteDBInteraction
+from db_layer.processing_db_interaction import ProcessingDBInteraction
 from models.note import AudioNote
-from schemas.note import NoteCreate, NoteUpdate
+from schemas.note import NoteCreate, NoteUpdate, NoteResponse, NOTE_RESPONSE_FIELDS
+from services.note_text_service import NoteTextService
+from services.scheduler_service import TASK_TYPE, transcription_job
+from services.transcript_service import normalize_segments
 
+logger = logging.getLogger(__name__)
 
 class NoteService:
-    def __init__(self, db: AsyncSession):
-        self.repository = NoteDBInteraction(db)
+    # read_db - сессия реплики для чтений (списки, карточки), None - все через primary
+    # user_id - пользователь запроса (core.auth.current_user_id), None - системный доступ
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None,
+                 user_id: Optional[uuid.UUID] = None):
+        self.user_id = user_id
+        self.repository = NoteDBInteraction(db, read_db, user_id)
+        self.processing = ProcessingDBInteraction(db)
+        self.embeddings = EmbeddingDBInteraction(db)
+        # документы для отдачи собираются из только что записанного - всегда primary
+        self.texts = NoteTextService(db, user_id=user_id)
 
     async def get_notes(self, skip: int = 0, limit: int = 100, filters: Optional[Dict[str, Any]] = None) -> Sequence[AudioNote]:
         # бизнес логика получения всех заметок
@@ -20,6 +41,52 @@ class NoteService:
         # бизнес логика получения заметки по id
         return await self.repository.get_by_id(note_id)
 
+    async def get_notes_json(self, skip: int = 0, limit: int = 100,
+                             filters: Optional[Dict[str, Any]] = None) -> bytes:
+        # готовый JSON списка заметок через кэш, ключ - нормализованный хэш фильтров
+        # строки берутся из SELECT как dict и кодируются orjson без валидации pydantic,
+        # результат побайтно совпадает с сериализацией List[NoteResponse]
+        key = await note_cache.list_key(skip, limit, self._cache_filters(filters))
+        cached = await note_cache.get("list", key)
+        if cached is not None:
+            return cached
+
+        rows = await self.repository.get_all_rows(NOTE_RESPONSE_FIELDS, skip, limit, filters)
+        body = dumps(rows)
+        await self._cache_set(key, body)
+        return body
+
+    async def get_cached_note(self, note_id: uuid.UUID) -> Optional[NoteResponse]:
+        # получение заметки по id через кэш
+        key = await note_cache.note_key(note_id, self.user_id)
+        cached = await note_cache.get("note", key, decoder=NoteResponse.model_validate_json)
+        if cached is not None:
+            return cached
+
+        note = await self.repository.get_by_id(note_id)
+        if note is None:
+            return None
+
+        response = NoteResponse.model_validate(note)
+        await self._cache_set(key, response, encoder=lambda value: value.model_dump_json())
+        return response
+
+    async def _cache_set(self, key: str, value, **kwargs):
+        # кэш заполняется только чтениями из primary: отстающая реплика положила бы
+        # старые данные под ключ новой версии, и они жили бы до истечения TTL
+        if not self.repository.from_replica:
+            await note_cache.set(key, value, **kwargs)
+
+    async def get_notes_etag(self, skip: int = 0, limit: int = 100,
+                             filters: Optional[Dict[str, Any]] = None) -> str:
+        # ETag страницы списка считается агрегатом, строки не читаются
+        max_updated_at, count = await self.repository.get_list_version(filters)
+        return list_etag(max_updated_at, count, note_cache.filters_hash(skip, limit, self._cache_filters(filters)))
+
+    def _cache_filters(self, filters: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        # пользователь входит в ключ кэша и ETag: одинаковые фильтры разных пользователей - разные страницы
+        return {**(filters or {}), "user_id": self.user_id}
+
     async def create_note(self, note_data: NoteCreate) -> AudioNote:
         # бизнес-логика создания заметок
         db_note_data = {
@@ -38,8 +105,18 @@ class NoteService:
         return await self.repository.update(note_id, update_dict)
 
     async def delete_note(self, note_id: uuid.UUID) -> bool:
-        # бизнес-логика удаления заметок
-        return await self.repository.delete(note_id)
+        # бизнес-логика удаления заметок: строки удаляются транзакцией, файлы в S3 - сразу после нее;
+        # если S3 недоступен, ключи без ссылок позже заберет обход сирот (reaper.py orphans)
+        keys = await self.repository.delete(note_id)
+        if keys is None:
+            return False
+
+        if keys:
+            try:
+                await s3_client.delete_files(keys)
+            except Exception as e:
+                logger.warning(f"Failed to delete S3 objects of note {note_id}, left to the orphan sweep: {e}")
+        return True
 
     async def get_note_status(self, note_id: uuid.UUID) -> str:
         # получить статус заметки
@@ -53,21 +130,68 @@ class NoteService:
         # получить статус суммаризации заметки
         return await self.repository.get_note_summarization(note_id)
 
+    # этапы обработки заметки (upload -> transcription -> summarization) в NoteProcessing
+    async def start_stage(self, note_id: uuid.UUID, stage: str):
+        return await self.processing.start(note_id, stage)
+
+    async def queue_transcription(self, note_id: uuid.UUID, user_id: uuid.UUID, duration: float,
+                                  tier: Optional[str] = None):
+        # транскрибация через планировщик (services/scheduler_service.py): задача ждет места у движков
+        # в очереди с приоритетом по длительности и честной долей пользователя; без планировщика - этап сразу
+        if not settings.SCHEDULER_ENABLED:
+            return await self.start_stage(note_id, TASK_TYPE)
+        await self.processing.enqueue_many([transcription_job(note_id, user_id, duration, tier)], TASK_TYPE)
+
+    async def extend_stage(self, note_id: uuid.UUID, stage: str):
+        return await self.processing.extend(note_id, stage)
+
+    async def finish_stage(self, note_id: uuid.UUID, stage: str, status: str = "completed",
+                           error_message: Optional[str] = None):
+        processing = await self.processing.finish(note_id, stage, status, error_message)
+        if processing is not None:
+            observe_stage(stage, status, processing.started_at, processing.completed_at)
+        return processing
+
     # нижние методы для брокера сообщений
     async def update_note_status(self, note_id: uuid.UUID, status: str) -> Optional[AudioNote]:
         # смена статуса  замето
         return await self.repository.update(note_id, {"status": status})
 
-    async def update_transcription_status(self, note_id: uuid.UUID, transcription: str) -> Optional[AudioNote]:
-        # смена транскрибации заметки
-        return await self.repository.update(note_id, {
-            "transcription": transcription,
-            "status": "pending_summarization"
-        })
+    async def update_transcription_status(self, note_id: uuid.UUID, transcription: Optional[str] = None,
+                                          segments: Optional[Sequence[Any]] = None) -> Optional[AudioNote]:
+        # смена транскрибации заметки: segments [{start_ms, end_ms, text}] - результат движка с таймкодами,
+        # полный текст из них собирается при чтении; transcription - текст движка без таймкодов
+        update_data = {"status": "pending_summarization"}
+        if segments is None:
+            update_data["transcription"] = transcription
+        note = await self.repository.get_by_id(note_id)
+        # сегменты прошлой транскрибации удаляются и при новом тексте без таймкодов
+        if note is not None and (segments is not None or note.transcript_segmented):
+            await self.repository.replace_segments(note, normalize_segments(segments or []))
+        note = await self.repository.update(note_id, update_data)
+        await self._store_text(note, "transcription")
+        await self.finish_stage(note_id, "transcription")
+        await self.start_stage(note_id, "summarization")
+        await self._queue_embedding(note, "transcription")
+        return note
 
     async def update_summary_status(self, note_id: uuid.UUID, summary: str) -> Optional[AudioNote]:
         # смена суммаризации заметки
-        return await self.repository.update(note_id, {
+        note = await self.repository.update(note_id, {
             "summary": summary,
             "status": "completed"
-        })
\ No newline at end of file
+        })
+        await self._store_text(note, "summary")
+        await self.finish_stage(note_id, "summarization")
+        await self._queue_embedding(note, "summary")
+        return note
+
+    async def _store_text(self, note: Optional[AudioNote], kind: str):
+        # сжатый документ для GET /notes/{id}/transcription и /summary (services/note_text_service.py)
+        if note is not None:
+            await self.texts.store(note, kind)
+
+    async def _queue_embedding(self, note: Optional[AudioNote], kind: str):
+        # новый текст - в очередь индексатора семантического поиска (services/embedding_service.py)
+        if note is not None and settings.EMBEDDING_ENABLED:
+            await self.embeddings.enqueue([(note.id, note.user_id, kind)])
\ No newline at end of file
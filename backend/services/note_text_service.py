@@ -0,0 +1,93 @@
+import asyncio
+import uuid
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.compression import IDENTITY, compress, decompress, storage_encoding
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.json_response import dumps
+from db_layer.note_db_interaction import NoteDBInteraction
+from models.note import AudioNote
+from models.note_text import NoteText
+from services.transcript_service import TranscriptService
+
+# Сжатые документы транскрипта и саммари (таблица note_texts): JSON ответа собирается и сжимается один раз,
+# при смене текста (NoteService.update_transcription_status / update_summary_status), а GET отдает байты
+# как есть с Content-Encoding. Документ - производный: нет документа - ответ собирается из колонок и сегментов;
+# репозиторий удаляет документ в транзакции, меняющей текст (NoteDBInteraction.drop_text_documents).
+# Текст хранится дважды осознанно: колонки и сегменты остаются источником для поиска (search_vector, сегменты),
+# окон транскрипта и эмбеддингов, документ - кэш ответа. Цена - место: сжатые документы добавляют ~10% к
+# сегментам с их индексами (benchmarks/text_storage_benchmark.py, overhead), взамен - меньше блоков БД и
+# нет сборки и сжатия на каждый запрос
+
+# тексты заметок (с учетом архива и сегментов), для которых нет документа
+MISSING_TEXTS = text("""
+    SELECT n.id, n.user_id, k.kind
+    FROM audio_notes n
+    LEFT JOIN audio_note_archives a ON a.note_id = n.id
+    CROSS JOIN LATERAL (VALUES
+        ('transcription', coalesce(n.transcription, a.transcription) IS NOT NULL OR n.transcript_segmented),
+        ('summary', coalesce(n.summary, a.summary) IS NOT NULL)
+    ) AS k(kind, present)
+    WHERE k.present
+      AND NOT EXISTS (SELECT 1 FROM note_texts t WHERE t.note_id = n.id AND t.kind = k.kind)
+""")
+
+
+class NoteTextService:
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None,
+                 user_id: Optional[uuid.UUID] = None):
+        self.repository = NoteDBInteraction(db, read_db, user_id)
+        self.transcripts = TranscriptService(db, read_db, user_id)
+
+    async def build(self, note_id: uuid.UUID, kind: str) -> Optional[Dict[str, Any]]:
+        # тело ответа из исходных данных, None - текста нет
+        if kind == "transcription":
+            # весь транскрипт одним окном, в той же схеме TranscriptWindow, что и постраничное чтение
+            return await self.transcripts.get_window(note_id, 0, None, None)
+        if kind == "summary":
+            summary = (await self.repository.read(
+                self.repository.select_fields(["summary"]).where(AudioNote.id == note_id)
+            )).scalar_one_or_none()
+            return {"summary": summary} if summary else None
+        raise ValueError(f"Unknown text kind {kind!r}")
+
+    async def store(self, note: AudioNote, kind: str):
+        # пересобрать документ после смены текста; сжатие - в пуле потоков (zstd 19 на длинном транскрипте - мс)
+        document = await self.build(note.id, kind)
+        if document is None:
+            await self.repository.save_text_document(note, kind)
+            return
+
+        data = dumps(document)
+        encoding = storage_encoding() if len(data) >= settings.TEXT_COMPRESSION_MIN_BYTES else IDENTITY
+        body = await asyncio.to_thread(compress, data, encoding) if encoding != IDENTITY else data
+        await self.repository.save_text_document(note, kind, encoding, body, len(data))
+
+    async def get(self, note_id: uuid.UUID, kind: str) -> Optional[NoteText]:
+        return await self.repository.get_text_document(note_id, kind)
+
+
+async def decoded_body(document: NoteText) -> bytes:
+    # для клиента без поддержки кодирования документа; маленькие тела распаковываются в event loop
+    if document.encoding == IDENTITY:
+        return document.body
+    if document.size < 64 * 1024:
+        return decompress(document.body, document.encoding)
+    return await asyncio.to_thread(decompress, document.body, document.encoding)
+
+
+async def backfill_texts(session_factory=AsyncSessionLocal, batch_size: int = 500) -> int:
+    # документы заметок до миграции 0012: чтение серверным курсором в одной сессии, запись - в другой
+    stored = 0
+    async with session_factory() as reader, session_factory() as writer:
+        service = NoteTextService(writer)
+        result = await reader.stream(MISSING_TEXTS.execution_options(yield_per=batch_size))
+        async for rows in result.partitions():
+            for note_id, user_id, kind in rows:
+                await service.store(AudioNote(id=note_id, user_id=user_id), kind)
+            stored += len(rows)
+    return stored
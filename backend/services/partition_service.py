@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import re
+import time
+from datetime import date, datetime, timedelta
+from typing import Any, Dict, List, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncConnection
+
+from core.database import engine
+
+logger = logging.getLogger(__name__)
+
+# Обслуживание секционированной audio_notes (миграция 0004): месячные партиции заранее,
+# отключение старых партиций и перенос транскриптов старых заметок в audio_note_archives
+
+PARENT_TABLE = "audio_notes"
+PARTITIONS_LOCK = "audio_notes_partitions"
+BOUND_PATTERN = re.compile(r"FROM \((.+?)\) TO \((.+?)\)")
+
+# одна партия архивации одним запросом: строки блокируются (SKIP LOCKED - не ждем пишущих),
+# копируются в архив и обнуляются в audio_notes; created_at в условии - для отсечения партиций
+ARCHIVE_BATCH = text("""
+    WITH moved AS (
+        SELECT id, created_at, transcription, summary
+        FROM audio_notes
+        WHERE created_at < :cutoff AND (transcription IS NOT NULL OR summary IS NOT NULL)
+        ORDER BY created_at
+        LIMIT :batch_size
+        FOR UPDATE SKIP LOCKED
+    ), archived AS (
+        INSERT INTO audio_note_archives (note_id, transcription, summary)
+        SELECT id, transcription, summary FROM moved
+        ON CONFLICT (note_id) DO UPDATE SET
+            transcription = coalesce(EXCLUDED.transcription, audio_note_archives.transcription),
+            summary = coalesce(EXCLUDED.summary, audio_note_archives.summary),
+            archived_at = now()
+    )
+    UPDATE audio_notes n
+    SET transcription = NULL, summary = NULL, transcript_archived = true
+    FROM moved
+    WHERE n.id = moved.id AND n.created_at = moved.created_at AND n.created_at < :cutoff
+""")
+
+
+def month_start(day: date) -> date:
+    return day.replace(day=1)
+
+
+def add_months(day: date, months: int) -> date:
+    month = day.month - 1 + months
+    return date(day.year + month // 12, month % 12 + 1, 1)
+
+
+def parse_bound(value: str) -> Optional[date]:
+    # MINVALUE / MAXVALUE -> None, '2024-01-01 00:00:00' -> date
+    if value in ("MINVALUE", "MAXVALUE"):
+        return None
+    return datetime.fromisoformat(value.strip("'")).date()
+
+
+class PartitionService:
+    def __init__(self, db_engine=engine):
+        self.engine = db_engine
+
+    async def _partitions(self, conn: AsyncConnection) -> List[Dict[str, Any]]:
+        result = await conn.execute(text("""
+            SELECT c.relname, pg_get_expr(c.relpartbound, c.oid), c.reltuples::bigint, pg_total_relation_size(c.oid)
+            FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = to_regclass(:parent)
+        """), {"parent": PARENT_TABLE})
+
+        partitions = []
+        for name, bound, rows, size in result:
+            match = BOUND_PATTERN.search(bound)
+            partitions.append({
+                "name": name,
+                "from": parse_bound(match.group(1)) if match else None,
+                "to": parse_bound(match.group(2)) if match else None,
+                "rows": max(rows, 0),  # оценка по статистике, -1 если таблицу еще не анализировали
+                "size_bytes": size,
+            })
+        return sorted(partitions, key=lambda p: p["from"] or date.min)
+
+    async def list_partitions(self) -> List[Dict[str, Any]]:
+        async with self.engine.connect() as conn:
+            return await self._partitions(conn)
+
+    async def ensure_partitions(self, months_ahead: int) -> List[str]:
+        # создать месячные партиции от конца последней существующей до текущего месяца + months_ahead
+        # без DEFAULT партиции: строка вне диапазонов - ошибка вставки, поэтому партиции создаются с запасом
+        created = []
+        async with self.engine.begin() as conn:
+            await conn.execute(text("SET LOCAL lock_timeout = '5s'"))
+            await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext(:name))"), {"name": PARTITIONS_LOCK})
+
+            partitions = await self._partitions(conn)
+            current = month_start(datetime.utcnow().date())
+            bounds = [p["to"] for p in partitions if p["to"]]
+            start = max(bounds) if bounds else current
+            target = add_months(current, months_ahead + 1)
+
+            while start < target:
+                end = add_months(start, 1)
+                name = f"{PARENT_TABLE}_p{start:%Y_%m}"
+                await conn.execute(text(
+                    f"CREATE TABLE IF NOT EXISTS {name} PARTITION OF {PARENT_TABLE} "
+                    f"FOR VALUES FROM ('{start}') TO ('{end}')"
+                ))
+                created.append(name)
+                start = end
+
+        if created:
+            logger.info(f"Created partitions: {', '.join(created)}")
+        return created
+
+    async def detach_partition(self, name: str, restore_archived: bool = True) -> Dict[str, Any]:
+        # DETACH CONCURRENTLY не блокирует запросы к audio_notes, но не может выполняться в транзакции
+        # отключенная таблица остается в БД (pg_dump / DROP вручную), заметки из нее пропадают из API
+        partitions = {p["name"]: p for p in await self.list_partitions()}
+        partition = partitions.get(name)
+        if partition is None:
+            raise ValueError(f"{name} is not a partition of {PARENT_TABLE}")
+        if partition["to"] is None or partition["to"] > month_start(datetime.utcnow().date()):
+            raise ValueError(f"{name} covers the current month or later, refusing to detach")
+
+        async with self.engine.connect() as conn:
+            conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+            await conn.execute(text(f"ALTER TABLE {PARENT_TABLE} DETACH PARTITION {name} CONCURRENTLY"))
+
+        restored = 0
+        if restore_archived:
+            # архивные транскрипты возвращаются в отключенную таблицу - она самодостаточна для выгрузки
+            async with self.engine.begin() as conn:
+                result = await conn.execute(text(f"""
+                    WITH restored AS (
+                        UPDATE {name} n
+                        SET transcription = coalesce(n.transcription, a.transcription),
+                            summary = coalesce(n.summary, a.summary),
+                            transcript_archived = false
+                        FROM audio_note_archives a
+                        WHERE a.note_id = n.id
+                        RETURNING n.id
+                    )
+                    DELETE FROM audio_note_archives WHERE note_id IN (SELECT id FROM restored)
+                """))
+                restored = result.rowcount
+
+        logger.info(f"Detached partition {name} ({partition['rows']} rows), {restored} archived transcripts restored")
+        return {"name": name, "rows": partition["rows"], "restored_transcripts": restored}
+
+    async def archive_transcripts(self, older_than_days: int, batch_size: int = 1000, pause: float = 0.1) -> int:
+        # перенос transcription/summary заметок старше older_than_days в audio_note_archives,
+        # короткими транзакциями по batch_size строк с паузой между ними
+        cutoff = datetime.utcnow() - timedelta(days=older_than_days)
+        started = time.perf_counter()
+        total = 0
+
+        while True:
+            async with self.engine.begin() as conn:
+                result = await conn.execute(ARCHIVE_BATCH, {"cutoff": cutoff, "batch_size": batch_size})
+            total += result.rowcount
+
+            elapsed = time.perf_counter() - started
+            logger.info(f"Archived {total} transcripts older than {cutoff:%Y-%m-%d}, "
+                        f"{total / elapsed if elapsed else 0:.0f} notes/s")
+            if result.rowcount < batch_size:
+                break
+            if pause:
+                await asyncio.sleep(pause)
+
+        return total
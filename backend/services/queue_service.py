@@ -1,7 +1,8 @@
 # TODO - МОДУЛЬ РАБОТЫ С RABBITMQ И ВНЕШНИМ LLM
 import json
-from typing import Dict, Any
+from typing import Dict, Any, List
 from core.config import settings
+from core.metrics import track_queue_publish
 
 
 class QueueService:
@@ -25,6 +26,21 @@ class QueueService:
 
         await self._send_message("trascribation_queue", message)
 
+    async def send_transcription_tasks(self, tasks: List[Dict[str, str]]):
+        # Пакетная отправка задач на транскрибацию (массовый импорт)
+        messages = [
+            {
+                "task_type": "trascribation",
+                "note_id": task["note_id"],
+                "audio_path": task["audio_path"],
+                "audio_format": task.get("audio_format", "webm"),
+                "timestamp": "datetime"
+            }
+            for task in tasks
+        ]
+
+        await self._send_messages("trascribation_queue", messages)
+
     async def send_summarization_task(self, note_id: str, transcription_text: str):
         # Отправка задачи на суммаризацию
         message = {
@@ -49,7 +65,13 @@ class QueueService:
 
     async def _send_message(self, queue_name: str, message: Dict[str, Any]):
         # Отправка сообщения в очередь
-        pass
+        with track_queue_publish(queue_name):
+            pass
+
+    async def _send_messages(self, queue_name: str, messages: List[Dict[str, Any]]):
+        # Отправка пачки сообщений в очередь
+        for message in messages:
+            await self._send_message(queue_name, message)
 
     async def close(self):
         # Закрытие соединения
@@ -0,0 +1,242 @@
+import asyncio
+import logging
+import random
+from collections import Counter
+from datetime import datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional, Sequence, Tuple
+
+from sqlalchemy import select, text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.cache import note_cache
+from core.config import settings
+from core.database import AsyncSessionLocal, engine
+from core.metrics import S3_ORPHANS_DELETED, observe_reaper, observe_stage
+from core.s3_client import s3_client
+from db_layer.note_db_interaction import NoteDBInteraction
+from db_layer.processing_db_interaction import ProcessingDBInteraction, stale_after
+from db_layer.usage_db_interaction import UsageDBInteraction, UsageDeltas, add_status
+from models.note import AudioNote
+from models.processing import CANCELLED, DEAD_LETTER, RETRY_SCHEDULED, NoteProcessing
+from services.queue_service import queue_service
+
+logger = logging.getLogger(__name__)
+
+# Восстановление зависших этапов обработки (клиент отключился посреди загрузки, воркер упал):
+# просроченный этап повторяется с экспоненциальной задержкой, после PROCESSING_MAX_ATTEMPTS - dead_letter,
+# плюс удаление объектов S3, на которые не ссылается ни одна заметка
+
+REAPER_LOCK = "processing_reaper"
+ORPHANS_LOCK = "s3_orphan_sweep"
+# префиксы бакета, которые пишет приложение: аудио загрузок и пики waveform (services/waveform_service.py)
+ORPHAN_PREFIXES = ("audio_notes/", "waveforms/")
+
+# статус заметки, в котором она ждет этап; если статус другой - этап уже не нужен
+STAGE_NOTE_STATUS = {
+    "upload": "uploading",
+    "transcription": "pending_transcription",
+    "summarization": "pending_summarization",
+}
+
+# ключи страницы листинга S3 без ссылок из audio_notes/audio_files
+# (индексы по audio_path/file_path - 0007, по waveform_path - 0009)
+UNREFERENCED_KEYS = text("""
+    SELECT key FROM unnest(CAST(:keys AS text[])) AS key
+    WHERE NOT EXISTS (SELECT 1 FROM audio_notes WHERE audio_path = key)
+      AND NOT EXISTS (SELECT 1 FROM audio_files WHERE file_path = key)
+      AND NOT EXISTS (SELECT 1 FROM audio_files WHERE waveform_path = key)
+""")
+
+
+def retry_delay(attempts: int) -> float:
+    # base * 2^(attempts-1), не больше RETRY_BACKOFF_MAX; половина задержки случайная,
+    # чтобы этапы, упавшие одновременно, не вернулись в очередь одним залпом
+    delay = min(settings.RETRY_BACKOFF_BASE * 2 ** max(attempts - 1, 0), settings.RETRY_BACKOFF_MAX)
+    return delay / 2 + random.uniform(0, delay / 2)
+
+
+class ProcessingReaper:
+    def __init__(self, session_factory=AsyncSessionLocal, db_engine=engine, queue=queue_service, storage=s3_client,
+                 batch_size: int = settings.REAPER_BATCH_SIZE, max_attempts: int = settings.PROCESSING_MAX_ATTEMPTS):
+        self.session_factory = session_factory
+        self.engine = db_engine
+        self.queue = queue
+        self.storage = storage
+        self.batch_size = batch_size
+        self.max_attempts = max_attempts
+
+    async def run_once(self) -> Dict[str, int]:
+        # один проход пачками по batch_size, пока есть этапы со сроком
+        actions = Counter()
+        while True:
+            batch = await self._reap_batch()
+            if batch is None:
+                break
+            actions.update(batch)
+            if sum(batch.values()) < self.batch_size:
+                break
+        return dict(actions)
+
+    async def run_forever(self, interval: float):
+        # фоновая задача воркера (lifespan): интервал со случайным сдвигом, чтобы воркеры не просыпались разом
+        while True:
+            await asyncio.sleep(interval * random.uniform(0.5, 1.5))
+            try:
+                actions = await self.run_once()
+                if actions:
+                    logger.info(f"Reaper pass: {actions}")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Reaper pass failed")
+
+    async def _reap_batch(self) -> Optional[Counter]:
+        # None - проход сейчас выполняет другой процесс (реплика или воркер)
+        now = datetime.utcnow()
+        actions = Counter()
+        dispatch: List[Tuple[str, str, Optional[str], Optional[str]]] = []
+        changed_notes = []
+        usage = UsageDeltas()
+
+        async with self.session_factory() as db:
+            # xact lock: в кластере один проход за раз, остальные не ждут, а пропускают интервал;
+            # SKIP LOCKED в claim_due - страховка, если блокировка будет снята раньше
+            locked = (await db.execute(
+                text("SELECT pg_try_advisory_xact_lock(hashtext(:name))"), {"name": REAPER_LOCK}
+            )).scalar()
+            if not locked:
+                return None
+
+            jobs = await ProcessingDBInteraction(db).claim_due(now, self.batch_size)
+            notes = await self._notes(db, {job.note_id for job in jobs})
+
+            for job in jobs:
+                note = notes.get(job.note_id)
+                note_status = note.status if note is not None else None
+                action = self._handle(job, note, now)
+                actions[action] += 1
+                observe_reaper(job.task_type, action)
+
+                if action == "dispatch":
+                    dispatch.append((job.task_type, str(note.id), note.audio_path, note.transcription))
+                if note is not None and note.status != note_status:
+                    changed_notes.append(note.id)
+                    add_status(usage, note.user_id, note_status, note.status)
+
+            await UsageDBInteraction(db).add(usage)
+            await db.commit()
+
+        # публикация после коммита: если она не удалась, этап снова просрочится через stale_after и будет повторен
+        for task_type, note_id, audio_path, transcription in dispatch:
+            try:
+                await self._dispatch(task_type, note_id, audio_path, transcription)
+            except Exception as e:
+                logger.error(f"Failed to requeue {task_type} for note {note_id}: {e}")
+
+        for note_id in changed_notes:
+            await note_cache.invalidate_note(note_id)
+        return actions
+
+    async def _notes(self, db: AsyncSession, note_ids) -> Dict[Any, AudioNote]:
+        if not note_ids:
+            return {}
+        # строки под блокировкой до коммита прохода: статус, от которого считаются счетчики пользователя, не
+        # поменяет параллельная запись (воркер транскрибации, API); populate_existing - статус из строки,
+        # а не из identity map; порядок id - блокировки в одном порядке у всех проходов
+        result = await db.execute(
+            select(AudioNote)
+            .where(AudioNote.id.in_(note_ids))
+            .order_by(AudioNote.id)
+            .with_for_update()
+            .execution_options(populate_existing=True)
+        )
+        notes = result.scalars().all()
+        # транскрипт для повторной суммаризации - в том числе из архива и сегментов
+        repository = NoteDBInteraction(db)
+        await repository.load_archived(notes)
+        await repository.load_segmented(notes)
+        return {note.id: note for note in notes}
+
+    def _handle(self, job: NoteProcessing, note: Optional[AudioNote], now: datetime) -> str:
+        if note is None or note.status != STAGE_NOTE_STATUS.get(job.task_type):
+            self._close(job, CANCELLED, "Note deleted" if note is None else f"Note is already {note.status}", now)
+            return "cancelled"
+
+        if job.status == RETRY_SCHEDULED:
+            # время повтора пришло: новая попытка с новым сроком
+            job.status = "in_progress"
+            job.attempts = (job.attempts or 0) + 1
+            job.started_at = now
+            job.due_at = now + stale_after(job.task_type)
+            return "dispatch"
+
+        # in_progress со сроком в прошлом - попытка зависла
+        if job.task_type == "upload":
+            # загрузку повторить может только клиент: заметка возвращается в pending, аудио можно загрузить заново
+            self._close(job, "error", "Upload abandoned", now)
+            note.status = "pending"
+            return "abandoned"
+
+        attempts = max(job.attempts or 0, 1)
+        if attempts >= self.max_attempts:
+            self._close(job, DEAD_LETTER, f"No result after {attempts} attempts", now)
+            note.status = "error"
+            return "dead_letter"
+
+        job.status = RETRY_SCHEDULED
+        job.attempts = attempts
+        job.error_message = f"Attempt {attempts} timed out"
+        job.due_at = now + timedelta(seconds=retry_delay(attempts))
+        return "retry"
+
+    def _close(self, job: NoteProcessing, status: str, error_message: str, now: datetime):
+        job.status = status
+        job.error_message = error_message
+        job.completed_at = now
+        observe_stage(job.task_type, status, job.started_at, now)
+
+    async def _dispatch(self, task_type: str, note_id: str, audio_path: Optional[str], transcription: Optional[str]):
+        if task_type == "transcription":
+            await self.queue.send_transcription_task(note_id, audio_path)
+        elif task_type == "summarization":
+            await self.queue.send_summarization_task(note_id, transcription or "")
+
+    async def delete_orphans(self, min_age: timedelta, prefixes: Sequence[str] = ORPHAN_PREFIXES,
+                             dry_run: bool = False) -> Dict[str, Any]:
+        # обход префиксов бакета страницами: ключи старше min_age (загрузки в процессе еще не записаны в БД),
+        # на которые нет ссылок, удаляются пачкой; session-level lock - один обход на кластер
+        report = {"scanned": 0, "orphans": 0, "deleted": 0, "skipped": False}
+        async with self.engine.connect() as conn:
+            locked = (await conn.execute(
+                text("SELECT pg_try_advisory_lock(hashtext(:name))"), {"name": ORPHANS_LOCK}
+            )).scalar()
+            await conn.commit()
+            if not locked:
+                logger.info("S3 orphan sweep is already running elsewhere")
+                report["skipped"] = True
+                return report
+
+            try:
+                cutoff = datetime.now(timezone.utc) - min_age
+                for prefix in prefixes:
+                    async for page in self.storage.list_objects(prefix):
+                        report["scanned"] += len(page)
+                        candidates = [key for key, modified in page if modified < cutoff]
+                        if not candidates:
+                            continue
+
+                        orphans = list((await conn.execute(UNREFERENCED_KEYS, {"keys": candidates})).scalars())
+                        # транзакция на страницу: обход бакета не держит старый снимок БД
+                        await conn.commit()
+                        report["orphans"] += len(orphans)
+                        if orphans and not dry_run:
+                            report["deleted"] += await self.storage.delete_files(orphans)
+                            S3_ORPHANS_DELETED.inc(len(orphans))
+            finally:
+                await conn.rollback()
+                await conn.execute(text("SELECT pg_advisory_unlock(hashtext(:name))"), {"name": ORPHANS_LOCK})
+                await conn.commit()
+
+        logger.info(f"S3 orphan sweep: {report['scanned']} objects, {report['orphans']} unreferenced, "
+                    f"{report['deleted']} deleted{' (dry run)' if dry_run else ''}")
+        return report
@@ -0,0 +1,188 @@
+import asyncio
+import io
+import logging
+import random
+import uuid
+import wave
+from collections import Counter
+from datetime import datetime, timedelta
+from typing import Dict, List, Optional, Tuple
+
+from sqlalchemy import case, select, text
+
+from core.config import settings
+from core.database import AsyncSessionLocal
+from core.metrics import TRANSCRIPTION_QUEUE_DEPTH, TRANSCRIPTION_QUEUE_WAIT
+from db_layer.processing_db_interaction import ProcessingDBInteraction, stale_after
+from models.note import AudioNote
+from models.processing import CANCELLED, NoteProcessing
+from services.queue_service import queue_service
+from services.reaper_service import STAGE_NOTE_STATUS
+
+logger = logging.getLogger(__name__)
+
+# Планировщик транскрибации. Задачи не уходят в RabbitMQ сразу: они ждут в note_processing (status queued),
+# и диспетчер публикует следующие, когда у движков освобождается место (SCHEDULER_CAPACITY задач в работе).
+# В брокере лежит не больше, чем движки успевают взять, поэтому порядок решается здесь:
+#   - приоритет - класс по длительности записи (short / standard / long), строгий, с защитой от голодания:
+#     задача старше SCHEDULER_STARVATION_AFTER идет как short
+#   - внутри класса - взвешенная честная очередь по user_id (self-clocked WFQ): метка задачи -
+#     виртуальное время пользователя после нее, стоимость - секунды аудио / вес тарифа пользователя;
+#     массовая загрузка одного пользователя не задерживает короткие заметки остальных
+#   - задачи не вытесняются, поэтому long никогда не занимает SCHEDULER_RESERVED_SLOTS мест: иначе короткая
+#     заметка ждала бы, пока освободится движок, занятый часовой записью
+
+SCHEDULER_LOCK = "transcription_scheduler"
+TASK_TYPE = "transcription"
+
+PRIORITY_CLASSES = ("short", "standard", "long")
+LONG = PRIORITY_CLASSES.index("long")
+POLICIES = ("priority_fair", "priority", "fair", "fifo")
+
+# байт в секунду аудио для оценки длительности до расчета пиков (AudioFile.duration считается после загрузки)
+BYTES_PER_SECOND = {"wav": 32000, "flac": 20000, "mp3": 16000, "m4a": 16000, "aac": 16000,
+                    "ogg": 8000, "opus": 8000, "webm": 8000}
+DEFAULT_BYTES_PER_SECOND = 16000
+
+
+def estimate_duration(size: int, audio_format: Optional[str], audio_data: Optional[bytes] = None) -> float:
+    # секунды записи: WAV в памяти - точно по заголовку, остальное - по размеру и типичному битрейту формата
+    if audio_format == "wav" and audio_data is not None:
+        try:
+            with wave.open(io.BytesIO(audio_data)) as wav:
+                return wav.getnframes() / wav.getframerate()
+        except (wave.Error, EOFError, ZeroDivisionError):
+            pass
+    return size / BYTES_PER_SECOND.get(audio_format or "", DEFAULT_BYTES_PER_SECOND)
+
+
+def priority_class(duration: float) -> int:
+    # индекс в PRIORITY_CLASSES, 0 - самый высокий
+    if duration <= settings.PRIORITY_SHORT_SECONDS:
+        return 0
+    if duration >= settings.PRIORITY_LONG_SECONDS:
+        return LONG
+    return 1
+
+
+def tier_weight(tier: Optional[str]) -> float:
+    weights = settings.USER_TIER_WEIGHTS
+    return weights.get(tier or "", weights.get(settings.DEFAULT_USER_TIER, 1.0))
+
+
+def transcription_job(note_id: uuid.UUID, user_id: uuid.UUID, duration: float,
+                      tier: Optional[str] = None) -> Dict:
+    # строка для ProcessingDBInteraction.enqueue_many: стоимость в секундах аудио с поправкой на вес тарифа
+    cost = duration + settings.SCHEDULER_JOB_OVERHEAD
+    return {"note_id": note_id, "user_id": user_id, "priority": priority_class(duration),
+            "cost": cost / tier_weight(tier)}
+
+
+class TranscriptionScheduler:
+    def __init__(self, session_factory=AsyncSessionLocal, queue=queue_service,
+                 capacity: int = settings.SCHEDULER_CAPACITY, policy: str = settings.SCHEDULER_POLICY,
+                 reserved_slots: int = settings.SCHEDULER_RESERVED_SLOTS):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown SCHEDULER_POLICY {policy!r}")
+        self.session_factory = session_factory
+        self.queue = queue
+        self.capacity = capacity
+        self.policy = policy
+        self.reserved_slots = reserved_slots
+
+    def order_by(self, now: datetime) -> List:
+        # порядок выборки из очереди для политики; created_at - при равных метках и для fifo
+        starved = NoteProcessing.created_at <= now - timedelta(seconds=settings.SCHEDULER_STARVATION_AFTER)
+        priority = case((starved, 0), else_=NoteProcessing.priority)
+        order = {
+            "priority_fair": [priority, NoteProcessing.finish_tag],
+            "priority": [priority],
+            "fair": [NoteProcessing.finish_tag],
+            "fifo": [],
+        }[self.policy]
+        return order + [NoteProcessing.created_at]
+
+    async def run_once(self, now: Optional[datetime] = None) -> Optional[Dict[str, int]]:
+        # один проход: заполнить свободные места; None - проход сейчас выполняет другой процесс
+        now = now or datetime.utcnow()
+        actions = Counter()
+        dispatch: List[Tuple[str, Optional[str]]] = []
+
+        async with self.session_factory() as db:
+            processing = ProcessingDBInteraction(db)
+            # глубина - в каждом воркере (gauge livemax), не только у держателя блокировки
+            depth = await processing.queue_depth(TASK_TYPE)
+            for index, name in enumerate(PRIORITY_CLASSES):
+                TRANSCRIPTION_QUEUE_DEPTH.labels(name).set(depth.get(index, 0))
+            if not depth:
+                return {}
+
+            locked = (await db.execute(
+                text("SELECT pg_try_advisory_xact_lock(hashtext(:name))"), {"name": SCHEDULER_LOCK}
+            )).scalar()
+            if not locked:
+                return None
+
+            free = self.capacity - await processing.count_in_flight(TASK_TYPE)
+            if free <= 0:
+                return {}
+
+            # места для long - без зарезервированных (но хотя бы одно); нет мест - long не выбираются вовсе
+            long_slots = max(self.capacity - self.reserved_slots, 1)
+            long_free = long_slots - await processing.count_in_flight(TASK_TYPE, LONG)
+            jobs = await processing.claim_queued(TASK_TYPE, free, self.order_by(now),
+                                                 max_priority=None if long_free > 0 else LONG - 1)
+            notes = {}
+            if jobs:
+                result = await db.execute(
+                    select(AudioNote.id, AudioNote.status, AudioNote.audio_path)
+                    .where(AudioNote.id.in_({job.note_id for job in jobs}))
+                )
+                notes = {row.id: row for row in result}
+
+            for job in jobs:
+                note = notes.get(job.note_id)
+                if note is None or note.status != STAGE_NOTE_STATUS[TASK_TYPE]:
+                    # заметку удалили или транскрипт уже получен другим путем
+                    job.status = CANCELLED
+                    job.error_message = "Note deleted" if note is None else f"Note is already {note.status}"
+                    job.completed_at = now
+                    actions["cancelled"] += 1
+                    continue
+
+                if job.priority == LONG:
+                    if long_free <= 0:
+                        # остается в очереди, следующий проход выберет без long
+                        continue
+                    long_free -= 1
+
+                job.status = "in_progress"
+                job.attempts = 1
+                job.started_at = now
+                job.due_at = now + stale_after(TASK_TYPE)
+                TRANSCRIPTION_QUEUE_WAIT.labels(PRIORITY_CLASSES[job.priority or 0]).observe(
+                    (now - job.created_at).total_seconds()
+                )
+                dispatch.append((str(job.note_id), note.audio_path))
+                actions["dispatched"] += 1
+
+            await db.commit()
+
+        # публикация после коммита: не удалась - этап просрочится и reaper его повторит
+        for note_id, audio_path in dispatch:
+            try:
+                await self.queue.send_transcription_task(note_id, audio_path)
+            except Exception as e:
+                logger.error(f"Failed to publish transcription for note {note_id}: {e}")
+        return dict(actions)
+
+    async def run_forever(self, interval: float):
+        # фоновая задача воркера (lifespan), как у reaper: проход в кластере один за раз (advisory lock)
+        while True:
+            await asyncio.sleep(interval * random.uniform(0.5, 1.5))
+            try:
+                await self.run_once()
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Scheduler pass failed")
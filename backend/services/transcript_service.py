@@ -0,0 +1,84 @@
+import uuid
+from typing import Any, Dict, List, Optional, Sequence
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from db_layer.note_db_interaction import NoteDBInteraction
+from models.note import AudioNote
+
+# Транскрипт сегментами с таймкодами: окно [from_ms, to_ms) читается без полного текста,
+# поиск по сегментам возвращает момент аудио; полный текст заметки - производный (NoteDBInteraction)
+
+
+def normalize_segments(segments: Sequence[Any]) -> List[Dict[str, Any]]:
+    # сегменты движка (dict или объект с start_ms/end_ms/text) -> по возрастанию start_ms, без пустых и перекрытий:
+    # перекрытие обрезает конец предыдущего сегмента, сегменты с одинаковым началом склеиваются
+    items = []
+    for segment in segments:
+        if not isinstance(segment, dict):
+            segment = {"start_ms": segment.start_ms, "end_ms": segment.end_ms, "text": segment.text}
+        body = (segment.get("text") or "").strip()
+        if not body:
+            continue
+        start_ms = max(int(segment["start_ms"]), 0)
+        end_ms = max(int(segment.get("end_ms") or start_ms), start_ms + 1)
+        items.append({"start_ms": start_ms, "end_ms": end_ms, "text": body})
+    items.sort(key=lambda item: (item["start_ms"], item["end_ms"]))
+
+    result: List[Dict[str, Any]] = []
+    for item in items:
+        if result and item["start_ms"] == result[-1]["start_ms"]:
+            result[-1]["text"] += " " + item["text"]
+            result[-1]["end_ms"] = max(result[-1]["end_ms"], item["end_ms"])
+            continue
+        if result and item["start_ms"] < result[-1]["end_ms"]:
+            result[-1]["end_ms"] = item["start_ms"]
+        result.append(item)
+    return result
+
+
+class TranscriptService:
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None,
+                 user_id: Optional[uuid.UUID] = None):
+        self.repository = NoteDBInteraction(db, read_db, user_id)
+
+    async def get_window(self, note_id: uuid.UUID, from_ms: int = 0, to_ms: Optional[int] = None,
+                         limit: Optional[int] = 200) -> Optional[Dict[str, Any]]:
+        # страница сегментов окна; следующая страница - тот же запрос с from_ms = next_from_ms, limit None - все
+        # None - заметки нет или транскрипт еще не готов
+        segments = [
+            {"start_ms": segment.start_ms, "end_ms": segment.end_ms, "text": segment.text}
+            for segment in await self.repository.get_segments(note_id, from_ms, to_ms, limit)
+        ]
+        next_from_ms = None
+        if len(segments) == limit and (to_ms is None or segments[-1]["end_ms"] < to_ms):
+            next_from_ms = segments[-1]["end_ms"]
+
+        if not segments:
+            # пустое окно: заметки нет, сегменты в другом месте аудио или транскрипт без таймкодов
+            segmented = (await self.repository.read(
+                self.repository.select_fields(["transcript_segmented"]).where(AudioNote.id == note_id)
+            )).scalar_one_or_none()
+            if segmented is None:
+                return None
+            if not segmented:
+                # транскрипт до сегментов или от движка без таймкодов: один сегмент на весь текст, конец неизвестен
+                transcription = (await self.repository.read(
+                    self.repository.select_fields(["transcription"]).where(AudioNote.id == note_id)
+                )).scalar_one_or_none()
+                if not transcription:
+                    return None
+                if from_ms == 0:
+                    segments = [{"start_ms": 0, "end_ms": None, "text": transcription}]
+
+        return {
+            "note_id": note_id,
+            "from_ms": from_ms,
+            "to_ms": to_ms,
+            "transcription": " ".join(segment["text"] for segment in segments),
+            "segments": segments,
+            "next_from_ms": next_from_ms,
+        }
+
+    async def search(self, search: str, limit: int = 50) -> List[Dict[str, Any]]:
+        return await self.repository.search_segments(search, limit)
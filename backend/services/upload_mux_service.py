@@ -0,0 +1,234 @@
+import asyncio
+import json
+import struct
+import uuid
+from typing import Dict, Optional
+
+from fastapi import WebSocket, status
+from starlette.websockets import WebSocketDisconnect
+
+from core.admission import AdmissionRejected, client_id, upload_admission
+from core.config import settings
+from core.database import AsyncSessionLocal
+from services.upload_service import UploadService, upload_tracker
+
+# Мультиплексированная загрузка: одно соединение /ws/upload несет загрузки нескольких заметок (потоки).
+# Каждый поток проходит тот же pipeline, что и /ws/upload/{note_id} (UploadService.handle_upload): ему
+# передается UploadStream с интерфейсом WebSocket, кадры потока приходят из очереди, ответы уходят с stream_id.
+# Протокол:
+#   {"stream_id": 1, "note_id": "...", "filename", "file_size"[, "stream", "format"]} - открыть поток
+#     с метаданными загрузки; ответ {"stream_id": 1, "status": "opened", "window": ...}, дальше - ответы
+#     UploadService ("ready", "progress", "completed", ...) с тем же stream_id и в конце {"status": "closed"}
+#   бинарное сообщение - 4 байта stream_id (big-endian) + кадр аудио
+#   {"stream_id", "event": "end"} - конец записи в потоковом режиме, {"stream_id", "event": "cancel"} - отмена
+# Управление потоком: по каждому потоку клиент отправляет не больше window байт сверх подтвержденных,
+# сервер возвращает кредит {"stream_id", "status": "window", "increment": n}, когда загрузка забрала кадры.
+# Медленная или большая загрузка не копит данные в памяти и не задерживает кадры остальных потоков.
+# Допуск: каждый принимаемый поток занимает место клиента в upload_admission - тот же бюджет
+# MAX_UPLOADS_PER_CLIENT, что у загрузок отдельными сокетами, по всем соединениям клиента. Потоки сверх него
+# открыты и ждут очереди (их кадры в пределах окна ждут в очереди потока), а не получают отказ; затем поток
+# занимает место в лимите воркера. Соединений у клиента не больше MAX_UPLOADS_PER_CLIENT
+
+FRAME_HEADER = struct.Struct(">I")
+MAX_STREAM_ID = 2 ** 32 - 1
+
+
+class UploadStream:
+    # поток соединения для UploadService: send_json/receive/receive_json/receive_bytes как у WebSocket
+    def __init__(self, connection: "UploadMultiplexer", stream_id: int, metadata: str):
+        self.connection = connection
+        self.stream_id = stream_id
+        self.messages: asyncio.Queue = asyncio.Queue()
+        # первое сообщение потока - метаданные из запроса на открытие (UploadService.receive_metadata)
+        self.messages.put_nowait({"type": "websocket.receive", "text": metadata})
+        # байт, которые клиент еще может отправить; забранные загрузкой, но еще не возвращенные кредитом
+        self.window = settings.UPLOAD_MUX_STREAM_WINDOW
+        self.consumed = 0
+        self.closed = False
+        self.task: Optional[asyncio.Task] = None
+
+    def push_bytes(self, data: bytes) -> bool:
+        # False - клиент превысил окно потока
+        if len(data) > self.window:
+            return False
+        self.window -= len(data)
+        self.messages.put_nowait({"type": "websocket.receive", "bytes": data})
+        return True
+
+    def push_text(self, data: str):
+        self.messages.put_nowait({"type": "websocket.receive", "text": data})
+
+    def close(self, code: int = 1000):
+        # для загрузки - как отключение клиента: заметка возвращается в pending, кадры потока дальше отбрасываются
+        if not self.closed:
+            self.closed = True
+            self.messages.put_nowait({"type": "websocket.disconnect", "code": code})
+
+    async def send_json(self, data: dict):
+        # закрытый поток дорабатывает молча, как загрузка после отключения сокета
+        if not self.closed:
+            await self.connection.send({"stream_id": self.stream_id, **data})
+
+    async def receive(self) -> dict:
+        message = await self.messages.get()
+        if message.get("bytes") is not None:
+            await self._credit(len(message["bytes"]))
+        return message
+
+    async def receive_json(self) -> dict:
+        message = await self.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message["code"])
+        if message.get("text") is None:
+            raise ValueError("Expected a JSON message")
+        return json.loads(message["text"])
+
+    async def receive_bytes(self) -> bytes:
+        message = await self.receive()
+        if message["type"] == "websocket.disconnect":
+            raise WebSocketDisconnect(message["code"])
+        if message.get("bytes") is None:
+            raise ValueError("Expected an audio frame")
+        return message["bytes"]
+
+    async def _credit(self, size: int):
+        # кредит возвращается пачками от половины окна, а не на каждый кадр
+        self.consumed += size
+        if self.consumed >= settings.UPLOAD_MUX_STREAM_WINDOW // 2:
+            increment, self.consumed = self.consumed, 0
+            self.window += increment
+            await self.send_json({"status": "window", "increment": increment})
+
+
+class UploadMultiplexer:
+    # одно соединение: чтение кадров и раздача по потокам, у каждого потока - своя задача, сессия БД,
+    # место клиента и место в общем лимите загрузок воркера
+    def __init__(self, websocket: WebSocket, user_id: Optional[uuid.UUID] = None, tier: Optional[str] = None):
+        self.websocket = websocket
+        self.user_id = user_id
+        self.tier = tier
+        self.client = client_id(websocket.client.host if websocket.client else None)
+        self.streams: Dict[int, UploadStream] = {}
+        self.connected = True
+        self._send_lock = asyncio.Lock()
+
+    async def send(self, message: dict):
+        # ответы потоков идут по одному соединению по очереди; клиент отключился - загрузки дорабатывают молча
+        if not self.connected:
+            return
+        async with self._send_lock:
+            try:
+                await self.websocket.send_json(message)
+            except Exception:
+                self.connected = False
+
+    async def run(self):
+        try:
+            async with upload_admission.connection_slot(self.client):
+                await self._receive()
+        except AdmissionRejected as e:
+            # у клиента уже MAX_UPLOADS_PER_CLIENT соединений - как отказ отдельному сокету, код 1013
+            await self._error(None, e.reason, retry_after=e.retry_after)
+            await self.websocket.close(code=status.WS_1013_TRY_AGAIN_LATER)
+
+    async def _receive(self):
+        try:
+            while True:
+                message = await self.websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    break
+                if message.get("bytes") is not None:
+                    await self._on_frame(message["bytes"])
+                elif message.get("text") is not None:
+                    await self._on_control(message["text"])
+        finally:
+            # соединение закрыто: потоки, которые еще принимают аудио, завершаются как при отключении клиента
+            self.connected = False
+            streams = list(self.streams.values())
+            for stream in streams:
+                stream.close()
+            await asyncio.gather(*(stream.task for stream in streams), return_exceptions=True)
+
+    async def _error(self, stream_id: Optional[int], message: str, **extra):
+        await self.send({"stream_id": stream_id, "status": "error", "message": message, **extra})
+
+    async def _on_frame(self, data: bytes):
+        if len(data) < FRAME_HEADER.size:
+            await self._error(None, "Binary frame without stream header")
+            return
+
+        (stream_id,) = FRAME_HEADER.unpack_from(data)
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            await self._error(stream_id, "Unknown stream")
+        elif stream.closed:
+            # кадры, отправленные до того, как клиент узнал о закрытии потока
+            return
+        elif not stream.push_bytes(data[FRAME_HEADER.size:]):
+            # клиент не соблюдает окно - закрывается только этот поток
+            stream.close()
+            await self._error(stream_id, "Flow-control window exceeded")
+
+    async def _on_control(self, data: str):
+        try:
+            control = json.loads(data)
+            stream_id = int(control["stream_id"])
+        except (ValueError, KeyError, TypeError):
+            await self._error(None, "Invalid control message: stream_id is required")
+            return
+
+        stream = self.streams.get(stream_id)
+        if stream is None:
+            if "note_id" in control:
+                await self._open(stream_id, control)
+            else:
+                await self._error(stream_id, "Unknown stream")
+        elif control.get("event") == "cancel":
+            stream.close()
+        elif not stream.closed:
+            stream.push_text(data)
+
+    async def _open(self, stream_id: int, control: dict):
+        if upload_tracker.draining:
+            # воркер останавливается - новые загрузки не принимаются, клиент откроет поток на другом
+            await self._error(stream_id, "Worker is shutting down", retry_after=settings.UPLOAD_RETRY_AFTER)
+            return
+        if not 0 < stream_id <= MAX_STREAM_ID:
+            await self._error(stream_id, f"stream_id must be between 1 and {MAX_STREAM_ID}")
+            return
+        if len(self.streams) >= settings.UPLOAD_MUX_MAX_STREAMS:
+            await self._error(stream_id, f"Too many streams on this connection (max {settings.UPLOAD_MUX_MAX_STREAMS})",
+                              retry_after=settings.UPLOAD_RETRY_AFTER)
+            return
+        try:
+            note_id = uuid.UUID(str(control["note_id"]))
+        except ValueError:
+            await self._error(stream_id, "Invalid note_id")
+            return
+
+        metadata = {key: value for key, value in control.items() if key not in ("stream_id", "note_id")}
+        stream = UploadStream(self, stream_id, json.dumps(metadata))
+        self.streams[stream_id] = stream
+        await stream.send_json({"status": "opened", "note_id": str(note_id), "window": stream.window})
+        stream.task = asyncio.create_task(self._run_stream(stream, note_id))
+
+    async def _run_stream(self, stream: UploadStream, note_id: uuid.UUID):
+        upload_tracker.start()
+        try:
+            # места клиента и воркера занимаются до сессии БД: загрузки в очереди не держат соединения пула
+            async with upload_admission.client_slot(self.client, wait=True), upload_admission.worker_slot():
+                # поток отменен или соединение закрыто, пока поток ждал очереди
+                if not stream.closed:
+                    async with AsyncSessionLocal() as db:
+                        await UploadService(db, self.user_id, self.tier).handle_upload(stream, note_id)
+        except AdmissionRejected as e:
+            await stream.send_json({"status": "error", "message": e.reason, "retry_after": e.retry_after})
+        except WebSocketDisconnect:
+            pass
+        except Exception as e:
+            await stream.send_json({"status": "error", "message": f"Unexpected error: {str(e)}"})
+        finally:
+            stream.closed = True
+            self.streams.pop(stream.stream_id, None)
+            upload_tracker.finish()
+            await self.send({"stream_id": stream.stream_id, "status": "closed"})
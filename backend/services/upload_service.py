@@ -1,4 +1,7 @@
 import asyncio
+import logging
+import os
+import time
 import uuid
 import json
 from typing import Optional
@@ -7,14 +10,64 @@ from sqlalchemy.ext.asyncio import AsyncSession
 from starlette.websockets import WebSocketDisconnect
 
 from services.note_service import NoteService
+from services.waveform_service import WaveformService, audio_format
+from services.scheduler_service import estimate_duration
+from services.queue_service import queue_service
+from services.transcript_service import normalize_segments
+from services.live_transcription_service import (
+    PCM_FORMATS, LiveTranscription, live_transcription_available, pcm_to_wav
+)
+from db_layer.audio_file_db_interaction import AudioFileDBInteraction
+from models.audio_file import AudioFile
 from core.s3_client import s3_client
+from core.config import settings
+from core.metrics import LIVE_TRANSCRIPTIONS, observe_upload
+from core.admission import AdmissionRejected, upload_admission
 # TODO - rabbitmq
 from datetime import datetime
 
+logger = logging.getLogger(__name__)
+
+
+class UploadTracker:
+    # учет активных загрузок в воркере: при остановке новые не принимаются,
+    # а текущие дожидаются завершения (graceful drain)
+    def __init__(self):
+        self.active = 0
+        self.draining = False
+        self._idle = asyncio.Event()
+        self._idle.set()
+
+    def start(self):
+        self.active += 1
+        self._idle.clear()
+
+    def finish(self):
+        self.active -= 1
+        if self.active == 0:
+            self._idle.set()
+
+    async def drain(self, timeout: float) -> bool:
+        # True - все загрузки завершились до таймаута
+        self.draining = True
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+            return True
+        except asyncio.TimeoutError:
+            return False
+
+
+# Глобальный трекер загрузок воркера
+upload_tracker = UploadTracker()
+
+
 class UploadService:
-    def __init__(self, db: AsyncSession):
+    # user_id - владелец заметки: загрузить аудио можно только в свою заметку
+    def __init__(self, db: AsyncSession, user_id: Optional[uuid.UUID] = None, tier: Optional[str] = None):
         self.db = db
-        self.note_service = NoteService(db)
+        self.note_service = NoteService(db, user_id=user_id)
+        self.user_id = user_id
+        self.tier = tier
 
     async def send_error(self, websocket: WebSocket, message: str):
         # отправка ошибки
@@ -32,9 +85,21 @@ class UploadService:
                 websocket.receive_json(),
                 timeout=10.0
             )
+            filename = metadata_json.get("filename", "audio.webm") # todo - имя файла должно быть настраиваемым?
+            # stream - потоковый режим: запись идет, размер заранее неизвестен (file_size - верхняя граница),
+            # конец записи - текстовое сообщение {"event": "end"}
+            stream = bool(metadata_json.get("stream", False))
+            file_size = int(metadata_json.get("file_size") or 0)
+            # размер резервируется в бюджете памяти (upload_admission.reserve_bytes): отрицательный уменьшил бы
+            # bytes_in_flight, нулевой без потокового режима - пустая загрузка
+            if file_size < 0 or (file_size == 0 and not stream):
+                raise ValueError(f"file_size must be a positive number of bytes, got {file_size}")
             return {
-                "filename": metadata_json.get("filename", "audio.webm"), # todo - имя файла должно быть настраиваемым?
-                "file_size": metadata_json.get("file_size", 0)
+                "filename": filename,
+                "file_size": min(file_size or settings.LIVE_TRANSCRIPTION_MAX_BYTES,
+                                 settings.LIVE_TRANSCRIPTION_MAX_BYTES) if stream else file_size,
+                "stream": stream,
+                "format": str(metadata_json.get("format") or audio_format(filename)).lower()
             }
         except asyncio.TimeoutError:
             await self.send_error(websocket, "Timeout waiting for metadata")
@@ -54,6 +119,10 @@ class UploadService:
 
             while total_bytes_received < file_size:
                 data = await websocket.receive_bytes()
+                # память резервируется по объявленному размеру - больше принимать нельзя
+                if total_bytes_received + len(data) > file_size:
+                    await self.send_error(websocket, f"Received more than declared file_size {file_size}")
+                    return None
                 audio_data.extend(data)
                 total_bytes_received += len(data)
 
@@ -71,36 +140,142 @@ class UploadService:
             await self.send_error(websocket, f"Error receiving audio: {str(e)}")
             return None
 
+    async def receive_stream(self, websocket: WebSocket, note_id: uuid.UUID, max_bytes: int,
+                             live: Optional[LiveTranscription]) -> Optional[bytes]:
+        # потоковый режим: кадры записи до {"event": "end"}, каждый сразу уходит в транскрибацию,
+        # сегменты отправляются клиенту между кадрами
+        audio_data = bytearray()
+        extended = time.monotonic()
+        try:
+            await websocket.send_json({
+                "status": "ready",
+                "mode": "stream",
+                "live_transcription": live is not None and live.active
+            })
+
+            while True:
+                message = await websocket.receive()
+                if message["type"] == "websocket.disconnect":
+                    raise WebSocketDisconnect(message.get("code", 1000))
+
+                if message.get("bytes") is not None:
+                    data = message["bytes"]
+                    if len(audio_data) + len(data) > max_bytes:
+                        await self.send_error(websocket, f"Recording exceeds {max_bytes} bytes")
+                        return None
+                    audio_data.extend(data)
+                    if live is not None:
+                        await self.feed_live(websocket, live, data)
+                elif message.get("text") is not None and json.loads(message["text"]).get("event") == "end":
+                    return bytes(audio_data)
+
+                # запись дольше UPLOAD_STALE_AFTER - срок этапа продлевается, иначе reaper сочтет загрузку брошенной
+                if time.monotonic() - extended > settings.UPLOAD_STALE_AFTER / 3:
+                    await self.note_service.extend_stage(note_id, "upload")
+                    extended = time.monotonic()
+
+        except Exception as e:
+            await self.send_error(websocket, f"Error receiving audio: {str(e)}")
+            return None
+
+    async def feed_live(self, websocket: WebSocket, live: LiveTranscription, data: bytes):
+        was_active = live.active
+        await live.feed(data)
+        await self.send_segments(websocket, live.pending())
+        if was_active and not live.active:
+            # запись продолжается, транскрипт будет получен обычным pipeline после загрузки
+            LIVE_TRANSCRIPTIONS.labels("failed").inc()
+            await websocket.send_json({"status": "live_transcription_failed", "message": live.error})
+
+    async def send_segments(self, websocket: WebSocket, events):
+        # partial - гипотеза текущей фразы (заменяет предыдущую partial), segment - окончательный сегмент
+        for event in events:
+            await websocket.send_json({
+                "status": "segment" if event["final"] else "partial",
+                "start_ms": event["start_ms"],
+                "end_ms": event["end_ms"],
+                "text": event["text"]
+            })
+
+    async def save_live_transcript(self, websocket: WebSocket, note_id: uuid.UUID,
+                                   live: LiveTranscription) -> bool:
+        # запись остановлена: последняя фраза и сохранение транскрипта сразу, до загрузки в S3 и без batch-задачи
+        # False - транскрипта нет, заметка пойдет в обычный pipeline
+        if not live.active:
+            return False
+
+        await self.note_service.start_stage(note_id, "transcription")
+        await self.send_segments(websocket, await live.finish())
+        if not live.active:
+            LIVE_TRANSCRIPTIONS.labels("failed").inc()
+            await self.note_service.finish_stage(note_id, "transcription", "error", live.error)
+            await websocket.send_json({"status": "live_transcription_failed", "message": live.error})
+            return False
+
+        await self.note_service.update_transcription_status(note_id, segments=live.segments)
+        LIVE_TRANSCRIPTIONS.labels("saved").inc()
+        # передачу заметки суммаризации раньше делал воркер транскрибации - теперь его место занимает поток.
+        # Публикация после коммита: не удалась - этап summarization просрочится и reaper его повторит
+        transcription = " ".join(segment["text"] for segment in normalize_segments(live.segments))
+        try:
+            await queue_service.send_summarization_task(str(note_id), transcription)
+        except Exception as e:
+            logger.error(f"Failed to publish summarization for note {note_id}: {e}")
+        await websocket.send_json({"status": "transcribed", "segments": len(live.segments)})
+        return True
+
     async def process_upload(self, websocket: WebSocket, note_id: uuid.UUID,
-                            audio_data: bytes, filename: str):
-        # обработка загруженного аудио
+                            audio_data: bytes, filename: str, transcribed: bool = False) -> Optional[AudioFile]:
+        # обработка загруженного аудио, возвращает запись о файле (None - загрузка не удалась)
+        # transcribed - транскрипт уже сохранен потоковой транскрибацией, задача на транскрибацию не нужна
+        file_key = None
         try:
             # загружаем в S3
             file_key = await s3_client.upload_file(audio_data, filename)
             audio_url = await s3_client.generate_presigned_url(file_key, 3600)
 
             # обновляем БД
-            await self.note_service.repository.update(note_id, {
+            note_update = {
                 "audio_filename": filename,
                 "audio_path": file_key,
-                "audio_url": audio_url,
-                "status": "pending_transcription"
+                "audio_url": audio_url
+            }
+            if not transcribed:
+                note_update["status"] = "pending_transcription"
+            await self.note_service.repository.update(note_id, note_update)
+            audio_file = await AudioFileDBInteraction(self.db).create({
+                "note_id": note_id,
+                "file_path": file_key,
+                "file_size": len(audio_data),
+                "format": audio_format(filename)
             })
-
-            # отправляем задачу в RabbitMQ
-            #await self.publish_transcription_task(note_id, file_key, audio_url)
+            await self.note_service.finish_stage(note_id, "upload")
+            if not transcribed:
+                # задачу в RabbitMQ публикует планировщик, когда у движков есть место
+                duration = estimate_duration(len(audio_data), audio_file.format, audio_data)
+                await self.note_service.queue_transcription(note_id, self.user_id, duration, self.tier)
 
             # уведомляем фронт об успехе
             await websocket.send_json({
                 "status": "completed",
-                "message": "Audio uploaded and processing started",
+                "message": "Audio uploaded" if transcribed else "Audio uploaded and processing started",
                 "file_key": file_key,
                 "audio_url": audio_url
             })
 
         except Exception as e:
+            # объект без ссылки из заметки сразу удаляем (не удалось - его найдет ProcessingReaper.delete_orphans)
+            if file_key is not None:
+                try:
+                    await s3_client.delete_file(file_key)
+                except Exception:
+                    pass
             await self.note_service.update_note_status(note_id, "error")
+            await self.note_service.finish_stage(note_id, "upload", "error", str(e))
             await self.send_error(websocket, f"Upload failed: {str(e)}")
+            return None
+
+        return audio_file
 
 
     async def handle_upload(self, websocket: WebSocket, note_id: uuid.UUID):
@@ -113,16 +288,63 @@ class UploadService:
 
         # обновляем статус
         await self.note_service.update_note_status(note_id, "uploading")
+        await self.note_service.start_stage(note_id, "upload")
+        started = time.perf_counter()
 
-        # получаем метаданные
+        # получаем метаданные; если клиент отключился - заметка возвращается в pending, загрузку можно повторить
         metadata = await self.receive_metadata(websocket)
         if not metadata:
+            await self.note_service.finish_stage(note_id, "upload", "error", "No metadata received")
+            await self.note_service.update_note_status(note_id, "pending")
+            observe_upload(0, time.perf_counter() - started, "error")
             return
 
-        # принимаем аудио данные
-        audio_data = await self.receive_audio_data(websocket, metadata['file_size'])
-        if not audio_data:
-            return
+        # аудио буферизуется в памяти целиком - объявленный размер (в потоковом режиме - предел записи)
+        # резервируется в бюджете воркера
+        live = None
+        try:
+            async with upload_admission.reserve_bytes(metadata['file_size']):
+                # принимаем аудио данные
+                if metadata['stream']:
+                    if live_transcription_available():
+                        live = LiveTranscription(metadata['format'])
+                        await live.start()
+                        if not live.active:
+                            LIVE_TRANSCRIPTIONS.labels("failed").inc()
+                    else:
+                        LIVE_TRANSCRIPTIONS.labels("unavailable").inc()
+                    audio_data = await self.receive_stream(websocket, note_id, metadata['file_size'], live)
+                else:
+                    audio_data = await self.receive_audio_data(websocket, metadata['file_size'])
+                if not audio_data:
+                    await self.note_service.finish_stage(note_id, "upload", "error", "No audio data received")
+                    await self.note_service.update_note_status(note_id, "pending")
+                    observe_upload(0, time.perf_counter() - started, "error")
+                    return
+
+                filename = metadata['filename']
+                transcribed = live is not None and await self.save_live_transcript(websocket, note_id, live)
+                if metadata['stream'] and metadata['format'] in PCM_FORMATS:
+                    audio_data = pcm_to_wav(audio_data, settings.LIVE_TRANSCRIPTION_SAMPLE_RATE)
+                    filename = f"{os.path.splitext(filename)[0]}.wav"
+
+                # обрабатываем загрузку
+                audio_file = await self.process_upload(websocket, note_id, audio_data, filename, transcribed)
+                observe_upload(len(audio_data), time.perf_counter() - started,
+                               "completed" if audio_file is not None else "error")
 
-        # обрабатываем загрузку
-        await self.process_upload(websocket, note_id, audio_data, metadata['filename'])
\ No newline at end of file
+                # пики для плеера считаются из аудио, уже лежащего в памяти (внутри резерва байтов): декодирование
+                # идет кусками, сверх резерва - только кусок PCM и пики; клиент к этому моменту получил "completed"
+                if audio_file is not None:
+                    await WaveformService(self.db, self.user_id).build(
+                        note_id, audio_file.id, audio_data, audio_file.format
+                    )
+        except AdmissionRejected as e:
+            # заметка возвращается в pending - клиент повторит загрузку через retry_after
+            await self.note_service.finish_stage(note_id, "upload", "error", e.reason)
+            await self.note_service.update_note_status(note_id, "pending")
+            observe_upload(0, time.perf_counter() - started, "rejected")
+            raise
+        finally:
+            if live is not None:
+                await live.close()
\ No newline at end of file
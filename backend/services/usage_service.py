@@ -0,0 +1,72 @@
+import asyncio
+import logging
+import random
+import uuid
+from typing import Any, Dict, Optional
+
+from sqlalchemy import text
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.database import AsyncSessionLocal
+from core.metrics import USAGE_COUNTERS_CORRECTED
+from db_layer.note_db_interaction import NoteDBInteraction
+from db_layer.usage_db_interaction import UsageDBInteraction
+from models.note import NOTE_STATUSES
+from models.usage_counter import AUDIO_SECONDS, STORAGE_BYTES, status_metric
+
+logger = logging.getLogger(__name__)
+
+# Статистика для дашборда: заметки по статусам, объем и минуты аудио пользователя из счетчиков usage_counters -
+# чтение не зависит от числа заметок. Счетчики меняются в транзакциях NoteDBInteraction / AudioFileDBInteraction
+# и reaper; изменения мимо них (отключенные партиции, ручные правки) исправляет периодическая сверка
+
+RECONCILE_LOCK = "usage_reconcile"
+
+
+class UsageService:
+    def __init__(self, db: AsyncSession, read_db: Optional[AsyncSession] = None,
+                 user_id: Optional[uuid.UUID] = None):
+        self.repository = NoteDBInteraction(db, read_db, user_id)
+
+    async def get_stats(self) -> Dict[str, Any]:
+        usage = await self.repository.get_usage()
+        by_status = {status: usage.get(status_metric(status), 0) for status in NOTE_STATUSES}
+        return {
+            "notes": sum(by_status.values()),
+            "by_status": by_status,
+            "storage_bytes": usage.get(STORAGE_BYTES, 0),
+            "audio_minutes": round(usage.get(AUDIO_SECONDS, 0) / 60, 1),
+        }
+
+
+class UsageReconciler:
+    def __init__(self, session_factory=AsyncSessionLocal):
+        self.session_factory = session_factory
+
+    async def run_once(self) -> Optional[int]:
+        # число исправленных счетчиков; None - сверку сейчас выполняет другой процесс
+        async with self.session_factory() as db:
+            locked = (await db.execute(
+                text("SELECT pg_try_advisory_xact_lock(hashtext(:name))"), {"name": RECONCILE_LOCK}
+            )).scalar()
+            if not locked:
+                return None
+
+            corrected = await UsageDBInteraction(db).reconcile()
+            await db.commit()
+
+        USAGE_COUNTERS_CORRECTED.inc(corrected)
+        return corrected
+
+    async def run_forever(self, interval: float):
+        # фоновая задача воркера (lifespan), как у reaper: сверка в кластере одна за раз (advisory lock)
+        while True:
+            await asyncio.sleep(interval * random.uniform(0.5, 1.5))
+            try:
+                corrected = await self.run_once()
+                if corrected:
+                    logger.info(f"Usage reconciliation corrected {corrected} counters")
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception("Usage reconciliation failed")
@@ -0,0 +1,295 @@
+import asyncio
+import io
+import logging
+import os
+import struct
+import subprocess
+import threading
+import uuid
+import wave
+from typing import Iterator, List, Optional, Tuple
+
+from sqlalchemy.ext.asyncio import AsyncSession
+
+from core.config import settings
+from core.s3_client import s3_client
+from db_layer.audio_file_db_interaction import AudioFileDBInteraction
+from models.audio_file import AudioFile
+from services.note_service import NoteService
+
+logger = logging.getLogger(__name__)
+
+# Пики waveform для плеера: аудио декодируется один раз при загрузке, для каждого уровня детализации
+# считаются пары (min, max) на блок из samples_per_pixel отсчетов. Уровень хранится в формате .dat
+# audiowaveform (BBC, v1): заголовок + чередующиеся min/max int8 или int16 - его читают peaks.js/wavesurfer.
+# Все уровни лежат одним объектом S3, смещения уровней - в audio_files.waveform_levels
+
+DAT_HEADER = struct.Struct("<iIiiI")  # version, flags (1 - 8 бит), sample_rate, samples_per_pixel, length
+DAT_VERSION = 1
+DAT_FLAG_8BIT = 1
+
+# самый детальный уровень - не больше MAX_PEAKS пиков, отсчетов на пик - MIN_SAMPLES_PER_PEAK или кратно ему,
+# каждый следующий грубее в LEVEL_FACTOR раз, пока пиков больше MIN_PEAKS
+MAX_PEAKS = 65536
+MIN_SAMPLES_PER_PEAK = 256
+MIN_PEAKS = 256
+LEVEL_FACTOR = 4
+
+WAVEFORM_CONTENT_TYPE = "application/octet-stream"
+# ответ по URL с версией пиков (?v=audio_files.id): содержимое под таким URL никогда не меняется
+WAVEFORM_IMMUTABLE = "private, max-age=31536000, immutable"
+
+
+def numpy_available() -> bool:
+    # numpy - необязательная зависимость (extra "waveform"), без нее этап пропускается
+    try:
+        import numpy  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def audio_format(filename: str) -> str:
+    return os.path.splitext(filename)[1].lstrip(".").lower()[:10] or "webm"
+
+
+# декодированное аудио не держится в памяти целиком (час opus - сотни МБ float32): отсчеты идут кусками
+# по CHUNK_SAMPLES, из каждого сразу считаются min/max блоков по MIN_SAMPLES_PER_PEAK отсчетов,
+# уровни строятся из этих блоков; в памяти - исходный файл (он уже в резерве загрузки), кусок и блоки
+CHUNK_SAMPLES = MIN_SAMPLES_PER_PEAK * 4096
+
+
+def pcm_samples(frames: bytes, width: int, channels: int):
+    # кадры PCM -> моно float32 в [-1, 1]
+    import numpy as np
+
+    if width == 1:
+        samples = (np.frombuffer(frames, dtype=np.uint8).astype(np.float32) - 128) / 128
+    elif width == 2:
+        samples = np.frombuffer(frames, dtype="<i2").astype(np.float32) / 32768
+    elif width == 3:
+        # 24 бит: три байта дополняются до int32 сдвигом, знак сохраняется
+        raw = np.frombuffer(frames, dtype=np.uint8).reshape(-1, 3).astype(np.int32)
+        samples = ((raw[:, 0] << 8 | raw[:, 1] << 16 | raw[:, 2] << 24) >> 8).astype(np.float32) / 8388608
+    elif width == 4:
+        samples = np.frombuffer(frames, dtype="<i4").astype(np.float32) / 2147483648
+    else:
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+
+    if channels > 1:
+        samples = samples[:len(samples) // channels * channels].reshape(-1, channels).mean(axis=1)
+    return samples
+
+
+def decode_wav(audio: bytes) -> Tuple[int, Iterator]:
+    # PCM WAV разбирается без ffmpeg; заголовок читается сразу (ошибка формата - до первого куска)
+    wav = wave.open(io.BytesIO(audio))
+    channels, width, sample_rate = wav.getnchannels(), wav.getsampwidth(), wav.getframerate()
+    if width not in (1, 2, 3, 4):
+        wav.close()
+        raise ValueError(f"Unsupported WAV sample width: {width}")
+
+    def chunks():
+        with wav:
+            while True:
+                frames = wav.readframes(CHUNK_SAMPLES)
+                if not frames:
+                    return
+                yield pcm_samples(frames, width, channels)
+
+    return sample_rate, chunks()
+
+
+def decode_ffmpeg(audio: bytes, sample_rate: int) -> Tuple[int, Iterator]:
+    # сжатые форматы (webm/opus, mp3, ...) - ffmpeg в моно s16le с заданной частотой через пайпы;
+    # вход пишет отдельный поток, выход читается кусками по мере декодирования
+    def chunks():
+        process = subprocess.Popen(
+            [settings.WAVEFORM_FFMPEG, "-v", "error", "-i", "pipe:0", "-f", "s16le", "-ac", "1",
+             "-ar", str(sample_rate), "pipe:1"],
+            stdin=subprocess.PIPE, stdout=subprocess.PIPE, stderr=subprocess.PIPE
+        )
+        errors = []
+
+        def feed():
+            try:
+                process.stdin.write(audio)
+            except BrokenPipeError:
+                pass  # ffmpeg завершился раньше - причина будет в stderr
+            finally:
+                process.stdin.close()
+
+        threads = [threading.Thread(target=feed, daemon=True),
+                   threading.Thread(target=lambda: errors.append(process.stderr.read()), daemon=True)]
+        for thread in threads:
+            thread.start()
+        try:
+            while True:
+                data = process.stdout.read(CHUNK_SAMPLES * 2)
+                if not data:
+                    break
+                yield pcm_samples(data[:len(data) // 2 * 2], 2, 1)
+        finally:
+            process.stdout.close()
+            returncode = process.wait()
+            for thread in threads:
+                thread.join()
+        if returncode != 0:
+            raise ValueError(f"ffmpeg failed: {b''.join(errors).decode(errors='replace')[-500:]}")
+
+    return sample_rate, chunks()
+
+
+def decode_audio(audio: bytes, fmt: str) -> Tuple[int, Iterator]:
+    # частота и итератор кусков моно float32
+    if fmt == "wav":
+        try:
+            return decode_wav(audio)
+        except (wave.Error, EOFError):
+            pass  # не PCM (например, WAV с float/ADPCM) - через ffmpeg
+    return decode_ffmpeg(audio, settings.WAVEFORM_DECODE_RATE)
+
+
+def reduce_peaks(mins, maxs, block: int):
+    # min/max по блокам из block элементов; последний блок может быть короче - reduceat без циклов Python
+    import numpy as np
+
+    starts = np.arange(0, len(mins), block)
+    return np.minimum.reduceat(mins, starts), np.maximum.reduceat(maxs, starts)
+
+
+def block_peaks(chunks: Iterator) -> Tuple[object, object, int]:
+    # min/max блоков по MIN_SAMPLES_PER_PEAK отсчетов из потока кусков и число отсчетов;
+    # хвост куска, не заполнивший блок, переносится в следующий
+    import numpy as np
+
+    block = MIN_SAMPLES_PER_PEAK
+    mins, maxs = [], []
+    carry = np.empty(0, dtype=np.float32)
+    count = 0
+    for chunk in chunks:
+        count += len(chunk)
+        samples = np.concatenate((carry, chunk)) if len(carry) else chunk
+        full = len(samples) // block * block
+        if full:
+            blocks = samples[:full].reshape(-1, block)
+            mins.append(blocks.min(axis=1))
+            maxs.append(blocks.max(axis=1))
+        carry = samples[full:]
+    if len(carry):
+        mins.append(np.array([carry.min()], dtype=np.float32))
+        maxs.append(np.array([carry.max()], dtype=np.float32))
+    if not mins:
+        return np.empty(0, dtype=np.float32), np.empty(0, dtype=np.float32), 0
+    return np.concatenate(mins), np.concatenate(maxs), count
+
+
+def peak_levels(mins, maxs, count: int) -> List[Tuple[int, object, object]]:
+    # уровни (samples_per_pixel, mins, maxs) из блоков по MIN_SAMPLES_PER_PEAK отсчетов: самый детальный -
+    # не больше MAX_PEAKS пиков (samples_per_pixel кратен размеру блока), следующие - из предыдущего
+    if count == 0:
+        return []
+
+    factor = max(1, -(-count // (MAX_PEAKS * MIN_SAMPLES_PER_PEAK)))
+    samples_per_pixel = MIN_SAMPLES_PER_PEAK * factor
+    if factor > 1:
+        mins, maxs = reduce_peaks(mins, maxs, factor)
+    levels = [(samples_per_pixel, mins, maxs)]
+    while len(mins) > MIN_PEAKS:
+        samples_per_pixel *= LEVEL_FACTOR
+        mins, maxs = reduce_peaks(mins, maxs, LEVEL_FACTOR)
+        levels.append((samples_per_pixel, mins, maxs))
+    return levels
+
+
+def encode_dat(mins, maxs, sample_rate: int, samples_per_pixel: int, bits: int) -> bytes:
+    import numpy as np
+
+    scale, dtype = (127, "<i1") if bits == 8 else (32767, "<i2")
+    pairs = np.empty(len(mins) * 2, dtype=np.float32)
+    pairs[0::2], pairs[1::2] = mins, maxs
+    data = np.clip(np.rint(pairs * scale), -scale - 1, scale).astype(dtype)
+    header = DAT_HEADER.pack(DAT_VERSION, DAT_FLAG_8BIT if bits == 8 else 0, sample_rate,
+                             samples_per_pixel, len(mins))
+    return header + data.tobytes()
+
+
+def build_waveform(audio: bytes, fmt: str, bits: int = 8) -> Tuple[bytes, List[dict], float]:
+    # артефакт (все уровни подряд), оглавление уровней и длительность в секундах
+    sample_rate, chunks = decode_audio(audio, fmt)
+    mins, maxs, count = block_peaks(chunks)
+    artifact = bytearray()
+    levels = []
+    for samples_per_pixel, level_mins, level_maxs in peak_levels(mins, maxs, count):
+        level = encode_dat(level_mins, level_maxs, sample_rate, samples_per_pixel, bits)
+        levels.append({
+            "samples_per_pixel": samples_per_pixel,
+            "length": len(level_mins),
+            "offset": len(artifact),
+            "size": len(level),
+        })
+        artifact.extend(level)
+    return bytes(artifact), levels, count / sample_rate if sample_rate else 0.0
+
+
+def choose_level(levels: List[dict], resolution: int) -> dict:
+    # самый грубый уровень, в котором пиков не меньше запрошенного (ширина плеера в пикселях)
+    # уровни отсортированы от детального к грубому; если детализации не хватает - самый детальный
+    suitable = [level for level in levels if level["length"] >= resolution]
+    return suitable[-1] if suitable else levels[0]
+
+
+class WaveformService:
+    def __init__(self, db: AsyncSession, user_id: Optional[uuid.UUID] = None):
+        self.db = db
+        self.audio_files = AudioFileDBInteraction(db)
+        self.note_service = NoteService(db, user_id=user_id)
+
+    async def build(self, note_id: uuid.UUID, audio_file_id: uuid.UUID, audio: bytes, fmt: str) -> bool:
+        # этап "waveform" после загрузки: ошибка этапа не влияет на статус заметки (плеер работает и без пиков)
+        if not settings.WAVEFORM_ENABLED or not numpy_available():
+            return False
+
+        await self.note_service.start_stage(note_id, "waveform")
+        file_key = None
+        try:
+            # декодирование и numpy - в пуле потоков, не больше WAVEFORM_CONCURRENCY на воркер
+            async with waveform_limiter:
+                artifact, levels, duration = await asyncio.to_thread(
+                    build_waveform, audio, fmt, settings.WAVEFORM_BITS
+                )
+            if not levels:
+                raise ValueError("No audio samples decoded")
+
+            # префикс waveforms/ входит в обход сирот (reaper_service.ORPHAN_PREFIXES)
+            file_key = f"waveforms/{note_id}/{audio_file_id}.dat"
+            await s3_client.put_object(file_key, artifact, WAVEFORM_CONTENT_TYPE)
+            await self.audio_files.set_waveform(audio_file_id, file_key, levels, round(duration))
+        except Exception as e:
+            logger.warning(f"Waveform for note {note_id} failed: {e}")
+            if file_key is not None:
+                try:
+                    await s3_client.delete_file(file_key)
+                except Exception:
+                    pass
+            await self.note_service.finish_stage(note_id, "waveform", "error", str(e))
+            return False
+
+        await self.note_service.finish_stage(note_id, "waveform")
+        return True
+
+    async def get_level(self, note_id: uuid.UUID, resolution: int) -> Optional[Tuple[AudioFile, dict]]:
+        # файл с пиками и подходящий уровень или None, если пики еще не готовы
+        audio_file = await self.audio_files.get_waveform(note_id)
+        if audio_file is None or not audio_file.waveform_levels:
+            return None
+        return audio_file, choose_level(audio_file.waveform_levels, resolution)
+
+    @staticmethod
+    async def read_level(audio_file: AudioFile, level: dict) -> bytes:
+        # из объекта читается только нужный уровень (Range GET)
+        return await s3_client.download_range(audio_file.waveform_path, level["offset"], level["size"])
+
+
+# ограничение одновременных расчетов пиков в воркере (CPU и память декодированного аудио)
+waveform_limiter = asyncio.Semaphore(settings.WAVEFORM_CONCURRENCY)
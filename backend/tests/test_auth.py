@@ -0,0 +1,96 @@
+# пользователь запроса: токен шлюза (X-User-Token, HS256) и однопользовательский режим; тариф - из claim токена
+import time
+import uuid
+
+import pytest
+from fastapi import FastAPI, Depends, HTTPException
+from fastapi.testclient import TestClient
+
+from core.auth import current_user_id, current_user_tier, sign_gateway_token, verify_gateway_token
+from core.config import settings
+
+SECRET = "test-gateway-secret"
+USER = uuid.uuid4()
+
+app = FastAPI()
+
+
+@app.get("/whoami")
+def whoami(user_id: uuid.UUID = Depends(current_user_id)):
+    return {"user_id": str(user_id)}
+
+
+@app.get("/tier")
+def tier(user_tier: str = Depends(current_user_tier)):
+    return {"tier": user_tier}
+
+
+@pytest.fixture
+def client(monkeypatch):
+    monkeypatch.setattr(settings, "GATEWAY_SECRET", SECRET)
+    monkeypatch.setattr(settings, "DEFAULT_USER_ID", None)
+    return TestClient(app)
+
+
+def token(**claims) -> str:
+    return sign_gateway_token({"sub": str(USER), "exp": time.time() + 60, **claims}, SECRET)
+
+
+def test_signed_token_identifies_user(client):
+    response = client.get("/whoami", headers={"X-User-Token": token()})
+    assert response.status_code == 200
+    assert response.json() == {"user_id": str(USER)}
+
+
+def test_token_is_required_without_default_user(client):
+    assert client.get("/whoami").status_code == 401
+    # заголовок X-User-Id без подписи ничего не значит
+    assert client.get("/whoami", headers={"X-User-Id": str(USER)}).status_code == 401
+
+
+@pytest.mark.parametrize("bad_token", [
+    "garbage",
+    "a.b.c",
+    sign_gateway_token({"sub": str(USER), "exp": time.time() + 60}, "other-secret"),
+    sign_gateway_token({"sub": str(USER), "exp": time.time() - 1}, SECRET),
+    sign_gateway_token({"sub": str(USER)}, SECRET),
+    sign_gateway_token({"sub": "not-a-uuid", "exp": time.time() + 60}, SECRET),
+])
+def test_invalid_tokens_are_rejected(client, bad_token):
+    assert client.get("/whoami", headers={"X-User-Token": bad_token}).status_code == 401
+
+
+def test_tampered_claims_are_rejected():
+    header, _, signature = token().split(".")
+    forged = sign_gateway_token({"sub": str(uuid.uuid4()), "exp": time.time() + 60}, SECRET).split(".")[1]
+    with pytest.raises(HTTPException):
+        verify_gateway_token(f"{header}.{forged}.{signature}", SECRET)
+
+
+def test_token_rejected_without_configured_secret(client, monkeypatch):
+    monkeypatch.setattr(settings, "GATEWAY_SECRET", None)
+    assert client.get("/whoami", headers={"X-User-Token": token()}).status_code == 401
+
+
+def test_single_user_mode(client, monkeypatch):
+    monkeypatch.setattr(settings, "DEFAULT_USER_ID", str(USER))
+    assert client.get("/whoami").json() == {"user_id": str(USER)}
+
+
+def test_tier_comes_from_signed_claim(client):
+    assert client.get("/tier", headers={"X-User-Token": token(tier="premium")}).json() == {"tier": "premium"}
+
+
+@pytest.mark.parametrize("claims, headers", [
+    ({}, {}),                                  # токен без тарифа
+    ({"tier": "platinum"}, {}),                # неизвестный тариф
+    ({}, {"X-User-Tier": "premium"}),          # заголовок клиента не повышает приоритет
+])
+def test_tier_defaults_without_known_claim(client, claims, headers):
+    response = client.get("/tier", headers={"X-User-Token": token(**claims), **headers})
+    assert response.json() == {"tier": settings.DEFAULT_USER_TIER}
+
+
+def test_tier_in_single_user_mode(client, monkeypatch):
+    monkeypatch.setattr(settings, "DEFAULT_USER_ID", str(USER))
+    assert client.get("/tier", headers={"X-User-Tier": "premium"}).json() == {"tier": settings.DEFAULT_USER_TIER}
@@ -0,0 +1,55 @@
+# Честная очередь транскрибации: постановки задач одного пользователя из разных воркеров (enqueue_many)
+# не читают одну и ту же последнюю метку - каждая задача встает за предыдущей
+# нужна БД с "bench" в имени (DATABASE_URL): таблицы очищаются
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import select, text
+from sqlalchemy.engine import make_url
+
+from core import database
+from db_layer.processing_db_interaction import ProcessingDBInteraction
+from models.processing import NoteProcessing
+
+JOBS = 20
+COST = 10.0
+
+
+async def concurrent_enqueues():
+    from benchmarks.common import prepare_database, seed_notes
+
+    user_id = uuid.uuid4()
+
+    async def enqueue(note_id):
+        async with database.AsyncSessionLocal() as session:
+            await ProcessingDBInteraction(session).enqueue_many(
+                [{"note_id": note_id, "user_id": user_id, "priority": 1, "cost": COST}], "transcription"
+            )
+
+    try:
+        await prepare_database()
+        await seed_notes(JOBS)
+        async with database.engine.connect() as conn:
+            note_ids = list((await conn.execute(text("SELECT id FROM audio_notes"))).scalars())
+        await asyncio.gather(*(enqueue(note_id) for note_id in note_ids))
+        async with database.AsyncSessionLocal() as session:
+            result = await session.execute(
+                select(NoteProcessing.finish_tag).where(NoteProcessing.user_id == user_id)
+            )
+            return sorted(result.scalars())
+    finally:
+        await database.engine.dispose()
+
+
+def test_concurrent_enqueues_get_distinct_tags():
+    # таблицы очищаются - только на отдельной bench БД
+    database_name = make_url(database.engine.url).database or ""
+    if "bench" not in database_name:
+        pytest.skip(f"needs a database with 'bench' in its name, DATABASE_URL points to '{database_name}'")
+    try:
+        tags = asyncio.run(concurrent_enqueues())
+    except (OSError, ConnectionError) as e:
+        pytest.skip(f"database is unavailable: {e}")
+
+    assert tags == [COST * (position + 1) for position in range(JOBS)]
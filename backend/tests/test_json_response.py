@@ -0,0 +1,79 @@
+# FastJSONResponse должен отдавать побайтно тот же JSON, что и FastAPI через response_model + JSONResponse
+import uuid
+from datetime import datetime, timedelta, timezone
+from typing import List
+
+import pytest
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+from pydantic import TypeAdapter
+
+from core.json_response import FastJSONResponse, dumps
+from schemas.note import NoteResponse, NOTE_RESPONSE_FIELDS
+
+notes_adapter = TypeAdapter(List[NoteResponse])
+
+
+def make_rows(count: int, uuid_type=uuid.UUID, tz=None) -> List[dict]:
+    now = datetime(2024, 1, 1, 12, 0, 0, tzinfo=tz)
+    rows = []
+    for i in range(count):
+        row = {
+            "id": uuid_type(str(uuid.uuid4())),
+            "title": f"Заметка {i} \"в кавычках\"",
+            "tags": ["work", f"tag{i % 3}"] if i % 2 else [],
+            "notes": "Описание\nс переводом строки" if i % 2 else None,
+            "audio_filename": f"audio_{i}.webm",
+            "audio_path": f"audio_notes/{i}.webm" if i % 3 else None,
+            "status": "completed",
+            "transcription": "Текст транскрибации. " * 5,
+            "summary": None,
+            "created_at": now + timedelta(seconds=i, microseconds=i * 7),
+            "updated_at": now + timedelta(minutes=i),
+            "waveform_version": uuid_type(str(uuid.uuid4())) if i % 2 else None,
+        }
+        # столбцы SELECT идут в порядке полей NoteResponse (см. NoteDBInteraction.get_all_rows)
+        rows.append({field: row[field] for field in NOTE_RESPONSE_FIELDS})
+    return rows
+
+
+def expected_body(rows: List[dict]) -> bytes:
+    # путь FastAPI: валидация response_model -> jsonable_encoder -> starlette JSONResponse
+    validated = notes_adapter.validate_python(rows)
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def _uuid_types():
+    types = [uuid.UUID]
+    try:
+        from asyncpg.pgproto.pgproto import UUID as AsyncpgUUID
+    except ImportError:
+        return types
+
+    # asyncpg отдает из базы свой подкласс UUID
+    types.append(AsyncpgUUID)
+    return types
+
+
+@pytest.mark.parametrize("tz", [None, timezone.utc, timezone(timedelta(hours=3))])
+@pytest.mark.parametrize("uuid_type", _uuid_types())
+def test_fast_response_is_byte_equivalent(uuid_type, tz):
+    rows = make_rows(10, uuid_type=uuid_type, tz=tz)
+    assert FastJSONResponse(rows).body == expected_body(rows)
+
+
+def test_fast_response_passes_bytes_through():
+    body = FastJSONResponse(make_rows(2)).body
+    assert FastJSONResponse(body).body == body
+
+
+@pytest.mark.parametrize("uuid_type", _uuid_types())
+def test_dumps_encodes_uuid_subclasses(uuid_type):
+    # строки списка из asyncpg идут в orjson без response_model - подкласс UUID кодирует хук _default
+    value = uuid.uuid4()
+    assert dumps({"id": uuid_type(str(value))}) == f'{{"id":"{value}"}}'.encode()
+
+
+def test_dumps_rejects_unknown_types():
+    with pytest.raises(TypeError):
+        dumps({"value": object()})
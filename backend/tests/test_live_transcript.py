@@ -0,0 +1,76 @@
+# Потоковая транскрибация заменяет воркер транскрибации: сохранив транскрипт, загрузка сама публикует задачу
+# суммаризации (без нее заметка ждала бы reaper). Заметки и очередь подменены, БД и RabbitMQ не нужны
+import asyncio
+import uuid
+
+import services.upload_service as upload_service
+from services.upload_service import UploadService
+
+NOTE = uuid.uuid4()
+SEGMENTS = [{"start_ms": 900, "end_ms": 1500, "text": " world "}, {"start_ms": 0, "end_ms": 800, "text": "hello"}]
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.sent = []
+
+    async def send_json(self, message: dict):
+        self.sent.append(message)
+
+
+class FakeLive:
+    active = True
+    error = None
+    segments = SEGMENTS
+
+    async def finish(self):
+        return []
+
+
+class FakeNoteService:
+    def __init__(self):
+        self.calls = []
+
+    async def start_stage(self, note_id, stage):
+        self.calls.append(("start", stage))
+
+    async def finish_stage(self, note_id, stage, status="completed", error_message=None):
+        self.calls.append(("finish", stage, status))
+
+    async def update_transcription_status(self, note_id, transcription=None, segments=None):
+        self.calls.append(("transcribed", note_id))
+
+
+class FakeQueue:
+    def __init__(self, fail: bool = False):
+        self.fail = fail
+        self.summarizations = []
+
+    async def send_summarization_task(self, note_id: str, transcription_text: str):
+        if self.fail:
+            raise ConnectionError("broker is down")
+        self.summarizations.append((note_id, transcription_text))
+
+
+def save(monkeypatch, queue: FakeQueue):
+    monkeypatch.setattr(upload_service, "queue_service", queue)
+    service = UploadService(db=None)
+    service.note_service = FakeNoteService()
+    websocket = FakeWebSocket()
+    saved = asyncio.run(service.save_live_transcript(websocket, NOTE, FakeLive()))
+    return saved, service.note_service.calls, websocket.sent
+
+
+def test_live_transcript_publishes_summarization(monkeypatch):
+    queue = FakeQueue()
+    saved, calls, sent = save(monkeypatch, queue)
+
+    assert saved and ("transcribed", NOTE) in calls
+    assert queue.summarizations == [(str(NOTE), "hello world")]
+    assert sent[-1] == {"status": "transcribed", "segments": len(SEGMENTS)}
+
+
+def test_failed_publish_keeps_transcript(monkeypatch):
+    # этап summarization уже начат - публикацию повторит reaper
+    saved, calls, _ = save(monkeypatch, FakeQueue(fail=True))
+    assert saved and ("transcribed", NOTE) in calls
@@ -0,0 +1,157 @@
+# Планы запросов списка заметок: фильтры по статусу и датам должны идти по индексам миграции 0006,
+# а не последовательным чтением партиций. SQL перехватывается у NoteDBInteraction (тот же, что выполняет API)
+# и объясняется с теми же параметрами - и custom, и generic планом (prepared statements asyncpg)
+# нужна БД с "bench" в имени (DATABASE_URL): таблицы очищаются; размер - EXPLAIN_CHECK_ROWS (по умолчанию 50000)
+import asyncio
+import json
+import os
+from datetime import timedelta
+from typing import Any, Dict, List, Set, Tuple
+
+import pytest
+from sqlalchemy import event, text
+from sqlalchemy.engine import make_url
+
+from core import database
+from db_layer.note_db_interaction import NoteDBInteraction
+from models.note import ACTIVE_NOTE_STATUSES
+
+ROWS = int(os.environ.get("EXPLAIN_CHECK_ROWS", 50000))
+
+# (название, фильтры относительно последней заметки, подходящие индексы)
+CASES = [
+    ("unfinished notes not updated for an hour",
+     lambda last: {"status": list(ACTIVE_NOTE_STATUSES), "updated_before": last - timedelta(hours=1)},
+     ("active_updated_at",)),
+    ("stuck in transcription for an hour",
+     lambda last: {"status": ["pending_transcription"], "updated_before": last - timedelta(hours=1)},
+     # статус из незавершенных - годится и маленький частичный индекс
+     ("status_created_at", "active_updated_at")),
+    ("errors for the last week",
+     lambda last: {"status": "error", "created_after": last - timedelta(days=7)},
+     ("status_created_at",)),
+    ("errors and uploads in a date range",
+     lambda last: {"status": ["error", "uploading"], "created_after": last - timedelta(days=30),
+                   "created_before": last - timedelta(days=7)},
+     ("status_created_at",)),
+]
+
+
+async def production_like_statuses():
+    # в seed_notes статусы распределены равномерно, в реальной базе почти все заметки завершены:
+    # в обработке - заметки последнего часа и редкие зависшие (каждая тысячная), ошибки - каждая сотая
+    async with database.engine.begin() as conn:
+        await conn.execute(text("""
+            UPDATE audio_notes SET status = CASE
+                WHEN abs(hashtext(id::text)) % 1000 = 0 THEN 'pending_transcription'
+                WHEN abs(hashtext(id::text)) % 100 = 0 THEN 'error'
+                ELSE 'completed' END
+            WHERE created_at < (SELECT max(created_at) - interval '1 hour' FROM audio_notes)
+        """))
+    # частичный индекс раздут строками, бывшими незавершенными при загрузке, - перестраиваем,
+    # чтобы его размер (а с ним и стоимость в плане) был как в рабочей базе
+    async with database.engine.connect() as conn:
+        conn = await conn.execution_options(isolation_level="AUTOCOMMIT")
+        await conn.execute(text("VACUUM audio_notes"))
+        await conn.execute(text("REINDEX TABLE audio_notes"))
+        await conn.execute(text("ANALYZE audio_notes"))
+
+
+async def captured_list_query(filters: Dict[str, Any]) -> Tuple[str, Any]:
+    # первый запрос get_all - выборка списка (второй, если есть, догружает архив)
+    statements = []
+
+    def capture(conn, cursor, statement, parameters, context, executemany):
+        statements.append((statement, parameters))
+
+    sync_engine = database.engine.sync_engine
+    event.listen(sync_engine, "before_cursor_execute", capture)
+    try:
+        async with database.AsyncSessionLocal() as session:
+            await NoteDBInteraction(session).get_all(0, 100, filters)
+    finally:
+        event.remove(sync_engine, "before_cursor_execute", capture)
+    return statements[0]
+
+
+def plan_nodes(plan: Dict[str, Any]) -> List[Dict[str, Any]]:
+    nodes = [plan]
+    for child in plan.get("Plans", []):
+        nodes.extend(plan_nodes(child))
+    return nodes
+
+
+async def explain(statement: str, parameters: Any, plan_cache_mode: str) -> Dict[str, Any]:
+    async with database.engine.connect() as conn:
+        await conn.execute(text(f"SET plan_cache_mode = {plan_cache_mode}"))
+        result = await conn.exec_driver_sql(f"EXPLAIN (FORMAT JSON) {statement}", parameters)
+        raw = result.scalar_one()
+        return (json.loads(raw) if isinstance(raw, str) else raw)[0]["Plan"]
+
+
+async def empty_partitions() -> Set[str]:
+    # Seq Scan по пустой партиции (будущие месяцы) - нормальный план
+    async with database.engine.connect() as conn:
+        result = await conn.execute(text("""
+            SELECT c.relname FROM pg_inherits i JOIN pg_class c ON c.oid = i.inhrelid
+            WHERE i.inhparent = 'audio_notes'::regclass AND c.reltuples < 1000
+        """))
+        return set(result.scalars())
+
+
+def check_plan(plan: Dict[str, Any], expected_indexes: Tuple[str, ...], skip_relations: Set[str]) -> List[str]:
+    nodes = plan_nodes(plan)
+    problems = []
+    seq_scans = sorted({node["Relation Name"] for node in nodes
+                        if node["Node Type"] == "Seq Scan" and node.get("Relation Name", "").startswith("audio_notes")
+                        and node["Relation Name"] not in skip_relations})
+    if seq_scans:
+        problems.append(f"Seq Scan on {', '.join(seq_scans)}")
+    if not any(index in node.get("Index Name", "") for node in nodes for index in expected_indexes):
+        used = sorted({node["Index Name"] for node in nodes if "Index Name" in node})
+        expected = " or ".join(f"*{index}*" for index in expected_indexes)
+        problems.append(f"index {expected} not used (used: {', '.join(used) or 'none'})")
+    return problems
+
+
+async def prepare():
+    from benchmarks.common import prepare_database, seed_notes
+
+    try:
+        await prepare_database()
+        await seed_notes(ROWS)
+        await production_like_statuses()
+        async with database.engine.connect() as conn:
+            last = (await conn.execute(text("SELECT max(created_at) FROM audio_notes"))).scalar_one()
+        return last, await empty_partitions()
+    finally:
+        await database.engine.dispose()
+
+
+async def plan_problems(filters: Dict[str, Any], expected_indexes: Tuple[str, ...], mode: str,
+                        skip_relations: Set[str]) -> List[str]:
+    try:
+        statement, parameters = await captured_list_query(filters)
+        return check_plan(await explain(statement, parameters, mode), expected_indexes, skip_relations)
+    finally:
+        await database.engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def seeded():
+    # таблицы очищаются - только на отдельной bench БД
+    database_name = make_url(database.engine.url).database or ""
+    if "bench" not in database_name:
+        pytest.skip(f"needs a database with 'bench' in its name, DATABASE_URL points to '{database_name}'")
+    try:
+        return asyncio.run(prepare())
+    except (OSError, ConnectionError) as e:
+        pytest.skip(f"database is unavailable: {e}")
+
+
+@pytest.mark.parametrize("mode", ["force_custom_plan", "force_generic_plan"])
+@pytest.mark.parametrize("name, filters, expected_indexes", CASES, ids=[case[0] for case in CASES])
+def test_list_filters_use_status_indexes(seeded, name, filters, expected_indexes, mode):
+    last, skip_relations = seeded
+    problems = asyncio.run(plan_problems(filters(last), expected_indexes, mode, skip_relations))
+    assert not problems, f"{name} [{mode}]: {'; '.join(problems)}"
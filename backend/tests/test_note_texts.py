@@ -0,0 +1,75 @@
+# Сохраненные документы транскрипта и саммари (note_texts) не переживают смену текста: любая запись текста
+# через репозиторий удаляет документ в той же транзакции, NoteService пересобирает его
+# нужна БД с "bench" в имени (DATABASE_URL): таблицы очищаются
+import asyncio
+
+import orjson
+import pytest
+from sqlalchemy.engine import make_url
+
+from core import database
+from core.compression import IDENTITY, decompress
+from db_layer.note_db_interaction import NoteDBInteraction
+from services.note_service import NoteService
+
+
+async def document(session, note_id, kind):
+    stored = await NoteDBInteraction(session).get_text_document(note_id, kind)
+    if stored is None:
+        return None
+    return orjson.loads(stored.body if stored.encoding == IDENTITY else decompress(stored.body, stored.encoding))
+
+
+async def scenario():
+    from benchmarks.common import BENCH_USER, prepare_database, seed_notes
+
+    documents = {}
+    try:
+        await prepare_database()
+        await seed_notes(6)
+        async with database.AsyncSessionLocal() as session:
+            repository = NoteDBInteraction(session, user_id=BENCH_USER)
+            service = NoteService(session, user_id=BENCH_USER)
+            note = (await repository.get_all(0, 1))[0]
+
+            await service.update_summary_status(note.id, "first")
+            documents["built"] = await document(session, note.id, "summary")
+            await repository.update(note.id, {"summary": "second"})
+            documents["update"] = await document(session, note.id, "summary")
+
+            await service.update_summary_status(note.id, "third")
+            await repository.update_many([{"id": note.id, "summary": "fourth"}])
+            documents["update_many"] = await document(session, note.id, "summary")
+
+            await service.update_transcription_status(note.id, transcription="plain text")
+            await repository.replace_segments(note, [{"start_ms": 0, "end_ms": 900, "text": "segment"}])
+            documents["replace_segments"] = await document(session, note.id, "transcription")
+
+            await service.update_transcription_status(note.id, segments=[{"start_ms": 0, "end_ms": 900,
+                                                                          "text": "new segment"}])
+            documents["rebuilt"] = await document(session, note.id, "transcription")
+        return documents
+    finally:
+        await database.engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def documents():
+    # таблицы очищаются - только на отдельной bench БД
+    database_name = make_url(database.engine.url).database or ""
+    if "bench" not in database_name:
+        pytest.skip(f"needs a database with 'bench' in its name, DATABASE_URL points to '{database_name}'")
+    try:
+        return asyncio.run(scenario())
+    except (OSError, ConnectionError) as e:
+        pytest.skip(f"database is unavailable: {e}")
+
+
+def test_document_is_built_by_note_service(documents):
+    assert documents["built"] == {"summary": "first"}
+    assert documents["rebuilt"]["transcription"] == "new segment"
+
+
+@pytest.mark.parametrize("path", ["update", "update_many", "replace_segments"])
+def test_text_change_drops_document(documents, path):
+    assert documents[path] is None
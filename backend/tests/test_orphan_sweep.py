@@ -0,0 +1,67 @@
+# Обход S3-сирот (ProcessingReaper.delete_orphans) по умолчанию проходит все префиксы приложения:
+# пики waveform, оставшиеся после неудачного удаления заметки, тоже удаляются, объекты со ссылкой - нет
+# нужна БД с "bench" в имени (DATABASE_URL): таблицы очищаются
+import asyncio
+from datetime import datetime, timedelta, timezone
+
+import pytest
+from sqlalchemy.engine import make_url
+
+from core import database
+from db_layer.audio_file_db_interaction import AudioFileDBInteraction
+from db_layer.note_db_interaction import NoteDBInteraction
+from services.reaper_service import ProcessingReaper
+
+OLD = datetime.now(timezone.utc) - timedelta(days=2)
+REFERENCED = ["audio_notes/kept.webm", "waveforms/kept/kept.dat"]
+ORPHANS = ["audio_notes/orphan.webm", "waveforms/deleted-note/file.dat"]
+
+
+class FakeStorage:
+    def __init__(self, keys):
+        self.objects = {key: OLD for key in keys}
+
+    async def list_objects(self, prefix: str):
+        yield [(key, modified) for key, modified in self.objects.items() if key.startswith(prefix)]
+
+    async def delete_files(self, keys) -> int:
+        for key in keys:
+            del self.objects[key]
+        return len(keys)
+
+
+async def sweep():
+    from benchmarks.common import BENCH_USER, prepare_database, seed_notes
+
+    try:
+        await prepare_database()
+        await seed_notes(1)
+        storage = FakeStorage(REFERENCED + ORPHANS)
+        async with database.AsyncSessionLocal() as session:
+            note = (await NoteDBInteraction(session, user_id=BENCH_USER).get_all(0, 1))[0]
+            await AudioFileDBInteraction(session).create({
+                "note_id": note.id, "file_path": REFERENCED[0], "waveform_path": REFERENCED[1], "file_size": 1,
+            })
+        report = await ProcessingReaper(storage=storage).delete_orphans(timedelta(hours=1))
+        return report, set(storage.objects)
+    finally:
+        await database.engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def swept():
+    # таблицы очищаются - только на отдельной bench БД
+    database_name = make_url(database.engine.url).database or ""
+    if "bench" not in database_name:
+        pytest.skip(f"needs a database with 'bench' in its name, DATABASE_URL points to '{database_name}'")
+    try:
+        return asyncio.run(sweep())
+    except (OSError, ConnectionError) as e:
+        pytest.skip(f"database is unavailable: {e}")
+
+
+def test_sweep_covers_waveform_prefix(swept):
+    report, remaining = swept
+    assert remaining == set(REFERENCED)
+    assert report["scanned"] == len(REFERENCED) + len(ORPHANS)
+    assert report["deleted"] == len(ORPHANS)
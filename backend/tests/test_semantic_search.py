@@ -0,0 +1,103 @@
+# Семантический поиск на детерминированной модели (FakeEmbeddingModel): индексатор векторизует тексты заметок,
+# поиск возвращает заметки только своего пользователя и не короче запрошенного, когда векторы пользователя -
+# малая доля таблицы (HNSW фильтрует пользователя после индекса)
+# нужна БД с "bench" в имени (DATABASE_URL) и pgvector: таблицы очищаются
+import asyncio
+import uuid
+
+import pytest
+from sqlalchemy import text
+from sqlalchemy.engine import make_url
+
+pytest.importorskip("numpy")
+
+from core import database
+from core.config import settings
+from core.embeddings import FakeEmbeddingModel
+from db_layer.embedding_db_interaction import EmbeddingDBInteraction
+from services.embedding_service import EmbeddingIndexer, SemanticSearchService
+
+USER = uuid.UUID(int=1)
+OTHER_USER = uuid.UUID(int=2)
+OTHER_NOTES = 6000
+
+TEXTS = [
+    "Rain and thunderstorm forecast for the weekend weather",
+    "Quarterly budget review with the finance team",
+    "Grocery list milk bread eggs",
+    "Guitar practice chords and scales",
+    "Weather tomorrow sunny after morning rain",
+]
+
+model = FakeEmbeddingModel(settings.EMBEDDING_DIM)
+
+
+async def prepare():
+    from benchmarks.common import NOTE_COLUMNS, note_records, prepare_database, seed_notes
+
+    try:
+        await prepare_database()
+        # заметки другого пользователя: у каждой шестой есть транскрипт и саммари
+        await seed_notes(OTHER_NOTES, users=[OTHER_USER])
+        records = [record[:8] + (body, None) + record[10:]
+                   for record, body in zip(note_records(len(TEXTS), OTHER_NOTES, [USER]), TEXTS)]
+        async with database.engine.connect() as conn:
+            driver = (await conn.get_raw_connection()).driver_connection
+            await driver.copy_records_to_table("audio_notes", records=records, columns=NOTE_COLUMNS)
+            await conn.commit()
+
+        indexer = EmbeddingIndexer(model=model, batch_size=500)
+        await indexer.backfill()
+        await indexer.run_once()
+        async with database.AsyncSessionLocal() as session:
+            await session.execute(text("ANALYZE note_embeddings"))
+            await session.commit()
+        return {record[0]: body for record, body in zip(records, TEXTS)}
+    finally:
+        await database.engine.dispose()
+
+
+async def search(query: str, limit: int):
+    try:
+        async with database.AsyncSessionLocal() as session:
+            results = await SemanticSearchService(session, USER, model).search(query, limit)
+            return [(note.id, score) for note, score in results]
+    finally:
+        await database.engine.dispose()
+
+
+@pytest.fixture(scope="module")
+def notes():
+    # таблицы очищаются - только на отдельной bench БД
+    database_name = make_url(database.engine.url).database or ""
+    if "bench" not in database_name:
+        pytest.skip(f"needs a database with 'bench' in its name, DATABASE_URL points to '{database_name}'")
+    try:
+        return asyncio.run(prepare())
+    except (OSError, ConnectionError) as e:
+        pytest.skip(f"database is unavailable: {e}")
+
+
+def test_search_ranks_related_notes_first(notes):
+    found = asyncio.run(search("weather forecast rain", 2))
+    assert [notes[note_id] for note_id, _ in found] == [TEXTS[0], TEXTS[4]]
+    assert found[0][1] > found[1][1]
+
+
+@pytest.mark.parametrize("limit", [3, 10])
+def test_search_returns_full_page_of_own_notes(notes, limit):
+    found = asyncio.run(search("weekly planning", limit))
+    assert len(found) == min(limit, len(TEXTS))
+    assert {note_id for note_id, _ in found} <= set(notes)
+
+
+def test_search_through_hnsw_returns_full_page(notes, monkeypatch):
+    # статистика "пустой таблицы" и нулевой порог - поиск начинается с HNSW, как у крупного пользователя;
+    # векторов пользователя среди кандидатов индекса не хватит - выдачу добирает перебор
+    async def no_statistics(self):
+        return 0
+
+    monkeypatch.setattr(EmbeddingDBInteraction, "total_vectors_estimate", no_statistics)
+    monkeypatch.setattr(settings, "EMBEDDING_EXACT_THRESHOLD", 0)
+    found = asyncio.run(search("weekly planning", 10))
+    assert {note_id for note_id, _ in found} == set(notes)
@@ -0,0 +1,153 @@
+# Мультиплексированная загрузка: каждый принимаемый поток - место клиента в upload_admission, бюджет
+# MAX_UPLOADS_PER_CLIENT общий для всех соединений клиента, потоки сверх него ждут очереди, а не получают отказ.
+# Прием аудио заменен заглушкой UploadService (читает метаданные и один кадр) - проверяется только допуск потоков
+import asyncio
+import json
+import uuid
+from contextlib import AsyncExitStack, asynccontextmanager
+
+import pytest
+
+import services.upload_mux_service as upload_mux
+from core.admission import AdmissionRejected, UploadAdmission
+from core.config import settings
+from services.upload_mux_service import FRAME_HEADER, UploadMultiplexer
+
+CLIENT = "203.0.113.7"
+STREAMS = 10
+
+
+class FakeClient:
+    host = CLIENT
+
+
+class FakeWebSocket:
+    def __init__(self):
+        self.client = FakeClient()
+        self.incoming: asyncio.Queue = asyncio.Queue()
+        self.sent = []
+        self.close_code = None
+
+    async def receive(self) -> dict:
+        return await self.incoming.get()
+
+    async def send_json(self, message: dict):
+        self.sent.append(message)
+
+    async def close(self, code: int = 1000):
+        self.close_code = code
+
+    def send_text(self, message: dict):
+        self.incoming.put_nowait({"type": "websocket.receive", "text": json.dumps(message)})
+
+    def send_frame(self, stream_id: int, data: bytes):
+        self.incoming.put_nowait({"type": "websocket.receive", "bytes": FRAME_HEADER.pack(stream_id) + data})
+
+    def disconnect(self):
+        self.incoming.put_nowait({"type": "websocket.disconnect", "code": 1000})
+
+
+@pytest.fixture
+def admission(monkeypatch):
+    admission = UploadAdmission(max_uploads=32, max_per_client=settings.MAX_UPLOADS_PER_CLIENT, queue_timeout=1.0)
+    monkeypatch.setattr(upload_mux, "upload_admission", admission)
+    return admission
+
+
+@pytest.fixture
+def uploads(monkeypatch, admission):
+    state = {"active": 0, "max_active": 0, "max_client_slots": 0}
+
+    class FakeUploadService:
+        def __init__(self, db, user_id=None, tier=None):
+            pass
+
+        async def handle_upload(self, stream, note_id):
+            await stream.receive_json()
+            state["active"] += 1
+            state["max_active"] = max(state["max_active"], state["active"])
+            state["max_client_slots"] = max(state["max_client_slots"], admission.per_client[CLIENT])
+            try:
+                await stream.receive_bytes()
+                await asyncio.sleep(0.01)
+                await stream.send_json({"status": "completed"})
+            finally:
+                state["active"] -= 1
+
+    @asynccontextmanager
+    async def no_session():
+        yield None
+
+    monkeypatch.setattr(upload_mux, "UploadService", FakeUploadService)
+    monkeypatch.setattr(upload_mux, "AsyncSessionLocal", no_session)
+    return state
+
+
+async def upload_streams(websocket: FakeWebSocket, count: int):
+    multiplexer = UploadMultiplexer(websocket)
+    connection = asyncio.create_task(multiplexer.run())
+    for stream_id in range(1, count + 1):
+        websocket.send_text({"stream_id": stream_id, "note_id": str(uuid.uuid4()),
+                             "filename": "a.webm", "file_size": 1})
+        websocket.send_frame(stream_id, b"x")
+    while sum(message.get("status") == "closed" for message in websocket.sent) < count:
+        await asyncio.sleep(0.01)
+    websocket.disconnect()
+    await connection
+
+
+def assert_completed(websocket: FakeWebSocket, count: int):
+    completed = {message["stream_id"] for message in websocket.sent if message.get("status") == "completed"}
+    errors = [message for message in websocket.sent if message.get("status") == "error"]
+    assert completed == set(range(1, count + 1)) and not errors
+
+
+def test_streams_beyond_client_limit_are_queued(uploads):
+    websocket = FakeWebSocket()
+    asyncio.run(upload_streams(websocket, STREAMS))
+
+    assert_completed(websocket, STREAMS)
+    assert uploads["max_active"] == settings.MAX_UPLOADS_PER_CLIENT
+    assert uploads["max_client_slots"] == settings.MAX_UPLOADS_PER_CLIENT
+
+
+def test_connections_of_one_client_share_its_budget(uploads, admission):
+    # два соединения одного клиента вместе принимают не больше MAX_UPLOADS_PER_CLIENT потоков
+    async def scenario():
+        await asyncio.gather(*(upload_streams(websocket, STREAMS) for websocket in websockets))
+
+    websockets = [FakeWebSocket(), FakeWebSocket()]
+    asyncio.run(scenario())
+
+    for websocket in websockets:
+        assert_completed(websocket, STREAMS)
+    assert uploads["max_active"] == settings.MAX_UPLOADS_PER_CLIENT
+    assert uploads["max_client_slots"] == settings.MAX_UPLOADS_PER_CLIENT
+    assert not admission.per_client and not admission.connections
+
+
+def test_socket_upload_rejected_while_streams_hold_client_budget(uploads, admission):
+    async def scenario():
+        async with AsyncExitStack() as stack:
+            for _ in range(settings.MAX_UPLOADS_PER_CLIENT):
+                await stack.enter_async_context(admission.client_slot(CLIENT, wait=True))
+            with pytest.raises(AdmissionRejected):
+                async with admission.slot(CLIENT):
+                    pass
+
+    asyncio.run(scenario())
+
+
+def test_connection_rejected_when_client_has_max_connections(uploads, admission):
+    async def scenario():
+        # у клиента уже MAX_UPLOADS_PER_CLIENT мультиплексированных соединений
+        websocket = FakeWebSocket()
+        async with AsyncExitStack() as stack:
+            for _ in range(settings.MAX_UPLOADS_PER_CLIENT):
+                await stack.enter_async_context(admission.connection_slot(CLIENT))
+            await UploadMultiplexer(websocket).run()
+        return websocket
+
+    websocket = asyncio.run(scenario())
+    assert websocket.sent[0]["status"] == "error" and "retry_after" in websocket.sent[0]
+    assert websocket.close_code == 1013
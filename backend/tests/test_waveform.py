@@ -0,0 +1,50 @@
+# Пики считаются по кускам декодированного аудио - результат должен совпадать с расчетом по всем отсчетам сразу
+import io
+import wave
+
+import pytest
+
+np = pytest.importorskip("numpy")
+
+from services.waveform_service import CHUNK_SAMPLES, DAT_HEADER, MAX_PEAKS, MIN_SAMPLES_PER_PEAK, build_waveform
+
+
+def make_wav(samples, channels: int = 1, rate: int = 16000) -> bytes:
+    buffer = io.BytesIO()
+    with wave.open(buffer, "wb") as wav:
+        wav.setnchannels(channels)
+        wav.setsampwidth(2)
+        wav.setframerate(rate)
+        wav.writeframes(samples.astype("<i2").tobytes())
+    return buffer.getvalue()
+
+
+def expected_level(mono, samples_per_pixel: int):
+    starts = np.arange(0, len(mono), samples_per_pixel)
+    pairs = np.empty(len(starts) * 2, dtype=np.float32)
+    pairs[0::2] = np.minimum.reduceat(mono, starts)
+    pairs[1::2] = np.maximum.reduceat(mono, starts)
+    return np.clip(np.rint(pairs * 32767), -32768, 32767).astype("<i2")
+
+
+@pytest.mark.parametrize("count, channels", [
+    (10, 1),                                         # меньше одного блока
+    (CHUNK_SAMPLES * 2 + 123, 1),                    # хвост блока переносится между кусками
+    (CHUNK_SAMPLES + 7, 2),                          # стерео сводится в моно
+    (MAX_PEAKS * MIN_SAMPLES_PER_PEAK * 2 + 5, 1),   # первый уровень грубее блока
+])
+def test_streamed_peaks_match_whole_buffer(count, channels):
+    samples = np.random.default_rng(count).integers(-32768, 32768, count * channels)
+    mono = samples.astype(np.float32) / 32768
+    if channels > 1:
+        mono = mono.reshape(-1, channels).mean(axis=1)
+
+    artifact, levels, duration = build_waveform(make_wav(samples, channels), "wav", bits=16)
+
+    assert duration == count / 16000
+    first = levels[0]
+    assert first["length"] <= MAX_PEAKS
+    assert first["samples_per_pixel"] % MIN_SAMPLES_PER_PEAK == 0
+    for level in levels:
+        data = np.frombuffer(artifact[level["offset"] + DAT_HEADER.size:level["offset"] + level["size"]], dtype="<i2")
+        assert np.array_equal(data, expected_level(mono, level["samples_per_pixel"]))
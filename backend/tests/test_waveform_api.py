@@ -0,0 +1,59 @@
+# Заголовки кэширования GET /notes/{id}/waveform: URL с версией пиков (v = waveform_version заметки) кэшируется
+# навсегда, без версии или с устаревшей - ревалидация по ETag. Заметка и пики подменены, БД и S3 не нужны
+import uuid
+
+import pytest
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from api import notes
+from core.auth import current_user_id
+from core.database import get_db, get_read_db
+from models.audio_file import AudioFile
+from services.note_service import NoteService
+from services.waveform_service import WaveformService, WAVEFORM_IMMUTABLE
+
+NOTE = uuid.uuid4()
+AUDIO_FILE = uuid.uuid4()
+LEVEL = {"samples_per_pixel": 512, "length": 4, "offset": 0, "size": 36}
+DATA = b"\x00" * LEVEL["size"]
+
+
+@pytest.fixture
+def client(monkeypatch):
+    async def cached_note(self, note_id):
+        return object() if note_id == NOTE else None
+
+    async def get_level(self, note_id, resolution):
+        return AudioFile(id=AUDIO_FILE, note_id=note_id, file_path="audio_notes/a.webm"), LEVEL
+
+    async def read_level(audio_file, level):
+        return DATA
+
+    monkeypatch.setattr(NoteService, "get_cached_note", cached_note)
+    monkeypatch.setattr(WaveformService, "get_level", get_level)
+    monkeypatch.setattr(WaveformService, "read_level", staticmethod(read_level))
+
+    app = FastAPI()
+    app.include_router(notes.router)
+    app.dependency_overrides[get_db] = lambda: None
+    app.dependency_overrides[get_read_db] = lambda: None
+    app.dependency_overrides[current_user_id] = lambda: uuid.uuid4()
+    return TestClient(app)
+
+
+def test_versioned_url_is_immutable(client):
+    response = client.get(f"/notes/{NOTE}/waveform", params={"v": str(AUDIO_FILE), "resolution": 4})
+    assert response.status_code == 200 and response.content == DATA
+    assert response.headers["Cache-Control"] == WAVEFORM_IMMUTABLE
+
+
+@pytest.mark.parametrize("params", [{}, {"v": str(uuid.uuid4())}])
+def test_unversioned_url_is_revalidated(client, params):
+    response = client.get(f"/notes/{NOTE}/waveform", params=params)
+    assert response.status_code == 200
+    assert response.headers["Cache-Control"] == "private, no-cache"
+
+    revalidated = client.get(f"/notes/{NOTE}/waveform", params=params,
+                             headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
@@ -0,0 +1,27 @@
+# Сжатые документы транскрипта и саммари (таблица note_texts, миграция 0012)
+#   python texts.py backfill    - собрать документы заметок, у которых их еще нет
+import argparse
+import asyncio
+import logging
+
+from core.compression import storage_encoding
+from core.database import engine
+from services.note_text_service import backfill_texts
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(args):
+    try:
+        if args.command == "backfill":
+            logger.info(f"Stored {await backfill_texts(batch_size=args.batch_size)} documents ({storage_encoding()})")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compressed transcript and summary documents")
+    parser.add_argument("command", choices=["backfill"])
+    parser.add_argument("--batch-size", type=int, default=500, help="notes read per cursor fetch")
+    asyncio.run(main(parser.parse_args()))
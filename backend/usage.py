@@ -0,0 +1,30 @@
+# Счетчики заметок пользователей для GET /api/v1/stats (таблица usage_counters, миграция 0014)
+#   python usage.py reconcile    - пересчитать из audio_notes/audio_files и исправить расхождения
+#                                  (после миграции заполняет пустую таблицу)
+import argparse
+import asyncio
+import logging
+
+from core.database import engine
+from services.usage_service import UsageReconciler
+
+logging.basicConfig(level=logging.INFO)
+logger = logging.getLogger(__name__)
+
+
+async def main(args):
+    try:
+        if args.command == "reconcile":
+            corrected = await UsageReconciler().run_once()
+            if corrected is None:
+                logger.info("Reconciliation is running in another process")
+            else:
+                logger.info(f"Corrected {corrected} counters")
+    finally:
+        await engine.dispose()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="User usage counters")
+    parser.add_argument("command", choices=["reconcile"])
+    asyncio.run(main(parser.parse_args()))